@@ -0,0 +1,10 @@
+#!/bin/bash
+# Роль и доступ для потоковой репликации (профиль replica в docker-compose.yml).
+# Выполняется docker-entrypoint только на пустом томе postgres_data.
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-SQL
+    CREATE ROLE ${REPLICATION_USER:-replicator} WITH REPLICATION LOGIN PASSWORD '${REPLICATION_PASSWORD:-replicator}';
+SQL
+
+echo "host replication ${REPLICATION_USER:-replicator} all md5" >> "$PGDATA/pg_hba.conf"
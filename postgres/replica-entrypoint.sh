@@ -0,0 +1,15 @@
+#!/bin/bash
+# Read-реплика: при пустом томе - копия primary (pg_basebackup -R пишет
+# standby.signal и primary_conninfo), затем postgres в режиме hot standby.
+set -e
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_isready -h "$PRIMARY_HOST" -U "$REPLICATION_USER"; do
+        sleep 1
+    done
+    PGPASSWORD="$REPLICATION_PASSWORD" pg_basebackup \
+        -h "$PRIMARY_HOST" -U "$REPLICATION_USER" -D "$PGDATA" -X stream -R -P
+    chmod 700 "$PGDATA"
+fi
+
+exec postgres -c hot_standby=on
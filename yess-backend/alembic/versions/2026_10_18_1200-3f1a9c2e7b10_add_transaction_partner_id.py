@@ -0,0 +1,31 @@
+"""add transaction partner_id
+
+Revision ID: 3f1a9c2e7b10
+Revises: 
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9c2e7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('transactions', sa.Column('partner_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_transactions_partner_id_partners', 'transactions', 'partners',
+        ['partner_id'], ['id']
+    )
+    op.create_index(op.f('ix_transactions_partner_id'), 'transactions', ['partner_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_transactions_partner_id'), table_name='transactions')
+    op.drop_constraint('fk_transactions_partner_id_partners', 'transactions', type_='foreignkey')
+    op.drop_column('transactions', 'partner_id')
@@ -0,0 +1,25 @@
+"""add partner_locations.open_intervals
+
+Revision ID: 8b4d2f6a1c93
+Revises: 3f1a9c2e7b10
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4d2f6a1c93'
+down_revision = '3f1a9c2e7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Заполняется scripts/reparse_working_hours.py
+    op.add_column('partner_locations', sa.Column('open_intervals', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('partner_locations', 'open_intervals')
@@ -0,0 +1,93 @@
+"""add partner full-text search index
+
+Revision ID: c52e7a9d04f1
+Revises: 8b4d2f6a1c93
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.core.text_search import searchable
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e7a9d04f1'
+down_revision = '8b4d2f6a1c93'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.add_column('partners', sa.Column('rating', sa.Float(), nullable=True))
+    op.add_column('partners', sa.Column('search_name', sa.Text(), nullable=True))
+    op.add_column('partners', sa.Column('search_text', sa.Text(), nullable=True))
+    op.add_column('partners', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('simple', coalesce(search_name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(search_text, '')), 'B')",
+            persisted=True
+        ),
+        nullable=True
+    ))
+
+    # Нормализация и транслитерация выполняются в Python (app.core.text_search)
+    partners = sa.table(
+        'partners',
+        sa.column('id', sa.Integer),
+        sa.column('name', sa.String),
+        sa.column('description', sa.Text),
+        sa.column('category', sa.String),
+        sa.column('search_name', sa.Text),
+        sa.column('search_text', sa.Text),
+    )
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(partners.c.id, partners.c.name, partners.c.description, partners.c.category)
+            .where(partners.c.id > last_id)
+            .order_by(partners.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(
+            partners.update()
+            .where(partners.c.id == sa.bindparam('_id'))
+            .values(search_name=sa.bindparam('_name'), search_text=sa.bindparam('_text')),
+            [
+                {
+                    '_id': row.id,
+                    '_name': searchable(row.name),
+                    '_text': searchable(f"{row.description or ''} {row.category or ''}"),
+                }
+                for row in rows
+            ]
+        )
+        last_id = rows[-1].id
+
+    op.create_index(
+        'ix_partners_search_vector', 'partners', ['search_vector'],
+        postgresql_using='gin'
+    )
+    op.create_index(
+        'ix_partners_search_name_trgm', 'partners', ['search_name'],
+        postgresql_using='gin', postgresql_ops={'search_name': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_partners_search_name_trgm', table_name='partners')
+    op.drop_index('ix_partners_search_vector', table_name='partners')
+    op.drop_column('partners', 'search_vector')
+    op.drop_column('partners', 'search_text')
+    op.drop_column('partners', 'search_name')
+    op.drop_column('partners', 'rating')
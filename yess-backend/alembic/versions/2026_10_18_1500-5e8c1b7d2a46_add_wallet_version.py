@@ -0,0 +1,24 @@
+"""add wallet version
+
+Revision ID: 5e8c1b7d2a46
+Revises: c52e7a9d04f1
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8c1b7d2a46'
+down_revision = 'c52e7a9d04f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('wallets', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    op.drop_column('wallets', 'version')
@@ -29,7 +29,7 @@ async def find_nearby_partners(
     - Сортировка по расстоянию
     """
     try:
-        nearby_partners = GeolocationService.find_nearby_partners(
+        nearby_partners = await GeolocationService.find_nearby_partners(
             db=db, 
             request=request
         )
@@ -76,7 +76,7 @@ async def update_partner_location(
         if not current_user.is_partner:
             raise HTTPException(status_code=403, detail="Доступ только для партнеров")
         
-        location = GeolocationService.update_partner_location(
+        location = await GeolocationService.update_partner_location(
             db=db, 
             partner_id=current_user.partner_id,
             latitude=request.latitude,
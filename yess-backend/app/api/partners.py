@@ -1,7 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from sqlalchemy import or_
 
 from app.core.database import get_db
 from app.services.geolocation_service import GeolocationService
@@ -12,6 +11,9 @@ from app.schemas.partner import (
     NearbyPartnerRequest
 )
 from app.services.recommendation_service import RecommendationService
+from app.services.spend_profile_service import spend_profile_service
+from app.services.partner_search_service import partner_search_service
+from app.services.partner_catalog_service import list_categories
 from app.services.auth_service import get_current_user
 from app.models.user import User
 from app.models.partner import Partner
@@ -32,6 +34,8 @@ async def get_personalized_partners(
     - Учитывает категории и сумму предыдущих покупок
     """
     try:
+        # Прогрев LRU профиля трат из Redis до синхронного расчёта
+        await spend_profile_service.get_profile(db, current_user.id)
         recommendations = RecommendationService.get_personalized_partners(
             db=db, 
             user=current_user, 
@@ -53,8 +57,10 @@ async def get_trending_partners(
     - Основано на количестве транзакций за последний месяц
     """
     try:
-        trending_partners = RecommendationService.get_trending_partners(
-            db=db, 
+        # Async Redis, запрос к БД при промахе - в потоке (не блокирует event loop)
+        trending_partners = await RecommendationService.get_trending_partners.call_async(
+            RecommendationService,
+            db=db,
             limit=limit
         )
         return trending_partners
@@ -71,8 +77,24 @@ async def get_partner_categories(
     - Помогает в фильтрации и навигации
     """
     try:
-        categories = db.query(Partner.category).distinct().all()
-        return [category[0] for category in categories]
+        return await list_categories.call_async(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/autocomplete", response_model=List[dict])
+async def autocomplete_partners(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=20),
+    db: Session = Depends(get_db)
+):
+    """
+    Подсказки при вводе названия партнера
+    
+    - Поиск по началу слов, кириллица и латиница ("kofe" = "кофе")
+    - Результаты кэшируются по нормализованному префиксу
+    """
+    try:
+        return await partner_search_service.autocomplete(db, q, limit=limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -95,14 +117,12 @@ async def search_partners(
         # Базовый запрос на поиск
         base_query = db.query(Partner)
         
-        # Текстовый поиск
+        # Текстовый поиск по tsvector/триграммам (GIN индексы)
         if search_request.query:
-            base_query = base_query.filter(
-                or_(
-                    Partner.name.ilike(f"%{search_request.query}%"),
-                    Partner.description.ilike(f"%{search_request.query}%")
-                )
-            )
+            condition = partner_search_service.match_condition(search_request.query)
+            if condition is None:
+                return []
+            base_query = base_query.filter(condition)
         
         # Применение фильтров
         if search_request.filter:
@@ -140,6 +160,12 @@ async def search_partners(
                     if sort_order == 'desc' 
                     else Partner.name.asc()
                 )
+        elif search_request.query:
+            # Без явной сортировки - по релевантности
+            base_query = base_query.order_by(
+                partner_search_service.rank_expression(search_request.query).desc(),
+                Partner.id
+            )
         
         # Постраничная навигация
         partners = base_query.offset(
@@ -148,6 +174,7 @@ async def search_partners(
         
         # Персонализация для авторизованного пользователя
         if current_user:
+            profile = await spend_profile_service.get_profile(db, current_user.id)
             recommendations = [
                 PartnerRecommendation(
                     id=partner.id,
@@ -155,7 +182,7 @@ async def search_partners(
                     category=partner.category,
                     logo_url=partner.logo_url,
                     cashback_rate=RecommendationService._calculate_dynamic_cashback(
-                        current_user, partner
+                        current_user, partner, profile
                     )
                 ) for partner in partners
             ]
@@ -191,7 +218,7 @@ async def find_nearby_partners_with_filter(
     """
     try:
         # Поиск ближайших партнеров с фильтрацией
-        nearby_locations = GeolocationService.find_nearby_partners(
+        nearby_locations = await GeolocationService.find_nearby_partners(
             db=db, 
             request=nearby_request,
             filter_request=filter_request
@@ -199,6 +226,7 @@ async def find_nearby_partners_with_filter(
         
         # Персонализация для авторизованного пользователя
         if current_user:
+            profile = await spend_profile_service.get_profile(db, current_user.id)
             recommendations = [
                 PartnerRecommendation(
                     id=loc.id,
@@ -206,7 +234,7 @@ async def find_nearby_partners_with_filter(
                     category=loc.partner.category,
                     logo_url=loc.partner.logo_url,
                     cashback_rate=RecommendationService._calculate_dynamic_cashback(
-                        current_user, loc.partner
+                        current_user, loc.partner, profile
                     )
                 ) for loc in nearby_locations
             ]
@@ -1,9 +1,12 @@
 """API v1 routes"""
 
-from fastapi import APIRouter
-from .endpoints import users, payments, notifications, achievements, reviews, promotions, analytics
+from fastapi import APIRouter, Depends
 
-api_router = APIRouter()
+from app.core.nplus1 import track_loads
+from app.core.query_stats import track_endpoint
+from .endpoints import users, payments, notifications, achievements, reviews, promotions, analytics, monitoring
+
+api_router = APIRouter(dependencies=[Depends(track_endpoint), Depends(track_loads)])
 
 # Включение роутов
 api_router.include_router(users.router, prefix="/users", tags=["users"])
@@ -12,4 +15,5 @@ api_router.include_router(notifications.router, prefix="/notifications", tags=["
 api_router.include_router(achievements.router, prefix="/achievements", tags=["achievements"])
 api_router.include_router(reviews.router, prefix="/reviews", tags=["reviews"])
 api_router.include_router(promotions.router, prefix="/promotions", tags=["promotions"])
-api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
\ No newline at end of file
+api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
+api_router.include_router(monitoring.router, prefix="/monitoring", tags=["monitoring"])
\ No newline at end of file
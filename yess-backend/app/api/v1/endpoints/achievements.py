@@ -3,7 +3,7 @@
 """
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager
 from sqlalchemy import and_, desc, func
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
@@ -354,7 +354,9 @@ async def get_user_achievements(
 ):
     """Получение достижений пользователя"""
     
-    query = db.query(UserAchievement).join(Achievement).filter(
+    query = db.query(UserAchievement).join(Achievement).options(
+        contains_eager(UserAchievement.achievement)
+    ).filter(
         UserAchievement.user_id == user_id
     )
     
@@ -397,14 +399,22 @@ async def get_achievement_progress(
     achievements = query.all()
     progress_list = []
     
+    # Полученные достижения - одним запросом, а не по запросу на достижение
+    unlocked = {
+        achievement_id for (achievement_id,) in db.query(UserAchievement.achievement_id).filter(
+            UserAchievement.user_id == user_id
+        )
+    }
+    # Агрегаты пользователя общие для достижений: считаются один раз
+    totals = {}
+    
+    def total(name, query):
+        if name not in totals:
+            totals[name] = query.scalar() or 0
+        return totals[name]
+    
     for achievement in achievements:
-        # Проверяем, получено ли достижение
-        user_achievement = db.query(UserAchievement).filter(
-            UserAchievement.user_id == user_id,
-            UserAchievement.achievement_id == achievement.id
-        ).first()
-        
-        if user_achievement:
+        if achievement.id in unlocked:
             # Достижение получено
             progress_list.append(AchievementProgressResponse(
                 achievement_id=achievement.id,
@@ -422,21 +432,21 @@ async def get_achievement_progress(
             
             if achievement.category == AchievementCategory.TRANSACTION:
                 if requirements.get("type") == "transaction_count":
-                    current_progress = db.query(func.count(Transaction.id)).filter(
+                    current_progress = total("transaction_count", db.query(func.count(Transaction.id)).filter(
                         Transaction.user_id == user_id,
                         Transaction.status == "completed"
-                    ).scalar()
+                    ))
                 elif requirements.get("type") == "transaction_amount":
-                    current_progress = db.query(func.sum(Transaction.amount)).filter(
+                    current_progress = total("transaction_amount", db.query(func.sum(Transaction.amount)).filter(
                         Transaction.user_id == user_id,
                         Transaction.status == "completed"
-                    ).scalar() or 0
+                    ))
                     required_progress = requirements.get("amount", 1)
             
             elif achievement.category == AchievementCategory.REFERRAL:
-                current_progress = db.query(func.count(Referral.id)).filter(
+                current_progress = total("referral_count", db.query(func.count(Referral.id)).filter(
                     Referral.referrer_id == user_id
-                ).scalar()
+                ))
             
             progress_percentage = min(100.0, (current_progress / required_progress) * 100) if required_progress > 0 else 0
             
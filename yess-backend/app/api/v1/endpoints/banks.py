@@ -5,6 +5,7 @@
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, validator
 from datetime import datetime, timedelta
@@ -21,6 +22,7 @@ from app.models.transaction import Transaction
 from app.models.payment import PaymentMethod
 from app.core.security import get_current_user
 from app.core.config import settings
+from app.services.wallet_balance_service import wallet_balance_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/banks", tags=["banks"])
@@ -712,21 +714,26 @@ async def handle_bank_webhook(
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
-    # Обновляем статус транзакции
-    transaction.status = webhook_data.status.value
-    transaction.bank_reference = webhook_data.bank_reference
-    transaction.updated_at = datetime.utcnow()
-    
-    # Если платеж успешен, обновляем баланс пользователя
-    if webhook_data.status == PaymentStatus.SUCCESS:
-        user = db.query(User).filter(User.id == transaction.user_id).first()
-        if user and user.wallet:
-            if transaction.transaction_type == "deposit":
-                user.wallet.balance += webhook_data.amount
-            elif transaction.transaction_type == "withdrawal":
-                user.wallet.balance -= webhook_data.amount
-    
-    db.commit()
+    def apply_webhook():
+        # Обновляем статус транзакции
+        transaction.status = webhook_data.status.value
+        transaction.bank_reference = webhook_data.bank_reference
+        transaction.updated_at = datetime.utcnow()
+        
+        # Если платеж успешен, обновляем баланс пользователя
+        if webhook_data.status == PaymentStatus.SUCCESS:
+            user = db.query(User).filter(User.id == transaction.user_id).first()
+            if user and user.wallet:
+                if transaction.transaction_type == "deposit":
+                    user.wallet.balance += webhook_data.amount
+                elif transaction.transaction_type == "withdrawal":
+                    user.wallet.balance -= webhook_data.amount
+    
+    # Коммит через кэш балансов: /wallet, /qr/scan, /order/calculate видят новый баланс
+    try:
+        await wallet_balance_service.apply(db, apply_webhook)
+    except StaleDataError:
+        raise HTTPException(status_code=409, detail="Wallet was modified concurrently, retry later")
     
     return {"message": "Webhook processed successfully"}
 
@@ -808,20 +815,25 @@ async def refund_payment(
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
-    if transaction.status != "success":
-        raise HTTPException(status_code=400, detail="Can only refund successful transactions")
-    
-    # Здесь можно добавить логику возврата через банк
-    # Пока просто обновляем статус
-    
-    transaction.status = "refunded"
-    transaction.updated_at = datetime.utcnow()
-    
-    # Возвращаем деньги на баланс
-    user = db.query(User).filter(User.id == transaction.user_id).first()
-    if user and user.wallet:
-        user.wallet.balance -= transaction.amount
+    def apply_refund():
+        # Статус проверяется и при повторе: параллельный возврат мог уже пройти
+        if transaction.status != "success":
+            raise HTTPException(status_code=400, detail="Can only refund successful transactions")
+        
+        # Здесь можно добавить логику возврата через банк
+        # Пока просто обновляем статус
+        
+        transaction.status = "refunded"
+        transaction.updated_at = datetime.utcnow()
+        
+        # Возвращаем деньги на баланс
+        user = db.query(User).filter(User.id == transaction.user_id).first()
+        if user and user.wallet:
+            user.wallet.balance -= transaction.amount
     
-    db.commit()
+    try:
+        await wallet_balance_service.apply(db, apply_refund)
+    except StaleDataError:
+        raise HTTPException(status_code=409, detail="Wallet was modified concurrently, retry the request")
     
     return {"message": "Refund processed successfully"}
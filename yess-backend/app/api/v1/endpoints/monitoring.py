@@ -0,0 +1,70 @@
+"""
+Диагностика производительности (только для администраторов)
+
+Статистика SQL по отпечаткам (app.core.query_stats), состояние пулов
+соединений (app.core.resources) и горячие ключи кэшей (app.core.cache_metrics).
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List
+
+from app.api.v1.auth import get_current_user
+from app.core import cache_metrics
+from app.core.database import get_db
+from app.core.query_stats import QueryStats, query_stats
+from app.core.resources import resources
+from app.models.role import Role, UserRole
+from app.models.user import User
+
+router = APIRouter()
+
+
+def require_admin(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> User:
+    """Доступ только пользователям с ролью admin"""
+    admin_role = db.query(Role).filter(Role.code == "admin").first()
+    is_admin = admin_role is not None and db.query(UserRole).filter(
+        UserRole.user_id == current_user.id,
+        UserRole.role_id == admin_role.id
+    ).first() is not None
+    if not is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+
+@router.get("/queries")
+async def list_queries(
+    order_by: str = Query("total", regex=f"^({'|'.join(QueryStats.ORDERINGS)})$"),
+    limit: int = Query(50, ge=1, le=500),
+    admin: User = Depends(require_admin)
+) -> List[Dict[str, Any]]:
+    """Отпечатки запросов по суммарному времени (count, mean, max, p95)"""
+    return query_stats.snapshot(order_by=order_by, limit=limit)
+
+
+@router.get("/queries/{fingerprint}")
+async def get_query(fingerprint: str, admin: User = Depends(require_admin)) -> Dict[str, Any]:
+    """Отпечаток со всеми эндпоинтами, примером запроса и планом EXPLAIN"""
+    stats = query_stats.get(fingerprint)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Fingerprint not found")
+    return stats
+
+
+@router.post("/queries/reset")
+async def reset_queries(admin: User = Depends(require_admin)) -> Dict[str, Any]:
+    """Сброс статистики (например, перед нагрузочным тестом)"""
+    query_stats.reset()
+    return {"success": True}
+
+
+@router.get("/pools")
+async def list_pools(admin: User = Depends(require_admin)) -> List[Dict[str, Any]]:
+    """Заполненность пулов соединений БД и Redis"""
+    return resources.snapshot()
+
+
+@router.get("/cache-keys")
+async def cache_keys(admin: User = Depends(require_admin)) -> Dict[str, dict]:
+    """Горячие и крупные ключи кэшей (при CACHE_KEY_SAMPLE_RATE > 0)"""
+    return cache_metrics.snapshot()
@@ -359,8 +359,11 @@ async def send_bulk_notification(
     
     notifications = []
     
+    # Пользователи - одним запросом, а не по запросу на получателя
+    users = {user.id: user for user in db.query(User).filter(User.id.in_(bulk_data.user_ids))}
+    
     for user_id in bulk_data.user_ids:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = users.get(user_id)
         if user:
             notification = Notification(
                 user_id=user_id,
@@ -374,17 +377,23 @@ async def send_bulk_notification(
             db.add(notification)
             notifications.append(notification)
     
+    db.flush()
+    notification_ids = [notification.id for notification in notifications]
     db.commit()
     
+    # commit сбрасывает загруженные атрибуты: обновляем уведомления и
+    # пользователей двумя запросами, а не по запросу на объект в фоновых задачах
+    if notifications:
+        db.query(Notification).filter(Notification.id.in_(notification_ids)).all()
+        db.query(User).filter(User.id.in_(list(users))).all()
+    
     # Отправляем все уведомления в фоне
     for notification in notifications:
-        user = db.query(User).filter(User.id == notification.user_id).first()
-        if user:
-            background_tasks.add_task(
-                notification_service.send_notification,
-                notification,
-                user
-            )
+        background_tasks.add_task(
+            notification_service.send_notification,
+            notification,
+            users[notification.user_id]
+        )
     
     return {
         "message": f"Bulk notification scheduled for {len(notifications)} users",
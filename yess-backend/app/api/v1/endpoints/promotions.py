@@ -3,7 +3,7 @@
 """
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, desc, func, or_
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, validator
@@ -13,6 +13,8 @@ from enum import Enum
 import secrets
 import string
 
+from app.core.cache import cached, redis_cache
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.user import User
 from app.models.partner import Partner
@@ -21,6 +23,7 @@ from app.models.promotion import (
     PromotionType, PromoCodeType, PromoCodeStatus
 )
 from app.core.security import get_current_user
+from app.services.lookup_filters import promo_codes
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/promotions", tags=["promotions"])
@@ -241,6 +244,7 @@ class PromotionService:
         db.add(promo_code)
         db.commit()
         db.refresh(promo_code)
+        await promo_codes.add(promo_code.code)
         
         return promo_code
     
@@ -251,8 +255,11 @@ class PromotionService:
     ) -> PromoCodeValidationResponse:
         """Валидация промо-кода"""
         
-        # Ищем промо-код
-        promo_code = db.query(PromoCode).filter(PromoCode.code == validation_data.code).first()
+        # Ищем промо-код (несуществующие отсекаются фильтром без запроса в БД)
+        promo_code = await promo_codes.lookup(
+            validation_data.code,
+            lambda: db.query(PromoCode).filter(PromoCode.code == validation_data.code).first()
+        )
         
         if not promo_code:
             return PromoCodeValidationResponse(
@@ -391,9 +398,39 @@ async def create_promotion(
         promotion_data=promotion_data,
         db=db
     )
+    await redis_cache.invalidate_tags("promotions")
     
     return PromotionResponse.from_orm(promotion)
 
+@cached(
+    ttl=settings.PROMOTIONS_CACHE_TTL,
+    tags=["promotions"],
+    compress=True,
+    model=List[PromotionResponse]
+)
+def active_promotions(
+    db: Session,
+    category: Optional[PromotionCategory] = None,
+    partner_id: Optional[int] = None
+) -> List[PromotionResponse]:
+    """
+    Действующие акции (общий список - самый частый запрос, прогревается)
+    Границы действия акций учитываются с точностью до PROMOTIONS_CACHE_TTL
+    """
+    now = datetime.utcnow()
+    query = db.query(Promotion).filter(
+        Promotion.status == PromotionStatus.ACTIVE,
+        Promotion.start_date <= now,
+        Promotion.end_date >= now
+    )
+    if category:
+        query = query.filter(Promotion.category == category)
+    if partner_id:
+        query = query.filter(Promotion.partner_id == partner_id)
+
+    promotions = query.order_by(desc(Promotion.created_at)).all()
+    return [PromotionResponse.from_orm(promotion) for promotion in promotions]
+
 @router.get("/", response_model=List[PromotionResponse])
 async def get_promotions(
     category: Optional[PromotionCategory] = None,
@@ -404,6 +441,9 @@ async def get_promotions(
 ):
     """Получение списка акций"""
     
+    if active_only and not status:
+        return await active_promotions.call_async(db, category, partner_id)
+    
     query = db.query(Promotion)
     
     if category:
@@ -497,6 +537,7 @@ async def generate_promo_code(
         generated_codes.append(code)
     
     db.commit()
+    await promo_codes.add(*generated_codes)
     
     return {
         "message": f"Generated {count} promo codes",
@@ -524,7 +565,10 @@ async def get_promo_code(
 ):
     """Получение информации о промо-коде"""
     
-    promo_code = db.query(PromoCode).filter(PromoCode.code == code).first()
+    promo_code = await promo_codes.lookup(
+        code,
+        lambda: db.query(PromoCode).filter(PromoCode.code == code).first()
+    )
     if not promo_code:
         raise HTTPException(status_code=404, detail="Promo code not found")
     
@@ -537,7 +581,9 @@ async def get_user_promo_codes(
 ):
     """Получение промо-кодов пользователя"""
     
-    user_promo_codes = db.query(UserPromoCode).filter(
+    user_promo_codes = db.query(UserPromoCode).options(
+        joinedload(UserPromoCode.promo_code)
+    ).filter(
         UserPromoCode.user_id == user_id
     ).order_by(desc(UserPromoCode.used_at)).all()
     
@@ -569,6 +615,7 @@ async def update_promotion_status(
     promotion.updated_at = datetime.utcnow()
     
     db.commit()
+    await redis_cache.invalidate_tags("promotions")
     
     return {"message": f"Promotion status updated to {status}"}
 
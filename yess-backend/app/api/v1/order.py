@@ -2,14 +2,18 @@
 Order endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from app.core.database import get_db
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import and_, select
+from app.core.database import get_async_db, get_async_user_read_db, get_db
 from app.models.order import Order
 from app.models.partner import Partner
 from app.models.wallet import Wallet
 from app.models.transaction import Transaction
 from app.models.user import User
+from app.services.spend_profile_service import spend_profile_service
+from app.services.wallet_balance_service import wallet_balance_service
 from app.schemas.order import (
     OrderCalculateRequest,
     OrderCalculateResponse,
@@ -18,7 +22,9 @@ from app.schemas.order import (
 )
 from decimal import Decimal
 from datetime import datetime
+import logging
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
@@ -31,8 +37,8 @@ async def calculate_discount(request: OrderCalculateRequest, db: Session = Depen
     if not partner:
         raise HTTPException(status_code=404, detail="Partner not found")
     
-    # Get user wallet
-    wallet = db.query(Wallet).filter(Wallet.user_id == request.user_id).first()
+    # Get user wallet balance (cached, write-through on every change)
+    wallet = await wallet_balance_service.get_balance(db, request.user_id)
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
@@ -57,13 +63,15 @@ async def calculate_discount(request: OrderCalculateRequest, db: Session = Depen
 
 
 @router.post("/confirm", response_model=OrderConfirmResponse)
-async def confirm_order(request: OrderConfirmRequest, db: Session = Depends(get_db)):
+async def confirm_order(request: OrderConfirmRequest, db: AsyncSession = Depends(get_async_db)):
     """Confirm order and deduct YessCoin"""
     
     # Check idempotency
-    existing_order = db.query(Order).filter(Order.idempotency_key == request.idempotency_key).first()
+    existing_order = (await db.execute(
+        select(Order).where(Order.idempotency_key == request.idempotency_key)
+    )).scalars().first()
     if existing_order:
-        wallet = db.query(Wallet).filter(Wallet.user_id == request.user_id).first()
+        wallet = await wallet_balance_service.get_balance(db, request.user_id)
         return OrderConfirmResponse(
             success=True,
             message="Order already processed",
@@ -74,19 +82,19 @@ async def confirm_order(request: OrderConfirmRequest, db: Session = Depends(get_
         )
     
     # Get user
-    user = db.query(User).filter(User.id == request.user_id).first()
+    user = await db.get(User, request.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get partner
-    partner = db.query(Partner).filter(
-        and_(Partner.id == request.partner_id, Partner.is_active == True)
-    ).first()
+    partner = (await db.execute(
+        select(Partner).where(and_(Partner.id == request.partner_id, Partner.is_active == True))
+    )).scalars().first()
     if not partner:
         raise HTTPException(status_code=404, detail="Partner not found")
     
     # Get wallet
-    wallet = db.query(Wallet).filter(Wallet.user_id == request.user_id).first()
+    wallet = (await db.execute(select(Wallet).where(Wallet.user_id == request.user_id))).scalars().first()
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
@@ -98,14 +106,25 @@ async def confirm_order(request: OrderConfirmRequest, db: Session = Depends(get_
             detail=f"Discount exceeds partner's maximum ({partner.max_discount_percent}%)"
         )
     
-    if request.discount > wallet.balance:
-        raise HTTPException(status_code=402, detail="Insufficient balance")
-    
     if request.discount > request.order_total:
         raise HTTPException(status_code=400, detail="Discount cannot exceed order total")
     
-    # Atomic transaction
-    try:
+    # После rollback повтора объекты сессии сброшены - категория читается заранее
+    category = partner.category
+    order = transaction = None
+    new_balance = None
+    retry = False
+    
+    async def apply_order():
+        nonlocal order, transaction, new_balance, retry
+        # Rollback конфликта версий сбрасывает объекты сессии - перечитываем
+        if retry:
+            await db.refresh(wallet)
+        retry = True
+        
+        if request.discount > wallet.balance:
+            raise HTTPException(status_code=402, detail="Insufficient balance")
+        
         # Deduct from wallet
         old_balance = wallet.balance
         new_balance = old_balance - request.discount
@@ -123,11 +142,12 @@ async def confirm_order(request: OrderConfirmRequest, db: Session = Depends(get_
             idempotency_key=request.idempotency_key
         )
         db.add(order)
-        db.flush()
+        await db.flush()
         
         # Create transaction record
         transaction = Transaction(
             user_id=request.user_id,
+            partner_id=request.partner_id,
             type="discount",
             amount=request.discount,
             balance_before=old_balance,
@@ -136,26 +156,40 @@ async def confirm_order(request: OrderConfirmRequest, db: Session = Depends(get_
             completed_at=datetime.utcnow()
         )
         db.add(transaction)
-        
-        db.commit()
-        
-        return OrderConfirmResponse(
-            success=True,
-            message="Order confirmed successfully",
-            order_id=order.id,
-            new_balance=new_balance,
-            discount=request.discount,
-            final_amount=order.final_amount
-        )
-        
+    
+    # Atomic transaction
+    try:
+        await wallet_balance_service.apply(db, apply_order)
+    except HTTPException:
+        await db.rollback()
+        raise
+    except StaleDataError:
+        raise HTTPException(status_code=409, detail="Wallet was modified concurrently, retry the order")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Transaction failed: {str(e)}")
+    
+    # Заказ уже закоммичен: ошибка профиля трат не должна давать 500 и повтор списания
+    try:
+        await spend_profile_service.record_transaction(transaction, category)
+    except Exception as e:
+        logger.error(f"Spend profile update failed for order {order.id}: {e}")
+    
+    return OrderConfirmResponse(
+        success=True,
+        message="Order confirmed successfully",
+        order_id=order.id,
+        new_balance=new_balance,
+        discount=request.discount,
+        final_amount=order.final_amount
+    )
 
 
 @router.get("/history")
-async def get_order_history(user_id: int, db: Session = Depends(get_db)):
+async def get_order_history(user_id: int, db: AsyncSession = Depends(get_async_user_read_db)):
     """Get user's order history"""
-    orders = db.query(Order).filter(Order.user_id == user_id).order_by(Order.created_at.desc()).all()
+    orders = (await db.execute(
+        select(Order).where(Order.user_id == user_id).order_by(Order.created_at.desc())
+    )).scalars().all()
     return orders
 
@@ -1,12 +1,15 @@
 """
 Partner endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from sqlalchemy.orm import Session, contains_eager
 from sqlalchemy import and_
 from app.core.database import get_db
 from app.models.partner import Partner, PartnerLocation
 from app.schemas.partner import PartnerResponse, PartnerLocationResponse
+from app.services.lookup_filters import partner_ids
+from app.services.map_tile_service import map_tile_service
+from app.services.partner_catalog_service import list_categories, list_partners
 from typing import List, Optional
 
 router = APIRouter()
@@ -16,24 +19,20 @@ router = APIRouter()
 async def get_partners(
     category: Optional[str] = None,
     active: bool = True,
+    city_id: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
     """Get list of partners"""
-    query = db.query(Partner)
-    
-    if active:
-        query = query.filter(Partner.is_active == True)
-    if category:
-        query = query.filter(Partner.category == category)
-    
-    partners = query.all()
-    return partners
+    return await list_partners.call_async(db, category, active, city_id)
 
 
 @router.get("/{partner_id}", response_model=PartnerResponse)
 async def get_partner(partner_id: int, db: Session = Depends(get_db)):
     """Get partner details"""
-    partner = db.query(Partner).filter(Partner.id == partner_id).first()
+    partner = await partner_ids.lookup(
+        partner_id,
+        lambda: db.query(Partner).filter(Partner.id == partner_id).first()
+    )
     if not partner:
         raise HTTPException(status_code=404, detail="Partner not found")
     return partner
@@ -48,7 +47,10 @@ async def get_partner_locations(
     db: Session = Depends(get_db)
 ):
     """Get partner locations for map"""
-    query = db.query(PartnerLocation).join(Partner).filter(PartnerLocation.is_active == True)
+    # Партнёр - из того же JOIN, без запроса на каждую точку
+    query = db.query(PartnerLocation).join(Partner).options(
+        contains_eager(PartnerLocation.partner)
+    ).filter(PartnerLocation.is_active == True)
     
     if partner_id:
         query = query.filter(PartnerLocation.partner_id == partner_id)
@@ -76,9 +78,34 @@ async def get_partner_locations(
     return result
 
 
+@router.get("/tiles/{z}/{x}/{y}")
+async def get_partner_tile(
+    z: int,
+    x: int,
+    y: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Map tile with pre-clustered partner pins (z/x/y, Web Mercator)
+    
+    Coordinates are E5 integers, delta-encoded from the tile origin.
+    Supports conditional requests via ETag / If-None-Match.
+    """
+    if not map_tile_service.is_valid(z, x, y):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+    
+    tile = await map_tile_service.get_tile(db, z, x, y)
+    headers = {"ETag": tile.etag, "Cache-Control": "public, max-age=60"}
+    
+    if if_none_match and tile.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=tile.body, media_type="application/json", headers=headers)
+
+
 @router.get("/categories")
 async def get_categories(db: Session = Depends(get_db)):
     """Get list of partner categories"""
-    categories = db.query(Partner.category).distinct().all()
-    return [{"name": cat[0]} for cat in categories if cat[0]]
+    return [{"name": category} for category in await list_categories.call_async(db)]
 
@@ -3,10 +3,14 @@ QR Code API
 Эндпоинты для сканирования и оплаты через QR коды
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from pydantic import BaseModel
 from typing import Optional, List
-from app.core.database import get_db
+from datetime import datetime
+from app.core.database import get_async_db, get_db
 from app.models.user import User
 from app.models.partner import Partner
 from app.models.transaction import Transaction
@@ -17,6 +21,9 @@ from app.core.notifications import sms_service, push_service
 from app.core.cache import redis_cache
 from app.schemas.qr import QRPaymentRequest, QRPaymentResponse
 from app.services.transaction_notification_service import transaction_notification_service
+from app.services.spend_profile_service import spend_profile_service
+from app.services.wallet_balance_service import wallet_balance_service
+from app.services.lookup_filters import partner_ids
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,11 +59,13 @@ async def scan_qr_code(
     # Парсим QR код
     qr_data = await qr_service.parse_qr_data(request.qr_data)
     
-    # Получаем партнёра
-    partner = db.query(Partner).filter(
-        Partner.id == qr_data["partner_id"],
-        Partner.is_active == True
-    ).first()
+    # Получаем партнёра: несуществующий ID из подделанного QR - без запроса в БД
+    partner = None
+    if await partner_ids.might_exist(qr_data["partner_id"]):
+        partner = db.query(Partner).filter(
+            Partner.id == qr_data["partner_id"],
+            Partner.is_active == True
+        ).first()
     
     if not partner:
         raise HTTPException(
@@ -64,15 +73,15 @@ async def scan_qr_code(
             detail="Partner not found or inactive"
         )
     
-    # Получаем баланс пользователя
-    wallet = db.query(Wallet).filter(Wallet.user_id == current_user.id).first()
+    # Получаем баланс пользователя (из кэша балансов)
+    wallet = await wallet_balance_service.get_balance(db, current_user.id)
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
     # Валидируем QR для оплаты
     await qr_service.validate_qr_for_payment(
         partner_id=partner.id,
-        user_balance=float(wallet.yescoin_balance),
+        user_balance=float(wallet.balance),
         min_amount=1.0
     )
     
@@ -83,7 +92,7 @@ async def scan_qr_code(
         partner_logo=partner.logo_url,
         max_discount=float(partner.max_discount_percent),
         cashback_rate=float(partner.cashback_rate),
-        user_balance=float(wallet.yescoin_balance),
+        user_balance=float(wallet.balance),
         message=f"Отсканирован QR код партнёра: {partner.name}"
     )
 
@@ -92,7 +101,7 @@ async def scan_qr_code(
 async def pay_with_qr(
     request: QRPaymentRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Оплата через QR код
@@ -113,10 +122,9 @@ async def pay_with_qr(
         )
     
     # Получаем партнёра
-    partner = db.query(Partner).filter(
-        Partner.id == request.partner_id,
-        Partner.is_active == True
-    ).first()
+    partner = (await db.execute(
+        select(Partner).where(Partner.id == request.partner_id, Partner.is_active == True)
+    )).scalars().first()
     
     if not partner:
         raise HTTPException(
@@ -125,7 +133,7 @@ async def pay_with_qr(
         )
     
     # Получаем кошелёк
-    wallet = db.query(Wallet).filter(Wallet.user_id == current_user.id).first()
+    wallet = (await db.execute(select(Wallet).where(Wallet.user_id == current_user.id))).scalars().first()
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
@@ -136,37 +144,56 @@ async def pay_with_qr(
     # Итоговая сумма к списанию
     final_amount = request.amount - discount_amount
     
-    # Проверка баланса
-    if wallet.yescoin_balance < final_amount:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Insufficient balance. Required: {final_amount} YesCoin, Available: {wallet.yescoin_balance}"
-        )
-    
-    # Списываем баллы
-    wallet.yescoin_balance -= final_amount
-    
-    # Рассчитываем и начисляем кэшбэк
+    # Рассчитываем кэшбэк
     cashback_percent = float(partner.cashback_rate)
     cashback_amount = final_amount * (cashback_percent / 100)
-    wallet.yescoin_balance += cashback_amount
+    transaction = None
+    retry = False
     
-    # Создаём транзакцию
-    transaction = Transaction(
-        user_id=current_user.id,
-        partner_id=partner.id,
-        amount=request.amount,
-        yescoin_used=final_amount,
-        yescoin_earned=cashback_amount,
-        type="payment",
-        description=f"Оплата в {partner.name}"
-    )
-    db.add(transaction)
-    db.commit()
-    db.refresh(transaction)
+    async def apply_payment():
+        nonlocal transaction, retry
+        # Rollback конфликта версий сбрасывает объекты сессии - перечитываем
+        if retry:
+            await db.refresh(wallet)
+            await db.refresh(partner)
+        retry = True
+        
+        # Проверка баланса
+        if wallet.balance < final_amount:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Insufficient balance. Required: {final_amount} YesCoin, Available: {wallet.balance}"
+            )
+        
+        # Списываем баллы и начисляем кэшбэк
+        wallet.balance = wallet.balance - final_amount + cashback_amount
+        
+        # Создаём транзакцию
+        transaction = Transaction(
+            user_id=current_user.id,
+            partner_id=partner.id,
+            amount=request.amount,
+            yescoin_used=final_amount,
+            yescoin_earned=cashback_amount,
+            type="payment",
+            status="completed",
+            completed_at=datetime.utcnow(),
+            description=f"Оплата в {partner.name}"
+        )
+        db.add(transaction)
+    
+    try:
+        await wallet_balance_service.apply(db, apply_payment)
+    except StaleDataError:
+        raise HTTPException(status_code=409, detail="Wallet was modified concurrently, retry the payment")
     
-    # Инвалидируем кэш
-    await redis_cache.invalidate_user_cache(current_user.id)
+    # Инвалидируем кэш и обновляем профиль трат: платёж уже проведён,
+    # ошибка кэша не должна превращать его в ответ 500
+    try:
+        await redis_cache.invalidate_user_cache(current_user.id)
+        await spend_profile_service.record_transaction(transaction, partner.category)
+    except Exception as e:
+        logger.error(f"Spend profile update failed for transaction {transaction.id}: {e}")
     
     # Отправляем уведомления через новый сервис
     await transaction_notification_service.notify_transaction(
@@ -187,7 +214,7 @@ async def pay_with_qr(
         amount_charged=final_amount,
         discount_applied=discount_amount,
         cashback_earned=cashback_amount,
-        new_balance=float(wallet.yescoin_balance),
+        new_balance=float(wallet.balance),
         partner_name=partner.name
     )
 
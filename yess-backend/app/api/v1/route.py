@@ -31,7 +31,7 @@ async def calculate_route(
     - Оптимизация маршрута
     """
     try:
-        route = route_service.calculate_route(db, request)
+        route = await route_service.calculate_route(db, request)
         return route
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -48,22 +48,22 @@ async def optimize_route(
     Параметры:
     - Список ID локаций партнеров
     - Начальная точка (опционально)
+    - Конечная точка (опционально)
     """
     try:
         locations = db.query(PartnerLocation).filter(
             PartnerLocation.id.in_(request.partner_location_ids)
         ).all()
 
-        if request.start_location_id:
-            start_location = next(
-                (loc for loc in locations if loc.id == request.start_location_id), 
-                None
-            )
-            if start_location:
-                locations.remove(start_location)
-                locations.insert(0, start_location)
+        # Порядок как в запросе: первая локация - старт по умолчанию
+        positions = {loc_id: i for i, loc_id in enumerate(request.partner_location_ids)}
+        locations.sort(key=lambda loc: positions[loc.id])
 
-        optimized_route = route_service._optimize_route_order(locations)
+        optimized_route = route_service.optimize_location_order(
+            locations,
+            start_location_id=request.start_location_id,
+            end_location_id=request.end_location_id
+        )
         return [loc.id for loc in optimized_route]
     
     except Exception as e:
@@ -93,7 +93,7 @@ async def get_navigation(
             longitude=request.end_longitude
         )
 
-        route_data = route_service._get_route_from_provider(
+        route_data = await route_service._get_route_from_provider(
             locations=[start_location, end_location],
             mode=request.transport_mode
         )
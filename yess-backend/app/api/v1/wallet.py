@@ -2,12 +2,15 @@
 Wallet endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import get_async_db, get_async_user_read_db, get_db
 from app.models.wallet import Wallet
 from app.models.transaction import Transaction
 from app.models.user import User
 from app.schemas.wallet import WalletResponse, TopUpRequest, TopUpResponse
+from app.services.wallet_balance_service import wallet_balance_service
 from app.core.config import settings
 import qrcode
 import io
@@ -18,12 +21,12 @@ router = APIRouter()
 
 
 @router.get("/", response_model=WalletResponse)
-async def get_balance(userId: int = Query(...), db: Session = Depends(get_db)):
+async def get_balance(userId: int = Query(...), db: AsyncSession = Depends(get_async_db)):
     """Get user wallet balance"""
-    wallet = db.query(Wallet).filter(Wallet.user_id == userId).first()
-    if not wallet:
+    snapshot = await wallet_balance_service.get_balance(db, userId)
+    if not snapshot:
         raise HTTPException(status_code=404, detail="Wallet not found")
-    return wallet
+    return WalletResponse(balance=snapshot.balance, last_updated=snapshot.last_updated)
 
 
 @router.post("/topup", response_model=TopUpResponse)
@@ -81,11 +84,11 @@ async def payment_webhook(
     transaction_id: int,
     status: str,
     amount: float,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Webhook for payment confirmation"""
     
-    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    transaction = await db.get(Transaction, transaction_id)
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
@@ -94,7 +97,7 @@ async def payment_webhook(
     
     if status == "completed" and float(transaction.amount) == amount:
         # Update wallet balance (x2 multiplier)
-        wallet = db.query(Wallet).filter(Wallet.user_id == transaction.user_id).first()
+        wallet = (await db.execute(select(Wallet).where(Wallet.user_id == transaction.user_id))).scalars().first()
         bonus_amount = transaction.amount * settings.TOPUP_MULTIPLIER
         
         wallet.balance += bonus_amount
@@ -105,7 +108,7 @@ async def payment_webhook(
         transaction.completed_at = datetime.utcnow()
         transaction.balance_after = wallet.balance
         
-        db.commit()
+        await wallet_balance_service.commit(db)
         
         return {"success": True, "message": "Payment confirmed"}
     
@@ -113,11 +116,11 @@ async def payment_webhook(
 
 
 @router.get("/history")
-async def get_transaction_history(user_id: int = Query(...), db: Session = Depends(get_db)):
+async def get_transaction_history(user_id: int = Query(...), db: AsyncSession = Depends(get_async_user_read_db)):
     """Get transaction history"""
-    transactions = db.query(Transaction).filter(
-        Transaction.user_id == user_id
-    ).order_by(Transaction.created_at.desc()).all()
+    transactions = (await db.execute(
+        select(Transaction).where(Transaction.user_id == user_id).order_by(Transaction.created_at.desc())
+    )).scalars().all()
     
     return transactions
 
@@ -0,0 +1,209 @@
+"""
+Bloom filter and not-found guard for lookups by ID/code
+
+ExistenceFilter отсекает поиск несуществующих значений (промо-коды,
+ID партнёров) до запроса в БД:
+
+1. Bloom filter в памяти воркера: "точно нет" - ответ без БД и Redis.
+   Строится из БД целиком (rebuild) и дополняется при вставке (add).
+   Доля ложных срабатываний - error_rate при заполнении до capacity;
+   capacity берётся с запасом growth на вставки до следующего перестроения.
+2. Значения, добавленные после перестроения в других воркерах, - в
+   множестве Redis {name}:recent (живёт дольше интервала перестроения);
+   оно проверяется только для значений, которых нет в фильтре.
+   Для автоинкрементных ID (monotonic) значения чуть выше максимума на
+   момент перестроения пропускаются в БД - так новые записи, созданные в
+   обход add (админка, импорт), видны до перестроения.
+3. Прошедшие фильтр, но не найденные в БД значения (ложное срабатывание,
+   удалённая запись) кэшируются как промах на negative_ttl секунд.
+
+Пока фильтр не построен или Redis недоступен, запросы идут в БД - фильтр
+может ошибаться только в сторону лишнего запроса.
+"""
+import math
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional, TypeVar
+
+from app.core.cache import RedisCache, redis_cache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+KEY_PREFIX = "exists"
+
+
+def _to_bytes(value: Any) -> bytes:
+    return str(value).encode()
+
+
+class BloomFilter:
+    """
+    Bloom filter на bytearray: size бит, hashes хэш-функций (двойное
+    хэширование blake2b). Значения приводятся к str: 42 и "42" совпадают
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        # Оптимальные m = -n ln p / ln²2 и k = m/n ln 2
+        self.size = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def from_values(cls, values: Iterable[Any], error_rate: float = 0.001, growth: float = 1.0) -> "BloomFilter":
+        values = list(values)
+        bloom = cls(math.ceil(len(values) * growth), error_rate)
+        for value in values:
+            bloom.add(value)
+        return bloom
+
+    def _positions(self, value: Any):
+        digest = hashlib.blake2b(_to_bytes(value), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value: Any) -> None:
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: Any) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    @property
+    def saturated(self) -> bool:
+        """Заполнен сверх capacity - ложных срабатываний больше error_rate"""
+        return self.count > self.capacity
+
+    def estimated_error_rate(self) -> float:
+        """Ожидаемая доля ложных срабатываний при текущем заполнении"""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class ExistenceFilter:
+    """Bloom filter значений + промахи в Redis перед поиском в БД"""
+
+    def __init__(
+        self,
+        name: str,
+        error_rate: float = 0.001,
+        growth: float = 2.0,
+        negative_ttl: int = 60,
+        recent_ttl: int = 7200,
+        monotonic: bool = False,
+        cache: Optional[RedisCache] = None
+    ):
+        self.name = name
+        self.error_rate = error_rate
+        self.growth = growth
+        self.negative_ttl = negative_ttl
+        self.recent_ttl = recent_ttl
+        self.monotonic = monotonic
+        self.cache = cache or redis_cache
+        self.bloom: Optional[BloomFilter] = None
+        self._max_id: Optional[int] = None
+        self._id_headroom = 0
+        self.stats = {
+            "lookups": 0,
+            "rejected": 0,
+            "recent_hits": 0,
+            "negative_hits": 0,
+            "db_misses": 0,
+        }
+
+    @property
+    def recent_key(self) -> str:
+        return f"{KEY_PREFIX}:{self.name}:recent"
+
+    def _missing_key(self, value: Any) -> str:
+        value = str(value)
+        if len(value) > 64:
+            value = hashlib.sha1(value.encode()).hexdigest()
+        return f"{KEY_PREFIX}:{self.name}:missing:{value}"
+
+    def rebuild(self, values: Iterable[Any]) -> BloomFilter:
+        """Новый фильтр из полного списка значений (значения из БД)"""
+        values = list(values)
+        bloom = BloomFilter.from_values(values, self.error_rate, self.growth)
+        if self.monotonic:
+            self._max_id = max((int(value) for value in values), default=0)
+            self._id_headroom = max(1000, bloom.capacity - bloom.count)
+        self.bloom = bloom
+        logger.info(
+            f"Existence filter {self.name} rebuilt: {bloom.count} values, "
+            f"{bloom.memory_bytes} bytes, {bloom.hashes} hashes"
+        )
+        return bloom
+
+    async def add(self, *values: Any) -> None:
+        """Вставка новых значений (после коммита): фильтр, множество recent, сброс промахов"""
+        if self.bloom is not None:
+            for value in values:
+                self.bloom.add(value)
+        members = [str(value) for value in values]
+        await self.cache.add_to_set(self.recent_key, *members, ttl=self.recent_ttl)
+        await self.cache.delete_many(*(self._missing_key(value) for value in values))
+
+    async def might_exist(self, value: Any) -> bool:
+        """False - значения точно нет (без запроса в БД)"""
+        if self.bloom is None or value in self.bloom:
+            return True
+        if self._max_id is not None:
+            try:
+                number = int(value)
+            except (TypeError, ValueError):
+                return False
+            if self._max_id < number <= self._max_id + self._id_headroom:
+                return True
+        # Вставки других воркеров после перестроения; Redis недоступен - идём в БД
+        recent = await self.cache.is_set_member(self.recent_key, str(value))
+        if recent is None or recent:
+            self.stats["recent_hits"] += 1
+            return True
+        return False
+
+    async def lookup(self, value: Any, load: Callable[[], Optional[T]]) -> Optional[T]:
+        """
+        Поиск через фильтр: load (запрос в БД) вызывается, только если
+        значение может существовать и не закэшировано как промах
+        """
+        self.stats["lookups"] += 1
+        if not await self.might_exist(value):
+            self.stats["rejected"] += 1
+            return None
+
+        missing_key = self._missing_key(value)
+        if await self.cache.get(missing_key) is not None:
+            self.stats["negative_hits"] += 1
+            return None
+
+        result = load()
+        if result is None:
+            self.stats["db_misses"] += 1
+            await self.cache.set(missing_key, 1, ttl=self.negative_ttl)
+        return result
+
+    def metrics(self) -> Dict[str, Any]:
+        bloom = self.bloom
+        return {
+            **self.stats,
+            "values": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else 0,
+            "memory_bytes": bloom.memory_bytes if bloom else 0,
+            "target_error_rate": self.error_rate,
+            "estimated_error_rate": bloom.estimated_error_rate() if bloom else None,
+        }
@@ -1,144 +1,1544 @@
 """
 Redis Caching Utilities
+
+Асинхронный клиент (redis.asyncio) с общим пулом соединений на процесс.
+Недоступность Redis не отключает кэш навсегда: после сетевой ошибки
+запросы REDIS_RECONNECT_BACKOFF секунд считаются промахами, затем
+соединение устанавливается заново.
+
+Горячие ключи (CACHE_LOCAL_PREFIXES) дополнительно держатся в
+in-process LRU уже декодированными. Запись и удаление таких ключей
+рассылаются через pub/sub, и остальные воркеры вытесняют их из своего
+локального слоя. Пока подписка не активна, локальный слой не используется.
+
+get_or_set / @cached защищают дорогие вычисления от stampede: значение
+вычисляет один запрос (общий future в процессе + блокировка в Redis между
+воркерами), устаревшее значение отдаётся, пока один воркер обновляет его
+в фоне, а обновление может начаться заранее (probabilistic early expiry).
+
+Групповая инвалидация - без KEYS/FLUSHDB:
+- теги: запись регистрируется в множествах tag:{tag} (например partner:42,
+  city:1), invalidate_tags удаляет участников порциями SPOP + UNLINK;
+  истёкшие участники вычищаются выборочно при регистрации новых;
+- пространства имён: ключ содержит версию (namespaced_key), bump_namespace
+  увеличивает версию, и старые записи доживают свой TTL, не читаясь.
+
+@cached работает и с обычными, и с async функциями: ключ строится из
+аргументов детерминированно (одинаковый во всех воркерах), пустые
+результаты можно кэшировать на меньший срок, крупные значения - сжимать.
+
+Значения кодируются CacheCodec (app.core.cache_codec): orjson/msgpack,
+сжатие от порога; команды чтения значений возвращают bytes (NEVER_DECODE),
+остальные ответы декодируются клиентом.
+
+RedisCache - общий интерфейс кэшей (CacheService и PerformanceManager -
+именованные экземпляры с синхронным API): попадания, промахи, ошибки,
+задержки и размеры значений пишутся в Prometheus по имени кэша
+(app.core.cache_metrics).
 """
 import json
+import math
+import time
+import uuid
+import zlib
+import random
+import asyncio
+import hashlib
+import inspect
 import logging
-from typing import Optional, Any
-from redis import Redis
+import functools
+import threading
+from typing import Optional, Any, Awaitable, Callable, Dict, Iterable, List, Tuple, Union
+from pydantic import parse_obj_as
+from pydantic.json import pydantic_encoder
+from redis import Redis as SyncRedis
+from redis.client import NEVER_DECODE
+from redis.asyncio import Redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from redis.retry import Retry as SyncRetry
+from sqlalchemy.orm import Session
+from app.core.cache_codec import CacheCodec
+from app.core.cache_metrics import cache_metrics
 from app.core.config import settings
+from app.core.resources import resources
+from app.core.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+_NETWORK_ERRORS = (RedisConnectionError, RedisTimeoutError, OSError)
+# Ответ команды без декодирования в str (закодированные значения)
+_RAW = {NEVER_DECODE: []}
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+LOCK_PREFIX = "lock"
+TAG_PREFIX = "tag"
+NAMESPACE_PREFIX = "ns"
+CACHED_PREFIX = "cached"
+# Размер порции при удалении участников тега: каждая команда O(порции)
+INVALIDATION_CHUNK = 500
+# Сколько случайных участников тега проверяется при каждой регистрации
+TAG_PRUNE_SAMPLE = 3
+
+# Регистрация ключа в множествах тегов; TTL множества только продлевается,
+# чтобы тег жил не меньше самого долгоживущего участника. Истёкшие участники
+# вычищаются по ходу: при каждом SADD проверяются sample случайных
+# участников и отсутствующие удаляются (SREM). Добавление даёт одного
+# участника, проверка удаляет в среднем sample * доля мёртвых - в
+# равновесии мёртвых не больше, чем живых, и множество не растёт без предела
+# KEYS: множества тегов, ARGV: ключ, ttl[, sample]
+_TAG_KEY = """
+local ttl = tonumber(ARGV[2])
+local sample = tonumber(ARGV[3] or '0')
+for _, tag in ipairs(KEYS) do
+    redis.call('SADD', tag, ARGV[1])
+    if sample > 0 then
+        for _, member in ipairs(redis.call('SRANDMEMBER', tag, sample)) do
+            if redis.call('EXISTS', member) == 0 then
+                redis.call('SREM', tag, member)
+            end
+        end
+    end
+    if redis.call('TTL', tag) < ttl then
+        redis.call('EXPIRE', tag, ttl)
+    end
+end
+return #KEYS
+"""
+
+# Снятие блокировки только её владельцем
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Атомарное обновление полей hash, только если hash уже существует
+# KEYS: hash[, маркер перестройки]; ARGV: ttl, префикс, порог, затем тройки
+# (op, field, value), op: incr | set. Если идёт перестройка (маркер есть),
+# снимок перестройки может не содержать это изменение: маркер портится
+# (снимок не будет записан), hash удаляется - следующее чтение строит его
+# из источника. Непустой префикс: поля <префикс>...:<n> с n < порога
+# удаляются (устаревшие счётчики по дням)
+_HASH_UPDATE_IF_EXISTS = """
+local key = KEYS[1]
+if KEYS[2] and redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('SET', KEYS[2], 'stale', 'PX', math.max(redis.call('PTTL', KEYS[2]), 1))
+    redis.call('DEL', key)
+    return -1
+end
+if redis.call('EXISTS', key) == 0 then
+    return 0
+end
+local prefix = ARGV[2]
+if prefix ~= '' then
+    local threshold = tonumber(ARGV[3])
+    for _, field in ipairs(redis.call('HKEYS', key)) do
+        if string.sub(field, 1, #prefix) == prefix then
+            local n = tonumber(string.match(field, ':(%d+)$'))
+            if n and n < threshold then
+                redis.call('HDEL', key, field)
+            end
+        end
+    end
+end
+for i = 4, #ARGV, 3 do
+    if ARGV[i] == 'incr' then
+        redis.call('HINCRBYFLOAT', key, ARGV[i + 1], ARGV[i + 2])
+    else
+        redis.call('HSET', key, ARGV[i + 1], ARGV[i + 2])
+    end
+end
+local ttl = tonumber(ARGV[1])
+if ttl > 0 then
+    redis.call('EXPIRE', key, ttl)
+end
+return 1
+"""
+
+
+# Запись снимка перестройки hash, только если маркер перестройки всё ещё
+# принадлежит ей (не испорчен изменением во время перестройки). После
+# записи маркер остаётся на grace секунд: запоздавшие изменения транзакций,
+# уже попавших в снимок, сбрасывают hash, а не учитываются дважды
+# KEYS: hash, маркер; ARGV: токен, ttl, grace, затем пары field, value
+_HASH_REPLACE_IF_MARKED = """
+if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 4, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+if tonumber(ARGV[2]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+if tonumber(ARGV[3]) > 0 then
+    redis.call('SET', KEYS[2], 'built', 'EX', ARGV[3])
+else
+    redis.call('DEL', KEYS[2])
+end
+return 1
+"""
+
+# Версионированная запись (hash: version, value, pending). Запись с версией
+# меньше текущей или меньше зарезервированной (pending) отклоняется
+# KEYS: запись, ARGV: версия, значение, ttl
+_VERSIONED_SET = """
+local version = tonumber(ARGV[1])
+local current = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+local pending = tonumber(redis.call('HGET', KEYS[1], 'pending') or '0')
+if version < current or version < pending then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'version', ARGV[1], 'value', ARGV[2])
+if pending > 0 then
+    redis.call('HDEL', KEYS[1], 'pending')
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# Резерв версии до коммита: пока она не записана, запись считается
+# промахом, а значения старее неё не принимаются
+# KEYS: запись, ARGV: версия, ttl резерва
+_VERSION_RESERVE = """
+local version = tonumber(ARGV[1])
+if version > tonumber(redis.call('HGET', KEYS[1], 'pending') or '0') then
+    redis.call('HSET', KEYS[1], 'pending', ARGV[1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def tag_key(tag: str) -> str:
+    return f"{TAG_PREFIX}:{tag}"
+
+
+# Теги для кода на синхронном клиенте redis.Redis (CacheService)
+
+def register_tag_script(client):
+    """Скрипт регистрации ключа в тегах: script(keys=[tag_key(...)], args=[key, ttl, TAG_PRUNE_SAMPLE])"""
+    return client.register_script(_TAG_KEY)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, (list, tuple, dict, set, str)) and not value)
+
+
+def _envelope(
+    value: Any,
+    elapsed: float,
+    ttl: int,
+    stale_ttl: int,
+    negative_ttl: Optional[int]
+) -> Tuple[dict, int]:
+    """Запись get_or_set и время её хранения в Redis"""
+    fresh_ttl, keep_ttl = ttl, ttl + stale_ttl
+    if negative_ttl is not None and _is_empty(value):
+        # Пустой результат живёт меньше и устаревшим не отдаётся
+        fresh_ttl = keep_ttl = negative_ttl
+    return {"v": value, "exp": time.time() + fresh_ttl, "d": elapsed}, keep_ttl
+
+
+def invalidate_tag_sync(client, tag: str) -> int:
+    """Синхронный вариант RedisCache.invalidate_tags для одного тега"""
+    deleted = 0
+    while True:
+        members = client.spop(tag_key(tag), INVALIDATION_CHUNK)
+        if not members:
+            return deleted
+        deleted += client.unlink(*members)
+
 
 class RedisCache:
     """Redis кэш для оптимизации запросов"""
-    
-    def __init__(self):
-        try:
-            self.redis = Redis.from_url(
-                settings.REDIS_URL,
-                decode_responses=True
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        socket_timeout: float = 0.5,
+        socket_connect_timeout: float = 0.5,
+        retry_attempts: int = 2,
+        health_check_interval: int = 30,
+        reconnect_backoff: float = 5.0,
+        local_max_items: int = 10000,
+        local_max_bytes: Optional[int] = None,
+        local_ttl: float = 30,
+        local_prefixes: Iterable[str] = (),
+        codec: Optional[CacheCodec] = None,
+        name: str = "default"
+    ):
+        self.url = url or str(settings.REDIS_URL)
+        # Имя кэша - метка метрик
+        self.name = name
+        self.telemetry = cache_metrics(name)
+        # None - размер пула из бюджета соединений (app.core.resources)
+        self.max_connections = max_connections
+        self.socket_timeout = socket_timeout
+        self.socket_connect_timeout = socket_connect_timeout
+        self.retry_attempts = retry_attempts
+        self.health_check_interval = health_check_interval
+        self.reconnect_backoff = reconnect_backoff
+        self.codec = codec or CacheCodec()
+
+        self._redis: Optional[Redis] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._hash_update_script = None
+        self._hash_replace_script = None
+        self._release_lock_script = None
+        self._tag_script = None
+        self._versioned_set_script = None
+        self._version_reserve_script = None
+        self._sync_redis: Optional[SyncRedis] = None
+        self._sync_tag_script = None
+        self._sync_client_lock = threading.Lock()
+        # Блокировки вычислений синхронного пути (по хэшу ключа)
+        self._sync_key_locks = [threading.Lock() for _ in range(64)]
+        # До этого момента (monotonic) Redis считается недоступным
+        self._unavailable_until = 0.0
+
+        # Локальный слой: значения хранятся декодированными, размер - длина записи в Redis
+        self.local = TTLCache(max_size=local_max_items, ttl=local_ttl, max_bytes=local_max_bytes)
+        self.local_prefixes = tuple(local_prefixes)
+        self.instance_id = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self._listening = False
+        # Растёт на каждой инвалидации: значение, прочитанное из Redis до неё,
+        # не попадает в локальный слой
+        self._generation = 0
+        # Версии пространств имён, валидные пока активна подписка на инвалидации
+        self._namespace_versions = TTLCache(max_size=1000, ttl=local_ttl)
+        self.stats = {
+            "local_hits": 0,
+            "local_misses": 0,
+            "redis_hits": 0,
+            "redis_misses": 0,
+            "invalidations_received": 0,
+            "stale_served": 0,
+            "recomputes": 0,
+        }
+        # Вычисления в процессе: ключ -> future результата
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ENABLE_CACHING and time.monotonic() >= self._unavailable_until
+
+    @property
+    def redis(self) -> Redis:
+        """
+        Клиент с общим пулом соединений процесса (app.core.resources)
+        При исчерпании пула запрос ждёт свободное соединение, а не падает.
+        Соединения привязаны к event loop, поэтому при смене loop пул создаётся заново
+        """
+        loop = asyncio.get_running_loop()
+        if self._redis is None or self._loop is not loop:
+            pool = resources.redis_pool(
+                self.url,
+                asynchronous=True,
+                max_connections=self.max_connections,
+                decode_responses=True,
+                timeout=self.socket_timeout,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.socket_connect_timeout,
+                health_check_interval=self.health_check_interval,
+                retry=Retry(ExponentialBackoff(cap=0.1, base=0.01), self.retry_attempts),
+                retry_on_error=[RedisConnectionError, RedisTimeoutError]
             )
-            # Проверяем соединение
-            self.redis.ping()
-            self.enabled = True
-            logger.info("Redis cache initialized successfully")
-        except Exception as e:
-            logger.error(f"Redis connection failed: {str(e)}")
-            self.enabled = False
-            self.redis = None
-    
+            self._redis = Redis(connection_pool=pool)
+            self._hash_update_script = self._redis.register_script(_HASH_UPDATE_IF_EXISTS)
+            self._hash_replace_script = self._redis.register_script(_HASH_REPLACE_IF_MARKED)
+            self._release_lock_script = self._redis.register_script(_RELEASE_LOCK)
+            self._tag_script = self._redis.register_script(_TAG_KEY)
+            self._versioned_set_script = self._redis.register_script(_VERSIONED_SET)
+            self._version_reserve_script = self._redis.register_script(_VERSION_RESERVE)
+            self._loop = loop
+        return self._redis
+
+    @property
+    def sync_redis(self) -> SyncRedis:
+        """Синхронный клиент для @cached на обычных функциях (выполняются в пуле потоков)"""
+        if self._sync_redis is None:
+            with self._sync_client_lock:
+                if self._sync_redis is None:
+                    pool = resources.redis_pool(
+                        self.url,
+                        asynchronous=False,
+                        max_connections=self.max_connections,
+                        decode_responses=True,
+                        timeout=self.socket_timeout,
+                        socket_timeout=self.socket_timeout,
+                        socket_connect_timeout=self.socket_connect_timeout,
+                        health_check_interval=self.health_check_interval,
+                        retry=SyncRetry(ExponentialBackoff(cap=0.1, base=0.01), self.retry_attempts),
+                        retry_on_error=[RedisConnectionError, RedisTimeoutError]
+                    )
+                    client = SyncRedis(connection_pool=pool)
+                    self._sync_tag_script = client.register_script(_TAG_KEY)
+                    self._sync_redis = client
+        return self._sync_redis
+
+    # Локальный слой и межворкерная инвалидация
+
+    def _is_local(self, key: str) -> bool:
+        return bool(self.local_prefixes) and key.startswith(self.local_prefixes)
+
+    def _local_ready(self) -> bool:
+        """Локальный слой доступен, только пока активна подписка на инвалидации"""
+        loop = asyncio.get_running_loop()
+        if self._listener is None or self._listener.done() or self._listener.get_loop() is not loop:
+            self._listening = False
+            self._listener = loop.create_task(self._listen())
+        return self._listening
+
+    def _evict_local(self, keys: Optional[Iterable[str]] = None) -> None:
+        """Вытеснение ключей из локального слоя (None - всех, вместе с версиями пространств имён)"""
+        self._generation += 1
+        if keys is None:
+            self.local.clear()
+            self._namespace_versions.clear()
+            return
+        for key in keys:
+            self.local.delete(key)
+
+    async def _listen(self) -> None:
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Записи, сделанные до подписки, могли пропустить инвалидации
+            self._evict_local()
+            self._listening = True
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    self._on_invalidation(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._failed("pubsub", e)
+        finally:
+            self._listening = False
+            self._evict_local()
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+    def _on_invalidation(self, data: str) -> None:
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        if message.get("origin") == self.instance_id:
+            return
+        self.stats["invalidations_received"] += 1
+        for namespace in message.get("namespaces", []):
+            self._namespace_versions.delete(namespace)
+        self._evict_local(message.get("keys", []))
+
+    async def _publish_invalidation(self, keys: Iterable[str] = (), namespaces: Iterable[str] = ()) -> None:
+        """Рассылка вытеснения локальных копий другим воркерам"""
+        keys = [key for key in keys if self._is_local(key)]
+        namespaces = list(namespaces)
+        if not keys and not namespaces:
+            return
+        payload = {"origin": self.instance_id, "keys": keys}
+        if namespaces:
+            payload["namespaces"] = namespaces
+        try:
+            await self.redis.publish(INVALIDATION_CHANNEL, json.dumps(payload))
+        except Exception as e:
+            self._failed("publish", e)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hit ratio по слоям, память локального слоя и выборка горячих/крупных ключей"""
+        local_total = self.stats["local_hits"] + self.stats["local_misses"]
+        redis_total = self.stats["redis_hits"] + self.stats["redis_misses"]
+        return {
+            **self.stats,
+            "local_hit_ratio": self.stats["local_hits"] / local_total if local_total else 0.0,
+            "redis_hit_ratio": self.stats["redis_hits"] / redis_total if redis_total else 0.0,
+            "local_entries": len(self.local),
+            "local_memory_bytes": self.local.memory_bytes,
+            "local_max_bytes": self.local.max_bytes,
+            "invalidation_listener": self._listening,
+            **self.telemetry.snapshot(),
+        }
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        """Логирование ошибки; сетевая ошибка включает паузу перед переподключением"""
+        self.telemetry.error(operation)
+        if isinstance(error, _NETWORK_ERRORS):
+            if self.enabled:
+                logger.error(
+                    f"Redis unavailable ({operation}): {str(error)}, "
+                    f"retrying in {self.reconnect_backoff}s"
+                )
+            self._unavailable_until = time.monotonic() + self.reconnect_backoff
+        else:
+            logger.error(f"Redis {operation} error: {str(error)}")
+
+    async def ping(self) -> bool:
+        """Проверка соединения (health check, startup)"""
+        try:
+            return bool(await self.redis.ping())
+        except Exception as e:
+            self._failed("ping", e)
+            return False
+
+    async def close(self) -> None:
+        """Закрытие пула соединений (shutdown приложения)"""
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        if self._listener is not None and not self._listener.done():
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._listener = None
+        if self._redis is not None:
+            await self._redis.close()
+            await self._redis.connection_pool.disconnect()
+            self._redis = None
+            self._loop = None
+        if self._sync_redis is not None:
+            self._sync_redis.close()
+            self._sync_redis.connection_pool.disconnect()
+            self._sync_redis = None
+
     async def get(self, key: str) -> Optional[Any]:
-        """Получение значения из кэша"""
+        """
+        Получение значения из кэша
+        Значение из локального слоя общее для всех вызовов - его нельзя изменять
+        """
+        return (await self.get_many(key))[0]
+
+    async def get_many(self, *keys: str) -> List[Optional[Any]]:
+        """Получение нескольких значений: локальный слой, затем один MGET"""
+        if not keys:
+            return []
         if not self.enabled:
-            return None
-        
+            for key in keys:
+                self.telemetry.miss(key)
+            return [None for _ in keys]
+
+        with self.telemetry.timed("get"):
+            return await self._get_many(keys)
+
+    async def _get_many(self, keys: Tuple[str, ...]) -> List[Optional[Any]]:
+        results: List[Optional[Any]] = [None for _ in keys]
+        missing = []
+        local_ready = self._local_ready() if any(self._is_local(key) for key in keys) else False
+        for i, key in enumerate(keys):
+            if local_ready and self._is_local(key):
+                value = self.local.get(key)
+                if value is not None:
+                    self.stats["local_hits"] += 1
+                    self.telemetry.hit("local", key)
+                    results[i] = value
+                    continue
+                self.stats["local_misses"] += 1
+            missing.append(i)
+
+        if not missing:
+            return results
+
+        generation = self._generation
         try:
-            value = self.redis.get(key)
-            if value:
-                return json.loads(value)
-            return None
+            if len(missing) == 1:
+                raw_values = [await self.redis.execute_command("GET", keys[missing[0]], **_RAW)]
+            else:
+                raw_values = await self.redis.execute_command("MGET", *(keys[i] for i in missing), **_RAW)
         except Exception as e:
-            logger.error(f"Redis get error: {str(e)}")
-            return None
-    
+            self._failed("get", e)
+            for i in missing:
+                self.telemetry.miss(keys[i])
+            return results
+
+        for i, raw in zip(missing, raw_values):
+            if not raw:
+                self.stats["redis_misses"] += 1
+                self.telemetry.miss(keys[i])
+                continue
+            self.stats["redis_hits"] += 1
+            self.telemetry.hit("redis", keys[i], len(raw))
+            self.telemetry.payload("get", keys[i], len(raw))
+            try:
+                value = self.codec.decode(raw)
+            except Exception as e:
+                # Нечитаемая запись (например, формат без установленной библиотеки) - промах
+                logger.error(f"Cache decode error for {keys[i]}: {str(e)}")
+                continue
+            results[i] = value
+            if local_ready and self._is_local(keys[i]) and generation == self._generation:
+                self.local.set(keys[i], value, size=len(raw))
+        return results
+
     async def set(
-        self, 
-        key: str, 
-        value: Any, 
-        ttl: Optional[int] = None
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        tags: Iterable[str] = (),
+        compress: Optional[bool] = None
     ) -> bool:
         """
         Сохранение значения в кэш
         ttl: время жизни в секундах
+        tags: теги для групповой инвалидации (invalidate_tags)
+        compress: True - сжимать от порога независимо от CACHE_COMPRESSION
         """
         if not self.enabled:
             return False
-        
+
         try:
-            ttl = ttl or settings.REDIS_CACHE_TTL
-            serialized = json.dumps(value)
-            self.redis.setex(key, ttl, serialized)
-            return True
+            ttl = ttl or settings.REDIS_CACHE_EXPIRATION
+            serialized = self.codec.encode(value, compress=compress)
+            self.telemetry.payload("set", key, len(serialized))
+            tags = list(tags)
+            with self.telemetry.timed("set"):
+                if tags:
+                    client = self.redis
+                    async with client.pipeline(transaction=False) as pipe:
+                        pipe.setex(key, ttl, serialized)
+                        await self._tag_script(keys=[tag_key(tag) for tag in tags], args=[key, ttl, TAG_PRUNE_SAMPLE], client=pipe)
+                        await pipe.execute()
+                else:
+                    await self.redis.setex(key, ttl, serialized)
         except Exception as e:
-            logger.error(f"Redis set error: {str(e)}")
+            self._failed("set", e)
             return False
-    
+
+        if self._is_local(key):
+            self._evict_local((key,))
+            await self._publish_invalidation((key,))
+            if self._local_ready():
+                self.local.set(key, value, size=len(serialized), ttl=min(ttl, self.local.ttl))
+        return True
+
+    async def set_many(
+        self,
+        values: Dict[str, Any],
+        ttl: Optional[int] = None,
+        tags: Iterable[str] = ()
+    ) -> bool:
+        """Сохранение нескольких значений одним pipeline"""
+        if not self.enabled or not values:
+            return False
+
+        try:
+            ttl = ttl or settings.REDIS_CACHE_EXPIRATION
+            tag_keys = [tag_key(tag) for tag in tags]
+            with self.telemetry.timed("set"):
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, value in values.items():
+                        serialized = self.codec.encode(value)
+                        self.telemetry.payload("set", key, len(serialized))
+                        pipe.setex(key, ttl, serialized)
+                        if tag_keys:
+                            await self._tag_script(keys=tag_keys, args=[key, ttl, TAG_PRUNE_SAMPLE], client=pipe)
+                    await pipe.execute()
+        except Exception as e:
+            self._failed("set many", e)
+            return False
+
+        self._evict_local(values)
+        await self._publish_invalidation(values)
+        return True
+
     async def delete(self, key: str) -> bool:
         """Удаление из кэша"""
         if not self.enabled:
             return False
-        
+
+        self._evict_local((key,))
+        try:
+            await self.redis.delete(key)
+        except Exception as e:
+            self._failed("delete", e)
+            return False
+
+        await self._publish_invalidation((key,))
+        return True
+
+    async def delete_many(self, *keys: str) -> int:
+        """Удаление нескольких ключей одной командой"""
+        if not self.enabled or not keys:
+            return 0
+
+        self._evict_local(keys)
+        try:
+            deleted = await self.redis.delete(*keys)
+        except Exception as e:
+            self._failed("delete many", e)
+            return 0
+
+        await self._publish_invalidation(keys)
+        return deleted
+
+    async def add_to_set(self, key: str, *members: str, ttl: Optional[int] = None) -> bool:
+        """Добавление элементов в множество (индексы ключей)"""
+        if not self.enabled or not members:
+            return False
+
+        try:
+            async with self.redis.pipeline() as pipe:
+                pipe.sadd(key, *members)
+                if ttl:
+                    pipe.expire(key, ttl)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            self._failed("sadd", e)
+            return False
+
+    async def is_set_member(self, key: str, member: str) -> Optional[bool]:
+        """Проверка элемента множества; None - Redis недоступен (ответ неизвестен)"""
+        if not self.enabled:
+            return None
+
+        try:
+            return bool(await self.redis.sismember(key, member))
+        except Exception as e:
+            self._failed("sismember", e)
+            return None
+
+    async def pop_set_members(self, key: str) -> list:
+        """Чтение и удаление множества за один round-trip"""
+        if not self.enabled:
+            return []
+
+        try:
+            async with self.redis.pipeline() as pipe:
+                pipe.smembers(key)
+                pipe.delete(key)
+                members, _ = await pipe.execute()
+            return list(members)
+        except Exception as e:
+            self._failed("pop set", e)
+            return []
+
+    async def get_hashes(self, *keys: str) -> list:
+        """Чтение нескольких hash одним pipeline (пустой dict для отсутствующих)"""
+        if not self.enabled or not keys:
+            return [{} for _ in keys]
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hgetall(key)
+                return await pipe.execute()
+        except Exception as e:
+            self._failed("hgetall", e)
+            return [{} for _ in keys]
+
+    async def replace_hashes(self, mappings: dict, ttl: Optional[int] = None) -> bool:
+        """Полная замена содержимого hash: {key: {field: value}}"""
+        if not self.enabled or not mappings:
+            return False
+
         try:
-            self.redis.delete(key)
+            async with self.redis.pipeline() as pipe:
+                for key, mapping in mappings.items():
+                    pipe.delete(key)
+                    pipe.hset(key, mapping=mapping)
+                    if ttl:
+                        pipe.expire(key, ttl)
+                await pipe.execute()
             return True
         except Exception as e:
-            logger.error(f"Redis delete error: {str(e)}")
+            self._failed("hset", e)
+            return False
+
+    async def begin_hash_rebuild(self, markers: Iterable[str], timeout: int) -> Optional[str]:
+        """
+        Начало перестройки hash из источника - до чтения источника. Маркеры
+        (по одному на hash) живут timeout секунд; токен передаётся в
+        finish_hash_rebuild. None - Redis недоступен
+        """
+        markers = list(markers)
+        if not self.enabled or not markers:
+            return None
+
+        token = uuid.uuid4().hex
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for marker in markers:
+                    pipe.set(marker, token, ex=timeout)
+                await pipe.execute()
+            return token
+        except Exception as e:
+            self._failed("rebuild mark", e)
+            return None
+
+    async def finish_hash_rebuild(
+        self,
+        mappings: dict,
+        markers: dict,
+        token: str,
+        ttl: Optional[int] = None,
+        grace: int = 10
+    ) -> List[str]:
+        """
+        Запись снимков {key: {field: value}}, построенных после
+        begin_hash_rebuild; markers: {key: маркер}. Hash, изменённый во время
+        перестройки (update_hash_if_exists с маркером), не перезаписывается.
+        Возвращает записанные ключи
+        """
+        if not self.enabled or not mappings:
+            return []
+
+        keys = list(mappings)
+        try:
+            client = self.redis
+            async with client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    args = [token, ttl or 0, grace]
+                    for field, value in mappings[key].items():
+                        args.extend((field, value))
+                    await self._hash_replace_script(keys=[key, markers[key]], args=args, client=pipe)
+                results = await pipe.execute()
+            return [key for key, written in zip(keys, results) if written == 1]
+        except Exception as e:
+            self._failed("hash rebuild", e)
+            return []
+
+    async def update_hash_if_exists(
+        self,
+        key: str,
+        increments: Optional[dict] = None,
+        values: Optional[dict] = None,
+        ttl: Optional[int] = None,
+        rebuild_marker: Optional[str] = None,
+        prune: Optional[Tuple[str, int]] = None
+    ) -> bool:
+        """
+        Атомарный инкремент/запись полей существующего hash
+        Возвращает False, если hash отсутствует (его нужно построить целиком)
+        или сброшен, потому что идёт его перестройка (rebuild_marker)
+        prune=(префикс, порог): заодно удаляются поля <префикс>...:<n> с n < порога
+        """
+        if not self.enabled:
+            return False
+
+        prefix, threshold = prune or ("", 0)
+        args = [ttl or 0, prefix, threshold]
+        for field, amount in (increments or {}).items():
+            args.extend(("incr", field, amount))
+        for field, value in (values or {}).items():
+            args.extend(("set", field, value))
+
+        keys = [key, rebuild_marker] if rebuild_marker else [key]
+        try:
+            client = self.redis
+            return await self._hash_update_script(keys=keys, args=args, client=client) == 1
+        except Exception as e:
+            self._failed("hash update", e)
+            return False
+
+    # Версионированные записи (сквозная запись: значение не старее последнего коммита)
+
+    async def get_versioned(self, key: str) -> Optional[Tuple[int, Any]]:
+        """
+        (версия, значение) или None: записи нет или зарезервирована более
+        новая версия, которая ещё не записана (нужно читать источник)
+        """
+        if not self.enabled:
+            self.telemetry.miss(key)
+            return None
+
+        try:
+            with self.telemetry.timed("get"):
+                version, pending, raw = await self.redis.execute_command(
+                    "HMGET", key, "version", "pending", "value", **_RAW
+                )
+        except Exception as e:
+            self._failed("get versioned", e)
+            self.telemetry.miss(key)
+            return None
+
+        if raw is None or version is None or (pending is not None and int(pending) > int(version)):
+            self.stats["redis_misses"] += 1
+            self.telemetry.miss(key)
+            return None
+        self.stats["redis_hits"] += 1
+        self.telemetry.hit("redis", key, len(raw))
+        self.telemetry.payload("get", key, len(raw))
+        return int(version), self.codec.decode(raw)
+
+    async def set_versioned(self, key: str, version: int, value: Any, ttl: Optional[int] = None) -> bool:
+        """Запись значения версии version; False - в кэше уже более новая версия"""
+        if not self.enabled:
+            return False
+
+        try:
+            client = self.redis
+            serialized = self.codec.encode(value)
+            self.telemetry.payload("set", key, len(serialized))
+            with self.telemetry.timed("set"):
+                return bool(await self._versioned_set_script(
+                    keys=[key],
+                    args=[version, serialized, ttl or settings.REDIS_CACHE_EXPIRATION],
+                    client=client
+                ))
+        except Exception as e:
+            self._failed("set versioned", e)
+            return False
+
+    async def reserve_version(self, key: str, version: int, ttl: int) -> bool:
+        """
+        Резерв версии перед коммитом в источник: до set_versioned этой версии
+        (или истечения ttl) чтения - промахи, а более старые значения,
+        прочитанные из источника до коммита, не будут записаны
+        """
+        if not self.enabled:
+            return False
+
+        try:
+            client = self.redis
+            return bool(await self._version_reserve_script(keys=[key], args=[version, ttl], client=client))
+        except Exception as e:
+            self._failed("reserve version", e)
             return False
-    
-    async def clear_pattern(self, pattern: str) -> int:
+
+    # Групповая инвалидация
+
+    async def invalidate_tags(self, *tags: str) -> int:
         """
-        Удаление всех ключей по шаблону
-        Пример: 'user:*' удалит все ключи начинающиеся с 'user:'
+        Удаление всех записей с любым из тегов
+        Участники вынимаются порциями (SPOP count) и удаляются UNLINK,
+        поэтому Redis не блокируется даже на больших тегах
         """
+        if not self.enabled or not tags:
+            return 0
+
+        deleted = 0
+        try:
+            for tag in tags:
+                while True:
+                    members = await self.redis.spop(tag_key(tag), INVALIDATION_CHUNK)
+                    if not members:
+                        break
+                    self._evict_local(members)
+                    deleted += await self.redis.unlink(*members)
+                    await self._publish_invalidation(members)
+        except Exception as e:
+            self._failed("invalidate tags", e)
+        return deleted
+
+    async def namespace_version(self, namespace: str) -> int:
+        """Текущая версия пространства имён (кэшируется в процессе)"""
         if not self.enabled:
             return 0
-        
+
+        version = self._namespace_versions.get(namespace) if self._local_ready() else None
+        if version is not None:
+            return version
+
         try:
-            keys = self.redis.keys(pattern)
-            if keys:
-                return self.redis.delete(*keys)
+            version = int(await self.redis.get(f"{NAMESPACE_PREFIX}:{namespace}") or 0)
+        except Exception as e:
+            self._failed("namespace version", e)
             return 0
+        self._namespace_versions.set(namespace, version)
+        return version
+
+    async def namespaced_key(self, namespace: str, key: str) -> str:
+        """Ключ внутри версионированного пространства имён: {namespace}:v{version}:{key}"""
+        return f"{namespace}:v{await self.namespace_version(namespace)}:{key}"
+
+    async def bump_namespace(self, namespace: str) -> int:
+        """
+        Инвалидация всего пространства имён за O(1): новая версия,
+        старые ключи больше не читаются и истекают по TTL
+        """
+        if not self.enabled:
+            return 0
+
+        try:
+            version = await self.redis.incr(f"{NAMESPACE_PREFIX}:{namespace}")
         except Exception as e:
-            logger.error(f"Redis clear pattern error: {str(e)}")
+            self._failed("bump namespace", e)
             return 0
-    
+        self._namespace_versions.set(namespace, version)
+        await self._publish_invalidation(namespaces=[namespace])
+        return version
+
     async def increment(self, key: str, amount: int = 1) -> int:
         """Инкремент значения (для счётчиков)"""
         if not self.enabled:
             return 0
-        
+
         try:
-            return self.redis.incrby(key, amount)
+            return await self.redis.incrby(key, amount)
         except Exception as e:
-            logger.error(f"Redis increment error: {str(e)}")
+            self._failed("increment", e)
             return 0
-    
+
+    async def claim_many(self, keys: Iterable[str], ttl: int) -> Optional[List[bool]]:
+        """
+        SET NX EX для каждого ключа за один round-trip: True - ключ занят этим
+        вызовом, False - уже занят (другим воркером). None - Redis недоступен
+        """
+        keys = list(keys)
+        if not self.enabled or not keys:
+            return None
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(key, 1, nx=True, ex=ttl)
+                return [bool(claimed) for claimed in await pipe.execute()]
+        except Exception as e:
+            self._failed("claim", e)
+            return None
+
+    # Защита от stampede
+
+    async def _acquire_lock(self, key: str, token: str, timeout: float) -> bool:
+        """Блокировка пересчёта между воркерами; без Redis - всегда успешно"""
+        if not self.enabled:
+            return True
+        try:
+            return bool(await self.redis.set(
+                f"{LOCK_PREFIX}:{key}", token, nx=True, px=int(timeout * 1000)
+            ))
+        except Exception as e:
+            self._failed("lock", e)
+            return True
+
+    async def _release_lock(self, key: str, token: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            client = self.redis
+            await self._release_lock_script(keys=[f"{LOCK_PREFIX}:{key}"], args=[token], client=client)
+        except Exception as e:
+            self._failed("unlock", e)
+
+    async def acquire_lock(self, name: str, timeout: float) -> Optional[str]:
+        """
+        Блокировка между воркерами на timeout секунд (например, задача одна на кластер)
+        Возвращает токен для release_lock или None, если блокировку держит другой
+        """
+        token = uuid.uuid4().hex
+        return token if await self._acquire_lock(name, token, timeout) else None
+
+    async def release_lock(self, name: str, token: str) -> None:
+        await self._release_lock(name, token)
+
+    async def _wait_for_value(self, key: str, timeout: float) -> Optional[dict]:
+        """Ожидание значения, которое вычисляет другой воркер"""
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            entry = await self.get(key)
+            if isinstance(entry, dict) and "exp" in entry:
+                return entry
+            delay = min(delay * 2, 0.2)
+        return None
+
+    async def _compute(
+        self,
+        key: str,
+        loader: Callable[[], Union[Any, Awaitable[Any]]],
+        ttl: int,
+        stale_ttl: int,
+        lock_timeout: float,
+        wait: bool,
+        tags: Iterable[str] = (),
+        negative_ttl: Optional[int] = None,
+        compress: bool = False
+    ) -> Optional[dict]:
+        """
+        Вычисление и запись значения под блокировкой
+        wait=False (фоновое обновление): если блокировка занята, ничего не делаем
+        """
+        token = uuid.uuid4().hex
+        acquired = await self._acquire_lock(key, token, lock_timeout)
+        if not acquired:
+            if not wait:
+                return None
+            entry = await self._wait_for_value(key, lock_timeout)
+            if entry is not None:
+                return entry
+            # Владелец блокировки не успел - считаем сами
+
+        try:
+            if acquired:
+                # Значение могли записать, пока мы ждали блокировку
+                entry = await self.get(key)
+                if isinstance(entry, dict) and entry.get("exp", 0) > time.time():
+                    return entry
+
+            started = time.perf_counter()
+            value = loader()
+            if inspect.isawaitable(value):
+                value = await value
+            entry, _ = await self.put(
+                key, value, ttl, stale_ttl, tags, negative_ttl, compress, time.perf_counter() - started
+            )
+            self.stats["recomputes"] += 1
+            return entry
+        finally:
+            if acquired:
+                await self._release_lock(key, token)
+
+    def _refresh_in_background(self, key: str, **kwargs) -> None:
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._compute(key, wait=False, **kwargs)
+            except Exception as e:
+                logger.error(f"Cache refresh error for {key}: {str(e)}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.get_running_loop().create_task(refresh())
+
+    async def put(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        stale_ttl: int = 0,
+        tags: Iterable[str] = (),
+        negative_ttl: Optional[int] = None,
+        compress: bool = False,
+        elapsed: float = 0.0
+    ) -> Tuple[dict, bool]:
+        """
+        Запись уже вычисленного значения в формате get_or_set (прогрев кэша)
+        Возвращает запись и признак сохранения в Redis
+        """
+        entry, keep_ttl = _envelope(
+            value, elapsed, ttl or settings.REDIS_CACHE_EXPIRATION, stale_ttl, negative_ttl
+        )
+        if keep_ttl <= 0:
+            return entry, False
+        return entry, await self.set(key, entry, ttl=keep_ttl, tags=tags, compress=compress or None)
+
+    async def _read_or_compute(self, key: str, early_expiry_beta: float, **options) -> Any:
+        entry = await self.get(key)
+        if isinstance(entry, dict) and "exp" in entry:
+            now = time.time()
+            # -log(U) ~ Exp(1): чем дороже вычисление, тем раньше обновление
+            early = entry.get("d", 0) * early_expiry_beta * -math.log(random.random() or 1e-12)
+            if now + early < entry["exp"]:
+                return entry["v"]
+            if now >= entry["exp"]:
+                self.stats["stale_served"] += 1
+                self.telemetry.stale()
+            self._refresh_in_background(key, **options)
+            return entry["v"]
+
+        return (await self._compute(key, wait=True, **options))["v"]
+
+    async def get_or_set(
+        self,
+        key: str,
+        loader: Callable[[], Union[Any, Awaitable[Any]]],
+        ttl: Optional[int] = None,
+        stale_ttl: int = 0,
+        early_expiry_beta: float = 1.0,
+        lock_timeout: float = 10.0,
+        tags: Iterable[str] = (),
+        negative_ttl: Optional[int] = None,
+        compress: bool = False
+    ) -> Any:
+        """
+        Чтение с вычислением при промахе и защитой от stampede
+
+        ttl: время свежести значения; stale_ttl: сколько после этого значение
+        ещё отдаётся, пока оно обновляется в фоне. Незадолго до истечения
+        обновление запускается с вероятностью, растущей со временем вычисления
+        (XFetch, early_expiry_beta=0 - отключено).
+        loader может быть обычной или async функцией.
+        tags: теги записи для invalidate_tags.
+        negative_ttl: время жизни пустого результата (None, [], {}), 0 - не кэшировать.
+        compress: сжимать значения от CACHE_COMPRESS_MIN_BYTES, даже если
+        CACHE_COMPRESSION выключено.
+
+        Конкурентные вызовы с одним ключом в процессе объединяются в одно
+        чтение/вычисление, между воркерами пересчёт защищён блокировкой в Redis.
+        """
+        loop = asyncio.get_running_loop()
+        future = self._inflight.get(key)
+        if future is not None and future.get_loop() is loop:
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._read_or_compute(
+                key,
+                early_expiry_beta=early_expiry_beta,
+                loader=loader,
+                ttl=ttl or settings.REDIS_CACHE_EXPIRATION,
+                stale_ttl=stale_ttl,
+                lock_timeout=lock_timeout,
+                tags=tuple(tags),
+                negative_ttl=negative_ttl,
+                compress=compress
+            )
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение получат ожидающие; без них future не должен ругаться в лог
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def get_or_set_sync(
+        self,
+        key: str,
+        loader: Callable[[], Any],
+        ttl: Optional[int] = None,
+        stale_ttl: int = 0,
+        tags: Iterable[str] = (),
+        negative_ttl: Optional[int] = None,
+        compress: bool = False
+    ) -> Any:
+        """
+        get_or_set для синхронного кода, формат записи общий
+
+        Конкурентные вызовы с одним ключом в процессе ждут друг друга, между
+        воркерами блокировки нет. Устаревшее значение не отдаётся - после
+        ttl пересчёт сразу; локальный слой не используется.
+        """
+        if not self.enabled:
+            self.telemetry.miss(key)
+            return loader()
+
+        ttl = ttl or settings.REDIS_CACHE_EXPIRATION
+        with self._sync_key_locks[zlib.crc32(key.encode()) % len(self._sync_key_locks)]:
+            try:
+                raw = self._read_sync(key)
+                entry = self.codec.decode(raw) if raw else None
+            except Exception as e:
+                self._failed("get", e)
+                self.telemetry.miss(key)
+                return loader()
+
+            if entry is not None:
+                if isinstance(entry, dict) and entry.get("exp", 0) > time.time():
+                    self.stats["redis_hits"] += 1
+                    self.telemetry.hit("redis", key, len(raw))
+                    return entry["v"]
+            self.stats["redis_misses"] += 1
+            self.telemetry.miss(key)
+
+            started = time.perf_counter()
+            value = loader()
+            entry, keep_ttl = _envelope(value, time.perf_counter() - started, ttl, stale_ttl, negative_ttl)
+            self.stats["recomputes"] += 1
+            if keep_ttl > 0:
+                self.set_sync(key, entry, keep_ttl, tags, compress or None)
+            return value
+
+    # Синхронный API (CacheService, PerformanceManager, код вне event loop)
+
+    def _read_sync(self, key: str) -> Optional[bytes]:
+        with self.telemetry.timed("get"):
+            raw = self.sync_redis.execute_command("GET", key, **_RAW)
+        if raw:
+            self.telemetry.payload("get", key, len(raw))
+        return raw
+
+    def get_sync(self, key: str) -> Optional[Any]:
+        """get для синхронного кода (без локального слоя)"""
+        if not self.enabled:
+            self.telemetry.miss(key)
+            return None
+
+        try:
+            raw = self._read_sync(key)
+            value = self.codec.decode(raw) if raw else None
+        except Exception as e:
+            self._failed("get", e)
+            value = raw = None
+
+        if value is None:
+            self.stats["redis_misses"] += 1
+            self.telemetry.miss(key)
+            return None
+        self.stats["redis_hits"] += 1
+        self.telemetry.hit("redis", key, len(raw))
+        return value
+
+    def set_sync(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        tags: Iterable[str] = (),
+        compress: Optional[bool] = None
+    ) -> bool:
+        """set для синхронного кода"""
+        if not self.enabled:
+            return False
+
+        try:
+            ttl = ttl or settings.REDIS_CACHE_EXPIRATION
+            serialized = self.codec.encode(value, compress=compress)
+            self.telemetry.payload("set", key, len(serialized))
+            tags = list(tags)
+            with self.telemetry.timed("set"):
+                client = self.sync_redis
+                pipe = client.pipeline(transaction=False)
+                pipe.setex(key, ttl, serialized)
+                if tags:
+                    self._sync_tag_script(keys=[tag_key(tag) for tag in tags], args=[key, ttl, TAG_PRUNE_SAMPLE], client=pipe)
+                if self._is_local(key):
+                    pipe.publish(INVALIDATION_CHANNEL, json.dumps({"origin": self.instance_id, "keys": [key]}))
+                pipe.execute()
+        except Exception as e:
+            self._failed("set", e)
+            return False
+        if self._is_local(key):
+            self._evict_local((key,))
+        return True
+
+    def delete_sync(self, key: str) -> bool:
+        """delete для синхронного кода"""
+        if not self.enabled:
+            return False
+
+        try:
+            deleted = bool(self.sync_redis.delete(key))
+        except Exception as e:
+            self._failed("delete", e)
+            return False
+        if self._is_local(key):
+            self._evict_local((key,))
+        return deleted
+
+    def invalidate_tags_sync(self, *tags: str) -> int:
+        """invalidate_tags для синхронного кода (без рассылки вытеснения локальных копий)"""
+        if not self.enabled:
+            return 0
+
+        try:
+            return sum(invalidate_tag_sync(self.sync_redis, tag) for tag in tags)
+        except Exception as e:
+            self._failed("invalidate tags", e)
+            return 0
+
     # Специализированные методы для YESS
-    
+
     async def cache_user(self, user_id: int, user_data: dict, ttl: int = 3600) -> bool:
         """Кэширование данных пользователя"""
         return await self.set(f"user:{user_id}", user_data, ttl)
-    
+
     async def get_cached_user(self, user_id: int) -> Optional[dict]:
         """Получение данных пользователя из кэша"""
         return await self.get(f"user:{user_id}")
-    
+
     async def cache_partner(self, partner_id: int, partner_data: dict, ttl: int = 3600) -> bool:
         """Кэширование данных партнёра"""
         return await self.set(f"partner:{partner_id}", partner_data, ttl)
-    
+
     async def get_cached_partner(self, partner_id: int) -> Optional[dict]:
         """Получение данных партнёра из кэша"""
         return await self.get(f"partner:{partner_id}")
-    
+
     async def cache_partners_list(self, city_id: int, partners: list, ttl: int = 1800) -> bool:
         """Кэширование списка партнёров по городу"""
         return await self.set(f"partners:city:{city_id}", partners, ttl)
-    
+
     async def get_cached_partners_list(self, city_id: int) -> Optional[list]:
         """Получение списка партнёров из кэша"""
         return await self.get(f"partners:city:{city_id}")
-    
+
     async def invalidate_user_cache(self, user_id: int) -> bool:
-        """Очистка кэша пользователя"""
+        """Очистка кэша пользователя и записей с тегом user:{id}"""
+        await self.invalidate_tags(f"user:{user_id}")
         return await self.delete(f"user:{user_id}")
-    
+
     async def invalidate_partner_cache(self, partner_id: int) -> bool:
-        """Очистка кэша партнёра"""
+        """
+        Очистка кэша партнёра, записей с тегом partner:{id} и списков партнёров
+        (тег partners: каталог, тренды)
+        """
+        await self.invalidate_tags(f"partner:{partner_id}", "partners")
         return await self.delete(f"partner:{partner_id}")
 
 
 # Singleton instance
-redis_cache = RedisCache()
+redis_cache = RedisCache(
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+    retry_attempts=settings.REDIS_RETRY_ATTEMPTS,
+    health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    reconnect_backoff=settings.REDIS_RECONNECT_BACKOFF,
+    local_max_items=settings.CACHE_LOCAL_MAX_ITEMS,
+    local_max_bytes=settings.CACHE_LOCAL_MAX_BYTES,
+    local_ttl=settings.CACHE_LOCAL_TTL,
+    local_prefixes=settings.CACHE_LOCAL_PREFIXES,
+    codec=CacheCodec(
+        serializer=settings.CACHE_CODEC,
+        compression=settings.CACHE_COMPRESSION,
+        compress_min_bytes=settings.CACHE_COMPRESS_MIN_BYTES,
+        compression_level=settings.CACHE_COMPRESSION_LEVEL
+    )
+)
+
+
+def _call_key(
+    name: str,
+    signature: inspect.Signature,
+    key_args: Optional[Tuple[str, ...]],
+    version: int,
+    args: tuple,
+    kwargs: dict
+) -> str:
+    """
+    Ключ вызова: cached:{модуль.функция}:v{версия}:{sha1 аргументов}
+
+    Аргументы связываются с сигнатурой (f(1) и f(x=1) дают один ключ),
+    self/cls и сессии БД пропускаются, остальное кодируется в JSON с
+    сортировкой ключей. Значение, которое нельзя закодировать однозначно, -
+    TypeError, а не ключ по repr с адресом объекта.
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    values = {}
+    for arg_name, value in bound.arguments.items():
+        if key_args is not None:
+            if arg_name not in key_args:
+                continue
+        elif arg_name in ("self", "cls") or isinstance(value, Session):
+            continue
+        values[arg_name] = value
+    payload = json.dumps(values, sort_keys=True, separators=(",", ":"), default=pydantic_encoder)
+    return f"{CACHED_PREFIX}:{name}:v{version}:{hashlib.sha1(payload.encode()).hexdigest()}"
+
+
+def cached(
+    key: Optional[Callable[..., str]] = None,
+    ttl: Optional[int] = None,
+    stale_ttl: int = 0,
+    tags: Union[Iterable[str], Callable[..., Iterable[str]], None] = None,
+    cache: Optional[RedisCache] = None,
+    key_args: Optional[Iterable[str]] = None,
+    version: int = 1,
+    negative_ttl: Optional[int] = None,
+    compress: bool = False,
+    model: Any = None
+):
+    """
+    Декоратор функций и методов сервисов (обычных и async) поверх get_or_set
+
+    key: построитель ключа, получает те же аргументы, что и функция. Без него
+    ключ выводится из аргументов (key_args - только перечисленные) и
+    включает version: увеличьте её, когда меняется формат результата.
+    tags: список тегов или функция от аргументов.
+    negative_ttl: время жизни пустого результата, 0 - не кэшировать.
+    compress: сжимать крупные значения.
+    model: тип результата (pydantic), из кэша значение восстанавливается через
+    parse_obj_as - иначе вернутся словари.
+
+        @cached(
+            key=lambda city_id: f"partners:city:{city_id}",
+            tags=lambda city_id: [f"city:{city_id}"],
+            ttl=300, stale_ttl=600
+        )
+        async def partners_for_city(city_id: int): ...
+
+        @classmethod
+        @cached(ttl=900, tags=["partners"], model=List[PartnerRecommendation])
+        def get_trending_partners(cls, db: Session, limit: int = 10): ...
+
+    Синхронные функции кэшируются через get_or_set_sync; из async-кода -
+    await wrapper.call_async(*args, **kwargs): async Redis, функция в потоке,
+    event loop не блокируется. Ключ конкретного вызова -
+    wrapper.cache_key(*args, **kwargs), пересчёт с записью без чтения кэша
+    (прогрев) - await wrapper.refresh(*args, **kwargs), синхронная функция -
+    тоже в потоке.
+    """
+    key_args = tuple(key_args) if key_args is not None else None
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        def call_key(args, kwargs) -> str:
+            if key is not None:
+                return key(*args, **kwargs)
+            return _call_key(name, signature, key_args, version, args, kwargs)
+
+        def call_tags(args, kwargs) -> Iterable[str]:
+            if tags is None:
+                return ()
+            return tags(*args, **kwargs) if callable(tags) else tags
+
+        def result(value):
+            return parse_obj_as(model, value) if model is not None else value
+
+        options = {"ttl": ttl, "stale_ttl": stale_ttl, "negative_ttl": negative_ttl, "compress": compress}
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                return result(await (cache or redis_cache).get_or_set(
+                    call_key(args, kwargs),
+                    lambda: func(*args, **kwargs),
+                    tags=call_tags(args, kwargs),
+                    **options
+                ))
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return result((cache or redis_cache).get_or_set_sync(
+                    call_key(args, kwargs),
+                    lambda: func(*args, **kwargs),
+                    tags=call_tags(args, kwargs),
+                    **options
+                ))
+
+        async def call_async(*args, **kwargs):
+            if inspect.iscoroutinefunction(func):
+                return await wrapper(*args, **kwargs)
+            return result(await (cache or redis_cache).get_or_set(
+                call_key(args, kwargs),
+                lambda: asyncio.to_thread(func, *args, **kwargs),
+                tags=call_tags(args, kwargs),
+                **options
+            ))
+
+        async def refresh(*args, **kwargs):
+            # Синхронная функция выполняется в потоке - прогрев идёт параллельно
+            started = time.perf_counter()
+            if inspect.iscoroutinefunction(func):
+                value = await func(*args, **kwargs)
+            else:
+                value = await asyncio.to_thread(func, *args, **kwargs)
+            await (cache or redis_cache).put(
+                call_key(args, kwargs),
+                value,
+                tags=call_tags(args, kwargs),
+                elapsed=time.perf_counter() - started,
+                **options
+            )
+            return result(value)
 
+        wrapper.cache_key = lambda *args, **kwargs: call_key(args, kwargs)
+        wrapper.refresh = refresh
+        wrapper.call_async = call_async
+        return wrapper
+    return decorator
@@ -0,0 +1,197 @@
+"""
+Cache payload codecs
+
+Значение кэша кодируется в bytes с заголовком из трёх байт:
+0x00, сериализатор, алгоритм сжатия. По заголовку декодируется любая
+запись независимо от текущих настроек, поэтому сериализатор и сжатие
+можно менять без сброса кэша. Записи без заголовка - прежний JSON.
+
+Сериализаторы: orjson (по умолчанию), msgpack, json (stdlib, запасной).
+Decimal, datetime, UUID, Pydantic-модели и dataclass кодируются всеми:
+msgpack восстанавливает Decimal/datetime/date/UUID как есть, orjson и
+json возвращают их строками (тип восстанавливается моделью, см.
+@cached(model=...)). Сжатие (zlib, lz4, zstd) применяется к значениям
+от compress_min_bytes. msgpack, lz4 и zstandard - опциональные зависимости.
+"""
+import json
+import uuid
+import zlib
+import dataclasses
+from enum import Enum
+from decimal import Decimal
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = 0x00
+
+SERIALIZERS = {"json": 1, "orjson": 2, "msgpack": 3}
+COMPRESSIONS = {"none": 0, "zlib": 1, "lz4": 2, "zstd": 3}
+
+# Коды ExtType msgpack
+_EXT_DECIMAL = 1
+_EXT_DATETIME = 2
+_EXT_DATE = 3
+_EXT_UUID = 4
+
+
+def _to_builtin(value: Any) -> Any:
+    """Приведение типов, которых нет в JSON (default для json/orjson)"""
+    if isinstance(value, Decimal):
+        # Строкой, чтобы не терять точность денежных сумм
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not cache-serializable")
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(value).encode())
+    if isinstance(value, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, date):
+        return msgpack.ExtType(_EXT_DATE, value.isoformat().encode())
+    if isinstance(value, uuid.UUID):
+        return msgpack.ExtType(_EXT_UUID, value.bytes)
+    return _to_builtin(value)
+
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == _EXT_DECIMAL:
+        return Decimal(data.decode())
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == _EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == _EXT_UUID:
+        return uuid.UUID(bytes=data)
+    return msgpack.ExtType(code, data)
+
+
+def _serializer(name: str) -> Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]:
+    if name == "orjson":
+        if orjson is None:
+            raise RuntimeError("orjson is not installed")
+        option = orjson.OPT_NON_STR_KEYS
+        return (lambda value: orjson.dumps(value, default=_to_builtin, option=option)), orjson.loads
+    if name == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed")
+        return (
+            lambda value: msgpack.packb(value, default=_msgpack_default, use_bin_type=True),
+            lambda data: msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)
+        )
+    if name == "json":
+        return (
+            lambda value: json.dumps(value, default=_to_builtin, separators=(",", ":")).encode(),
+            json.loads
+        )
+    raise ValueError(f"Unknown cache serializer: {name}")
+
+
+def _compressor(name: str, level: Optional[int]) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    if name == "none":
+        return (lambda data: data), (lambda data: data)
+    if name == "zlib":
+        return (lambda data: zlib.compress(data, 1 if level is None else level)), zlib.decompress
+    if name == "lz4":
+        if lz4_frame is None:
+            raise RuntimeError("lz4 is not installed")
+        return (
+            lambda data: lz4_frame.compress(data, compression_level=level or 0),
+            lz4_frame.decompress
+        )
+    if name == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        decompressor = zstandard.ZstdDecompressor()
+        return compressor.compress, decompressor.decompress
+    raise ValueError(f"Unknown cache compression: {name}")
+
+
+class CacheCodec:
+    """Кодирование значений кэша: сериализатор + сжатие от порога"""
+
+    def __init__(
+        self,
+        serializer: str = "orjson",
+        compression: str = "none",
+        compress_min_bytes: int = 1024,
+        compression_level: Optional[int] = None
+    ):
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self._dumps, _ = _serializer(serializer)
+        self._compress, _ = _compressor(compression, compression_level)
+        # Для compress=True при compression="none"
+        self._force_compression = compression if compression != "none" else "zlib"
+        self._force_compress, _ = _compressor(self._force_compression, compression_level)
+        self._header = bytes((MAGIC, SERIALIZERS[serializer]))
+        # Декодеры создаются по мере встречи форматов в заголовках
+        self._loads: Dict[int, Callable[[bytes], Any]] = {}
+        self._decompress: Dict[int, Callable[[bytes], bytes]] = {}
+
+    def encode(self, value: Any, compress: Optional[bool] = None) -> bytes:
+        """
+        compress: None - по настройке кодека, True - сжимать от порога даже
+        при compression="none" (zlib), False - не сжимать
+        """
+        data = self._dumps(value)
+        if compress is not False and len(data) >= self.compress_min_bytes:
+            if self.compression != "none":
+                return self._header + bytes((COMPRESSIONS[self.compression],)) + self._compress(data)
+            if compress:
+                return self._header + bytes((COMPRESSIONS[self._force_compression],)) + self._force_compress(data)
+        return self._header + b"\x00" + data
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        if isinstance(data, str) or not data or data[0] != MAGIC:
+            return json.loads(data)
+
+        serializer, compression = data[1], data[2]
+        payload = data[3:]
+        if compression:
+            decompress = self._decompress.get(compression)
+            if decompress is None:
+                name = next(name for name, code in COMPRESSIONS.items() if code == compression)
+                decompress = self._decompress.setdefault(compression, _compressor(name, None)[1])
+            payload = decompress(payload)
+
+        loads = self._loads.get(serializer)
+        if loads is None:
+            name = next(name for name, code in SERIALIZERS.items() if code == serializer)
+            loads = self._loads.setdefault(serializer, _serializer(name)[1])
+        return loads(payload)
@@ -0,0 +1,228 @@
+"""
+Cache metrics (Prometheus)
+
+Метрики ведутся по логическому кэшу (метка cache): redis_cache - default,
+CacheService - cache_service, PerformanceManager - performance_manager.
+
+- cache_hits_total{cache, tier}: попадания, tier - local (in-process) или redis;
+- cache_misses_total{cache}: промахи (в том числе пока Redis недоступен);
+- cache_stale_served_total{cache}: отдано устаревшее значение на время обновления;
+- cache_errors_total{cache, operation}: ошибки Redis;
+- cache_operation_seconds{cache, operation}: задержка get/set;
+- cache_payload_bytes{cache, operation}: размер прочитанных и записанных значений.
+
+Режим выборки (CACHE_KEY_SAMPLE_RATE > 0): доля обращений попадает в
+KeySampler, который считает самые частые и самые крупные ключи. Они
+экспортируются как cache_hot_key_accesses и cache_key_size_bytes -
+только top-N (CACHE_KEY_SAMPLE_TOP_N), чтобы число рядов было ограничено.
+
+Эндпоинт для Prometheus (monitoring/prometheus.yml ожидает /metrics):
+
+    app.mount("/metrics", metrics_app)
+
+prometheus-client - зависимость прода; без неё метрики не пишутся, а
+выборка ключей доступна через snapshot().
+"""
+import time
+import heapq
+import random
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    from prometheus_client import REGISTRY, Counter, Histogram, make_asgi_app
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:
+    REGISTRY = None
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class _NoopMetric:
+    """Заглушка, когда prometheus-client не установлен"""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def observe(self, amount: float) -> None:
+        pass
+
+
+if REGISTRY is not None and settings.CACHE_METRICS_ENABLED:
+    HITS = Counter("cache_hits_total", "Cache hits", ["cache", "tier"])
+    MISSES = Counter("cache_misses_total", "Cache misses", ["cache"])
+    STALE_SERVED = Counter("cache_stale_served_total", "Stale values served while refreshing", ["cache"])
+    ERRORS = Counter("cache_errors_total", "Cache backend errors", ["cache", "operation"])
+    LATENCY = Histogram(
+        "cache_operation_seconds", "Cache operation latency", ["cache", "operation"], buckets=LATENCY_BUCKETS
+    )
+    PAYLOAD = Histogram(
+        "cache_payload_bytes", "Cache payload size", ["cache", "operation"], buckets=SIZE_BUCKETS
+    )
+    metrics_app = make_asgi_app()
+else:
+    HITS = MISSES = STALE_SERVED = ERRORS = LATENCY = PAYLOAD = _NoopMetric()
+    metrics_app = None
+
+
+class KeySampler:
+    """
+    Выборка обращений к ключам: самые частые и самые крупные
+
+    Учитывается доля rate обращений, счётчики - оценка полного числа
+    (делятся на rate). Раз в window секунд счётчики уменьшаются вдвое,
+    чтобы топ отражал текущую нагрузку. Хранится не больше capacity
+    ключей: при переполнении остаются самые частые (и самые крупные).
+    """
+
+    def __init__(self, rate: float = 0.0, top_n: int = 20, window: float = 300, capacity: int = 10000):
+        self.rate = rate
+        self.top_n = top_n
+        self.window = window
+        self.capacity = capacity
+        self._counts: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        self._decayed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def record(self, key: str, size: Optional[int] = None) -> None:
+        if self.rate <= 0 or random.random() >= self.rate:
+            return
+        with self._lock:
+            self._decay()
+            self._counts[key] = self._counts.get(key, 0) + 1
+            if size is not None and size > self._sizes.get(key, 0):
+                self._sizes[key] = size
+            if len(self._counts) > self.capacity:
+                self._counts = dict(heapq.nlargest(self.capacity // 2, self._counts.items(), key=lambda item: item[1]))
+            if len(self._sizes) > self.capacity:
+                self._sizes = dict(heapq.nlargest(self.capacity // 2, self._sizes.items(), key=lambda item: item[1]))
+
+    def _decay(self) -> None:
+        now = time.monotonic()
+        if now - self._decayed_at < self.window:
+            return
+        self._decayed_at = now
+        self._counts = {key: count / 2 for key, count in self._counts.items() if count >= 1}
+
+    def hottest(self, n: Optional[int] = None) -> List[Tuple[str, float]]:
+        """(ключ, оценка числа обращений), по убыванию"""
+        with self._lock:
+            top = heapq.nlargest(n or self.top_n, self._counts.items(), key=lambda item: item[1])
+        return [(key, count / self.rate) for key, count in top]
+
+    def largest(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(ключ, максимальный размер значения в байтах), по убыванию"""
+        with self._lock:
+            return heapq.nlargest(n or self.top_n, self._sizes.items(), key=lambda item: item[1])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._sizes.clear()
+
+
+class CacheMetrics:
+    """Метрики одного логического кэша"""
+
+    def __init__(self, name: str, sampler: Optional[KeySampler] = None):
+        self.name = name
+        self.sampler = sampler or KeySampler()
+        self._hits = {tier: HITS.labels(name, tier) for tier in ("local", "redis")}
+        self._misses = MISSES.labels(name)
+        self._stale = STALE_SERVED.labels(name)
+
+    def hit(self, tier: str, key: str, size: Optional[int] = None) -> None:
+        self._hits[tier].inc()
+        self.sampler.record(key, size)
+
+    def miss(self, key: str) -> None:
+        self._misses.inc()
+        self.sampler.record(key)
+
+    def stale(self) -> None:
+        self._stale.inc()
+
+    def error(self, operation: str) -> None:
+        ERRORS.labels(self.name, operation).inc()
+
+    def payload(self, operation: str, key: str, size: int) -> None:
+        PAYLOAD.labels(self.name, operation).observe(size)
+        if operation == "set":
+            self.sampler.record(key, size)
+
+    @contextmanager
+    def timed(self, operation: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            LATENCY.labels(self.name, operation).observe(time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        return {
+            "hot_keys": [{"key": key, "accesses": round(count)} for key, count in self.sampler.hottest()],
+            "largest_keys": [{"key": key, "bytes": size} for key, size in self.sampler.largest()],
+        }
+
+
+_caches: Dict[str, CacheMetrics] = {}
+_caches_lock = threading.Lock()
+
+
+def cache_metrics(name: str) -> CacheMetrics:
+    """Метрики логического кэша name (один объект на процесс)"""
+    with _caches_lock:
+        metrics = _caches.get(name)
+        if metrics is None:
+            metrics = _caches[name] = CacheMetrics(name, KeySampler(
+                rate=settings.CACHE_KEY_SAMPLE_RATE,
+                top_n=settings.CACHE_KEY_SAMPLE_TOP_N,
+                window=settings.CACHE_KEY_SAMPLE_WINDOW
+            ))
+        return metrics
+
+
+def snapshot() -> Dict[str, dict]:
+    """Горячие и крупные ключи по всем кэшам (для отладки и админки)"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {metrics.name: metrics.snapshot() for metrics in caches}
+
+
+class _TopKeysCollector:
+    """Экспорт top-N ключей из выборки в момент scrape"""
+
+    def collect(self):
+        hot = GaugeMetricFamily(
+            "cache_hot_key_accesses", "Sampled top-N hottest keys (estimated accesses)", labels=["cache", "key"]
+        )
+        large = GaugeMetricFamily(
+            "cache_key_size_bytes", "Sampled top-N largest keys (max payload bytes)", labels=["cache", "key"]
+        )
+        with _caches_lock:
+            caches = list(_caches.values())
+        for metrics in caches:
+            if not metrics.sampler.enabled:
+                continue
+            for key, count in metrics.sampler.hottest():
+                hot.add_metric([metrics.name, key], count)
+            for key, size in metrics.sampler.largest():
+                large.add_metric([metrics.name, key], size)
+        yield hot
+        yield large
+
+
+if metrics_app is not None:
+    REGISTRY.register(_TopKeysCollector())
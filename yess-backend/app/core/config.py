@@ -7,6 +7,21 @@ import os
 from functools import lru_cache
 import secrets
 
+
+def async_database_url(url: str) -> str:
+    """
+    URL для async-движка: postgresql:// -> postgresql+asyncpg://,
+    sqlite:// -> sqlite+aiosqlite://; остальные схемы не меняются
+    """
+    scheme, _, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect in ("postgres", "postgresql"):
+        scheme = "postgresql+asyncpg"
+    elif dialect == "sqlite":
+        scheme = "sqlite+aiosqlite"
+    return f"{scheme}://{rest}"
+
+
 class Settings(BaseSettings):
     # Project settings
     PROJECT_NAME: str = "Yess Loyalty"
@@ -32,6 +47,37 @@ class Settings(BaseSettings):
             path=f"/{values.get('POSTGRES_DB') or ''}",
         )
     
+    # URL движка (docker-compose задаёт DATABASE_URL); по умолчанию SQLALCHEMY_DATABASE_URI
+    DATABASE_URL: Optional[str] = None
+    # URL async-движка (asyncpg); по умолчанию DATABASE_URL со схемой postgresql+asyncpg
+    ASYNC_DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 10  # верхняя граница на движок (app.core.resources)
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30  # seconds, ожидание свободного соединения
+    DB_POOL_RECYCLE: int = 1800  # seconds, пересоздание соединений
+    # Соединений с одной базой на все воркеры (ниже max_connections Postgres)
+    DB_CONNECTION_BUDGET: int = 90
+    # Соединение занято дольше - в метрике db_pool_long_checkouts
+    DB_LEAK_THRESHOLD: float = 60  # seconds
+    # Число воркеров gunicorn (он читает ту же переменную окружения)
+    WEB_CONCURRENCY: int = 1
+    
+    @validator("DATABASE_URL", pre=True, always=True)
+    def assemble_database_url(cls, v: Optional[str], values: Dict[str, Any]) -> str:
+        return v or str(values.get("SQLALCHEMY_DATABASE_URI"))
+    
+    @validator("ASYNC_DATABASE_URL", pre=True, always=True)
+    def assemble_async_database_url(cls, v: Optional[str], values: Dict[str, Any]) -> str:
+        return v or async_database_url(str(values.get("DATABASE_URL")))
+    
+    # Read-реплики (JSON-список URL); пустой - все запросы идут в primary
+    DATABASE_REPLICA_URLS: List[str] = []
+    # Реплика с отставанием больше порога не получает запросы
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_LAG_CHECK_INTERVAL: float = 5.0  # seconds
+    # После записи пользователь столько секунд читает из primary
+    READ_YOUR_WRITES_WINDOW: float = 10.0  # seconds
+    
     # Authentication settings
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ALGORITHM: str = "HS256"
@@ -67,6 +113,36 @@ class Settings(BaseSettings):
     # Redis Configuration
     REDIS_URL: RedisDsn
     REDIS_CACHE_EXPIRATION: int = 3600  # 1 hour
+    REDIS_MAX_CONNECTIONS: int = 100  # верхняя граница пула на процесс
+    REDIS_CONNECTION_BUDGET: int = 400  # соединений с одним Redis на все воркеры
+    REDIS_SOCKET_TIMEOUT: float = 0.5  # seconds
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 0.5  # seconds
+    REDIS_RETRY_ATTEMPTS: int = 2
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # seconds
+    REDIS_RECONNECT_BACKOFF: float = 5.0  # пауза после обрыва, кэш работает как промах
+    CACHE_LOCAL_MAX_ITEMS: int = 10000  # in-process слой перед Redis (на воркер)
+    CACHE_LOCAL_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_LOCAL_TTL: int = 30  # верхняя граница устаревания, если инвалидация потерялась
+    CACHE_LOCAL_PREFIXES: List[str] = ["partner:", "partners:city:", "user:"]
+    CACHE_CODEC: str = "orjson"  # orjson | msgpack | json (app.core.cache_codec)
+    CACHE_COMPRESSION: str = "none"  # none | zlib | lz4 | zstd
+    CACHE_COMPRESSION_LEVEL: Optional[int] = None  # None - уровень по умолчанию алгоритма
+    CACHE_COMPRESS_MIN_BYTES: int = 1024  # сжимаются значения от этого размера
+    CACHE_METRICS_ENABLED: bool = True  # Prometheus-метрики кэшей (app.core.cache_metrics)
+    POOL_METRICS_ENABLED: bool = True  # Prometheus-метрики пулов соединений (app.core.resources)
+    CACHE_KEY_SAMPLE_RATE: float = 0.0  # доля обращений в выборке горячих/крупных ключей, 0 - выключено
+    CACHE_KEY_SAMPLE_TOP_N: int = 20
+    CACHE_KEY_SAMPLE_WINDOW: int = 300  # seconds, период затухания счётчиков выборки
+    # Статистика SQL по отпечаткам запросов (app.core.query_stats)
+    QUERY_STATS_ENABLED: bool = True
+    QUERY_STATS_MAX_FINGERPRINTS: int = 500  # остальные - в метке "other"
+    SLOW_QUERY_THRESHOLD: float = 0.5  # seconds
+    SLOW_QUERY_EXPLAIN: bool = True  # EXPLAIN (ANALYZE, BUFFERS) медленных SELECT
+    SLOW_QUERY_EXPLAIN_INTERVAL: int = 300  # seconds, не чаще на отпечаток
+    # Детектор N+1 (app.core.nplus1): ленивые загрузки и повторы запросов за HTTP-запрос
+    N_PLUS_ONE_DETECTION: bool = False  # dev/test
+    N_PLUS_ONE_THRESHOLD: int = 10  # загрузок одной связи (повторов SELECT) за запрос
+    N_PLUS_ONE_RAISE: bool = False  # True - ошибка запроса (тесты падают), иначе warning
     
     # Frontend URLs
     FRONTEND_URL: str = "http://localhost:3000"
@@ -84,7 +160,38 @@ class Settings(BaseSettings):
     # Performance Configuration
     REQUEST_TIMEOUT: int = 10  # seconds
     MAX_CONCURRENT_REQUESTS: int = 100
-    
+    SPATIAL_INDEX_MAX_AGE_SECONDS: int = 300  # полная перестройка индекса локаций
+    NEARBY_CACHE_PRECISION: int = 6  # geohash ячейки кэша nearby (~1.2 x 0.6 км)
+    NEARBY_CACHE_INDEX_PRECISION: int = 4  # geohash ячейки для инвалидации (~39 x 20 км)
+    NEARBY_CACHE_TTL: int = 300  # seconds
+    ROUTE_OPTIMIZATION_TIME_BUDGET_MS: int = 200
+    PROXIMITY_GEOFENCE_RADIUS_KM: float = 0.5
+    PROXIMITY_OFFER_COOLDOWN_SECONDS: int = 6 * 3600  # повторное предложение user+partner
+    PROXIMITY_GEOFENCE_MAX_AGE_SECONDS: int = 300
+    MAP_TILE_MAX_ZOOM: int = 20
+    MAP_TILE_CLUSTER_MAX_ZOOM: int = 14  # с этого зума пины не кластеризуются
+    MAP_TILE_CLUSTER_GRID: int = 8  # сетка кластеров внутри тайла (8x8 = 32 px)
+    MAP_TILE_CACHE_TTL: int = 86400  # тайлы инвалидируются явно при изменении локаций
+    SPEND_PROFILE_TTL: int = 7 * 24 * 3600  # профиль трат в Redis
+    SPEND_PROFILE_LRU_SIZE: int = 10000
+    SPEND_PROFILE_LRU_TTL: int = 60  # допустимое отставание профиля между воркерами
+    SEARCH_AUTOCOMPLETE_TTL: int = 300
+    SEARCH_DISTANCE_SCALE_KM: float = 2.0  # на таком расстоянии вклад близости падает вдвое
+    PARTNERS_LIST_CACHE_TTL: int = 300  # seconds
+    TRENDING_PARTNERS_CACHE_TTL: int = 900  # seconds
+    PROMOTIONS_CACHE_TTL: int = 300  # seconds
+    LEADERBOARD_CACHE_TTL: int = 300  # seconds
+    CACHE_WARM_ON_STARTUP: bool = True
+    CACHE_WARM_INTERVAL: int = 0  # seconds, 0 - только при старте
+    CACHE_WARM_CONCURRENCY: int = 4  # одновременных задач прогрева (соединений к БД)
+    CACHE_WARM_LEADERBOARD_SIZE: int = 50
+    WALLET_BALANCE_CACHE_TTL: int = 300  # seconds, верхняя граница устаревания при сбое Redis
+    WALLET_BALANCE_RESERVE_TTL: int = 30  # seconds, резерв версии на время коммита
+    NOT_FOUND_CACHE_TTL: int = 60  # seconds, промах поиска по ID/коду (app.core.bloom_filter)
+    BLOOM_FILTER_ERROR_RATE: float = 0.001  # доля ложных срабатываний (память ~ -ln(p) / ln²2 бит на значение)
+    BLOOM_FILTER_GROWTH: float = 2.0  # запас ёмкости на вставки до перестроения
+    BLOOM_FILTER_REBUILD_INTERVAL: int = 3600  # seconds
+
     # Feature Flags
     ENABLE_CACHING: bool = True
     ENABLE_PERFORMANCE_MONITORING: bool = True
@@ -110,6 +217,17 @@ class Settings(BaseSettings):
     ELCART_MERCHANT_ID: str = ""
     ELCART_SECRET_KEY: str = ""
     
+    # Map Providers
+    GOOGLE_MAPS_API_KEY: str = ""
+    MAPBOX_API_KEY: str = ""
+    MAP_PROVIDER_TIMEOUTS: Dict[str, float] = {"google": 5.0, "mapbox": 5.0}  # seconds
+    MAP_PROVIDER_MAX_CONNECTIONS: int = 50
+    MAP_PROVIDER_MAX_CONCURRENCY: int = 20
+    MAP_PROVIDER_FAILURE_THRESHOLD: int = 5
+    MAP_PROVIDER_RESET_TIMEOUT: int = 30  # seconds
+    MAP_ROUTE_CACHE_TTL: int = 600  # seconds
+    MAP_ROUTE_CACHE_SIZE: int = 5000
+    
     # Notification Services
     FCM_SERVER_KEY: str = ""
     TWILIO_ACCOUNT_SID: str = ""
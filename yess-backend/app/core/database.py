@@ -1,28 +1,151 @@
 """
 Database connection and session management
+
+get_db - синхронная сессия (psycopg2): запросы блокируют поток, в
+async-эндпоинтах - весь event loop воркера. get_async_db - AsyncSession
+(asyncpg): пока запрос ждёт БД, воркер обслуживает другие запросы.
+Новые и горячие эндпоинты используют get_async_db; у AsyncSession нет
+ленивой загрузки связей вне await - связи грузятся явно (selectinload).
+
+Запросы только на чтение (отчёты, списки) - get_read_db / get_async_read_db:
+они уходят на read-реплики DATABASE_REPLICA_URLS по политике db_router
+(app.core.db_router); без реплик - в primary.
+
+Async движки создаются при открытии первой AsyncSession: импорт модуля не
+требует async-драйвера (sqlite в тестах, скрипты на синхронной сессии).
 """
-from sqlalchemy import create_engine
+from fastapi import Query
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from app.core.config import settings
-
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.cache import redis_cache
+from app.core.config import async_database_url, settings
+from app.core.db_router import DatabaseRouter
+from app.core.nplus1 import nplus1
+from app.core.resources import resources
+
+
+class PrimarySession(Session):
+    """Сессия primary: записи учитываются для read-your-writes"""
+
+
+def _async_sessionmaker(bind, sync_session_class=Session) -> sessionmaker:
+    # expire_on_commit=False: атрибуты объектов доступны после коммита без
+    # повторной загрузки (неявный запрос вне await невозможен)
+    return sessionmaker(
+        bind=bind,
+        class_=AsyncSession,
+        sync_session_class=sync_session_class,
+        autoflush=False,
+        expire_on_commit=False
+    )
+
+
+class LazyAsyncSessionmaker:
+    """Фабрика AsyncSession: движок url создаётся при первом вызове"""
+
+    def __init__(self, url: str, sync_session_class=Session):
+        self.url = url
+        self.sync_session_class = sync_session_class
+        self._factory = None
+
+    @property
+    def engine(self) -> AsyncEngine:
+        return resources.async_engine(self.url)
+
+    def __call__(self, **kwargs) -> AsyncSession:
+        if self._factory is None:
+            self._factory = _async_sessionmaker(self.engine, self.sync_session_class)
+        return self._factory(**kwargs)
+
+
+# Движки и пулы - общие для процесса, размер от бюджета соединений (app.core.resources)
+engine = resources.engine(settings.DATABASE_URL)
+
+SessionLocal = sessionmaker(class_=PrimarySession, autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = LazyAsyncSessionmaker(settings.ASYNC_DATABASE_URL, PrimarySession)
+
+
+def get_async_engine() -> AsyncEngine:
+    """Async движок primary (создаётся при первом обращении)"""
+    return AsyncSessionLocal.engine
+
+db_router = DatabaseRouter(
+    SessionLocal,
+    AsyncSessionLocal,
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+    check_interval=settings.REPLICA_LAG_CHECK_INTERVAL,
+    sticky_window=settings.READ_YOUR_WRITES_WINDOW,
+    cache=redis_cache
 )
+db_router.watch(PrimarySession)
+# Ленивые загрузки во всех сессиях, включая реплики
+nplus1.watch(Session)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+for index, url in enumerate(settings.DATABASE_REPLICA_URLS):
+    db_router.add_replica(
+        f"replica-{index}",
+        sessionmaker(autocommit=False, autoflush=False, bind=resources.engine(url)),
+        LazyAsyncSessionmaker(async_database_url(url))
+    )
 
 Base = declarative_base()
 
 
 def get_db():
     """Dependency for getting DB session"""
-    db = SessionLocal()
+    db = db_router.session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db():
+    """Dependency for getting read-only DB session (replica or primary)"""
+    db = db_router.session(read_only=True)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_primary_db():
+    """Dependency for getting primary DB session (explicitly, for writes)"""
+    db = db_router.session(read_only=False)
     try:
         yield db
     finally:
         db.close()
 
+
+async def get_async_db():
+    """Dependency for getting async DB session"""
+    db = await db_router.async_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def get_async_read_db():
+    """Dependency for getting read-only async DB session (replica or primary)"""
+    db = await db_router.async_session(read_only=True)
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def get_async_user_read_db(user_id: int = Query(...)):
+    """Чтение данных пользователя ?user_id=: после его записи - из primary"""
+    db = await db_router.async_session(read_only=True, user_id=user_id)
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def dispose_engines() -> None:
+    """Обработчик shutdown: закрытие пулов соединений (БД и Redis)"""
+    await resources.dispose()
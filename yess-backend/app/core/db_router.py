@@ -0,0 +1,311 @@
+"""
+Маршрутизация сессий БД: primary и read-реплики
+
+Запись всегда идёт в primary. Сессия читает с реплики, если:
+- она открыта с read_only=True (get_read_db, get_async_read_db,
+  get_async_user_read_db, db_router.read_session, декоратор
+  db_router.read_only); остальные сессии - primary;
+- есть реплика с отставанием не больше REPLICA_MAX_LAG_SECONDS (проверка
+  раз в REPLICA_LAG_CHECK_INTERVAL секунд, ошибка проверки - реплика
+  недоступна); иначе - fallback на primary;
+- пользователь, переданный при открытии сессии (user_id, например
+  get_async_user_read_db), не писал в БД последние READ_YOUR_WRITES_WINDOW
+  секунд - иначе он мог бы не увидеть свою запись. Без user_id окно не
+  проверяется.
+
+Запись пользователя фиксируется после commit сессии primary, в которой
+изменялись объекты с атрибутом user_id: в памяти процесса и в Redis,
+чтобы окно соблюдали все воркеры.
+"""
+import time
+import asyncio
+import logging
+import functools
+import itertools
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Отставание реплики в секундах; 0 - всё полученное применено (на простаивающем
+# primary now() - pg_last_xact_replay_timestamp() растёт без реального отставания)
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replica_lag(db: Session) -> float:
+    """Отставание реплики; NULL (не реплика) - 0"""
+    return float(db.execute(REPLICA_LAG_SQL).scalar() or 0)
+
+
+class ReadOnlySessionError(RuntimeError):
+    """Запись через сессию, открытую для чтения"""
+
+
+@dataclass
+class Replica:
+    name: str
+    session_factory: Callable[[], Session]
+    async_session_factory: Optional[Callable[[], AsyncSession]] = None
+    # None - не проверялась или недоступна
+    lag: Optional[float] = None
+    checked_at: float = float("-inf")
+
+
+class DatabaseRouter:
+    """Выбор primary или реплики для сессии"""
+
+    def __init__(
+        self,
+        primary: Callable[[], Session],
+        async_primary: Optional[Callable[[], AsyncSession]] = None,
+        max_lag: float = 5.0,
+        check_interval: float = 5.0,
+        sticky_window: float = 10.0,
+        probe: Callable[[Session], float] = replica_lag,
+        cache=None
+    ):
+        self.primary = primary
+        self.async_primary = async_primary
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_window = sticky_window
+        self.probe = probe
+        # RedisCache для окна read-your-writes между воркерами; None - только процесс
+        self.cache = cache
+        self.replicas: List[Replica] = []
+        self._written = TTLCache(max_size=100000, ttl=sticky_window)
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._tasks: set = set()
+        self.stats = {
+            "primary_reads": 0,
+            "replica_reads": 0,
+            "sticky_reads": 0,
+            "lagging_fallbacks": 0,
+            "writes_recorded": 0,
+        }
+
+    def add_replica(
+        self,
+        name: str,
+        session_factory: Callable[[], Session],
+        async_session_factory: Optional[Callable[[], AsyncSession]] = None
+    ) -> None:
+        self.replicas.append(Replica(name, session_factory, async_session_factory))
+
+    # --- Отставание реплик ---
+
+    def _claim_stale(self) -> List[Replica]:
+        """Реплики с устаревшей проверкой; проверяет их один вызывающий"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [r for r in self.replicas if now - r.checked_at >= self.check_interval]
+            for replica in stale:
+                replica.checked_at = now
+        return stale
+
+    def _check(self, replicas: Iterable[Replica]) -> None:
+        for replica in replicas:
+            try:
+                db = replica.session_factory()
+                try:
+                    replica.lag = self.probe(db)
+                finally:
+                    db.close()
+            except Exception as e:
+                logger.warning(f"Replica {replica.name} lag check failed: {str(e)}")
+                replica.lag = None
+            if replica.lag is not None and replica.lag > self.max_lag:
+                logger.warning(f"Replica {replica.name} lags {replica.lag:.1f}s, reads go to primary")
+
+    def refresh_lag(self) -> None:
+        self._check(self._claim_stale())
+
+    async def refresh_lag_async(self) -> None:
+        stale = self._claim_stale()
+        if stale:
+            await asyncio.to_thread(self._check, stale)
+
+    def _pick(self, asynchronous: bool = False) -> Optional[Replica]:
+        healthy = [
+            r for r in self.replicas
+            if r.lag is not None and r.lag <= self.max_lag
+            and (not asynchronous or r.async_session_factory is not None)
+        ]
+        if not healthy:
+            self.stats["lagging_fallbacks"] += 1
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    # --- Read-your-writes ---
+
+    def _sticky_key(self, user_id: int) -> str:
+        return f"db:recent_write:{user_id}"
+
+    def mark_write(self, user_ids: Iterable[int]) -> None:
+        """Пользователи user_ids читают из primary ближайшие sticky_window секунд"""
+        user_ids = list(user_ids)
+        for user_id in user_ids:
+            self._written.set(user_id, True)
+        self.stats["writes_recorded"] += len(user_ids)
+        if self.cache is None or not user_ids:
+            return
+
+        ttl = max(1, int(self.sticky_window + 0.5))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            for user_id in user_ids:
+                self.cache.set_sync(self._sticky_key(user_id), 1, ttl=ttl)
+            return
+
+        async def share():
+            for user_id in user_ids:
+                await self.cache.set(self._sticky_key(user_id), 1, ttl=ttl)
+
+        task = loop.create_task(share())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def recently_wrote(self, user_id: Optional[int]) -> bool:
+        """
+        Синхронная проверка для кода в потоках. В потоке event loop Redis
+        не опрашивается (блокирующий вызов): без записи в памяти процесса
+        пользователь считается писавшим - чтение из primary
+        """
+        if user_id is None:
+            return False
+        if self._written.get(user_id):
+            return True
+        if self.cache is None:
+            return False
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return bool(self.cache.get_sync(self._sticky_key(user_id)))
+        return True
+
+    async def recently_wrote_async(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        if self._written.get(user_id):
+            return True
+        return self.cache is not None and bool(await self.cache.get(self._sticky_key(user_id)))
+
+    # --- Сессии ---
+
+    def _opened(self, db, replica: Optional[Replica], read_only: bool, user_id: Optional[int]):
+        db.info.update(read_only=read_only, replica=replica.name if replica else None, user_id=user_id)
+        if read_only:
+            self.stats["replica_reads" if replica else "primary_reads"] += 1
+        return db
+
+    def session(self, read_only: bool = False, user_id: Optional[int] = None) -> Session:
+        """Синхронная сессия; read_only - с реплики, user_id - для read-your-writes"""
+        replica = None
+        if read_only and self.replicas:
+            if self.recently_wrote(user_id):
+                self.stats["sticky_reads"] += 1
+            else:
+                self.refresh_lag()
+                replica = self._pick()
+        factory = replica.session_factory if replica else self.primary
+        return self._opened(factory(), replica, read_only, user_id)
+
+    async def async_session(self, read_only: bool = False, user_id: Optional[int] = None) -> AsyncSession:
+        """AsyncSession; проверка отставания - в потоке, не блокируя event loop"""
+        replica = None
+        if read_only and self.replicas:
+            if await self.recently_wrote_async(user_id):
+                self.stats["sticky_reads"] += 1
+            else:
+                await self.refresh_lag_async()
+                replica = self._pick(asynchronous=True)
+        factory = replica.async_session_factory if replica else self.async_primary
+        return self._opened(factory(), replica, read_only, user_id)
+
+    @staticmethod
+    def _has_writes(db: Session) -> bool:
+        return bool(db.new or db.dirty or db.deleted or db.info.get("flushed"))
+
+    @contextmanager
+    def read_session(self, db: Optional[Session] = None) -> Iterator[Session]:
+        """
+        Сессия для запросов только на чтение. Сессия вызывающего db
+        используется, если она уже читающая или в ней есть незакоммиченные
+        изменения (реплика их не видит); иначе открывается своя
+        """
+        if db is not None and (db.info.get("read_only") or self._has_writes(db)):
+            yield db
+            return
+
+        user_id = db.info.get("user_id") if db is not None else None
+        own = self.session(read_only=True, user_id=user_id)
+        try:
+            yield own
+        finally:
+            own.close()
+
+    def read_only(self, func: Callable) -> Callable:
+        """Декоратор функции чтения с сессией первым аргументом: см. read_session"""
+        @functools.wraps(func)
+        def wrapper(db, *args, **kwargs):
+            with self.read_session(db) as session:
+                return func(session, *args, **kwargs)
+        return wrapper
+
+    # --- События сессий primary ---
+
+    def watch(self, session_class: type) -> None:
+        """Учёт записей в сессиях session_class (и AsyncSession с sync_session_class)"""
+        event.listen(session_class, "before_flush", self._before_flush)
+        event.listen(session_class, "after_flush", self._after_flush)
+        event.listen(session_class, "after_commit", self._after_commit)
+        event.listen(session_class, "after_rollback", self._after_rollback)
+
+    def _before_flush(self, session: Session, flush_context, instances) -> None:
+        if session.info.get("read_only") and (session.new or session.deleted or any(
+            session.is_modified(obj) for obj in session.dirty
+        )):
+            raise ReadOnlySessionError("Write through a read-only session; use get_primary_db")
+
+    def _after_flush(self, session: Session, flush_context) -> None:
+        # new/dirty/deleted здесь ещё в состоянии до flush
+        users = session.info.setdefault("written_users", set())
+        for obj in itertools.chain(session.new, session.dirty, session.deleted):
+            user_id = getattr(obj, "user_id", None)
+            if isinstance(user_id, int):
+                users.add(user_id)
+        if session.info.get("user_id") is not None:
+            users.add(session.info["user_id"])
+        session.info["flushed"] = True
+
+    def _after_commit(self, session: Session) -> None:
+        session.info.pop("flushed", None)
+        users = session.info.pop("written_users", None)
+        if users:
+            self.mark_write(users)
+
+    def _after_rollback(self, session: Session) -> None:
+        session.info.pop("flushed", None)
+        session.info.pop("written_users", None)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "replicas": [
+                {"name": r.name, "lag": r.lag, "healthy": r.lag is not None and r.lag <= self.max_lag}
+                for r in self.replicas
+            ],
+        }
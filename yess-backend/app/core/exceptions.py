@@ -80,6 +80,44 @@ class RateLimitException(YESSBaseException):
             details=details
         )
 
+class NotFoundException(YESSBaseException):
+    """Исключения при отсутствии запрошенных объектов"""
+    def __init__(
+        self, 
+        message: str = "Объект не найден", 
+        details: Optional[Dict[str, Any]] = None
+    ):
+        super().__init__(
+            message, 
+            status_code=status.HTTP_404_NOT_FOUND, 
+            details=details
+        )
+
+class ExternalServiceException(YESSBaseException):
+    """Ошибки внешних сервисов (карты, банки, уведомления)"""
+    def __init__(
+        self, 
+        message: str = "Внешний сервис недоступен", 
+        details: Optional[Dict[str, Any]] = None
+    ):
+        super().__init__(
+            message, 
+            status_code=status.HTTP_502_BAD_GATEWAY, 
+            details=details
+        )
+
+class CircuitOpenException(ExternalServiceException):
+    """Запрос не отправлен: circuit breaker провайдера разомкнут"""
+    def __init__(
+        self, 
+        provider: str, 
+        details: Optional[Dict[str, Any]] = None
+    ):
+        super().__init__(
+            f"Провайдер '{provider}' временно отключён", 
+            details=details
+        )
+
 def global_exception_handler(exc: Exception):
     """Глобальный обработчик исключений"""
     if isinstance(exc, YESSBaseException):
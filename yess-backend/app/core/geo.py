@@ -0,0 +1,218 @@
+"""
+Geo utilities: расстояния, ограничивающие прямоугольники и geohash
+"""
+import math
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+ArrayLike = Union[float, Sequence[float], np.ndarray]
+
+EARTH_RADIUS_KM = 6371.0
+
+# Длина одного градуса широты в километрах
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между двумя точками по формуле Haversine (км)"""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = math.radians(lon2 - lon1)
+
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Ограничивающий прямоугольник вокруг точки
+    Возвращает (min_lat, min_lon, max_lat, max_lon)
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(lat))
+
+    # Около полюсов долгота вырождается - берём весь диапазон
+    if cos_lat < 1e-6:
+        dlon = 180.0
+    else:
+        dlon = min(180.0, radius_km / (KM_PER_DEGREE_LAT * cos_lat))
+
+    return (
+        max(-90.0, lat - dlat),
+        max(-180.0, lon - dlon),
+        min(90.0, lat + dlat),
+        min(180.0, lon + dlon),
+    )
+
+
+def as_coordinate_array(values: ArrayLike) -> np.ndarray:
+    """Непрерывный float64-массив координат (в градусах)"""
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def haversine_km_batch(
+    lat1: ArrayLike,
+    lon1: ArrayLike,
+    lat2: ArrayLike,
+    lon2: ArrayLike
+) -> np.ndarray:
+    """
+    Векторизованный Haversine с numpy-бродкастингом (км)
+
+    Одна точка против N: haversine_km_batch(lat, lon, lats, lons)
+    Попарно для двух массивов одинаковой длины: haversine_km_batch(lats_a, lons_a, lats_b, lons_b)
+    """
+    lat1_rad = np.radians(as_coordinate_array(lat1))
+    lat2_rad = np.radians(as_coordinate_array(lat2))
+    dlat = lat2_rad - lat1_rad
+    dlon = np.radians(as_coordinate_array(lon2) - as_coordinate_array(lon1))
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix_km(
+    lats: ArrayLike,
+    lons: ArrayLike,
+    other_lats: Optional[ArrayLike] = None,
+    other_lons: Optional[ArrayLike] = None
+) -> np.ndarray:
+    """
+    Матрица расстояний N×M (км)
+    Без other_* считается квадратная матрица N×N
+    """
+    lats = as_coordinate_array(lats)
+    lons = as_coordinate_array(lons)
+    if other_lats is None or other_lons is None:
+        other_lats, other_lons = lats, lons
+    else:
+        other_lats = as_coordinate_array(other_lats)
+        other_lons = as_coordinate_array(other_lons)
+
+    return haversine_km_batch(lats[:, None], lons[:, None], other_lats[None, :], other_lons[None, :])
+
+
+def path_legs_km(lats: ArrayLike, lons: ArrayLike) -> np.ndarray:
+    """Длины последовательных отрезков маршрута (N-1 значений, км)"""
+    lats = as_coordinate_array(lats)
+    lons = as_coordinate_array(lons)
+    return haversine_km_batch(lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+_GEOHASH_INDEX = {char: i for i, char in enumerate(GEOHASH_ALPHABET)}
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 6) -> str:
+    """Geohash точки заданной точности"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        value, rng = (lon, lon_range) if even else (lat, lat_range)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def geohash_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Границы ячейки geohash: (min_lat, min_lon, max_lat, max_lon)"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        code = _GEOHASH_INDEX[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (code >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """Размер ячейки geohash в градусах: (высота, ширина)"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_cells_covering(
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    precision: int
+) -> List[str]:
+    """Все ячейки geohash, пересекающие прямоугольник"""
+    cell_height, cell_width = geohash_cell_size(precision)
+    cells = []
+
+    lat = min_lat
+    while True:
+        lon = min_lon
+        while True:
+            cells.append(geohash_encode(min(lat, max_lat), min(lon, max_lon), precision))
+            if lon >= max_lon:
+                break
+            lon += cell_width
+        if lat >= max_lat:
+            break
+        lat += cell_height
+
+    return sorted(set(cells))
+
+
+# Тайлы Web Mercator (z/x/y, как в OSM/Google)
+
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def mercator_tile_xy(lat: ArrayLike, lon: ArrayLike, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Дробные координаты тайла для точек: целая часть - x/y тайла"""
+    lat = np.clip(as_coordinate_array(lat), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    lon = as_coordinate_array(lon)
+    n = float(1 << zoom)
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(np.radians(lat))) / math.pi) / 2.0 * n
+    return np.clip(x, 0, n - 1e-9), np.clip(y, 0, n - 1e-9)
+
+
+def tile_for_point(lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+    """Тайл (x, y), содержащий точку"""
+    x, y = mercator_tile_xy([lat], [lon], zoom)
+    return int(x[0]), int(y[0])
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Границы тайла: (min_lat, min_lon, max_lat, max_lon)"""
+    n = 1 << zoom
+
+    def lat_of(tile_y: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return lat_of(y + 1), x / n * 360.0 - 180.0, lat_of(y), (x + 1) / n * 360.0 - 180.0
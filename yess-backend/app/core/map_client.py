@@ -0,0 +1,200 @@
+"""
+Async HTTP client for map providers
+Общий пул соединений, таймауты по провайдерам, ограничение конкурентности,
+circuit breaker и TTL-кэш ответов по квантованным координатам
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.exceptions import ExternalServiceException, CircuitOpenException
+from app.core.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 4 знака после запятой ~ 11 метров
+COORDINATE_PRECISION = 4
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker провайдера
+    closed -> open после failure_threshold ошибок подряд,
+    open -> half-open через reset_timeout (пропускается один пробный запрос;
+    вызывающий обязан завершить его record_success/record_failure или
+    release_probe, иначе провайдер останется отключённым)
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Пробный запрос завершён (идемпотентно)"""
+        self._probe_in_flight = False
+
+
+def route_cache_key(
+    provider: str,
+    points: Iterable[Tuple[float, float]],
+    mode: str,
+    precision: int = COORDINATE_PRECISION
+) -> Tuple:
+    """Ключ кэша маршрута: провайдер, режим и точки, округлённые до сетки"""
+    return (
+        provider,
+        mode,
+        tuple((round(float(lat), precision), round(float(lon), precision)) for lat, lon in points),
+    )
+
+
+class MapProviderClient:
+    """Общий async-клиент для Google Maps / Mapbox"""
+
+    def __init__(
+        self,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_connections: int = 50,
+        max_concurrency: int = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        cache_ttl: float = 600,
+        cache_size: int = 5000,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.timeouts = timeouts or {}
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.stats = {"requests": 0, "cache_hits": 0, "failures": 0, "short_circuited": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Ленивое создание клиента внутри работающего event loop"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                transport=self._transport,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=httpx.Timeout(settings.REQUEST_TIMEOUT)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        if provider not in self._breakers:
+            self._breakers[provider] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[provider]
+
+    async def get_json(
+        self,
+        provider: str,
+        url: str,
+        params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        GET-запрос к провайдеру через circuit breaker
+
+        :raises CircuitOpenException: провайдер временно отключён
+        :raises ExternalServiceException: ошибка сети или HTTP
+        """
+        breaker = self.breaker(provider)
+        if not breaker.allow_request():
+            self.stats["short_circuited"] += 1
+            raise CircuitOpenException(provider)
+
+        client = self.client
+        timeout = self.timeouts.get(provider, settings.REQUEST_TIMEOUT)
+
+        try:
+            async with self._semaphore:
+                self.stats["requests"] += 1
+                response = await client.get(url, params=params, timeout=timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            breaker.record_failure()
+            self.stats["failures"] += 1
+            logger.warning(f"Map provider {provider} request failed: {e}")
+            raise ExternalServiceException(f"Ошибка провайдера карт {provider}: {e}")
+        except BaseException:
+            # Отмена запроса или непредвиденная ошибка - тоже неудача
+            breaker.record_failure()
+            self.stats["failures"] += 1
+            raise
+        finally:
+            breaker.release_probe()
+
+        breaker.record_success()
+        return data
+
+    def cached(self, cache_key: Tuple) -> Optional[Dict[str, Any]]:
+        """Ранее разобранный ответ для квантованного ключа"""
+        value = self.cache.get(cache_key)
+        if value is not None:
+            self.stats["cache_hits"] += 1
+        return value
+
+    def remember(self, cache_key: Tuple, value: Dict[str, Any]) -> None:
+        """Кэширование успешно разобранного ответа"""
+        self.cache.set(cache_key, value)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Singleton
+map_client = MapProviderClient(
+    timeouts=settings.MAP_PROVIDER_TIMEOUTS,
+    max_connections=settings.MAP_PROVIDER_MAX_CONNECTIONS,
+    max_concurrency=settings.MAP_PROVIDER_MAX_CONCURRENCY,
+    failure_threshold=settings.MAP_PROVIDER_FAILURE_THRESHOLD,
+    reset_timeout=settings.MAP_PROVIDER_RESET_TIMEOUT,
+    cache_ttl=settings.MAP_ROUTE_CACHE_TTL,
+    cache_size=settings.MAP_ROUTE_CACHE_SIZE
+)
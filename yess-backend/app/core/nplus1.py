@@ -0,0 +1,120 @@
+"""
+Детектор N+1 запросов
+
+За один HTTP-запрос (или блок detector.track()) считаются:
+- ленивые загрузки каждой связи ORM (PartnerLocation.partner и т.п.) -
+  событие do_orm_execute сессий; связи, уже загруженные selectinload /
+  joinedload или взятые из identity map, не считаются;
+- повторы SELECT одного отпечатка (app.core.query_stats) - хуки движков
+  app.core.resources, так видны и циклы с db.query(...).first().
+
+Больше N_PLUS_ONE_THRESHOLD загрузок одной связи (повторов SELECT) -
+warning в лог, с N_PLUS_ONE_RAISE - NPlusOneError, запрос падает (dev/test).
+Включается N_PLUS_ONE_DETECTION; api_router подключает зависимость
+track_loads. В тестах число запросов эндпоинта:
+
+    with nplus1.track() as loads:
+        call_endpoint()
+    assert loads.queries == 2
+"""
+import logging
+from collections import Counter as Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.query_stats import current_endpoint, query_stats
+
+logger = logging.getLogger(__name__)
+
+
+class NPlusOneError(RuntimeError):
+    """Связь или запрос загружаются в цикле"""
+
+
+class LoadTracker:
+    """Загрузки одного HTTP-запроса"""
+
+    def __init__(self):
+        self.queries = 0
+        self.lazy_loads: Tally = Tally()
+        self.statements: Tally = Tally()
+        self.reported: set = set()
+
+
+_tracker: ContextVar[Optional[LoadTracker]] = ContextVar("nplus1_tracker", default=None)
+
+
+class NPlusOneDetector:
+    """Подсчёт ленивых загрузок и повторов запросов в рамках запроса"""
+
+    def __init__(self, enabled: bool = False, threshold: int = 10, raise_errors: bool = False):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.raise_errors = raise_errors
+
+    def watch(self, session_class: type) -> None:
+        """Учёт ленивых загрузок в сессиях session_class (Session - во всех)"""
+        event.listen(session_class, "do_orm_execute", self._orm_execute)
+
+    def instrument(self, engine: Engine) -> None:
+        """Подсчёт запросов движка (AsyncEngine - через engine.sync_engine)"""
+        event.listen(engine, "before_cursor_execute", self._before)
+
+    @contextmanager
+    def track(self) -> Iterator[LoadTracker]:
+        """Отдельный счёт загрузок блока кода (тесты, фоновые задачи)"""
+        tracker = LoadTracker()
+        token = _tracker.set(tracker)
+        try:
+            yield tracker
+        finally:
+            _tracker.reset(token)
+
+    def _orm_execute(self, orm_execute_state) -> None:
+        tracker = _tracker.get()
+        # selectinload тоже relationship load, но без lazy_loaded_from
+        if tracker is None or orm_execute_state.lazy_loaded_from is None:
+            return
+        name = str(orm_execute_state.loader_strategy_path[-1])
+        tracker.lazy_loads[name] += 1
+        self._check(tracker, f"lazy load of {name}", tracker.lazy_loads[name])
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        tracker = _tracker.get()
+        if tracker is None:
+            return
+        tracker.queries += 1
+        if not statement.lstrip().upper().startswith("SELECT"):
+            return
+        text = query_stats.fingerprint(statement)
+        tracker.statements[text] += 1
+        self._check(tracker, f"query {text[:200]}", tracker.statements[text])
+
+    def _check(self, tracker: LoadTracker, what: str, count: int) -> None:
+        if count <= self.threshold or what in tracker.reported:
+            return
+        tracker.reported.add(what)
+        message = f"N+1 in {current_endpoint()}: {what} executed more than {self.threshold} times"
+        if self.raise_errors:
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+
+# Singleton instance
+nplus1 = NPlusOneDetector(
+    enabled=settings.N_PLUS_ONE_DETECTION,
+    threshold=settings.N_PLUS_ONE_THRESHOLD,
+    raise_errors=settings.N_PLUS_ONE_RAISE
+)
+
+
+async def track_loads() -> None:
+    """Зависимость роутера: счёт загрузок на HTTP-запрос"""
+    # async: значение видят следующие зависимости и эндпоинт (и в threadpool)
+    if nplus1.enabled:
+        _tracker.set(LoadTracker())
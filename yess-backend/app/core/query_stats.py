@@ -0,0 +1,324 @@
+"""
+Статистика SQL-запросов по отпечаткам
+
+Хуки движков SQLAlchemy (все движки app.core.resources) записывают каждый
+запрос: отпечаток (текст без литералов и параметров, списки IN свёрнуты),
+длительность, число строк и эндпоинт, из которого он выполнен. По
+отпечатку копятся число, суммарное и максимальное время, гистограмма
+длительностей и эндпоинты. Для SELECT дольше SLOW_QUERY_THRESHOLD
+выполняется EXPLAIN (ANALYZE, BUFFERS) - не чаще раза в
+SLOW_QUERY_EXPLAIN_INTERVAL секунд на отпечаток: ANALYZE повторяет запрос,
+в той же транзакции под SAVEPOINT, поэтому ошибка плана её не прерывает.
+
+Эндпоинт запроса определяет middleware приложения или зависимость роутера
+(api_router подключает её сам):
+
+    app.add_middleware(QueryStatsMiddleware)
+    APIRouter(dependencies=[Depends(track_endpoint)])
+
+Данные - в админке (GET /monitoring/queries) и Prometheus:
+- db_query_seconds{fingerprint}, db_query_rows{fingerprint}: гистограммы;
+- db_queries_total{endpoint}: запросов по эндпоинтам;
+- db_slow_queries_total{fingerprint}: медленных запросов.
+Отпечатков в метках не больше QUERY_STATS_MAX_FINGERPRINTS, остальные -
+"other"; текст отпечатка по id - в админке.
+"""
+import re
+import time
+import bisect
+import hashlib
+import logging
+import threading
+from collections import Counter as Tally
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.cache_metrics import LATENCY_BUCKETS, _NoopMetric
+from app.core.config import settings
+
+try:
+    from prometheus_client import REGISTRY, Counter, Histogram
+except ImportError:
+    REGISTRY = None
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUCKETS = LATENCY_BUCKETS + (2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+if REGISTRY is not None and settings.QUERY_STATS_ENABLED:
+    QUERY_SECONDS = Histogram("db_query_seconds", "SQL statement duration", ["fingerprint"], buckets=QUERY_BUCKETS)
+    QUERY_ROWS = Histogram("db_query_rows", "Rows returned or affected", ["fingerprint"], buckets=ROW_BUCKETS)
+    QUERIES = Counter("db_queries_total", "SQL statements by endpoint", ["endpoint"])
+    SLOW_QUERIES = Counter("db_slow_queries_total", "Statements over SLOW_QUERY_THRESHOLD", ["fingerprint"])
+else:
+    QUERY_SECONDS = QUERY_ROWS = QUERIES = SLOW_QUERIES = _NoopMetric()
+
+# ASGI scope текущего запроса: после маршрутизации в нём есть endpoint
+_request_scope: ContextVar[Optional[dict]] = ContextVar("query_stats_scope", default=None)
+
+EXPLAIN_PREFIX = {
+    "postgresql": "EXPLAIN (ANALYZE, BUFFERS) ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+# Параметры DBAPI (%(name)s, %s, $1, ?) и bind-параметры text() (:name)
+_PARAMS = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+|\?")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Текст запроса без литералов и параметров: одинаковый для запросов одной формы"""
+    text = _COMMENTS.sub(" ", statement)
+    text = _STRINGS.sub("?", text)
+    text = _PARAMS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _LISTS.sub("(?+)", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def fingerprint_id(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=6).hexdigest()
+
+
+def current_endpoint() -> str:
+    scope = _request_scope.get()
+    if scope is None:
+        return "background"
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        return f"{endpoint.__module__}.{endpoint.__qualname__}"
+    # До маршрутизации (middleware) - путь запроса
+    return scope.get("path", "unknown")
+
+
+async def track_endpoint(request: Request) -> None:
+    """Зависимость роутера: запросы к БД относятся к эндпоинту"""
+    # async: значение видят следующие зависимости и эндпоинт (и в threadpool)
+    _request_scope.set(request.scope)
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware: запросы к БД относятся к эндпоинту HTTP-запроса"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+class FingerprintStats:
+    """Накопленная статистика одного отпечатка"""
+
+    def __init__(self, fid: str, text: str):
+        self.id = fid
+        self.text = text
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.buckets = [0] * (len(QUERY_BUCKETS) + 1)
+        self.endpoints: Tally = Tally()
+        self.sample: Optional[str] = None
+        self.explain: Optional[str] = None
+        self.explained_at = float("-inf")
+
+    def record(self, duration: float, rows: int, endpoint: str) -> None:
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.rows += max(rows, 0)
+        self.buckets[bisect.bisect_left(QUERY_BUCKETS, duration)] += 1
+        self.endpoints[endpoint] += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля - верхняя граница корзины"""
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return QUERY_BUCKETS[index] if index < len(QUERY_BUCKETS) else self.max
+        return 0.0
+
+    def summary(self, detail: bool = False) -> Dict[str, Any]:
+        data = {
+            "fingerprint": self.id,
+            "statement": self.text,
+            "count": self.count,
+            "total_seconds": round(self.total, 6),
+            "mean_seconds": round(self.total / self.count, 6) if self.count else 0.0,
+            "p95_seconds": self.quantile(0.95),
+            "max_seconds": round(self.max, 6),
+            "rows": self.rows,
+            "slow": self.slow,
+            "endpoints": dict(self.endpoints.most_common(None if detail else 5)),
+        }
+        if detail:
+            data.update(sample=self.sample, explain=self.explain)
+        return data
+
+
+class QueryStats:
+    """Хуки движков и статистика по отпечаткам"""
+
+    ORDERINGS = {
+        "total": lambda s: s.total,
+        "count": lambda s: s.count,
+        "mean": lambda s: s.total / s.count if s.count else 0.0,
+        "max": lambda s: s.max,
+        "p95": lambda s: s.quantile(0.95),
+    }
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_fingerprints: int = 500,
+        slow_threshold: float = 0.5,
+        explain: bool = True,
+        explain_interval: float = 300
+    ):
+        self.enabled = enabled
+        self.max_fingerprints = max_fingerprints
+        self.slow_threshold = slow_threshold
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self._stats: Dict[str, FingerprintStats] = {}
+        # Кэш текст запроса -> отпечаток (регулярные выражения дороже словаря)
+        self._fingerprints: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def instrument(self, engine: Engine) -> None:
+        """Подключение хуков к движку (AsyncEngine - через engine.sync_engine)"""
+        if not self.enabled:
+            return
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._failed)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _failed(self, context) -> None:
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        started = conn.info.get("query_started")
+        if not started:
+            return
+        duration = time.perf_counter() - started.pop()
+        rows = cursor.rowcount if cursor.rowcount is not None else -1
+        stats = self.record(statement, duration, rows)
+
+        if (
+            duration >= self.slow_threshold and self.explain and not executemany
+            and stats.id in self._stats
+            and time.monotonic() - stats.explained_at >= self.explain_interval
+        ):
+            stats.explained_at = time.monotonic()
+            stats.sample = statement
+            stats.explain = self._explain(conn, statement, parameters)
+
+    def _label(self, fid: str) -> str:
+        return fid if fid in self._stats else "other"
+
+    def fingerprint(self, statement: str) -> str:
+        """fingerprint() с кэшем по тексту запроса"""
+        text = self._fingerprints.get(statement)
+        if text is None:
+            text = fingerprint(statement)
+            if len(self._fingerprints) < self.max_fingerprints * 4:
+                self._fingerprints[statement] = text
+        return text
+
+    def record(self, statement: str, duration: float, rows: int = -1, endpoint: Optional[str] = None) -> FingerprintStats:
+        text = self.fingerprint(statement)
+        fid = fingerprint_id(text)
+        endpoint = endpoint or current_endpoint()
+
+        with self._lock:
+            stats = self._stats.get(fid)
+            if stats is None:
+                stats = FingerprintStats(fid, text)
+                if len(self._stats) < self.max_fingerprints:
+                    self._stats[fid] = stats
+            stats.record(duration, rows, endpoint)
+            slow = duration >= self.slow_threshold
+            if slow:
+                stats.slow += 1
+
+        label = self._label(fid)
+        QUERY_SECONDS.labels(label).observe(duration)
+        if rows >= 0:
+            QUERY_ROWS.labels(label).observe(rows)
+        QUERIES.labels(endpoint).inc()
+        if slow:
+            SLOW_QUERIES.labels(label).inc()
+            logger.warning(f"Slow query {fid} ({duration:.3f}s, {endpoint}): {text[:500]}")
+        return stats
+
+    def _explain(self, conn, statement: str, parameters) -> Optional[str]:
+        """План медленного SELECT; ANALYZE повторяет запрос, поэтому только чтение"""
+        prefix = EXPLAIN_PREFIX.get(conn.dialect.name)
+        if prefix is None or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            return None
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute("SAVEPOINT query_stats_explain")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                plan = "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT query_stats_explain")
+                plan = f"EXPLAIN failed: {str(e)}"
+            cursor.execute("RELEASE SAVEPOINT query_stats_explain")
+            return plan
+        except Exception as e:
+            logger.warning(f"EXPLAIN of slow query failed: {str(e)}")
+            return None
+        finally:
+            cursor.close()
+
+    def snapshot(self, order_by: str = "total", limit: int = 50) -> List[Dict[str, Any]]:
+        key = self.ORDERINGS.get(order_by, self.ORDERINGS["total"])
+        with self._lock:
+            stats = sorted(self._stats.values(), key=key, reverse=True)[:limit]
+            return [s.summary() for s in stats]
+
+    def get(self, fid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            stats = self._stats.get(fid)
+            return stats.summary(detail=True) if stats is not None else None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+# Singleton instance
+query_stats = QueryStats(
+    enabled=settings.QUERY_STATS_ENABLED,
+    max_fingerprints=settings.QUERY_STATS_MAX_FINGERPRINTS,
+    slow_threshold=settings.SLOW_QUERY_THRESHOLD,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+    explain_interval=settings.SLOW_QUERY_EXPLAIN_INTERVAL
+)
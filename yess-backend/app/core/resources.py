@@ -0,0 +1,366 @@
+"""
+Пулы соединений процесса: движки БД и пулы Redis
+
+Один ResourceManager на процесс (resources) создаёт движки SQLAlchemy и
+пулы Redis по URL и отдаёт один и тот же объект всем потребителям
+(app.core.database, PerformanceManager, RedisCache и CacheService), поэтому
+число соединений не растёт с числом модулей. Размеры считаются от
+бюджетов на все воркеры (WEB_CONCURRENCY - число воркеров gunicorn):
+
+- БД: DB_CONNECTION_BUDGET соединений с одной базой делится между
+  воркерами и двумя движками воркера (sync и async); DB_POOL_SIZE и
+  DB_MAX_OVERFLOW - верхние границы;
+- Redis: REDIS_CONNECTION_BUDGET соединений с одним URL делится между
+  воркерами и двумя пулами (sync и async); REDIS_MAX_CONNECTIONS - верхняя
+  граница. Параметры соединений пула задаёт первый запросивший его.
+
+Метрики Prometheus (отдаёт metrics_app из app.core.cache_metrics):
+- db_pool_checkout_wait_seconds{pool}, redis_pool_checkout_wait_seconds{pool}:
+  ожидание соединения из пула (с открытием нового);
+- db_pool_connections{pool, state}: checked_out, idle, overflow;
+- db_pool_saturation{pool}, redis_pool_saturation{pool}: доля занятых
+  соединений от предела пула;
+- db_pool_long_checkouts{pool}: соединения, занятые дольше DB_LEAK_THRESHOLD;
+- db_sessions_leaked_total{pool}: сессии, удалённые сборщиком мусора с
+  открытой транзакцией (без close()).
+
+К каждому движку подключаются статистика запросов (app.core.query_stats) и
+счёт запросов детектора N+1 (app.core.nplus1).
+"""
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from redis import BlockingConnectionPool as SyncBlockingConnectionPool
+from redis.asyncio import BlockingConnectionPool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, create_engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.cache_metrics import _NoopMetric
+from app.core.config import settings
+from app.core.nplus1 import nplus1
+from app.core.query_stats import query_stats
+
+try:
+    from prometheus_client import REGISTRY, Counter, Histogram
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:
+    REGISTRY = None
+
+logger = logging.getLogger(__name__)
+
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+if REGISTRY is not None and settings.POOL_METRICS_ENABLED:
+    DB_CHECKOUT_WAIT = Histogram(
+        "db_pool_checkout_wait_seconds", "Wait for a DB pool connection", ["pool"], buckets=WAIT_BUCKETS
+    )
+    REDIS_CHECKOUT_WAIT = Histogram(
+        "redis_pool_checkout_wait_seconds", "Wait for a Redis pool connection", ["pool"], buckets=WAIT_BUCKETS
+    )
+    SESSIONS_LEAKED = Counter(
+        "db_sessions_leaked_total", "Sessions garbage collected with an open transaction", ["pool"]
+    )
+else:
+    DB_CHECKOUT_WAIT = REDIS_CHECKOUT_WAIT = SESSIONS_LEAKED = _NoopMetric()
+
+
+def _db_pool_name(url: str, kind: str) -> str:
+    url = make_url(url)
+    return f"{url.host or 'local'}:{url.port or ''}/{url.database or ''}:{kind}"
+
+
+def _redis_pool_name(url: str, kind: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.hostname}:{parsed.port or ''}{parsed.path or '/0'}:{kind}"
+
+
+def _timed_db_pool(pool_class: type, name: str) -> type:
+    """Подкласс пула с замером ожидания; класс (и имя) переживает dispose()"""
+    wait = DB_CHECKOUT_WAIT.labels(name)
+
+    class TimedPool(pool_class):
+        resource_name = name
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                wait.observe(time.perf_counter() - started)
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+class TimedBlockingConnectionPool(BlockingConnectionPool):
+    resource_name = "redis"
+    # Event loop, к которому привязаны соединения пула
+    loop = None
+
+    async def get_connection(self, command_name, *keys, **options):
+        started = time.perf_counter()
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        finally:
+            REDIS_CHECKOUT_WAIT.labels(self.resource_name).observe(time.perf_counter() - started)
+
+
+class TimedSyncBlockingConnectionPool(SyncBlockingConnectionPool):
+    resource_name = "redis"
+    loop = None
+
+    def get_connection(self, command_name, *keys, **options):
+        started = time.perf_counter()
+        try:
+            return super().get_connection(command_name, *keys, **options)
+        finally:
+            REDIS_CHECKOUT_WAIT.labels(self.resource_name).observe(time.perf_counter() - started)
+
+
+class ResourceManager:
+    """Движки БД и пулы Redis процесса"""
+
+    # Движков на базу в воркере (sync и async) и пулов на Redis URL
+    ENGINES_PER_DATABASE = 2
+    POOLS_PER_REDIS = 2
+
+    def __init__(
+        self,
+        workers: int = 1,
+        db_budget: int = 90,
+        db_pool_size: int = 10,
+        db_max_overflow: int = 20,
+        db_pool_timeout: float = 30,
+        db_pool_recycle: int = 1800,
+        leak_threshold: float = 60,
+        redis_budget: int = 400,
+        redis_max_connections: int = 100
+    ):
+        self.workers = max(1, workers)
+        self.db_budget = db_budget
+        self.db_pool_size = db_pool_size
+        self.db_max_overflow = db_max_overflow
+        self.db_pool_timeout = db_pool_timeout
+        self.db_pool_recycle = db_pool_recycle
+        self.leak_threshold = leak_threshold
+        self.redis_budget = redis_budget
+        self.redis_max_connections = redis_max_connections
+
+        self._engines: Dict[Tuple[str, str], Any] = {}
+        # Пул -> (id записи соединения -> monotonic выдачи)
+        self._checkouts: Dict[str, Dict[int, float]] = {}
+        self._redis_pools: Dict[Tuple[str, str, int], Any] = {}
+        self._lock = threading.Lock()
+        self.stats = {"sessions_leaked": 0}
+        event.listen(Session, "after_begin", self._guard_session)
+        event.listen(Session, "after_transaction_end", self._release_session)
+
+    # --- Размеры ---
+
+    def db_pool_limits(self) -> Tuple[int, int]:
+        """(pool_size, max_overflow) одного движка в этом воркере"""
+        share = max(1, self.db_budget // self.workers // self.ENGINES_PER_DATABASE)
+        pool_size = min(self.db_pool_size, share)
+        return pool_size, max(0, min(self.db_max_overflow, share - pool_size))
+
+    def redis_pool_limit(self) -> int:
+        share = self.redis_budget // self.workers // self.POOLS_PER_REDIS
+        return max(1, min(self.redis_max_connections, share))
+
+    # --- БД ---
+
+    def _engine_options(self, pool_class: type, name: str) -> dict:
+        pool_size, max_overflow = self.db_pool_limits()
+        return dict(
+            poolclass=_timed_db_pool(pool_class, name),
+            pool_pre_ping=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=self.db_pool_timeout,
+            pool_recycle=self.db_pool_recycle
+        )
+
+    def engine(self, url: str) -> Engine:
+        """Синхронный движок url (один на процесс)"""
+        with self._lock:
+            key = (url, "sync")
+            if key not in self._engines:
+                name = _db_pool_name(url, "sync")
+                engine = create_engine(url, **self._engine_options(QueuePool, name))
+                self._watch_pool(name, engine)
+                query_stats.instrument(engine)
+                nplus1.instrument(engine)
+                self._engines[key] = engine
+            return self._engines[key]
+
+    def async_engine(self, url: str) -> AsyncEngine:
+        """Async движок url (один на процесс)"""
+        with self._lock:
+            key = (url, "async")
+            if key not in self._engines:
+                name = _db_pool_name(url, "async")
+                engine = create_async_engine(url, **self._engine_options(AsyncAdaptedQueuePool, name))
+                self._watch_pool(name, engine.sync_engine)
+                query_stats.instrument(engine.sync_engine)
+                nplus1.instrument(engine.sync_engine)
+                self._engines[key] = engine
+            return self._engines[key]
+
+    def _watch_pool(self, name: str, engine: Engine) -> None:
+        checkouts = self._checkouts[name] = {}
+
+        def on_checkout(dbapi_connection, record, proxy):
+            checkouts[id(record)] = time.monotonic()
+
+        def on_checkin(dbapi_connection, record):
+            checkouts.pop(id(record), None)
+
+        event.listen(engine, "checkout", on_checkout)
+        event.listen(engine, "checkin", on_checkin)
+
+    def _guard_session(self, session: Session, transaction, connection) -> None:
+        """Транзакция открыта: если сессию удалит сборщик мусора до её конца - утечка"""
+        name = getattr(connection.engine.pool, "resource_name", None)
+        if name not in self._checkouts or "leak_guard" in session.info:
+            return
+        session.info["leak_guard"] = weakref.finalize(session, self._leaked, name)
+
+    def _release_session(self, session: Session, transaction) -> None:
+        if transaction.parent is None:
+            guard = session.info.pop("leak_guard", None)
+            if guard is not None:
+                guard.detach()
+
+    def _leaked(self, name: str) -> None:
+        self.stats["sessions_leaked"] += 1
+        SESSIONS_LEAKED.labels(name).inc()
+        logger.warning(f"DB session on {name} was garbage collected with an open transaction (missing close())")
+
+    # --- Redis ---
+
+    def redis_pool(self, url: str, asynchronous: bool = True, max_connections: Optional[int] = None, **options):
+        """
+        Пул Redis url; max_connections=None - размер из бюджета.
+        Async пул привязан к event loop (пересоздаётся при смене loop)
+        """
+        size = max_connections or self.redis_pool_limit()
+        kind = "async" if asynchronous else "sync"
+        key = (url, kind, size)
+        with self._lock:
+            pool = self._redis_pools.get(key)
+            loop = asyncio.get_running_loop() if asynchronous else None
+            if pool is None or pool.loop is not loop:
+                pool_class = TimedBlockingConnectionPool if asynchronous else TimedSyncBlockingConnectionPool
+                pool = pool_class.from_url(url, max_connections=size, **options)
+                pool.resource_name = _redis_pool_name(url, kind)
+                pool.loop = loop
+                self._redis_pools[key] = pool
+            return pool
+
+    # --- Состояние ---
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Состояние всех пулов (метрики, админка)"""
+        now = time.monotonic()
+        pools = []
+        with self._lock:
+            engines = list(self._engines.items())
+            redis_pools = list(self._redis_pools.values())
+
+        for (url, kind), engine in engines:
+            pool = (engine.sync_engine if kind == "async" else engine).pool
+            name = pool.resource_name
+            capacity = pool.size() + pool._max_overflow
+            checked_out = pool.checkedout()
+            pools.append({
+                "pool": name,
+                "type": "db",
+                "checked_out": checked_out,
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "capacity": capacity,
+                "saturation": checked_out / capacity if capacity else 0.0,
+                "long_checkouts": sum(
+                    1 for started in list(self._checkouts.get(name, {}).values())
+                    if now - started > self.leak_threshold
+                ),
+            })
+
+        for pool in redis_pools:
+            in_use = pool.max_connections - pool.pool.qsize()
+            pools.append({
+                "pool": pool.resource_name,
+                "type": "redis",
+                "checked_out": in_use,
+                "capacity": pool.max_connections,
+                "saturation": in_use / pool.max_connections,
+            })
+        return pools
+
+    async def dispose(self) -> None:
+        """Обработчик shutdown: закрытие всех пулов"""
+        with self._lock:
+            engines = list(self._engines.items())
+            redis_pools = list(self._redis_pools.values())
+        for (url, kind), engine in engines:
+            if kind == "async":
+                await engine.dispose()
+            else:
+                engine.dispose()
+        for pool in redis_pools:
+            if isinstance(pool, TimedBlockingConnectionPool):
+                await pool.disconnect()
+            else:
+                pool.disconnect()
+
+
+class _PoolCollector:
+    """Заполненность пулов в момент scrape"""
+
+    def __init__(self, manager: ResourceManager):
+        self.manager = manager
+
+    def collect(self):
+        connections = GaugeMetricFamily("db_pool_connections", "DB pool connections", labels=["pool", "state"])
+        db_saturation = GaugeMetricFamily("db_pool_saturation", "Checked out / pool capacity", labels=["pool"])
+        long_checkouts = GaugeMetricFamily(
+            "db_pool_long_checkouts", "Connections checked out longer than DB_LEAK_THRESHOLD", labels=["pool"]
+        )
+        redis_saturation = GaugeMetricFamily("redis_pool_saturation", "In use / max connections", labels=["pool"])
+        for pool in self.manager.snapshot():
+            if pool["type"] == "redis":
+                redis_saturation.add_metric([pool["pool"]], pool["saturation"])
+                continue
+            for state in ("checked_out", "idle", "overflow"):
+                connections.add_metric([pool["pool"], state], pool[state])
+            db_saturation.add_metric([pool["pool"]], pool["saturation"])
+            long_checkouts.add_metric([pool["pool"]], pool["long_checkouts"])
+        yield connections
+        yield db_saturation
+        yield long_checkouts
+        yield redis_saturation
+
+
+# Singleton instance
+resources = ResourceManager(
+    workers=settings.WEB_CONCURRENCY,
+    db_budget=settings.DB_CONNECTION_BUDGET,
+    db_pool_size=settings.DB_POOL_SIZE,
+    db_max_overflow=settings.DB_MAX_OVERFLOW,
+    db_pool_timeout=settings.DB_POOL_TIMEOUT,
+    db_pool_recycle=settings.DB_POOL_RECYCLE,
+    leak_threshold=settings.DB_LEAK_THRESHOLD,
+    redis_budget=settings.REDIS_CONNECTION_BUDGET,
+    redis_max_connections=settings.REDIS_MAX_CONNECTIONS
+)
+
+if REGISTRY is not None and settings.POOL_METRICS_ENABLED:
+    REGISTRY.register(_PoolCollector(resources))
@@ -0,0 +1,75 @@
+"""
+Нормализация текста для полнотекстового поиска партнёров
+
+Русский и кыргызский текст приводится к нижнему регистру, ё/ң/ө/ү
+сворачиваются в е/н/о/у, пунктуация убирается. Для кириллицы
+добавляется латинская транслитерация, поэтому "kofe" и "кофе"
+совпадают и в индексе, и в запросе.
+"""
+import re
+from typing import List, Optional
+
+# Кыргызские буквы и ё - к базовым, как пользователи набирают без раскладки
+_FOLD = str.maketrans({"ё": "е", "ң": "н", "ө": "о", "ү": "у", "һ": "х"})
+
+_CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n",
+    "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f",
+    "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y",
+    "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+_TRANSLIT = str.maketrans(_CYRILLIC_TO_LATIN)
+
+_NON_WORD = re.compile(r"[^0-9a-zа-я]+")
+_CYRILLIC = re.compile(r"[а-я]")
+
+
+def normalize(text: Optional[str]) -> str:
+    """Нижний регистр, свёртка букв, только буквы/цифры через пробел"""
+    if not text:
+        return ""
+    text = text.lower().translate(_FOLD)
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def to_latin(text: str) -> str:
+    """Транслитерация нормализованного текста в латиницу"""
+    return text.translate(_TRANSLIT)
+
+
+def searchable(text: Optional[str]) -> str:
+    """Текст для индекса: нормализованный оригинал + латинская форма"""
+    normalized = normalize(text)
+    if not _CYRILLIC.search(normalized):
+        return normalized
+    return f"{normalized} {to_latin(normalized)}"
+
+
+def query_terms(query: Optional[str]) -> List[List[str]]:
+    """
+    Термы запроса: для каждого слова - варианты написания
+    ("кофе" -> ["кофе", "kofe"])
+    """
+    terms = []
+    for word in normalize(query).split():
+        variants = [word]
+        latin = to_latin(word)
+        if latin and latin != word:
+            variants.append(latin)
+        terms.append(variants)
+    return terms
+
+
+def prefix_tsquery(query: Optional[str]) -> Optional[str]:
+    """
+    Строка для to_tsquery('simple', ...): все слова обязательны,
+    каждое - по префиксу в любом из вариантов написания
+    """
+    terms = query_terms(query)
+    if not terms:
+        return None
+    return " & ".join(
+        "(" + " | ".join(f"{variant}:*" for variant in variants) + ")"
+        for variants in terms
+    )
@@ -0,0 +1,62 @@
+"""
+In-process LRU cache with per-entry TTL
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Ограниченный in-process кэш с временем жизни записей (LRU-вытеснение)
+
+    Помимо числа записей можно ограничить суммарный размер (max_bytes):
+    размер записи передаётся в set, например длина сериализованного значения.
+    """
+
+    def __init__(self, max_size: int = 5000, ttl: float = 600, max_bytes: Optional[int] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_bytes = 0
+        self._data: "OrderedDict[Any, Tuple[float, Any, int]]" = OrderedDict()
+
+    def get(self, key: Any) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value, _ = item
+        if expires_at < time.monotonic():
+            self.delete(key)
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Any, value: Any, size: int = 0, ttl: Optional[float] = None) -> None:
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Запись больше всего бюджета - не кэшируем, чтобы не вытеснить всё
+            self.delete(key)
+            return
+
+        self.delete(key)
+        self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value, size)
+        self.memory_bytes += size
+        while len(self._data) > self.max_size or (
+            self.max_bytes is not None and self.memory_bytes > self.max_bytes
+        ):
+            _, (_, _, evicted_size) = self._data.popitem(last=False)
+            self.memory_bytes -= evicted_size
+
+    def delete(self, key: Any) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.memory_bytes -= item[2]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.memory_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
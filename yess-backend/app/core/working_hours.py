@@ -0,0 +1,247 @@
+"""
+Working hours: разбор расписаний и индекс "открыто сейчас"
+
+Свободный JSON вида {"mon": "9:00-18:00", "sat": "выходной"} один раз
+преобразуется в отсортированный плоский список границ интервалов в минутах
+недели локального времени (0 = понедельник 00:00, 10080 = конец недели):
+[start1, end1, start2, end2, ...]. Проверка "открыто в минуту m" - один
+bisect по этому списку.
+"""
+import re
+import json
+import bisect
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+_DAY_NAMES = [
+    ("mon", "monday", "пн", "пон", "понедельник"),
+    ("tue", "tuesday", "вт", "вторник"),
+    ("wed", "wednesday", "ср", "среда"),
+    ("thu", "thursday", "чт", "четверг"),
+    ("fri", "friday", "пт", "пятница"),
+    ("sat", "saturday", "сб", "суббота"),
+    ("sun", "sunday", "вс", "воскресенье"),
+]
+DAY_ALIASES: Dict[str, Tuple[int, ...]] = {
+    alias: (day,) for day, aliases in enumerate(_DAY_NAMES) for alias in aliases
+}
+DAY_ALIASES.update({
+    alias: tuple(range(7))
+    for alias in ("daily", "everyday", "all", "ежедневно", "каждый день")
+})
+DAY_ALIASES.update({alias: tuple(range(5)) for alias in ("weekdays", "будни")})
+DAY_ALIASES.update({alias: (5, 6) for alias in ("weekends", "weekend", "выходные")})
+
+_TIME_RANGE = re.compile(
+    r"(\d{1,2})(?:[:.](\d{2}))?\s*[-–—]\s*(\d{1,2})(?:[:.](\d{2}))?"
+)
+_ALWAYS_OPEN = ("24/7", "24h", "24 h", "круглосуточно", "around the clock")
+# Явные пометки "закрыто": подстрокой и целым значением
+_CLOSED = ("выходной", "закрыто", "не работает", "нерабочий", "closed")
+_CLOSED_EXACT = ("-", "–", "—", "off", "day off", "нет")
+
+
+def _parse_days(key: str) -> Tuple[int, ...]:
+    """'mon', 'пн', 'mon-fri', 'weekdays' -> номера дней"""
+    key = key.strip().lower()
+    if key in DAY_ALIASES:
+        return DAY_ALIASES[key]
+
+    parts = [part.strip() for part in re.split(r"[-–—]", key)]
+    if len(parts) == 2 and parts[0] in DAY_ALIASES and parts[1] in DAY_ALIASES:
+        first, last = DAY_ALIASES[parts[0]][0], DAY_ALIASES[parts[1]][0]
+        if first <= last:
+            return tuple(range(first, last + 1))
+        return tuple(range(first, 7)) + tuple(range(0, last + 1))
+
+    return ()
+
+
+def _parse_ranges(value: Any) -> Optional[List[Tuple[int, int]]]:
+    """
+    Интервалы в минутах суток; конец может быть > 1440 (работа после полуночи)
+
+    :return: [] - явно закрыто (null, false, "выходной", "closed");
+             None - значение не распознано ("с 9 до 18")
+    """
+    if value is None or value is False:
+        return []
+    if isinstance(value, (list, tuple)):
+        parts = [_parse_ranges(item) for item in value]
+        if any(part is None for part in parts):
+            return None
+        return [interval for part in parts for interval in part]
+
+    text = str(value).strip().lower()
+    if any(marker in text for marker in _ALWAYS_OPEN):
+        return [(0, MINUTES_PER_DAY)]
+
+    ranges = []
+    for start_h, start_m, end_h, end_m in _TIME_RANGE.findall(text):
+        start = int(start_h) * 60 + int(start_m or 0)
+        end = int(end_h) * 60 + int(end_m or 0)
+        if start >= MINUTES_PER_DAY or end > MINUTES_PER_DAY:
+            continue
+        if end <= start:
+            end += MINUTES_PER_DAY
+        ranges.append((start, end))
+    if ranges:
+        return ranges
+    # Пометка "закрыто" учитывается, только если интервалов нет: "9-18, обед закрыто"
+    if text in _CLOSED_EXACT or any(marker in text for marker in _CLOSED):
+        return []
+    return None
+
+
+def merge_intervals(intervals: Iterable[Tuple[int, int]]) -> List[int]:
+    """Слияние пересекающихся/смежных интервалов недели в плоский список границ"""
+    normalized = []
+    for start, end in intervals:
+        # Работа после полуночи воскресенья переносится на понедельник
+        if end > MINUTES_PER_WEEK:
+            normalized.append((start, MINUTES_PER_WEEK))
+            normalized.append((0, end - MINUTES_PER_WEEK))
+        else:
+            normalized.append((start, end))
+
+    flat: List[int] = []
+    for start, end in sorted(normalized):
+        if start >= end:
+            continue
+        if flat and start <= flat[-1]:
+            flat[-1] = max(flat[-1], end)
+        else:
+            flat.extend((start, end))
+    return flat
+
+
+def parse_working_hours(raw: Any) -> Optional[List[int]]:
+    """
+    Разбор working_hours в плоский список границ интервалов недели
+
+    :return: [start1, end1, ...]; [] - закрыто всю неделю;
+             None - расписание отсутствует или не распознано (в том числе
+             значение хотя бы одного дня: такая локация считается открытой)
+    """
+    if raw is None or raw == "" or raw == {}:
+        return None
+
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            # Одна строка на все дни: "9:00-18:00"
+            raw = {"daily": raw}
+
+    if not isinstance(raw, dict):
+        return None
+
+    intervals = []
+    recognized = False
+    for key, value in raw.items():
+        days = _parse_days(str(key))
+        if not days:
+            continue
+        recognized = True
+        ranges = _parse_ranges(value)
+        if ranges is None:
+            return None
+        for day in days:
+            offset = day * MINUTES_PER_DAY
+            intervals.extend((offset + start, offset + end) for start, end in ranges)
+
+    if not recognized:
+        return None
+    return merge_intervals(intervals)
+
+
+def week_minute(at: Optional[datetime] = None, timezone: str = "Asia/Bishkek") -> int:
+    """Минута недели в локальном времени; naive datetime считается UTC"""
+    zone = ZoneInfo(timezone)
+    if at is None:
+        local = datetime.now(zone)
+    elif at.tzinfo is None:
+        local = at.replace(tzinfo=ZoneInfo("UTC")).astimezone(zone)
+    else:
+        local = at.astimezone(zone)
+    return local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+
+
+def is_open_at(intervals: Optional[Sequence[int]], minute: int) -> bool:
+    """Открыто ли в минуту недели; неизвестное расписание считается открытым"""
+    if intervals is None:
+        return True
+    return bisect.bisect_right(intervals, minute) % 2 == 1
+
+
+class WorkingHoursIndex:
+    """
+    Индекс "открыто в момент T" для набора локаций
+
+    Неделя режется на сегменты по всем границам интервалов; для каждого
+    сегмента хранится упакованная битовая маска открытых локаций. Запрос -
+    бинарный поиск сегмента и распаковка одной строки.
+    """
+
+    def __init__(self):
+        self._ids = np.empty(0, dtype=np.int64)
+        self._positions: Dict[int, int] = {}
+        self._boundaries = np.array([0, MINUTES_PER_WEEK], dtype=np.int64)
+        self._masks = np.zeros((1, 0), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def build(self, entries: Iterable[Tuple[int, Optional[Sequence[int]]]]) -> int:
+        """entries: пары (location_id, плоский список границ или None)"""
+        entries = list(entries)
+        count = len(entries)
+        ids = np.fromiter((location_id for location_id, _ in entries), dtype=np.int64, count=count)
+
+        columns, starts, ends, unknown = [], [], [], []
+        for column, (_, intervals) in enumerate(entries):
+            if intervals is None:
+                unknown.append(column)
+                continue
+            columns.extend([column] * (len(intervals) // 2))
+            starts.extend(intervals[0::2])
+            ends.extend(intervals[1::2])
+
+        boundaries = np.unique(np.concatenate((
+            [0, MINUTES_PER_WEEK],
+            np.asarray(starts, dtype=np.int64),
+            np.asarray(ends, dtype=np.int64),
+        ))).astype(np.int64)
+
+        # Разностный массив по сегментам -> накопленная сумма = открыто
+        diff = np.zeros((len(boundaries), count), dtype=np.int8)
+        columns = np.asarray(columns, dtype=np.int64)
+        np.add.at(diff, (np.searchsorted(boundaries, starts), columns), 1)
+        np.add.at(diff, (np.searchsorted(boundaries, ends), columns), -1)
+        open_matrix = np.cumsum(diff[:-1], axis=0, dtype=np.int8) > 0
+        if unknown:
+            open_matrix[:, unknown] = True
+
+        self._ids = ids
+        self._positions = {int(location_id): i for i, location_id in enumerate(ids.tolist())}
+        self._boundaries = boundaries
+        self._masks = np.packbits(open_matrix, axis=1)
+        return count
+
+    def open_mask(self, minute: int) -> np.ndarray:
+        """Булева маска открытых локаций (в порядке build)"""
+        segment = int(np.searchsorted(self._boundaries, minute % MINUTES_PER_WEEK, side="right")) - 1
+        segment = min(max(segment, 0), len(self._masks) - 1)
+        return np.unpackbits(self._masks[segment], count=len(self._ids)).astype(bool)
+
+    def open_ids(self, minute: int) -> np.ndarray:
+        return self._ids[self.open_mask(minute)]
+
+    def position(self, location_id: int) -> Optional[int]:
+        return self._positions.get(location_id)
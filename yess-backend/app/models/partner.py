@@ -1,8 +1,11 @@
 """Partner models"""
-from sqlalchemy import Column, Integer, String, Text, Numeric, Boolean, DateTime, ForeignKey, Date, CheckConstraint, JSON, Float, func, Geometry
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Numeric, Boolean, DateTime, ForeignKey, Date, CheckConstraint, JSON, Float, func, Geometry, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 from app.core.database import Base
+from app.core.text_search import searchable
+from app.core.working_hours import parse_working_hours
 
 
 class Partner(Base):
@@ -48,6 +51,20 @@ class Partner(Base):
     
     # Дополнительные атрибуты
     default_cashback_rate = Column(Float, default=5.0)
+    rating = Column(Float, nullable=True)
+    
+    # Полнотекстовый поиск (app.core.text_search): нормализованный текст
+    # с транслитерацией и tsvector, который строит PostgreSQL
+    search_name = Column(Text)
+    search_text = Column(Text)
+    search_vector = Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple', coalesce(search_name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(search_text, '')), 'B')",
+            persisted=True
+        )
+    )
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -56,6 +73,11 @@ class Partner(Base):
     __table_args__ = (
         CheckConstraint('max_discount_percent >= 0 AND max_discount_percent <= 100', name='check_discount_range'),
         CheckConstraint('cashback_rate >= 0 AND cashback_rate <= 100', name='check_cashback_range'),
+        Index('ix_partners_search_vector', 'search_vector', postgresql_using='gin'),
+        Index(
+            'ix_partners_search_name_trgm', 'search_name',
+            postgresql_using='gin', postgresql_ops={'search_name': 'gin_trgm_ops'}
+        ),
     )
     
     # Relationships
@@ -66,6 +88,19 @@ class Partner(Base):
     orders = relationship("Order", back_populates="partner")
     agent_bonuses = relationship("AgentPartnerBonus", back_populates="partner")
     transactions = relationship("Transaction", back_populates="partner")
+    
+    @validates("name", "description", "category")
+    def _sync_search_text(self, key, value):
+        """Поля поиска пересчитываются при изменении исходных"""
+        values = {
+            "name": self.name,
+            "description": self.description,
+            "category": self.category,
+            key: value,
+        }
+        self.search_name = searchable(values["name"])
+        self.search_text = searchable(f"{values['description'] or ''} {values['category'] or ''}")
+        return value
 
 
 class PartnerLocation(Base):
@@ -78,6 +113,8 @@ class PartnerLocation(Base):
     longitude = Column(Numeric(11, 8))
     phone_number = Column(String(50))
     working_hours = Column(JSON)  # {"mon": "9:00-18:00", "tue": "9:00-18:00", ...}
+    # Разобранные working_hours: границы интервалов в минутах недели (Asia/Bishkek)
+    open_intervals = Column(JSON, nullable=True)
     is_active = Column(Boolean, default=True)
     
     # Геолокационные данные
@@ -92,6 +129,12 @@ class PartnerLocation(Base):
     # Метаданные
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    @validates("working_hours")
+    def _sync_open_intervals(self, key, value):
+        """Разбор расписания один раз при записи"""
+        self.open_intervals = parse_working_hours(value)
+        return value
 
 
 class PartnerEmployee(Base):
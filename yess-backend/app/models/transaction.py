@@ -10,6 +10,7 @@ class Transaction(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    partner_id = Column(Integer, ForeignKey("partners.id"), nullable=True, index=True)
     type = Column(String(50), nullable=False, index=True)  # topup, discount, bonus, refund
     amount = Column(Numeric(10, 2), nullable=False)
     balance_before = Column(Numeric(10, 2))
@@ -26,4 +27,5 @@ class Transaction(Base):
     
     # Relationships
     user = relationship("User", back_populates="transactions")
+    partner = relationship("Partner", back_populates="transactions")
 
@@ -12,10 +12,14 @@ class Wallet(Base):
     user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
     balance = Column(Numeric(10, 2), default=0.00, nullable=False)
     last_updated = Column(DateTime, default=datetime.utcnow)
+    # Растёт на каждом UPDATE (version_id_col): версия записи в кэше баланса,
+    # параллельное изменение устаревшей копии - StaleDataError вместо потери обновления
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     __table_args__ = (
         CheckConstraint('balance >= 0', name='check_positive_balance'),
     )
+    __mapper_args__ = {"version_id_col": version}
     
     # Relationships
     user = relationship("User", back_populates="wallet")
@@ -2,6 +2,7 @@
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List, Dict, Any
 from decimal import Decimal
+from datetime import datetime
 
 class PartnerBase(BaseModel):
     id: int
@@ -66,6 +67,23 @@ class PartnerUpdate(BaseModel):
         description="Базовый процент кешбэка"
     )
 
+class PartnerResponse(BaseModel):
+    """Партнёр в каталоге (/partner/list)"""
+    id: int
+    name: str
+    category: Optional[str] = None
+    description: Optional[str] = None
+    logo_url: Optional[str] = None
+    city_id: Optional[int] = None
+    cashback_rate: Optional[float] = None
+    is_verified: bool = False
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    rating: Optional[float] = None
+
+    class Config:
+        orm_mode = True
+
 class PartnerLocationResponse(BaseModel):
     id: int
     partner_id: int
@@ -81,9 +99,11 @@ class NearbyPartnerRequest(BaseModel):
     latitude: float = Field(..., ge=-90, le=90, description="Широта")
     longitude: float = Field(..., ge=-180, le=180, description="Долгота")
     radius: float = Field(default=10, ge=0.1, le=100, description="Радиус поиска в километрах")
+    limit: Optional[int] = Field(default=None, ge=1, le=500, description="Максимальное количество результатов")
 
 class RouteRequest(BaseModel):
     partner_location_ids: List[int] = Field(..., min_items=2, description="Список ID локаций партнеров")
+    optimize_order: bool = Field(default=False, description="Оптимизировать порядок посещения (старт - первая локация)")
 
 class RouteResponse(BaseModel):
     route_points: List[Dict[str, Any]]
@@ -127,6 +147,14 @@ class PartnerFilterRequest(BaseModel):
         default=None, 
         description="Фильтр по времени работы"
     )
+    open_now: Optional[bool] = Field(
+        default=None, 
+        description="Только открытые сейчас"
+    )
+    open_at: Optional[datetime] = Field(
+        default=None, 
+        description="Только открытые в указанный момент"
+    )
     tags: Optional[List[str]] = Field(
         default=None, 
         description="Дополнительные теги для фильтрации"
@@ -20,6 +20,10 @@ class RouteOptimizationRequest(BaseModel):
         None, 
         description="Начальная точка маршрута (опционально)"
     )
+    end_location_id: Optional[int] = Field(
+        None, 
+        description="Конечная точка маршрута (опционально)"
+    )
 
 class RouteRequest(BaseModel):
     """Запрос на построение маршрута"""
@@ -7,6 +7,9 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 import logging
 
+from app.core.cache import cached
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 class AchievementType(Enum):
@@ -299,7 +302,8 @@ class AchievementService:
         except Exception as e:
             logger.error(f"Error awarding points: {e}")
     
-    async def get_leaderboard(self, limit: int = 50) -> List[Dict[str, Any]]:
+    @cached(ttl=settings.LEADERBOARD_CACHE_TTL, tags=["leaderboard"], negative_ttl=30)
+    def get_leaderboard(self, limit: int = 50) -> List[Dict[str, Any]]:
         """
         Получение таблицы лидеров
         """
@@ -6,6 +6,7 @@ from dataclasses import dataclass
 from enum import Enum
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from app.core.database import db_router
 import logging
 import statistics
 from datetime import datetime, timedelta
@@ -60,6 +61,12 @@ class AnalyticsService:
         self.buffer_size = 100
         self.flush_interval = 60  # секунды
         
+    def _fetch(self, query, params: Dict[str, Any], one: bool = False):
+        """Запрос только на чтение: на реплику по политике db_router"""
+        with db_router.read_session(self.db) as db:
+            result = db.execute(query, params)
+            return result.fetchone() if one else result.fetchall()
+
     async def track_event(self, event: AnalyticsEvent):
         """
         Отслеживание события пользователя
@@ -140,7 +147,7 @@ class AnalyticsService:
                 GROUP BY u.id, u.created_at, u.is_active, w.balance, us.achievement_points, us.level
             """
             
-            user_result = self.db.execute(text(user_query), {"user_id": user_id}).fetchone()
+            user_result = self._fetch(text(user_query), {"user_id": user_id}, one=True)
             
             if not user_result:
                 return None
@@ -155,7 +162,7 @@ class AnalyticsService:
                 LIMIT 1000
             """
             
-            events_results = self.db.execute(text(events_query), {"user_id": user_id}).fetchall()
+            events_results = self._fetch(text(events_query), {"user_id": user_id})
             
             # Анализ поведения
             behavior_analysis = self.analyze_user_behavior(events_results, user_result)
@@ -418,10 +425,10 @@ class AnalyticsService:
                 ORDER BY week
             """
             
-            registration_results = self.db.execute(text(registration_query), {
+            registration_results = self._fetch(text(registration_query), {
                 "start_date": start_date,
                 "end_date": end_date
-            }).fetchall()
+            })
             
             # Получение данных об активности по неделям
             activity_query = """
@@ -436,10 +443,10 @@ class AnalyticsService:
                 ORDER BY registration_week, activity_week
             """
             
-            activity_results = self.db.execute(text(activity_query), {
+            activity_results = self._fetch(text(activity_query), {
                 "start_date": start_date,
                 "end_date": end_date
-            }).fetchall()
+            })
             
             # Формирование когортного анализа
             cohorts = {}
@@ -496,10 +503,10 @@ class AnalyticsService:
                 
                 start_date = time.time() - (30 * 24 * 3600)  # Последние 30 дней
                 
-                result = self.db.execute(text(query), {
+                result = self._fetch(text(query), {
                     "event_name": event_name,
                     "start_date": start_date
-                }).fetchone()
+                }, one=True)
                 
                 funnel_data[stage] = result[0] if result else 0
             
@@ -548,9 +555,9 @@ class AnalyticsService:
                 WHERE timestamp >= :hour_ago
             """
             
-            active_users_result = self.db.execute(text(active_users_query), {
+            active_users_result = self._fetch(text(active_users_query), {
                 "hour_ago": hour_ago
-            }).fetchone()
+            }, one=True)
             
             # События за последний час
             events_query = """
@@ -562,9 +569,9 @@ class AnalyticsService:
                 GROUP BY event_type
             """
             
-            events_results = self.db.execute(text(events_query), {
+            events_results = self._fetch(text(events_query), {
                 "hour_ago": hour_ago
-            }).fetchall()
+            })
             
             # Новые регистрации за последний день
             new_registrations_query = """
@@ -573,9 +580,9 @@ class AnalyticsService:
                 WHERE created_at >= :day_ago
             """
             
-            new_registrations_result = self.db.execute(text(new_registrations_query), {
+            new_registrations_result = self._fetch(text(new_registrations_query), {
                 "day_ago": day_ago
-            }).fetchone()
+            }, one=True)
             
             return {
                 "active_users_last_hour": active_users_result[0] if active_users_result else 0,
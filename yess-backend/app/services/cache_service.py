@@ -1,54 +1,54 @@
 from redis import Redis
 from typing import Any, Optional
-import json
+
+from app.core.cache import RedisCache, cached, redis_cache
+from app.core.cache_codec import CacheCodec
 
 class CacheService:
-    def __init__(self, redis_host: str = 'redis', redis_port: int = 6379):
-        self.redis = Redis(host=redis_host, port=redis_port, decode_responses=True)
+    """
+    Синхронный кэш сервисов поверх RedisCache (метрики - под именем cache_service)
+    """
+    # Все ключи сервиса регистрируются в этом теге - очистка без FLUSHDB
+    TAG = "cache_service"
+
+    def __init__(self, redis_host: str = 'redis', redis_port: int = 6379, codec: Optional[CacheCodec] = None):
+        self.cache = RedisCache(
+            url=f"redis://{redis_host}:{redis_port}/0",
+            codec=codec or redis_cache.codec,
+            name="cache_service"
+        )
+        self.codec = self.cache.codec
         self.default_expiry = 3600  # 1 час по умолчанию
 
+    @property
+    def redis(self) -> Redis:
+        return self.cache.sync_redis
+
     def set(self, key: str, value: Any, expiry: Optional[int] = None):
         """Установка значения в кэш"""
-        expiry = expiry or self.default_expiry
-        serialized_value = json.dumps(value)
-        self.redis.setex(key, expiry, serialized_value)
+        return self.cache.set_sync(key, value, ttl=expiry or self.default_expiry, tags=(self.TAG,))
 
     def get(self, key: str) -> Optional[Any]:
         """Получение значения из кэша"""
-        cached_value = self.redis.get(key)
-        if cached_value:
-            return json.loads(cached_value)
-        return None
+        return self.cache.get_sync(key)
 
     def delete(self, key: str):
         """Удаление ключа из кэша"""
-        self.redis.delete(key)
+        self.cache.delete_sync(key)
 
     def clear_cache(self):
-        """Полная очистка кэша"""
-        self.redis.flushdb()
-
-    def cache_method(self, expiry: Optional[int] = None):
-        """Декоратор для кэширования методов"""
-        def decorator(func):
-            def wrapper(*args, **kwargs):
-                # Создание уникального ключа на основе аргументов
-                cache_key = f"{func.__name__}:{hash(str(args) + str(kwargs))}"
-                
-                # Проверка кэша
-                cached_result = self.get(cache_key)
-                if cached_result is not None:
-                    return cached_result
-                
-                # Выполнение метода
-                result = func(*args, **kwargs)
-                
-                # Кэширование результата
-                self.set(cache_key, result, expiry)
-                
-                return result
-            return wrapper
-        return decorator
+        """Очистка всех ключей сервиса (порциями, не блокируя Redis)"""
+        return self.cache.invalidate_tags_sync(self.TAG)
+
+    def cache_method(self, expiry: Optional[int] = None, **options):
+        """
+        Декоратор для кэширования методов (обычных и async)
+
+        Ключ строится из аргументов детерминированно - один для всех воркеров,
+        self и сессии БД в него не входят (app.core.cache.cached, там же
+        остальные options). Записи помечены тегом сервиса и удаляются clear_cache.
+        """
+        return cached(ttl=expiry or self.default_expiry, tags=(self.TAG,), cache=self.cache, **options)
 
 # Глобальный экземпляр сервиса
 cache_service = CacheService()
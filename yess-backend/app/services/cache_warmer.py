@@ -0,0 +1,248 @@
+"""
+Прогрев кэша после деплоя, перезапуска Redis и по расписанию
+
+Наборы данных объявляются декоратором cache_warmer.dataset: функция
+получает сессию БД и возвращает задачи прогрева, по одной на запись кэша.
+Задачи выполняются параллельно, не больше CACHE_WARM_CONCURRENCY
+одновременно, у каждой своя сессия. Значения пересчитываются через
+refresh функций с @cached - под теми же ключами, что читают запросы.
+Загрузчики - синхронные функции (запросы через Session): refresh
+выполняет их в потоке, поэтому задачи действительно идут параллельно и
+не блокируют event loop воркера.
+
+Запуск вручную: python -m scripts.warm_cache. В приложении:
+
+    app.add_event_handler("startup", cache_warmer.start)
+    app.add_event_handler("shutdown", cache_warmer.stop)
+
+При старте прогрев идёт в фоне и не задерживает готовность воркера;
+из всех воркеров кластера его выполняет один (блокировка в Redis).
+"""
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import RedisCache, redis_cache
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.achievement_service import AchievementService
+from app.services.partner_catalog_service import active_city_ids, list_categories, list_partners
+from app.services.recommendation_service import RecommendationService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmTask:
+    """Прогрев одной записи кэша"""
+    dataset: str
+    label: str
+    run: Callable[[Session], Awaitable[Any]]
+
+
+@dataclass
+class WarmReport:
+    """Итог прогрева по наборам данных"""
+    succeeded: Dict[str, int] = field(default_factory=dict)
+    failed: Dict[str, int] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(self.succeeded.values()) + sum(self.failed.values())
+
+    def record(self, dataset: str, label: str, error: Optional[Exception]) -> None:
+        if error is None:
+            self.succeeded[dataset] = self.succeeded.get(dataset, 0) + 1
+        else:
+            self.failed[dataset] = self.failed.get(dataset, 0) + 1
+            self.errors.append(f"{dataset} [{label}]: {error}")
+
+
+ProgressCallback = Callable[[int, int, WarmTask, Optional[Exception]], None]
+
+
+class CacheWarmer:
+    """Реестр наборов данных для прогрева и их параллельное выполнение"""
+
+    LOCK_NAME = "cache_warm"
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        concurrency: int = 4,
+        cache: Optional[RedisCache] = None
+    ):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.cache = cache or redis_cache
+        self._datasets: Dict[str, Callable[[Session], Iterable[WarmTask]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def dataset(self, name: str):
+        """Регистрация набора: функция (db) -> задачи прогрева"""
+        def decorator(func: Callable[[Session], Iterable[WarmTask]]):
+            self._datasets[name] = func
+            return func
+        return decorator
+
+    @property
+    def datasets(self) -> List[str]:
+        return list(self._datasets)
+
+    async def _plan(self, names: Iterable[str], report: WarmReport) -> List[WarmTask]:
+        tasks = []
+        for name in names:
+            planner = self._datasets.get(name)
+            if planner is None:
+                raise ValueError(f"Unknown cache dataset: {name}")
+            db = self.session_factory()
+            try:
+                # Планирование может читать БД (список городов) - в потоке
+                tasks.extend(await asyncio.to_thread(lambda: list(planner(db))))
+            except Exception as e:
+                report.record(name, "plan", e)
+            finally:
+                db.close()
+        return tasks
+
+    async def warm(
+        self,
+        names: Optional[Iterable[str]] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> WarmReport:
+        """
+        Прогрев наборов names (по умолчанию всех)
+        Ошибка задачи не останавливает остальные и попадает в отчёт
+        """
+        started = time.perf_counter()
+        report = WarmReport()
+        tasks = await self._plan(list(names or self._datasets), report)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        done = 0
+
+        async def run(task: WarmTask) -> None:
+            nonlocal done
+            error = None
+            async with semaphore:
+                db = self.session_factory()
+                try:
+                    await task.run(db)
+                except Exception as e:
+                    error = e
+                finally:
+                    db.close()
+            done += 1
+            report.record(task.dataset, task.label, error)
+            if progress is not None:
+                progress(done, len(tasks), task, error)
+
+        await asyncio.gather(*(run(task) for task in tasks))
+        report.duration = time.perf_counter() - started
+
+        logger.info(
+            f"Cache warmed: {sum(report.succeeded.values())}/{report.total} entries "
+            f"in {report.duration:.1f}s"
+        )
+        for error in report.errors:
+            logger.error(f"Cache warm error: {error}")
+        return report
+
+    async def warm_once(self, lock_timeout: float) -> Optional[WarmReport]:
+        """
+        Прогрев одним воркером кластера: блокировка не снимается, и
+        остальные воркеры пропускают прогрев до её истечения
+        """
+        if await self.cache.acquire_lock(self.LOCK_NAME, lock_timeout) is None:
+            logger.info("Cache warm skipped: running in another worker")
+            return None
+        return await self.warm()
+
+    async def _schedule(self, on_startup: bool, interval: int) -> None:
+        lock_timeout = interval * 0.9 if interval else 60
+        if not on_startup:
+            await asyncio.sleep(interval)
+        while True:
+            try:
+                await self.warm_once(lock_timeout)
+            except Exception as e:
+                logger.error(f"Cache warm failed: {str(e)}")
+            if not interval:
+                return
+            await asyncio.sleep(interval)
+
+    async def start(self) -> None:
+        """Обработчик startup: прогрев в фоне и далее каждые CACHE_WARM_INTERVAL секунд"""
+        if not settings.CACHE_WARM_ON_STARTUP and not settings.CACHE_WARM_INTERVAL:
+            return
+        self._task = asyncio.get_running_loop().create_task(
+            self._schedule(settings.CACHE_WARM_ON_STARTUP, settings.CACHE_WARM_INTERVAL)
+        )
+
+    async def stop(self) -> None:
+        """Обработчик shutdown"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+
+
+# Singleton instance
+cache_warmer = CacheWarmer(concurrency=settings.CACHE_WARM_CONCURRENCY)
+
+
+@cache_warmer.dataset("partners_by_city")
+def partners_by_city(db: Session) -> List[WarmTask]:
+    """Каталог целиком и по каждому городу (/partner/list)"""
+    tasks = [WarmTask("partners_by_city", "all", lambda session: list_partners.refresh(session))]
+    for city_id in active_city_ids(db):
+        tasks.append(WarmTask(
+            "partners_by_city",
+            f"city {city_id}",
+            lambda session, city_id=city_id: list_partners.refresh(session, city_id=city_id)
+        ))
+    return tasks
+
+
+@cache_warmer.dataset("categories")
+def categories(db: Session) -> List[WarmTask]:
+    """/partners/categories и /partner/categories"""
+    return [WarmTask("categories", "all", lambda session: list_categories.refresh(session))]
+
+
+@cache_warmer.dataset("trending")
+def trending(db: Session) -> List[WarmTask]:
+    """/partners/trending с лимитом по умолчанию"""
+    return [WarmTask(
+        "trending",
+        "top 10",
+        lambda session: RecommendationService.get_trending_partners.refresh(RecommendationService, session)
+    )]
+
+
+@cache_warmer.dataset("promotions")
+def promotions(db: Session) -> List[WarmTask]:
+    """Действующие акции (/promotions без фильтров)"""
+    # Функция объявлена рядом с эндпоинтом вместе со схемой ответа
+    from app.api.v1.endpoints.promotions import active_promotions
+
+    return [WarmTask("promotions", "active", lambda session: active_promotions.refresh(session))]
+
+
+@cache_warmer.dataset("leaderboard")
+def leaderboard(db: Session) -> List[WarmTask]:
+    """Таблица лидеров достижений"""
+    size = settings.CACHE_WARM_LEADERBOARD_SIZE
+    return [WarmTask(
+        "leaderboard",
+        f"top {size}",
+        lambda session: AchievementService.get_leaderboard.refresh(AchievementService(session), size)
+    )]
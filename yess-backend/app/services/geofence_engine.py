@@ -0,0 +1,317 @@
+"""
+Пакетный матчинг геопозиций пользователей с геозонами партнёров
+
+Активные геозоны (центр локации + радиус) держатся в памяти в сетке,
+где ячейка не меньше максимального радиуса. Кандидаты для всех пингов
+пакета (3x3 соседние ячейки) разворачиваются в плоский список пар,
+и расстояния считаются одним векторным вызовом. Повторные срабатывания
+user+partner внутри окна cooldown подавляются: в памяти процесса (записи
+старше окна удаляются по ходу обработки) и, в process_async, ключом
+SET NX EX в Redis - окно общее для всех воркеров.
+"""
+import math
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.cache import RedisCache, redis_cache
+from app.core.config import settings
+from app.core.geo import KM_PER_DEGREE_LAT, haversine_km_batch
+from app.models.partner import Partner, PartnerLocation
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Geofence:
+    """Геозона локации партнёра"""
+    location_id: int
+    partner_id: int
+    latitude: float
+    longitude: float
+    radius_km: float
+
+
+@dataclass(frozen=True)
+class LocationPing:
+    """Геопозиция пользователя"""
+    user_id: int
+    latitude: float
+    longitude: float
+    timestamp: Optional[float] = None  # unix time, по умолчанию - время обработки
+
+
+@dataclass(frozen=True)
+class GeofenceHit:
+    """Пользователь вошёл в геозону партнёра"""
+    user_id: int
+    partner_id: int
+    location_id: int
+    distance_km: float
+    timestamp: float
+
+
+class CooldownTracker:
+    """Подавление повторных событий user+partner внутри окна"""
+
+    KEY_PREFIX = "geofence:cooldown"
+
+    def __init__(self, cooldown_seconds: float, cache: Optional[RedisCache] = None, prune_interval: float = 60):
+        self.cooldown_seconds = cooldown_seconds
+        # RedisCache для окна, общего между воркерами; None - только процесс
+        self.cache = cache
+        self.prune_interval = min(prune_interval, cooldown_seconds)
+        self._last_seen: Dict[Tuple[int, int], float] = {}
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _shared_key(self, user_id: int, partner_id: int) -> str:
+        return f"{self.KEY_PREFIX}:{user_id}:{partner_id}"
+
+    def allow(self, user_id: int, partner_id: int, timestamp: float) -> bool:
+        key = (user_id, partner_id)
+        if time.monotonic() - self._pruned_at >= self.prune_interval:
+            self.prune()
+        with self._lock:
+            last = self._last_seen.get(key)
+            if last is not None and timestamp - last < self.cooldown_seconds:
+                return False
+            self._last_seen[key] = timestamp
+            return True
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Удаление истёкших записей"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._pruned_at = time.monotonic()
+            expired = [key for key, ts in self._last_seen.items() if now - ts >= self.cooldown_seconds]
+            for key in expired:
+                del self._last_seen[key]
+        return len(expired)
+
+    async def allow_shared(self, hits: Sequence["GeofenceHit"]) -> List["GeofenceHit"]:
+        """
+        Попадания, прошедшие локальный cooldown, которые не отправлял ни один
+        воркер: ключ SET NX EX на окно. Без Redis - решение процесса
+        """
+        if self.cache is None or not hits:
+            return list(hits)
+        claimed = await self.cache.claim_many(
+            (self._shared_key(hit.user_id, hit.partner_id) for hit in hits),
+            ttl=max(1, int(self.cooldown_seconds))
+        )
+        if claimed is None:
+            return list(hits)
+        return [hit for hit, ok in zip(hits, claimed) if ok]
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+
+class GeofenceEngine:
+    """In-memory движок геозон"""
+
+    # Упаковка (lat_cell, lon_cell) в один int64 ключ
+    _CELL_KEY_BASE = 1 << 31
+    _NEIGHBOURS = tuple((dlat, dlon) for dlat in (-1, 0, 1) for dlon in (-1, 0, 1))
+
+    def __init__(
+        self,
+        default_radius_km: float = 0.5,
+        cooldown_seconds: float = 6 * 3600,
+        cache: Optional[RedisCache] = None
+    ):
+        self.default_radius_km = default_radius_km
+        self.cooldown = CooldownTracker(cooldown_seconds, cache=cache)
+        self._geofences: List[Geofence] = []
+        self._lats = np.empty(0)
+        self._lons = np.empty(0)
+        self._radii = np.empty(0)
+        self._partner_ids = np.empty(0, dtype=np.int64)
+        # Индексы геозон, отсортированные по ключу ячейки
+        self._sorted_keys = np.empty(0, dtype=np.int64)
+        self._sorted_ids = np.empty(0, dtype=np.int64)
+        self._cell_lat_deg = 1.0
+        self._cell_lon_deg = 1.0
+        self._lock = threading.RLock()
+        self._loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._geofences)
+
+    # Загрузка геозон
+
+    def _cell_keys(self, lat_cells: np.ndarray, lon_cells: np.ndarray) -> np.ndarray:
+        return lat_cells * self._CELL_KEY_BASE + lon_cells
+
+    def load(self, geofences: Iterable[Geofence]) -> int:
+        geofences = list(geofences)
+        lats = np.array([g.latitude for g in geofences], dtype=np.float64)
+        lons = np.array([g.longitude for g in geofences], dtype=np.float64)
+        radii = np.array([g.radius_km for g in geofences], dtype=np.float64)
+        partner_ids = np.array([g.partner_id for g in geofences], dtype=np.int64)
+
+        # Ячейка не меньше максимального радиуса - достаточно соседей 3x3
+        max_radius = float(radii.max()) if len(radii) else self.default_radius_km
+        max_abs_lat = float(np.abs(lats).max()) if len(lats) else 0.0
+        cell_lat_deg = max_radius / KM_PER_DEGREE_LAT
+        cell_lon_deg = max_radius / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(max_abs_lat)), 0.01))
+
+        keys = self._cell_keys(
+            np.floor(lats / cell_lat_deg).astype(np.int64),
+            np.floor(lons / cell_lon_deg).astype(np.int64)
+        )
+        sorted_ids = np.argsort(keys, kind="stable")
+
+        with self._lock:
+            self._geofences = geofences
+            self._lats, self._lons, self._radii = lats, lons, radii
+            self._partner_ids = partner_ids
+            self._cell_lat_deg, self._cell_lon_deg = cell_lat_deg, cell_lon_deg
+            self._sorted_keys = keys[sorted_ids]
+            self._sorted_ids = sorted_ids
+            self._loaded_at = time.monotonic()
+
+        return len(geofences)
+
+    def load_from_db(self, db: Session) -> int:
+        """Загрузка геозон активных локаций активных партнёров"""
+        locations = db.query(PartnerLocation).join(Partner).filter(
+            PartnerLocation.is_active == True,
+            Partner.is_active == True,
+            PartnerLocation.latitude.isnot(None),
+            PartnerLocation.longitude.isnot(None)
+        ).all()
+
+        count = self.load(
+            Geofence(
+                location_id=loc.id,
+                partner_id=loc.partner_id,
+                latitude=float(loc.latitude),
+                longitude=float(loc.longitude),
+                radius_km=self.default_radius_km
+            ) for loc in locations
+        )
+        logger.info(f"Geofence engine loaded: {count} geofences")
+        return count
+
+    def ensure_loaded(self, db: Session, max_age_seconds: Optional[int] = None) -> None:
+        if self._loaded_at is None or (
+            max_age_seconds and time.monotonic() - self._loaded_at > max_age_seconds
+        ):
+            self.load_from_db(db)
+
+    # Матчинг
+
+    def _candidate_pairs(self, ping_lats: np.ndarray, ping_lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Пары (пинг, геозона) из соседних 3x3 ячеек"""
+        lat_cells = np.floor(ping_lats / self._cell_lat_deg).astype(np.int64)
+        lon_cells = np.floor(ping_lons / self._cell_lon_deg).astype(np.int64)
+        ping_range = np.arange(len(ping_lats))
+
+        ping_parts, geofence_parts = [], []
+        for dlat, dlon in self._NEIGHBOURS:
+            keys = self._cell_keys(lat_cells + dlat, lon_cells + dlon)
+            lo = np.searchsorted(self._sorted_keys, keys, side="left")
+            hi = np.searchsorted(self._sorted_keys, keys, side="right")
+            counts = hi - lo
+            total = int(counts.sum())
+            if not total:
+                continue
+
+            # Разворачиваем диапазоны [lo, hi) в плоский список пар
+            starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+            ping_parts.append(np.repeat(ping_range, counts))
+            geofence_parts.append(self._sorted_ids[starts + np.arange(total)])
+
+        if not ping_parts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(ping_parts), np.concatenate(geofence_parts)
+
+    def match(self, pings: Sequence[LocationPing], radius_km: Optional[float] = None) -> List[GeofenceHit]:
+        """
+        Все попадания пингов в геозоны (без cooldown)
+        Для каждой пары user+partner остаётся ближайшая локация
+
+        :param radius_km: переопределение радиуса всех геозон
+        """
+        if not pings or not self._geofences:
+            return []
+
+        now = time.time()
+        ping_lats = np.fromiter((p.latitude for p in pings), dtype=np.float64, count=len(pings))
+        ping_lons = np.fromiter((p.longitude for p in pings), dtype=np.float64, count=len(pings))
+        user_ids = np.fromiter((p.user_id for p in pings), dtype=np.int64, count=len(pings))
+
+        with self._lock:
+            geofences = self._geofences
+            lats, lons, radii, partner_ids = self._lats, self._lons, self._radii, self._partner_ids
+
+            if radius_km is not None and radius_km > self._cell_lat_deg * KM_PER_DEGREE_LAT:
+                # Радиус больше ячейки - соседей 3x3 недостаточно, полный перебор
+                ping_idx = np.repeat(np.arange(len(pings)), len(geofences))
+                geofence_idx = np.tile(np.arange(len(geofences)), len(pings))
+            else:
+                ping_idx, geofence_idx = self._candidate_pairs(ping_lats, ping_lons)
+
+        if not len(ping_idx):
+            return []
+
+        distances = haversine_km_batch(
+            ping_lats[ping_idx], ping_lons[ping_idx],
+            lats[geofence_idx], lons[geofence_idx]
+        )
+        inside = distances <= (radius_km if radius_km is not None else radii[geofence_idx])
+        ping_idx, geofence_idx, distances = ping_idx[inside], geofence_idx[inside], distances[inside]
+        if not len(ping_idx):
+            return []
+
+        # Ближайшая локация для каждой пары user+partner
+        hit_users = user_ids[ping_idx]
+        hit_partners = partner_ids[geofence_idx]
+        order = np.lexsort((distances, hit_partners, hit_users))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (
+            (hit_users[order][1:] != hit_users[order][:-1])
+            | (hit_partners[order][1:] != hit_partners[order][:-1])
+        )
+        selected = order[first]
+
+        hits = []
+        for ping_i, geofence_i, distance in zip(
+            ping_idx[selected].tolist(), geofence_idx[selected].tolist(), distances[selected].tolist()
+        ):
+            ping = pings[ping_i]
+            geofence = geofences[geofence_i]
+            hits.append(GeofenceHit(
+                user_id=ping.user_id,
+                partner_id=geofence.partner_id,
+                location_id=geofence.location_id,
+                distance_km=distance,
+                timestamp=ping.timestamp if ping.timestamp is not None else now
+            ))
+        return hits
+
+    def process(self, pings: Sequence[LocationPing], radius_km: Optional[float] = None) -> Iterator[GeofenceHit]:
+        """Поток попаданий с подавлением повторов внутри cooldown"""
+        for hit in self.match(pings, radius_km=radius_km):
+            if self.cooldown.allow(hit.user_id, hit.partner_id, hit.timestamp):
+                yield hit
+
+    async def process_async(self, pings: Sequence[LocationPing], radius_km: Optional[float] = None) -> List[GeofenceHit]:
+        """process с cooldown, общим для всех воркеров (Redis)"""
+        return await self.cooldown.allow_shared(list(self.process(pings, radius_km=radius_km)))
+
+
+# Singleton
+geofence_engine = GeofenceEngine(
+    default_radius_km=settings.PROXIMITY_GEOFENCE_RADIUS_KM,
+    cooldown_seconds=settings.PROXIMITY_OFFER_COOLDOWN_SECONDS,
+    cache=redis_cache
+)
@@ -10,13 +10,19 @@ import logging
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text, or_
-from math import radians, sin, cos, sqrt, atan2
-from functools import lru_cache
-import requests
 import logging
 
-from app.core.cache import redis_cache
-from app.models.partner import Partner, PartnerLocation
+from app.core.config import settings
+from app.core.geo import haversine_km, path_legs_km
+from app.core.working_hours import is_open_at, week_minute
+from app.services.spatial_index import partner_spatial_index
+from app.services.nearby_cache import nearby_partners_cache
+from app.services.partner_search_service import partner_search_service
+from app.services.map_tile_service import map_tile_service
+from app.core.map_client import map_client, route_cache_key
+from app.services.route_optimizer import route_optimizer
+from app.services.route_service import RouteService
+from app.models.partner import Partner as PartnerModel, PartnerLocation
 from app.schemas.partner import (
     PartnerLocationResponse, 
     NearbyPartnerRequest, 
@@ -63,112 +69,6 @@ class GeolocationService:
         self.db = db_session
         self.earth_radius = 6371  # Радиус Земли в километрах
         
-    def calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """
-        Расчет расстояния между двумя точками по формуле Haversine
-        """
-        # Преобразование в радианы
-        lat1_rad = math.radians(lat1)
-        lon1_rad = math.radians(lon1)
-        lat2_rad = math.radians(lat2)
-        lon2_rad = math.radians(lon2)
-        
-        # Разности координат
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
-        
-        # Формула Haversine
-        a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        return self.earth_radius * c
-    
-    def find_nearby_partners(
-        self, 
-        user_lat: float, 
-        user_lon: float, 
-        radius_km: float = 5.0,
-        category: Optional[PartnerCategory] = None,
-        limit: int = 50
-    ) -> List[Partner]:
-        """
-        Поиск партнеров поблизости
-        """
-        try:
-            # Базовый запрос
-            base_query = """
-                SELECT 
-                    p.id,
-                    p.name,
-                    p.category,
-                    p.latitude,
-                    p.longitude,
-                    p.address,
-                    p.city,
-                    p.rating,
-                    p.is_open,
-                    p.discount_percent,
-                    (
-                        6371 * acos(
-                            cos(radians(:user_lat)) * cos(radians(p.latitude)) * 
-                            cos(radians(p.longitude) - radians(:user_lon)) + 
-                            sin(radians(:user_lat)) * sin(radians(p.latitude))
-                        )
-                    ) AS distance
-                FROM partners p
-                WHERE p.is_active = true
-                AND (
-                    6371 * acos(
-                        cos(radians(:user_lat)) * cos(radians(p.latitude)) * 
-                        cos(radians(p.longitude) - radians(:user_lon)) + 
-                        sin(radians(:user_lat)) * sin(radians(p.latitude))
-                    )
-                ) <= :radius_km
-            """
-            
-            params = {
-                'user_lat': user_lat,
-                'user_lon': user_lon,
-                'radius_km': radius_km
-            }
-            
-            # Добавление фильтра по категории
-            if category:
-                base_query += " AND p.category = :category"
-                params['category'] = category.value
-            
-            # Сортировка по расстоянию и лимит
-            base_query += " ORDER BY distance ASC LIMIT :limit"
-            params['limit'] = limit
-            
-            query = text(base_query)
-            results = self.db.execute(query, params).fetchall()
-            
-            partners = []
-            for row in results:
-                partner = Partner(
-                    id=row[0],
-                    name=row[1],
-                    category=PartnerCategory(row[2]),
-                    location=Location(
-                        latitude=row[3],
-                        longitude=row[4],
-                        address=row[5],
-                        city=row[6]
-                    ),
-                    rating=float(row[7]),
-                    distance=float(row[10]),
-                    is_open=row[8],
-                    discount_percent=float(row[9])
-                )
-                partners.append(partner)
-            
-            return partners
-            
-        except Exception as e:
-            logger.error(f"Error finding nearby partners: {e}")
-            return []
-    
     def get_partners_by_category(
         self, 
         category: PartnerCategory, 
@@ -306,75 +206,41 @@ class GeolocationService:
         Поиск партнеров по названию или описанию
         """
         try:
-            base_query = """
-                SELECT 
-                    p.id,
-                    p.name,
-                    p.category,
-                    p.latitude,
-                    p.longitude,
-                    p.address,
-                    p.city,
-                    p.rating,
-                    p.is_open,
-                    p.discount_percent
-                FROM partners p
-                WHERE p.is_active = true
-                AND (
-                    LOWER(p.name) LIKE LOWER(:search_query)
-                    OR LOWER(p.description) LIKE LOWER(:search_query)
-                    OR LOWER(p.address) LIKE LOWER(:search_query)
-                )
-            """
-            
-            params = {'search_query': f'%{query}%'}
-            
-            # Если указаны координаты пользователя, добавляем фильтр по расстоянию
-            if user_lat and user_lon:
-                base_query += """
-                    AND (
-                        6371 * acos(
-                            cos(radians(:user_lat)) * cos(radians(p.latitude)) * 
-                            cos(radians(p.longitude) - radians(:user_lon)) + 
-                            sin(radians(:user_lat)) * sin(radians(p.latitude))
-                        )
-                    ) <= :radius_km
-                """
-                params.update({
-                    'user_lat': user_lat,
-                    'user_lon': user_lon,
-                    'radius_km': radius_km
-                })
-            
-            base_query += " ORDER BY p.rating DESC LIMIT :limit"
-            params['limit'] = limit
-            
-            sql_query = text(base_query)
-            results = self.db.execute(sql_query, params).fetchall()
+            # Ранжирование PartnerSearchService: текст + похожесть + рейтинг + близость,
+            # радиус - bounding box по индексу координат и точный Haversine
+            has_point = user_lat is not None and user_lon is not None
+            hits = partner_search_service.search(
+                self.db,
+                query,
+                latitude=user_lat,
+                longitude=user_lon,
+                radius_km=radius_km if has_point else None,
+                limit=limit
+            )
             
             partners = []
-            for row in results:
+            for hit in hits:
+                try:
+                    category = PartnerCategory(hit.partner.category)
+                except ValueError:
+                    logger.warning(f"Unknown category {hit.partner.category!r} for partner {hit.partner.id}")
+                    continue
+                # Адрес у локаций, город - отдельная связь: не подгружаем (N+1)
                 partner = Partner(
-                    id=row[0],
-                    name=row[1],
-                    category=PartnerCategory(row[2]),
+                    id=hit.partner.id,
+                    name=hit.partner.name,
+                    category=category,
                     location=Location(
-                        latitude=row[3],
-                        longitude=row[4],
-                        address=row[5],
-                        city=row[6]
+                        latitude=hit.partner.latitude,
+                        longitude=hit.partner.longitude,
+                        address=None,
+                        city=None
                     ),
-                    rating=float(row[7]),
-                    is_open=row[8],
-                    discount_percent=float(row[9])
+                    rating=float(hit.partner.rating or 0),
+                    distance=hit.distance_km,
+                    discount_percent=float(hit.partner.max_discount_percent or 0)
                 )
                 
-                # Расчет расстояния если указаны координаты пользователя
-                if user_lat and user_lon:
-                    partner.distance = self.calculate_distance(
-                        user_lat, user_lon, partner.location.latitude, partner.location.longitude
-                    )
-                
                 partners.append(partner)
             
             return partners
@@ -384,7 +250,6 @@ class GeolocationService:
             return []
 
     @classmethod
-    @lru_cache(maxsize=1000)
     def calculate_distance(
         cls, 
         lat1: float, 
@@ -393,22 +258,13 @@ class GeolocationService:
         lon2: float
     ) -> float:
         """
-        Кэшированное вычисление расстояния с использованием формулы Хаверсина
+        Расстояние между двумя точками по формуле Хаверсина (км)
+        Для множества точек используйте haversine_km_batch / distance_matrix_km
         """
-        R = 6371  # Радиус Земли в километрах
-        
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        
-        return R * c
+        return haversine_km(lat1, lon1, lat2, lon2)
 
     @classmethod
-    def find_nearby_partners(
+    async def find_nearby_partners(
         cls, 
         db: Session, 
         request: NearbyPartnerRequest,
@@ -417,68 +273,69 @@ class GeolocationService:
         """
         Оптимизированный поиск ближайших партнеров с расширенной фильтрацией
         """
-        # Кэш-ключ для запроса
-        cache_key = f"nearby_partners:{request.latitude}:{request.longitude}:{request.radius}"
-        
-        # Попытка получить из кэша
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            return cached_result
-        
-        # Базовый запрос с пространственным поиском
-        query = db.query(PartnerLocation).filter(
-            func.ST_DWithin(
-                PartnerLocation.geom, 
-                func.ST_MakePoint(request.longitude, request.latitude),
-                request.radius * 1000  # Перевод в метры
-            )
-        )
-        
+        radius = request.radius
+        categories = None
+        min_cashback = None
+        is_verified = None
+        open_minute = None
+
         # Дополнительная фильтрация
         if filter_request:
             if filter_request.categories:
-                query = query.filter(
-                    Partner.category.in_(filter_request.categories)
-                )
+                categories = set(filter_request.categories)
             
             if filter_request.min_cashback:
-                query = query.filter(
-                    Partner.default_cashback_rate >= filter_request.min_cashback
-                )
+                min_cashback = filter_request.min_cashback
             
             if filter_request.is_verified:
-                query = query.filter(Partner.is_verified == True)
-        
-        # Выполнение запроса
-        nearby_locations = query.all()
-        
-        # Сортировка по расстоянию
-        nearby_locations.sort(
-            key=lambda loc: cls.calculate_distance(
-                request.latitude, request.longitude, 
-                loc.latitude, loc.longitude
+                is_verified = True
+
+            if filter_request.max_distance:
+                radius = min(radius, filter_request.max_distance)
+            
+            if filter_request.open_at:
+                open_minute = week_minute(filter_request.open_at, settings.TIMEZONE)
+            elif filter_request.open_now:
+                open_minute = week_minute(timezone=settings.TIMEZONE)
+        
+        # Кэш по ячейке geohash: кандидаты общие для всех пользователей ячейки
+        cell = nearby_partners_cache.cell_of(request.latitude, request.longitude)
+        cached_radius = nearby_partners_cache.quantize_radius(radius)
+        signature = nearby_partners_cache.filter_signature(categories, min_cashback, is_verified)
+        
+        candidates = await nearby_partners_cache.get_candidates(cell, cached_radius, signature)
+        if candidates is None:
+            # Поиск по in-memory индексу вместо полного прохода по таблице
+            partner_spatial_index.ensure_built(db)
+            
+            center_lat, center_lon, area_radius = nearby_partners_cache.candidate_area(cell, cached_radius)
+            candidates = [
+                entry.to_response_dict()
+                for entry, _distance in partner_spatial_index.query(
+                    center_lat,
+                    center_lon,
+                    area_radius,
+                    categories=categories,
+                    min_cashback=min_cashback,
+                    is_verified=is_verified
+                )
+            ]
+            await nearby_partners_cache.set_candidates(cell, cached_radius, signature, candidates)
+        
+        # Фильтр по времени работы не зависит от ячейки и применяется к кэшу
+        if open_minute is not None:
+            candidates = [
+                item for item in candidates
+                if is_open_at(item.get("open_intervals"), open_minute)
+            ]
+        
+        # Точная пересортировка для реальной позиции пользователя
+        return [
+            PartnerLocationResponse(**item)
+            for item in nearby_partners_cache.rerank(
+                candidates, request.latitude, request.longitude, radius, request.limit
             )
-        )
-        
-        # Преобразование в ответ
-        result = [
-            PartnerLocationResponse(
-                id=loc.id,
-                partner_id=loc.partner_id,
-                partner_name=loc.partner.name,
-                address=loc.address,
-                latitude=loc.latitude,
-                longitude=loc.longitude,
-                phone_number=loc.phone_number,
-                working_hours=loc.working_hours,
-                max_discount_percent=loc.partner.default_cashback_rate
-            ) for loc in nearby_locations
         ]
-        
-        # Кэширование результата
-        redis_cache.set(cache_key, result, expire=cls.CACHE_EXPIRATION)
-        
-        return result
 
     @classmethod
     def build_route(
@@ -502,24 +359,29 @@ class GeolocationService:
             raise NotFoundException("Одна или несколько локаций не найдены")
         
         # Сортировка локаций по порядку в запросе
-        sorted_locations = sorted(
-            locations, 
-            key=lambda loc: request.partner_location_ids.index(loc.id)
-        )
+        positions = {loc_id: i for i, loc_id in enumerate(request.partner_location_ids)}
+        sorted_locations = sorted(locations, key=lambda loc: positions[loc.id])
+        
+        # Оптимизация порядка: старт фиксирован первой локацией запроса
+        if request.optimize_order:
+            result = route_optimizer.optimize_points(
+                [loc.latitude for loc in sorted_locations],
+                [loc.longitude for loc in sorted_locations],
+                start=0
+            )
+            sorted_locations = [sorted_locations[i] for i in result.order]
         
-        # Расчет маршрута
+        # Расчет маршрута: длины всех отрезков одним вызовом
+        legs = path_legs_km(
+            [loc.latitude for loc in sorted_locations],
+            [loc.longitude for loc in sorted_locations]
+        )
         route_points = []
-        total_distance = 0
         
-        for i in range(len(sorted_locations) - 1):
+        for i, distance in enumerate(legs):
             start = sorted_locations[i]
             end = sorted_locations[i + 1]
             
-            distance = cls.calculate_distance(
-                start.latitude, start.longitude,
-                end.latitude, end.longitude
-            )
-            
             route_points.append({
                 'start': {
                     'name': start.partner.name,
@@ -533,10 +395,10 @@ class GeolocationService:
                     'latitude': end.latitude,
                     'longitude': end.longitude
                 },
-                'distance': round(distance, 2)
+                'distance': round(float(distance), 2)
             })
-            
-            total_distance += distance
+        
+        total_distance = float(legs.sum())
         
         return {
             'route_points': route_points,
@@ -545,7 +407,7 @@ class GeolocationService:
         }
 
     @classmethod
-    def build_route_with_maps(
+    async def build_route_with_maps(
         cls, 
         db: Session, 
         request: RouteRequest,
@@ -553,6 +415,7 @@ class GeolocationService:
     ) -> Dict[str, Any]:
         """
         Построение маршрута с использованием Google/Apple Maps
+        При недоступности провайдера - упрощенный расчет по прямой
         """
         # Получаем локации партнеров
         locations = db.query(PartnerLocation).filter(
@@ -563,10 +426,8 @@ class GeolocationService:
             raise NotFoundException("Одна или несколько локаций не найдены")
         
         # Сортировка локаций по порядку в запросе
-        sorted_locations = sorted(
-            locations, 
-            key=lambda loc: request.partner_location_ids.index(loc.id)
-        )
+        positions = {loc_id: i for i, loc_id in enumerate(request.partner_location_ids)}
+        sorted_locations = sorted(locations, key=lambda loc: positions[loc.id])
         
         # Подготовка координат для API
         waypoints = [
@@ -575,10 +436,15 @@ class GeolocationService:
         
         try:
             if map_provider == 'google':
-                route = cls._get_google_maps_route(
+                route = await cls._get_google_maps_route(
                     origin=f"{sorted_locations[0].latitude},{sorted_locations[0].longitude}",
                     destination=f"{sorted_locations[-1].latitude},{sorted_locations[-1].longitude}",
-                    waypoints=waypoints
+                    waypoints=waypoints,
+                    cache_key=route_cache_key(
+                        "google",
+                        [(loc.latitude, loc.longitude) for loc in sorted_locations],
+                        "driving"
+                    )
                 )
             elif map_provider == 'apple':
                 route = cls._get_apple_maps_route(
@@ -591,35 +457,44 @@ class GeolocationService:
             
             return route
         
+        except ExternalServiceException as e:
+            logger.warning(f"Провайдер карт недоступен, упрощенный маршрут: {e.message}")
+            return RouteService._calculate_simple_route(sorted_locations)
+        
         except Exception as e:
             logger.error(f"Ошибка построения маршрута: {e}")
             raise ExternalServiceException("Не удалось построить маршрут")
 
     @classmethod
-    def _get_google_maps_route(
+    async def _get_google_maps_route(
         cls, 
         origin: str, 
         destination: str, 
-        waypoints: List[str]
+        waypoints: List[str],
+        cache_key: Optional[Tuple] = None
     ) -> Dict[str, Any]:
         """
         Получение маршрута через Google Maps API
         """
+        if cache_key is not None:
+            cached = map_client.cached(cache_key)
+            if cached is not None:
+                return cached
+        
         url = "https://maps.googleapis.com/maps/api/directions/json"
         params = {
             "origin": origin,
             "destination": destination,
             "waypoints": "|".join(waypoints),
-            "key": cls.GOOGLE_MAPS_API_KEY
+            "key": settings.GOOGLE_MAPS_API_KEY
         }
         
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = await map_client.get_json("google", url, params)
         
         if data['status'] != 'OK':
             raise ExternalServiceException("Ошибка Google Maps API")
         
-        return {
+        route = {
             "route_points": [
                 {
                     "start": leg['start_location'],
@@ -631,6 +506,10 @@ class GeolocationService:
             "total_distance": data['routes'][0]['legs'][-1]['distance']['text'],
             "estimated_time": data['routes'][0]['legs'][-1]['duration']['text']
         }
+        
+        if cache_key is not None:
+            map_client.remember(cache_key, route)
+        return route
 
     @classmethod
     def _get_apple_maps_route(
@@ -657,37 +536,28 @@ class GeolocationService:
     ) -> List[int]:
         """
         Оптимизация порядка посещения партнеров
-        Используется алгоритм ближайшего соседа
+        Ближайший сосед + 2-opt/Or-opt, старт - первая локация из списка
         """
         locations = db.query(PartnerLocation).filter(
             PartnerLocation.id.in_(partner_location_ids)
         ).all()
         
-        # Начальная точка - первая локация
-        start_location = locations[0]
-        unvisited = set(loc.id for loc in locations[1:])
-        optimized_route = [start_location.id]
+        if len(locations) != len(set(partner_location_ids)):
+            raise NotFoundException("Одна или несколько локаций не найдены")
         
-        while unvisited:
-            current = optimized_route[-1]
-            current_location = next(loc for loc in locations if loc.id == current)
-            
-            # Найти ближайшую непосещенную локацию
-            nearest = min(
-                [loc for loc in locations if loc.id in unvisited],
-                key=lambda loc: cls.calculate_distance(
-                    current_location.latitude, current_location.longitude,
-                    loc.latitude, loc.longitude
-                )
-            )
-            
-            optimized_route.append(nearest.id)
-            unvisited.remove(nearest.id)
+        positions = {loc_id: i for i, loc_id in enumerate(partner_location_ids)}
+        locations.sort(key=lambda loc: positions[loc.id])
+        
+        result = route_optimizer.optimize_points(
+            [loc.latitude for loc in locations],
+            [loc.longitude for loc in locations],
+            start=0
+        )
         
-        return optimized_route
+        return [locations[i].id for i in result.order]
 
     @classmethod
-    def update_partner_location(
+    async def update_partner_location(
         cls, 
         db: Session, 
         partner_id: int, 
@@ -709,6 +579,8 @@ class GeolocationService:
             PartnerLocation.is_main_location == True
         ).first()
         
+        previous_coordinates = (location.latitude, location.longitude) if location else (None, None)
+        
         if not location:
             # Создаем новую локацию, если не существует
             location = PartnerLocation(
@@ -725,12 +597,22 @@ class GeolocationService:
         location.geom = text(f"ST_MakePoint({longitude}, {latitude})")
         
         # Обновляем координаты основного партнера
-        partner = db.query(Partner).filter(Partner.id == partner_id).first()
+        partner = db.query(PartnerModel).filter(PartnerModel.id == partner_id).first()
         partner.latitude = latitude
         partner.longitude = longitude
         partner.geom = text(f"ST_MakePoint({longitude}, {latitude})")
         
         db.commit()
         db.refresh(location)
+
+        # Инкрементальное обновление пространственного индекса
+        partner_spatial_index.refresh_location(location)
+        
+        # Сброс кэша nearby только для ячеек старой и новой позиции
+        await nearby_partners_cache.invalidate_point(*previous_coordinates)
+        await nearby_partners_cache.invalidate_point(latitude, longitude)
+        
+        # Тайлы карты, содержащие старую и новую позицию
+        await map_tile_service.invalidate_points([previous_coordinates, (latitude, longitude)])
         
         return location
@@ -0,0 +1,111 @@
+"""
+Фильтры существования для поиска по ID и коду
+
+partner_ids - ID партнёров (/partner/{id}, сканирование QR), promo_codes -
+промо-коды (/promotions/promo-codes/{code}, валидация). Фильтры строятся
+из БД при старте и перестраиваются каждые BLOOM_FILTER_REBUILD_INTERVAL
+секунд (раньше - если фильтр переполнен вставками). В приложении:
+
+    app.add_event_handler("startup", lookup_filters.start)
+    app.add_event_handler("shutdown", lookup_filters.stop)
+"""
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.bloom_filter import ExistenceFilter
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.partner import Partner
+from app.models.promotion import PromoCode
+
+logger = logging.getLogger(__name__)
+
+Source = Callable[[Session], Iterable]
+
+
+def _filter(name: str, monotonic: bool = False) -> ExistenceFilter:
+    return ExistenceFilter(
+        name,
+        error_rate=settings.BLOOM_FILTER_ERROR_RATE,
+        growth=settings.BLOOM_FILTER_GROWTH,
+        negative_ttl=settings.NOT_FOUND_CACHE_TTL,
+        recent_ttl=settings.BLOOM_FILTER_REBUILD_INTERVAL * 2,
+        monotonic=monotonic
+    )
+
+
+partner_ids = _filter("partners", monotonic=True)
+promo_codes = _filter("promo_codes")
+
+
+class LookupFilters:
+    """Перестроение фильтров из БД по расписанию"""
+
+    # Как часто проверять переполнение между перестроениями
+    CHECK_INTERVAL = 60
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, interval: int = 3600):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._sources: Dict[str, Tuple[ExistenceFilter, Source]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, existence_filter: ExistenceFilter, source: Source) -> None:
+        self._sources[existence_filter.name] = (existence_filter, source)
+
+    @property
+    def filters(self) -> List[ExistenceFilter]:
+        return [existence_filter for existence_filter, _ in self._sources.values()]
+
+    async def rebuild(self, names: Optional[Iterable[str]] = None) -> None:
+        """Перестроение фильтров names (по умолчанию всех); ошибка одного не мешает остальным"""
+        for name in list(names or self._sources):
+            existence_filter, source = self._sources[name]
+
+            def load() -> list:
+                db = self.session_factory()
+                try:
+                    return list(source(db))
+                finally:
+                    db.close()
+
+            try:
+                values = await asyncio.to_thread(load)
+                existence_filter.rebuild(values)
+            except Exception as e:
+                logger.error(f"Existence filter {name} rebuild failed: {str(e)}")
+
+    async def _schedule(self) -> None:
+        rebuilt_at = 0.0
+        while True:
+            saturated = [f.name for f in self.filters if f.bloom is not None and f.bloom.saturated]
+            if time.monotonic() - rebuilt_at >= self.interval:
+                await self.rebuild()
+                rebuilt_at = time.monotonic()
+            elif saturated:
+                await self.rebuild(saturated)
+            await asyncio.sleep(min(self.interval, self.CHECK_INTERVAL))
+
+    async def start(self) -> None:
+        """Обработчик startup: построение в фоне, до него поиск идёт в БД"""
+        self._task = asyncio.get_running_loop().create_task(self._schedule())
+
+    async def stop(self) -> None:
+        """Обработчик shutdown"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+
+
+# Singleton instance
+lookup_filters = LookupFilters(interval=settings.BLOOM_FILTER_REBUILD_INTERVAL)
+lookup_filters.register(partner_ids, lambda db: (row[0] for row in db.query(Partner.id)))
+lookup_filters.register(promo_codes, lambda db: (row[0] for row in db.query(PromoCode.code)))
@@ -0,0 +1,238 @@
+"""
+Тайлы карты с пинами партнёров (z/x/y, Web Mercator)
+
+Каждый тайл содержит предкластеризованные пины: на мелких зумах точки
+объединяются по сетке внутри тайла, начиная с MAP_TILE_CLUSTER_MAX_ZOOM
+отдаются отдельные пины. Координаты кодируются целыми E5 (1e-5 градуса)
+дельтами, данные партнёров вынесены в словарь тайла.
+
+Готовый тайл (тело + ETag) кэшируется в Redis и инвалидируется только
+для тайлов, содержащих изменённую локацию (по одному тайлу на зум).
+"""
+import json
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.cache import redis_cache
+from app.core.config import settings
+from app.core.geo import mercator_tile_xy, tile_bounds, tile_for_point
+from app.models.partner import Partner, PartnerLocation
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "tile"
+# 1e-5 градуса ~ 1 метр
+COORDINATE_SCALE = 100000
+
+
+@dataclass(frozen=True)
+class TilePoint:
+    """Локация для построения тайла"""
+    location_id: int
+    partner_id: int
+    partner_name: str
+    category: Optional[str]
+    max_discount_percent: float
+    latitude: float
+    longitude: float
+
+
+@dataclass(frozen=True)
+class Tile:
+    """Закодированный тайл"""
+    body: bytes
+    etag: str
+
+
+def tile_key(zoom: int, x: int, y: int) -> str:
+    return f"{KEY_PREFIX}:{zoom}:{x}:{y}"
+
+
+def _delta_encode(values: np.ndarray, origin: float) -> List[int]:
+    scaled = np.round(values * COORDINATE_SCALE).astype(np.int64)
+    return np.diff(scaled, prepend=int(round(origin * COORDINATE_SCALE))).tolist()
+
+
+def delta_decode(deltas: Sequence[int], origin: float) -> List[float]:
+    """Обратное преобразование для клиентов и тестов"""
+    values = np.cumsum([int(round(origin * COORDINATE_SCALE)), *deltas])[1:]
+    return (values / COORDINATE_SCALE).tolist()
+
+
+class MapTileService:
+    """Построение, кэширование и инвалидация тайлов"""
+
+    def __init__(
+        self,
+        max_zoom: int = 20,
+        cluster_max_zoom: int = 14,
+        cluster_grid: int = 8,
+        ttl: int = 86400
+    ):
+        self.max_zoom = max_zoom
+        self.cluster_max_zoom = cluster_max_zoom
+        self.cluster_grid = cluster_grid
+        self.ttl = ttl
+
+    def is_valid(self, zoom: int, x: int, y: int) -> bool:
+        return 0 <= zoom <= self.max_zoom and 0 <= x < (1 << zoom) and 0 <= y < (1 << zoom)
+
+    # Построение
+
+    @staticmethod
+    def load_points(db: Session, zoom: int, x: int, y: int) -> List[TilePoint]:
+        """Активные локации внутри границ тайла (только нужные колонки)"""
+        min_lat, min_lon, max_lat, max_lon = tile_bounds(zoom, x, y)
+        rows = db.query(
+            PartnerLocation.id,
+            PartnerLocation.partner_id,
+            Partner.name,
+            Partner.category,
+            Partner.max_discount_percent,
+            PartnerLocation.latitude,
+            PartnerLocation.longitude
+        ).join(
+            Partner, Partner.id == PartnerLocation.partner_id
+        ).filter(
+            PartnerLocation.is_active == True,
+            Partner.is_active == True,
+            PartnerLocation.latitude >= min_lat,
+            PartnerLocation.latitude < max_lat,
+            PartnerLocation.longitude >= min_lon,
+            PartnerLocation.longitude < max_lon
+        ).all()
+
+        return [
+            TilePoint(
+                location_id=row[0],
+                partner_id=row[1],
+                partner_name=row[2],
+                category=row[3],
+                max_discount_percent=float(row[4] or 0),
+                latitude=float(row[5]),
+                longitude=float(row[6])
+            ) for row in rows
+        ]
+
+    def encode(self, zoom: int, x: int, y: int, points: Sequence[TilePoint]) -> Tile:
+        """Кластеризация и компактное кодирование точек тайла"""
+        min_lat, min_lon, _, _ = tile_bounds(zoom, x, y)
+        pins: List[TilePoint] = list(points)
+        clusters: List[Tuple[float, float, int]] = []
+
+        if zoom < self.cluster_max_zoom and len(points) > 1:
+            lats = np.fromiter((p.latitude for p in points), dtype=np.float64, count=len(points))
+            lons = np.fromiter((p.longitude for p in points), dtype=np.float64, count=len(points))
+            tile_x, tile_y = mercator_tile_xy(lats, lons, zoom)
+
+            # Ячейка сетки внутри тайла (cluster_grid x cluster_grid)
+            grid = self.cluster_grid
+            col = np.clip(((tile_x - x) * grid).astype(np.int64), 0, grid - 1)
+            row = np.clip(((tile_y - y) * grid).astype(np.int64), 0, grid - 1)
+            cells = row * grid + col
+            counts = np.bincount(cells, minlength=grid * grid)
+
+            single = counts[cells] == 1
+            pins = [point for point, keep in zip(points, single.tolist()) if keep]
+
+            for cell in np.flatnonzero(counts > 1).tolist():
+                members = cells == cell
+                clusters.append((
+                    float(lats[members].mean()),
+                    float(lons[members].mean()),
+                    int(counts[cell])
+                ))
+
+        pins.sort(key=lambda p: (p.latitude, p.longitude))
+        clusters.sort()
+
+        partner_index: Dict[int, int] = {}
+        partners = []
+        for pin in pins:
+            if pin.partner_id not in partner_index:
+                partner_index[pin.partner_id] = len(partners)
+                partners.append([pin.partner_id, pin.partner_name, pin.category, pin.max_discount_percent])
+
+        pin_lats = np.array([p.latitude for p in pins], dtype=np.float64)
+        pin_lons = np.array([p.longitude for p in pins], dtype=np.float64)
+        cluster_lats = np.array([c[0] for c in clusters], dtype=np.float64)
+        cluster_lons = np.array([c[1] for c in clusters], dtype=np.float64)
+
+        payload = {
+            "z": zoom,
+            "x": x,
+            "y": y,
+            "origin": [round(min_lat, 5), round(min_lon, 5)],
+            "scale": COORDINATE_SCALE,
+            "partners": partners,
+            "pins": {
+                "lat": _delta_encode(pin_lats, round(min_lat, 5)),
+                "lon": _delta_encode(pin_lons, round(min_lon, 5)),
+                "id": [p.location_id for p in pins],
+                "partner": [partner_index[p.partner_id] for p in pins],
+            },
+            "clusters": {
+                "lat": _delta_encode(cluster_lats, round(min_lat, 5)),
+                "lon": _delta_encode(cluster_lons, round(min_lon, 5)),
+                "count": [c[2] for c in clusters],
+            },
+        }
+
+        body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        return Tile(body=body, etag=etag)
+
+    # Кэширование
+
+    async def get_tile(self, db: Session, zoom: int, x: int, y: int) -> Tile:
+        key = tile_key(zoom, x, y)
+        cached = await redis_cache.get(key)
+        if cached:
+            return Tile(body=cached["body"].encode("utf-8"), etag=cached["etag"])
+
+        tile = self.encode(zoom, x, y, self.load_points(db, zoom, x, y))
+        await redis_cache.set(
+            key,
+            {"body": tile.body.decode("utf-8"), "etag": tile.etag},
+            ttl=self.ttl
+        )
+        return tile
+
+    def tiles_for_point(self, latitude: float, longitude: float) -> List[str]:
+        """Ключи тайлов всех зумов, содержащих точку"""
+        keys = []
+        for zoom in range(self.max_zoom + 1):
+            x, y = tile_for_point(latitude, longitude, zoom)
+            keys.append(tile_key(zoom, x, y))
+        return keys
+
+    async def invalidate_points(self, points: Iterable[Tuple[Optional[float], Optional[float]]]) -> int:
+        """Инвалидация тайлов, затронутых изменением локаций"""
+        keys = set()
+        for latitude, longitude in points:
+            if latitude is not None and longitude is not None:
+                keys.update(self.tiles_for_point(float(latitude), float(longitude)))
+        if not keys:
+            return 0
+        return await redis_cache.delete_many(*keys)
+
+    async def invalidate_partner(self, db: Session, partner_id: int) -> int:
+        """Инвалидация тайлов всех локаций партнёра (имя, скидка, статус)"""
+        rows = db.query(PartnerLocation.latitude, PartnerLocation.longitude).filter(
+            PartnerLocation.partner_id == partner_id
+        ).all()
+        return await self.invalidate_points(rows)
+
+
+# Singleton
+map_tile_service = MapTileService(
+    max_zoom=settings.MAP_TILE_MAX_ZOOM,
+    cluster_max_zoom=settings.MAP_TILE_CLUSTER_MAX_ZOOM,
+    cluster_grid=settings.MAP_TILE_CLUSTER_GRID,
+    ttl=settings.MAP_TILE_CACHE_TTL
+)
@@ -0,0 +1,182 @@
+"""
+Кэш nearby-запросов, квантованный по ячейкам geohash
+
+Координаты пользователя привязываются к ячейке geohash, и в Redis кладётся
+набор кандидатов для всей ячейки (радиус + полудиагональ ячейки от её центра).
+Затем кандидаты точно пересортировываются для реальной позиции пользователя,
+поэтому соседние пользователи делят одну запись без потери точности.
+
+Попадания и промахи экспортируются в Prometheus (cache_hits_total /
+cache_misses_total с меткой cache="nearby_partners").
+"""
+import math
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.cache import redis_cache, RedisCache
+from app.core.cache_metrics import cache_metrics
+from app.core.config import settings
+from app.core.geo import (
+    KM_PER_DEGREE_LAT,
+    bounding_box,
+    geohash_bbox,
+    geohash_encode,
+    geohash_cells_covering,
+    haversine_km_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+# Шаг квантования радиуса, км
+RADIUS_STEP_KM = 0.5
+
+
+class NearbyPartnersCache:
+    """Кэш кандидатов nearby-поиска по ячейкам geohash"""
+
+    KEY_PREFIX = "nearby"
+    METRICS_NAME = "nearby_partners"
+
+    def __init__(
+        self,
+        cache: RedisCache,
+        precision: int = 6,
+        index_precision: int = 4,
+        ttl: int = 300
+    ):
+        self.cache = cache
+        self.precision = precision
+        self.index_precision = index_precision
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+        self.telemetry = cache_metrics(self.METRICS_NAME)
+
+    # Ключи
+
+    def cell_of(self, latitude: float, longitude: float) -> str:
+        return geohash_encode(latitude, longitude, self.precision)
+
+    @staticmethod
+    def quantize_radius(radius_km: float) -> float:
+        """Радиус округляется вверх до шага, чтобы похожие запросы делили запись"""
+        return math.ceil(radius_km / RADIUS_STEP_KM) * RADIUS_STEP_KM
+
+    @staticmethod
+    def filter_signature(
+        categories: Optional[Iterable[str]] = None,
+        min_cashback: Optional[float] = None,
+        is_verified: Optional[bool] = None
+    ) -> str:
+        if not categories and min_cashback is None and not is_verified:
+            return "all"
+        raw = f"{sorted(categories or [])}|{min_cashback}|{bool(is_verified)}"
+        return hashlib.md5(raw.encode()).hexdigest()[:12]
+
+    def entry_key(self, cell: str, radius_km: float, signature: str) -> str:
+        return f"{self.KEY_PREFIX}:{cell}:{radius_km:g}:{signature}"
+
+    def index_key(self, index_cell: str) -> str:
+        return f"{self.KEY_PREFIX}:idx:{index_cell}"
+
+    def candidate_area(self, cell: str, radius_km: float) -> Tuple[float, float, float]:
+        """Центр ячейки и радиус, покрывающий запросы из любой её точки"""
+        min_lat, min_lon, max_lat, max_lon = geohash_bbox(cell)
+        center_lat = (min_lat + max_lat) / 2
+        center_lon = (min_lon + max_lon) / 2
+
+        half_height = (max_lat - min_lat) / 2 * KM_PER_DEGREE_LAT
+        half_width = (max_lon - min_lon) / 2 * KM_PER_DEGREE_LAT * math.cos(math.radians(center_lat))
+        return center_lat, center_lon, radius_km + math.hypot(half_height, half_width)
+
+    # Чтение / запись
+
+    async def get_candidates(self, cell: str, radius_km: float, signature: str) -> Optional[List[Dict[str, Any]]]:
+        key = self.entry_key(cell, radius_km, signature)
+        candidates = await self.cache.get(key)
+        if candidates is None:
+            self.stats["misses"] += 1
+            self.telemetry.miss(key)
+            return None
+
+        self.stats["hits"] += 1
+        self.telemetry.hit("redis", key)
+        return candidates
+
+    async def set_candidates(
+        self,
+        cell: str,
+        radius_km: float,
+        signature: str,
+        candidates: List[Dict[str, Any]]
+    ) -> None:
+        key = self.entry_key(cell, radius_km, signature)
+        if not await self.cache.set(key, candidates, self.ttl):
+            return
+
+        # Регистрируем ключ во всех крупных ячейках, которые покрывает запись,
+        # чтобы перемещение партнёра сбрасывало только затронутые записи
+        center_lat, center_lon, area_radius = self.candidate_area(cell, radius_km)
+        for index_cell in geohash_cells_covering(
+            *bounding_box(center_lat, center_lon, area_radius), self.index_precision
+        ):
+            await self.cache.add_to_set(self.index_key(index_cell), key, ttl=self.ttl)
+
+    @staticmethod
+    def rerank(
+        candidates: List[Dict[str, Any]],
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Точная фильтрация и сортировка кандидатов для позиции пользователя"""
+        if not candidates:
+            return []
+
+        distances = haversine_km_batch(
+            latitude,
+            longitude,
+            [item["latitude"] for item in candidates],
+            [item["longitude"] for item in candidates]
+        )
+        ranked = sorted(
+            (
+                (float(distance), item)
+                for distance, item in zip(distances, candidates)
+                if distance <= radius_km
+            ),
+            key=lambda pair: pair[0]
+        )
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [item for _, item in ranked]
+
+    # Инвалидация
+
+    async def invalidate_point(self, latitude: Optional[float], longitude: Optional[float]) -> int:
+        """Сброс записей, чьи наборы кандидатов могут содержать точку"""
+        if latitude is None or longitude is None:
+            return 0
+
+        index_cell = geohash_encode(float(latitude), float(longitude), self.index_precision)
+        keys = await self.cache.pop_set_members(self.index_key(index_cell))
+        if not keys:
+            return 0
+
+        deleted = await self.cache.delete_many(*keys)
+        self.stats["invalidations"] += deleted
+        return deleted
+
+    def hit_ratio(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+# Singleton
+nearby_partners_cache = NearbyPartnersCache(
+    redis_cache,
+    precision=settings.NEARBY_CACHE_PRECISION,
+    index_precision=settings.NEARBY_CACHE_INDEX_PRECISION,
+    ttl=settings.NEARBY_CACHE_TTL
+)
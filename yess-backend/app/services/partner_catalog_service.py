@@ -0,0 +1,54 @@
+"""
+Каталог партнёров: списки и категории для API и прогрева кэша
+
+Записи помечены тегом partners и сбрасываются invalidate_partner_cache.
+Функции синхронные (запросы через Session): из async-эндпоинтов -
+await list_partners.call_async(db, ...), загрузка идёт в потоке.
+"""
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import cached
+from app.core.config import settings
+from app.models.partner import Partner
+from app.schemas.partner import PartnerResponse
+
+
+@cached(
+    ttl=settings.PARTNERS_LIST_CACHE_TTL,
+    tags=["partners"],
+    compress=True,
+    model=List[PartnerResponse]
+)
+def list_partners(
+    db: Session,
+    category: Optional[str] = None,
+    active: bool = True,
+    city_id: Optional[int] = None
+) -> List[PartnerResponse]:
+    query = db.query(Partner)
+
+    if active:
+        query = query.filter(Partner.is_active == True)
+    if category:
+        query = query.filter(Partner.category == category)
+    if city_id is not None:
+        query = query.filter(Partner.city_id == city_id)
+
+    return [PartnerResponse.from_orm(partner) for partner in query.all()]
+
+
+@cached(ttl=settings.PARTNERS_LIST_CACHE_TTL, tags=["partners"])
+def list_categories(db: Session) -> List[str]:
+    categories = db.query(Partner.category).distinct().all()
+    return [category[0] for category in categories if category[0]]
+
+
+def active_city_ids(db: Session) -> List[int]:
+    """Города, в которых есть активные партнёры"""
+    rows = db.query(Partner.city_id).filter(
+        Partner.is_active == True,
+        Partner.city_id.isnot(None)
+    ).distinct().all()
+    return [row[0] for row in rows]
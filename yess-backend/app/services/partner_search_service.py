@@ -0,0 +1,207 @@
+"""
+Полнотекстовый поиск партнёров с ранжированием
+
+Совпадение ищется по tsvector (префиксы слов, оригинал + транслитерация)
+или по триграммам search_name (опечатки). Итоговый score складывается из
+ts_rank_cd, триграммной похожести, рейтинга партнёра и близости к
+пользователю. Автодополнение кэшируется в Redis по нормализованному префиксу.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, func, literal, or_
+from sqlalchemy.orm import Query, Session
+
+from app.core.cache import redis_cache
+from app.core.config import settings
+from app.core.geo import EARTH_RADIUS_KM, bounding_box
+from app.core.text_search import normalize, prefix_tsquery, searchable
+from app.models.partner import Partner
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_KEY_PREFIX = "search:ac"
+# Короче - триграммы и префиксы дают слишком много шума
+MIN_AUTOCOMPLETE_LENGTH = 2
+
+
+@dataclass
+class SearchHit:
+    """Найденный партнёр и его score"""
+    partner: Partner
+    score: float
+    distance_km: Optional[float] = None
+
+
+def haversine_sql(latitude: float, longitude: float):
+    """SQL-выражение расстояния (км) от точки до координат партнёра"""
+    dlat = func.radians(Partner.latitude - latitude)
+    dlon = func.radians(Partner.longitude - longitude)
+    a = (
+        func.power(func.sin(dlat / 2), 2)
+        + func.cos(func.radians(literal(latitude))) * func.cos(func.radians(Partner.latitude))
+        * func.power(func.sin(dlon / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(a)))
+
+
+class PartnerSearchService:
+    """Ранжированный текстовый поиск и автодополнение"""
+
+    def __init__(
+        self,
+        text_weight: float = 1.0,
+        trigram_weight: float = 0.5,
+        rating_weight: float = 0.3,
+        distance_weight: float = 0.5,
+        distance_scale_km: float = 2.0,
+        autocomplete_ttl: int = 300
+    ):
+        self.text_weight = text_weight
+        self.trigram_weight = trigram_weight
+        self.rating_weight = rating_weight
+        self.distance_weight = distance_weight
+        self.distance_scale_km = distance_scale_km
+        self.autocomplete_ttl = autocomplete_ttl
+
+    # Выражения
+
+    @staticmethod
+    def match_condition(query: str):
+        """Условие совпадения: префиксы по tsvector или триграммы по названию"""
+        tsquery = prefix_tsquery(query)
+        if tsquery is None:
+            return None
+        return or_(
+            Partner.search_vector.op("@@")(func.to_tsquery("simple", tsquery)),
+            Partner.search_name.op("%")(searchable(query))
+        )
+
+    def rank_expression(
+        self,
+        query: str,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ):
+        """score = текст + триграммы + рейтинг (+ близость при наличии координат)"""
+        tsquery = func.to_tsquery("simple", prefix_tsquery(query) or "")
+        score = (
+            self.text_weight * func.ts_rank_cd(Partner.search_vector, tsquery)
+            + self.trigram_weight * func.similarity(Partner.search_name, searchable(query))
+            + self.rating_weight * func.coalesce(Partner.rating, 0) / 5.0
+        )
+        if latitude is not None and longitude is not None:
+            distance = haversine_sql(latitude, longitude)
+            score = score + self.distance_weight / (1 + distance / self.distance_scale_km)
+        return score
+
+    # Поиск
+
+    def _filtered(
+        self,
+        db_query: Query,
+        categories: Optional[Sequence[str]] = None,
+        min_cashback: Optional[float] = None,
+        is_verified: Optional[bool] = None
+    ) -> Query:
+        db_query = db_query.filter(Partner.is_active == True)
+        if categories:
+            db_query = db_query.filter(Partner.category.in_(categories))
+        if min_cashback is not None:
+            db_query = db_query.filter(Partner.default_cashback_rate >= min_cashback)
+        if is_verified is not None:
+            db_query = db_query.filter(Partner.is_verified == is_verified)
+        return db_query
+
+    def search(
+        self,
+        db: Session,
+        query: str,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        radius_km: Optional[float] = None,
+        categories: Optional[Sequence[str]] = None,
+        min_cashback: Optional[float] = None,
+        is_verified: Optional[bool] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[SearchHit]:
+        """Партнёры, совпавшие с запросом, по убыванию score"""
+        condition = self.match_condition(query)
+        if condition is None:
+            return []
+
+        has_point = latitude is not None and longitude is not None
+        score = self.rank_expression(query, latitude, longitude).label("score")
+        distance = (haversine_sql(latitude, longitude) if has_point else literal(None)).label("distance")
+
+        db_query = self._filtered(
+            db.query(Partner, score, distance).filter(condition),
+            categories=categories,
+            min_cashback=min_cashback,
+            is_verified=is_verified
+        )
+
+        if has_point and radius_km:
+            # Прямоугольник отсекает по индексу координат до точного расстояния
+            min_lat, min_lon, max_lat, max_lon = bounding_box(latitude, longitude, radius_km)
+            db_query = db_query.filter(
+                and_(
+                    Partner.latitude.between(min_lat, max_lat),
+                    Partner.longitude.between(min_lon, max_lon)
+                ),
+                haversine_sql(latitude, longitude) <= radius_km
+            )
+
+        rows = db_query.order_by(score.desc(), Partner.id).offset(offset).limit(limit).all()
+        return [
+            SearchHit(
+                partner=partner,
+                score=float(row_score or 0),
+                distance_km=float(row_distance) if row_distance is not None else None
+            ) for partner, row_score, row_distance in rows
+        ]
+
+    # Автодополнение
+
+    def _autocomplete_from_db(self, db: Session, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        tsquery = prefix_tsquery(prefix)
+        name_prefix = searchable(prefix).split(" ")[0]
+        starts_with = Partner.search_name.like(f"{name_prefix}%")
+
+        rows = db.query(Partner.id, Partner.name, Partner.category, Partner.logo_url).filter(
+            Partner.is_active == True,
+            or_(starts_with, Partner.search_vector.op("@@")(func.to_tsquery("simple", tsquery)))
+        ).order_by(
+            starts_with.desc(),
+            func.coalesce(Partner.rating, 0).desc(),
+            Partner.name
+        ).limit(limit).all()
+
+        return [
+            {"id": row[0], "name": row[1], "category": row[2], "logo_url": row[3]}
+            for row in rows
+        ]
+
+    async def autocomplete(self, db: Session, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Подсказки по началу названия/слов; кэш по нормализованному префиксу"""
+        normalized = normalize(prefix)
+        if len(normalized) < MIN_AUTOCOMPLETE_LENGTH:
+            return []
+
+        key = f"{AUTOCOMPLETE_KEY_PREFIX}:{limit}:{normalized}"
+        cached = await redis_cache.get(key)
+        if cached is not None:
+            return cached
+
+        suggestions = self._autocomplete_from_db(db, normalized, limit)
+        await redis_cache.set(key, suggestions, ttl=self.autocomplete_ttl)
+        return suggestions
+
+
+# Singleton
+partner_search_service = PartnerSearchService(
+    distance_scale_km=settings.SEARCH_DISTANCE_SCALE_KM,
+    autocomplete_ttl=settings.SEARCH_AUTOCOMPLETE_TTL
+)
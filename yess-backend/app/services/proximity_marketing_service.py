@@ -1,97 +1,159 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Dict, Any, Sequence
+from dataclasses import dataclass
+from sqlalchemy.orm import Session, joinedload
 
+from app.core.config import settings
 from app.core.notifications import SMSService, PushNotificationService
 from app.models.user import User
 from app.models.partner import Partner, PartnerLocation
-from app.models.transaction import Transaction
 from app.models.wallet import Wallet
 from app.services.recommendation_service import RecommendationService
-from app.services.geolocation_service import GeolocationService
+from app.services.geofence_engine import GeofenceEngine, LocationPing, geofence_engine
+from app.services.spend_profile_service import SpendProfile, spend_profile_service
+
+
+@dataclass
+class ProximityEvent:
+    """Событие для слоя уведомлений: пользователь рядом с партнёром"""
+    user: User
+    partner: Partner
+    location: PartnerLocation
+    offer: Dict[str, Any]
+    distance_km: float
+
 
 class ProximityMarketingService:
     def __init__(
         self, 
         sms_service: SMSService, 
         push_service: PushNotificationService,
-        recommendation_service: RecommendationService
+        recommendation_service: RecommendationService,
+        engine: GeofenceEngine = geofence_engine
     ):
         self._sms_service = sms_service
         self._push_service = push_service
         self._recommendation_service = recommendation_service
+        self._engine = engine
 
-    async def check_nearby_partners(
-        self, 
-        user: User, 
-        current_location: Dict[str, float], 
+    async def match_pings(
+        self,
+        pings: Sequence[LocationPing],
         db: Session,
-        radius: float = 0.5  # 500 метров
-    ):
+        radius: Optional[float] = None
+    ) -> AsyncIterator[ProximityEvent]:
         """
-        Проверка ближайших партнеров и отправка персонализированных уведомлений
+        Пакетный матчинг геопозиций с геозонами партнёров
+
+        Все пинги сопоставляются с геозонами за один проход, повторы
+        user+partner внутри cooldown подавляются. Пользователи, локации,
+        профили трат и кошельки загружаются одним запросом на пакет.
         """
-        # Находим ближайшие локации партнеров
-        nearby_locations = db.query(PartnerLocation).filter(
-            func.ST_DWithin(
-                PartnerLocation.geom, 
-                func.ST_MakePoint(current_location['longitude'], current_location['latitude']),
-                radius * 1000  # Перевод в метры
-            )
-        ).all()
+        self._engine.ensure_loaded(db, settings.PROXIMITY_GEOFENCE_MAX_AGE_SECONDS)
 
-        if not nearby_locations:
+        hits = await self._engine.process_async(pings, radius_km=radius)
+        if not hits:
             return
 
-        # Получаем историю транзакций пользователя
-        recent_transactions = db.query(Transaction).filter(
-            Transaction.user_id == user.id,
-            Transaction.created_at >= datetime.utcnow() - timedelta(days=30)
-        ).all()
+        user_ids = {hit.user_id for hit in hits}
+        location_ids = {hit.location_id for hit in hits}
+
+        users = {
+            user.id: user
+            for user in db.query(User).filter(User.id.in_(user_ids)).all()
+        }
+        locations = {
+            location.id: location
+            for location in db.query(PartnerLocation).options(
+                joinedload(PartnerLocation.partner)
+            ).filter(PartnerLocation.id.in_(location_ids)).all()
+        }
+        wallets = {
+            wallet.user_id: wallet
+            for wallet in db.query(Wallet).filter(Wallet.user_id.in_(user_ids)).all()
+        }
+        profiles = await spend_profile_service.get_profiles(db, user_ids)
 
-        # Получаем текущий баланс кошелька
-        wallet = db.query(Wallet).filter(Wallet.user_id == user.id).first()
+        for hit in hits:
+            user = users.get(hit.user_id)
+            location = locations.get(hit.location_id)
+            if user is None or location is None:
+                continue
 
-        for location in nearby_locations:
             partner = location.partner
-            
-            # Персонализированное предложение
-            personalized_offer = self._get_personalized_offer(
-                user, partner, recent_transactions, wallet
+            offer = self._get_personalized_offer(
+                user, partner, profiles[user.id], wallets.get(user.id)
+            )
+            yield ProximityEvent(
+                user=user,
+                partner=partner,
+                location=location,
+                offer=offer,
+                distance_km=hit.distance_km
             )
 
-            # Отправляем уведомление
+    async def process_location_pings(
+        self,
+        pings: Sequence[LocationPing],
+        db: Session,
+        radius: Optional[float] = None
+    ) -> int:
+        """
+        Обработка пакета геопозиций и отправка уведомлений
+
+        :return: количество отправленных предложений
+        """
+        sent = 0
+        async for event in self.match_pings(pings, db, radius=radius):
             await self._send_proximity_notification(
-                user, partner, location, personalized_offer, db
+                event.user, event.partner, event.location, event.offer, db
             )
+            sent += 1
+
+        if sent:
+            db.commit()
+        return sent
+
+    async def check_nearby_partners(
+        self, 
+        user: User, 
+        current_location: Dict[str, float], 
+        db: Session,
+        radius: Optional[float] = None  # по умолчанию - радиус геозон (500 метров)
+    ):
+        """
+        Проверка ближайших партнеров и отправка персонализированных уведомлений
+        """
+        ping = LocationPing(
+            user_id=user.id,
+            latitude=current_location['latitude'],
+            longitude=current_location['longitude']
+        )
+        return await self.process_location_pings([ping], db, radius=radius)
 
     def _get_personalized_offer(
         self, 
         user: User, 
         partner: Partner, 
-        recent_transactions: List[Transaction],
-        wallet: Wallet
+        profile: SpendProfile,
+        wallet: Optional[Wallet]
     ) -> Dict[str, Any]:
         """
         Генерация персонализированного предложения
         """
-        # Анализ истории транзакций
-        partner_transactions = [
-            t for t in recent_transactions if t.partner_id == partner.id
-        ]
+        # Визиты к партнеру за последние 30 дней по профилю трат
+        visits = profile.recent_visits(partner.id)
 
         # Расчет персонализированного кешбэка
         dynamic_cashback = self._recommendation_service._calculate_dynamic_cashback(
-            user, partner
+            user, partner, profile
         )
 
         # Определение типа предложения
-        if not partner_transactions:
+        if not visits:
             # Новый партнер для пользователя
             offer_type = "first_visit"
             message = f"Впервые у {partner.name}? Специальная скидка {dynamic_cashback}%!"
-        elif len(partner_transactions) < 3:
+        elif visits < 3 or wallet is None:
             # Постоянный клиент
             offer_type = "loyalty"
             message = f"Ваш кешбэк у {partner.name} вырос до {dynamic_cashback}%!"
@@ -117,6 +179,7 @@ class ProximityMarketingService:
     ):
         """
         Отправка proximity-уведомления
+        Коммит выполняет вызывающий код (один на пакет)
         """
         # SMS уведомление
         if user.sms_enabled and user.phone:
@@ -156,7 +219,6 @@ class ProximityMarketingService:
             is_read=False
         )
         db.add(notification)
-        db.commit()
 
 # Singleton
 proximity_marketing_service = ProximityMarketingService(
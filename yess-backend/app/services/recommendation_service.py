@@ -1,12 +1,15 @@
-from typing import List, Dict, Any
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+from sqlalchemy.orm import Session, object_session
 from sqlalchemy import func
-from collections import defaultdict
 
+from app.core.cache import cached
+from app.core.config import settings
 from app.models.user import User
 from app.models.partner import Partner
 from app.models.transaction import Transaction
 from app.schemas.partner import PartnerRecommendation
+from app.services.spend_profile_service import SpendProfile, spend_profile_service
 
 class RecommendationService:
     @classmethod
@@ -24,39 +27,37 @@ class RecommendationService:
         :param limit: Максимальное количество рекомендаций
         :return: Список рекомендованных партнеров
         """
-        # 1. Анализ истории транзакций
-        transactions = db.query(Transaction).filter(
-            Transaction.user_id == user.id
-        ).all()
+        # 1-3. Траты по категориям из профиля пользователя
+        profile = spend_profile_service.get_profile_sync(db, user.id)
+        top_categories = profile.top_categories(3)
         
-        # 2. Группировка по категориям и сумме транзакций
-        category_scores = defaultdict(float)
-        for transaction in transactions:
-            category_scores[transaction.partner.category] += transaction.amount
-        
-        # 3. Определение топовых категорий
-        top_categories = sorted(
-            category_scores.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )[:3]
-        
-        # 4. Формирование рекомендаций
+        # 4. Формирование рекомендаций: по 3 случайных партнёра категории
+        # одним запросом (оконная функция), а не запросом на категорию
         recommendations = []
-        for category, _ in top_categories:
-            partners = db.query(Partner).filter(
-                Partner.category == category
-            ).order_by(func.random()).limit(3).all()
-            
-            for partner in partners:
-                recommendation = PartnerRecommendation(
-                    id=partner.id,
-                    name=partner.name,
-                    category=partner.category,
-                    logo_url=partner.logo_url,
-                    cashback_rate=cls._calculate_dynamic_cashback(user, partner)
-                )
-                recommendations.append(recommendation)
+        partners = []
+        if top_categories:
+            ranked = db.query(
+                Partner.id.label("partner_id"),
+                func.row_number().over(
+                    partition_by=Partner.category,
+                    order_by=func.random()
+                ).label("rank")
+            ).filter(Partner.category.in_(top_categories)).subquery()
+            partners = db.query(Partner).join(
+                ranked, ranked.c.partner_id == Partner.id
+            ).filter(ranked.c.rank <= 3).all()
+            # Порядок категорий - по тратам пользователя
+            partners.sort(key=lambda partner: top_categories.index(partner.category))
+        
+        for partner in partners:
+            recommendation = PartnerRecommendation(
+                id=partner.id,
+                name=partner.name,
+                category=partner.category,
+                logo_url=partner.logo_url,
+                cashback_rate=cls._calculate_dynamic_cashback(user, partner, profile)
+            )
+            recommendations.append(recommendation)
         
         # 5. Если недостаточно рекомендаций, добавляем случайные
         if len(recommendations) < limit:
@@ -70,30 +71,33 @@ class RecommendationService:
                     name=partner.name,
                     category=partner.category,
                     logo_url=partner.logo_url,
-                    cashback_rate=cls._calculate_dynamic_cashback(user, partner)
+                    cashback_rate=cls._calculate_dynamic_cashback(user, partner, profile)
                 )
                 recommendations.append(recommendation)
         
         return recommendations[:limit]
     
     @staticmethod
-    def _calculate_dynamic_cashback(user: User, partner: Partner) -> float:
+    def _calculate_dynamic_cashback(
+        user: User,
+        partner: Partner,
+        profile: Optional[SpendProfile] = None
+    ) -> float:
         """
         Динамический расчет кешбэка с учетом истории пользователя
         
         :param user: Пользователь
         :param partner: Партнер
+        :param profile: Профиль трат (если не передан - из LRU или одним запросом)
         :return: Процент кешбэка
         """
         # Базовый кешбэк партнера
         base_cashback = partner.default_cashback_rate
         
-        # История транзакций пользователя
-        total_spent = sum(
-            transaction.amount 
-            for transaction in user.transactions 
-            if transaction.partner.category == partner.category
-        )
+        # Траты пользователя в категории партнера
+        if profile is None:
+            profile = spend_profile_service.get_profile_sync(object_session(user), user.id)
+        total_spent = profile.spend_in_category(partner.category)
         
         # Бонусные множители
         multipliers = {
@@ -111,6 +115,12 @@ class RecommendationService:
         return base_cashback
 
     @classmethod
+    @cached(
+        ttl=settings.TRENDING_PARTNERS_CACHE_TTL,
+        tags=["partners"],
+        negative_ttl=60,
+        model=List[PartnerRecommendation]
+    )
     def get_trending_partners(
         cls, 
         db: Session, 
@@ -124,9 +134,11 @@ class RecommendationService:
         :return: Список трендовых партнеров
         """
         # Получаем партнеров с наибольшим количеством транзакций за последний месяц
-        trending_partners = db.query(Partner).join(Transaction).filter(
-            Transaction.created_at >= func.date_sub(func.current_date(), interval=1 month)
-        ).group_by(Partner).order_by(
+        trending_partners = db.query(Partner).join(
+            Transaction, Transaction.partner_id == Partner.id
+        ).filter(
+            Transaction.created_at >= datetime.utcnow() - timedelta(days=30)
+        ).group_by(Partner.id).order_by(
             func.count(Transaction.id).desc()
         ).limit(limit).all()
         
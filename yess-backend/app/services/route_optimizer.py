@@ -0,0 +1,230 @@
+"""
+Оптимизация порядка посещения точек маршрута
+
+Матрица расстояний считается один раз, затем:
+1. Жадная затравка методом ближайшего соседа
+2. Улучшение 2-opt (разворот отрезков)
+3. Улучшение Or-opt (перенос цепочек из 1-3 точек)
+Улучшения выполняются, пока есть выигрыш и не исчерпан бюджет времени.
+Маршрут открытый: начало и конец могут быть зафиксированы.
+"""
+import time
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.geo import distance_matrix_km
+
+logger = logging.getLogger(__name__)
+
+# Минимальный выигрыш, который считается улучшением (км)
+EPSILON = 1e-9
+
+# Сколько стартовых точек пробовать для затравки, если начало не задано
+MAX_SEEDS = 16
+
+
+@dataclass
+class OptimizedRoute:
+    """Результат оптимизации"""
+    order: List[int]  # индексы точек в порядке посещения
+    distance_km: float
+    seed_distance_km: float  # длина маршрута после ближайшего соседа
+    elapsed_ms: float
+    timed_out: bool = False
+
+
+def route_length(order: Sequence[int], distances) -> float:
+    """Длина открытого маршрута по матрице расстояний"""
+    return float(sum(distances[order[k]][order[k + 1]] for k in range(len(order) - 1)))
+
+
+class RouteOptimizer:
+    """Оптимизатор открытого маршрута с фиксированными началом/концом"""
+
+    def __init__(self, time_budget_ms: float = 200):
+        self.time_budget_ms = time_budget_ms
+
+    def optimize_points(
+        self,
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        start: Optional[int] = 0,
+        end: Optional[int] = None
+    ) -> OptimizedRoute:
+        """Оптимизация по координатам (матрица Haversine)"""
+        return self.optimize(distance_matrix_km(latitudes, longitudes), start=start, end=end)
+
+    def optimize(
+        self,
+        distances: np.ndarray,
+        start: Optional[int] = 0,
+        end: Optional[int] = None
+    ) -> OptimizedRoute:
+        """
+        Оптимизация по готовой матрице расстояний
+
+        :param distances: матрица N×N
+        :param start: индекс фиксированной начальной точки (None - любая)
+        :param end: индекс фиксированной конечной точки (None - любая)
+        """
+        started = time.perf_counter()
+        deadline = started + self.time_budget_ms / 1000
+        n = len(distances)
+
+        if start is not None and end is not None and start == end:
+            raise ValueError("Начальная и конечная точки должны различаться")
+
+        if n <= 2:
+            order = list(range(n))
+            if start is not None and order and order[0] != start:
+                order.reverse()
+            if end is not None and order and order[-1] != end:
+                order.reverse()
+            length = route_length(order, distances)
+            return OptimizedRoute(order, length, length, (time.perf_counter() - started) * 1000)
+
+        # Python-списки быстрее numpy для поэлементного доступа во внутренних циклах
+        d = distances.tolist() if isinstance(distances, np.ndarray) else distances
+
+        route = self._nearest_neighbour(distances, start, end)
+        seed_length = route_length(route, d)
+
+        timed_out = False
+        improved = True
+        while improved:
+            if time.perf_counter() >= deadline:
+                timed_out = True
+                break
+            improved = self._two_opt(route, d, start is not None, end is not None, deadline)
+            improved = self._or_opt(route, d, start is not None, end is not None, deadline) or improved
+
+        return OptimizedRoute(
+            order=route,
+            distance_km=route_length(route, d),
+            seed_distance_km=seed_length,
+            elapsed_ms=(time.perf_counter() - started) * 1000,
+            timed_out=timed_out or time.perf_counter() >= deadline,
+        )
+
+    # Затравка
+
+    @staticmethod
+    def _nearest_neighbour_from(distances: np.ndarray, seed: int, end: Optional[int]) -> List[int]:
+        n = len(distances)
+        visited = np.zeros(n, dtype=bool)
+        visited[seed] = True
+        if end is not None:
+            visited[end] = True
+
+        order = [seed]
+        remaining = n - int(visited.sum())
+        for _ in range(remaining):
+            row = np.where(visited, np.inf, distances[order[-1]])
+            nearest = int(np.argmin(row))
+            order.append(nearest)
+            visited[nearest] = True
+
+        if end is not None:
+            order.append(end)
+        return order
+
+    def _nearest_neighbour(self, distances: np.ndarray, start: Optional[int], end: Optional[int]) -> List[int]:
+        if start is not None:
+            return self._nearest_neighbour_from(distances, start, end)
+
+        seeds = [i for i in range(len(distances)) if i != end][:MAX_SEEDS]
+        candidates = [self._nearest_neighbour_from(distances, seed, end) for seed in seeds]
+        return min(candidates, key=lambda order: route_length(order, distances))
+
+    # Улучшения
+
+    @staticmethod
+    def _two_opt(route: List[int], d, fixed_start: bool, fixed_end: bool, deadline: float) -> bool:
+        """Разворот отрезка route[i..j], если это сокращает маршрут"""
+        n = len(route)
+        first = 1 if fixed_start else 0
+        last = n - 2 if fixed_end else n - 1
+        improved_any = False
+        improved = True
+
+        while improved:
+            improved = False
+            for i in range(first, last):
+                if time.perf_counter() >= deadline:
+                    return improved_any
+
+                a = route[i - 1] if i > 0 else None
+                for j in range(i + 1, last + 1):
+                    b = route[i]
+                    c = route[j]
+                    e = route[j + 1] if j < n - 1 else None
+
+                    before = (d[a][b] if a is not None else 0.0) + (d[c][e] if e is not None else 0.0)
+                    after = (d[a][c] if a is not None else 0.0) + (d[b][e] if e is not None else 0.0)
+                    if after < before - EPSILON:
+                        route[i:j + 1] = route[i:j + 1][::-1]
+                        improved = improved_any = True
+
+        return improved_any
+
+    @staticmethod
+    def _or_opt(route: List[int], d, fixed_start: bool, fixed_end: bool, deadline: float) -> bool:
+        """Перенос цепочки из 1-3 точек (возможно, развёрнутой) в лучшее место"""
+        n = len(route)
+        improved_any = False
+
+        for seg_len in (1, 2, 3):
+            i = 1 if fixed_start else 0
+            while i + seg_len <= (n - 1 if fixed_end else n):
+                if time.perf_counter() >= deadline:
+                    return improved_any
+
+                segment = route[i:i + seg_len]
+                prev = route[i - 1] if i > 0 else None
+                nxt = route[i + seg_len] if i + seg_len < n else None
+
+                removal_gain = (
+                    (d[prev][segment[0]] if prev is not None else 0.0)
+                    + (d[segment[-1]][nxt] if nxt is not None else 0.0)
+                    - (d[prev][nxt] if prev is not None and nxt is not None else 0.0)
+                )
+
+                rest = route[:i] + route[i + seg_len:]
+                lo = 1 if fixed_start else 0
+                hi = len(rest) - 1 if fixed_end else len(rest)
+                variants = (segment, segment[::-1]) if seg_len > 1 else (segment,)
+
+                best = None
+                for k in range(lo, hi + 1):
+                    left = rest[k - 1] if k > 0 else None
+                    right = rest[k] if k < len(rest) else None
+                    base = d[left][right] if left is not None and right is not None else 0.0
+
+                    for variant in variants:
+                        if k == i and variant is segment:
+                            continue
+                        added = (
+                            (d[left][variant[0]] if left is not None else 0.0)
+                            + (d[variant[-1]][right] if right is not None else 0.0)
+                            - base
+                        )
+                        if added < removal_gain - EPSILON and (best is None or added < best[0]):
+                            best = (added, k, variant)
+
+                if best is None:
+                    i += 1
+                    continue
+
+                _, k, variant = best
+                route[:] = rest[:k] + list(variant) + rest[k:]
+                improved_any = True
+
+        return improved_any
+
+
+# Singleton
+route_optimizer = RouteOptimizer(time_budget_ms=settings.ROUTE_OPTIMIZATION_TIME_BUDGET_MS)
@@ -1,8 +1,6 @@
-import requests
 import logging
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
-from geopy.distance import geodesic
 
 from app.models.partner import PartnerLocation
 from app.schemas.route import (
@@ -12,7 +10,10 @@ from app.schemas.route import (
     TransportMode
 )
 from app.core.config import settings
+from app.core.geo import path_legs_km
+from app.services.route_optimizer import route_optimizer
 from app.core.exceptions import ExternalServiceException
+from app.core.map_client import map_client, route_cache_key
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +22,7 @@ class RouteService:
     MAPBOX_API_URL = "https://api.mapbox.com/directions/v5/mapbox"
 
     @classmethod
-    def calculate_route(
+    async def calculate_route(
         cls, 
         db: Session, 
         request: RouteRequest
@@ -40,10 +41,14 @@ class RouteService:
                 raise ValueError("Требуется минимум две локации для построения маршрута")
 
             # Оптимизация порядка локаций
-            optimized_locations = cls._optimize_route_order(locations)
+            if request.optimize_route:
+                optimized_locations = cls._optimize_route_order(locations)
+            else:
+                positions = {loc_id: i for i, loc_id in enumerate(request.partner_location_ids)}
+                optimized_locations = sorted(locations, key=lambda loc: positions[loc.id])
 
             # Выбор провайдера карт
-            route_data = cls._get_route_from_provider(
+            route_data = await cls._get_route_from_provider(
                 locations=optimized_locations, 
                 mode=request.transport_mode or TransportMode.DRIVING
             )
@@ -55,7 +60,7 @@ class RouteService:
             raise ExternalServiceException(f"Не удалось построить маршрут: {e}")
 
     @classmethod
-    def _get_route_from_provider(
+    async def _get_route_from_provider(
         cls, 
         locations: List[PartnerLocation], 
         mode: TransportMode = TransportMode.DRIVING
@@ -63,15 +68,16 @@ class RouteService:
         """
         Получение маршрута от провайдера карт
         Приоритет: Google Maps → Mapbox → Fallback расчет
+        Ошибки провайдера и разомкнутый circuit breaker ведут к fallback
         """
         try:
             # Попытка использовать Google Maps
             if settings.GOOGLE_MAPS_API_KEY:
-                return cls._get_google_maps_route(locations, mode)
+                return await cls._get_google_maps_route(locations, mode)
             
             # Fallback на Mapbox
             if settings.MAPBOX_API_KEY:
-                return cls._get_mapbox_route(locations, mode)
+                return await cls._get_mapbox_route(locations, mode)
             
             # Fallback на простой расчет расстояния
             return cls._calculate_simple_route(locations)
@@ -81,12 +87,19 @@ class RouteService:
             return cls._calculate_simple_route(locations)
 
     @classmethod
-    def _get_google_maps_route(
+    async def _get_google_maps_route(
         cls, 
         locations: List[PartnerLocation], 
         mode: TransportMode
     ) -> Dict[str, Any]:
         """Получение маршрута через Google Maps API"""
+        cache_key = route_cache_key(
+            "google", [(loc.latitude, loc.longitude) for loc in locations], mode.value
+        )
+        cached = map_client.cached(cache_key)
+        if cached is not None:
+            return cached
+
         waypoints = [
             f"{loc.latitude},{loc.longitude}" for loc in locations[1:-1]
         ]
@@ -99,14 +112,13 @@ class RouteService:
             "key": settings.GOOGLE_MAPS_API_KEY
         }
 
-        response = requests.get(cls.GOOGLE_MAPS_API_URL, params=params)
-        data = response.json()
+        data = await map_client.get_json("google", cls.GOOGLE_MAPS_API_URL, params)
 
         if data['status'] != 'OK':
             raise ExternalServiceException("Ошибка Google Maps API")
 
         route = data['routes'][0]
-        return {
+        result = {
             "total_distance": route['legs'][-1]['distance']['text'],
             "estimated_time": route['legs'][-1]['duration']['text'],
             "route_points": [
@@ -118,14 +130,23 @@ class RouteService:
                 } for leg in route['legs']
             ]
         }
+        map_client.remember(cache_key, result)
+        return result
 
     @classmethod
-    def _get_mapbox_route(
+    async def _get_mapbox_route(
         cls, 
         locations: List[PartnerLocation], 
         mode: TransportMode
     ) -> Dict[str, Any]:
         """Получение маршрута через Mapbox API"""
+        cache_key = route_cache_key(
+            "mapbox", [(loc.latitude, loc.longitude) for loc in locations], mode.value
+        )
+        cached = map_client.cached(cache_key)
+        if cached is not None:
+            return cached
+
         coordinates = ";".join([
             f"{loc.longitude},{loc.latitude}" for loc in locations
         ])
@@ -137,17 +158,18 @@ class RouteService:
             "overview": "full"
         }
 
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = await map_client.get_json("mapbox", url, params)
 
         if data.get('code') != 'Ok':
             raise ExternalServiceException("Ошибка Mapbox API")
 
-        return {
+        result = {
             "total_distance": f"{data['routes'][0]['distance'] / 1000:.2f} km",
             "estimated_time": f"{data['routes'][0]['duration'] / 60:.0f} min",
             "route_points": []  # Можно добавить детали
         }
+        map_client.remember(cache_key, result)
+        return result
 
     @classmethod
     def _calculate_simple_route(
@@ -158,19 +180,17 @@ class RouteService:
         Простой расчет расстояния между точками
         Используется как fallback
         """
-        total_distance = 0
+        legs = path_legs_km(
+            [loc.latitude for loc in locations],
+            [loc.longitude for loc in locations]
+        )
+        total_distance = float(legs.sum())
         route_points = []
 
-        for i in range(len(locations) - 1):
+        for i, distance in enumerate(legs):
             start = locations[i]
             end = locations[i + 1]
 
-            distance = geodesic(
-                (start.latitude, start.longitude),
-                (end.latitude, end.longitude)
-            ).kilometers
-
-            total_distance += distance
             route_points.append({
                 "start": {"lat": start.latitude, "lng": start.longitude},
                 "end": {"lat": end.latitude, "lng": end.longitude},
@@ -183,34 +203,53 @@ class RouteService:
             "route_points": route_points
         }
 
+    @classmethod
+    def optimize_location_order(
+        cls, 
+        locations: List[PartnerLocation],
+        start_location_id: Optional[int] = None,
+        end_location_id: Optional[int] = None
+    ) -> List[PartnerLocation]:
+        """
+        Оптимизация порядка локаций с фиксированными началом/концом по ID
+        Без start_location_id маршрут начинается с первой локации списка,
+        если она не назначена концом - тогда начало выбирает оптимизатор
+        """
+        index_by_id = {loc.id: i for i, loc in enumerate(locations)}
+        end_index = index_by_id.get(end_location_id) if end_location_id is not None else None
+
+        if start_location_id in index_by_id:
+            start_index = index_by_id[start_location_id]
+        else:
+            start_index = 0 if end_index != 0 else None
+
+        # Явно заданные совпадающие начало и конец - маршрут без фиксированного конца
+        if end_index == start_index:
+            end_index = None
+
+        return cls._optimize_route_order(locations, start_index, end_index)
+
     @classmethod
     def _optimize_route_order(
         cls, 
-        locations: List[PartnerLocation]
+        locations: List[PartnerLocation],
+        start_index: Optional[int] = 0,
+        end_index: Optional[int] = None
     ) -> List[PartnerLocation]:
         """
         Оптимизация порядка локаций
-        Используется алгоритм ближайшего соседа
+        Ближайший сосед + 2-opt/Or-opt по единой матрице расстояний
         """
-        if len(locations) <= 2:
+        if len(locations) <= 2 and end_index is None:
             return locations
 
-        unvisited = locations[1:]
-        optimized = [locations[0]]
-
-        while unvisited:
-            current = optimized[-1]
-            nearest = min(
-                unvisited, 
-                key=lambda loc: geodesic(
-                    (current.latitude, current.longitude),
-                    (loc.latitude, loc.longitude)
-                ).kilometers
-            )
-            optimized.append(nearest)
-            unvisited.remove(nearest)
-
-        return optimized
+        result = route_optimizer.optimize_points(
+            [loc.latitude for loc in locations],
+            [loc.longitude for loc in locations],
+            start=start_index,
+            end=end_index
+        )
+        return [locations[i] for i in result.order]
 
 # Singleton
 route_service = RouteService()
@@ -0,0 +1,296 @@
+"""
+In-memory пространственный индекс локаций партнёров
+Сетка ячеек по широте/долготе + точное уточнение по Haversine
+"""
+import math
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session, joinedload
+
+from app.core.config import settings
+from app.core.geo import bounding_box, haversine_km_batch
+from app.core.working_hours import WorkingHoursIndex, is_open_at, parse_working_hours
+from app.models.partner import Partner, PartnerLocation
+
+logger = logging.getLogger(__name__)
+
+Cell = Tuple[int, int]
+
+
+@dataclass
+class IndexedLocation:
+    """Снимок локации партнёра, достаточный для ответа на nearby-запрос"""
+    id: int
+    partner_id: int
+    partner_name: str
+    category: Optional[str]
+    address: Optional[str]
+    latitude: float
+    longitude: float
+    phone_number: Optional[str]
+    working_hours: Optional[Any]
+    max_discount_percent: float
+    is_verified: bool = False
+    open_intervals: Optional[Sequence[int]] = None  # см. app.core.working_hours
+
+    @classmethod
+    def from_model(cls, location: PartnerLocation) -> "IndexedLocation":
+        partner = location.partner
+        return cls(
+            id=location.id,
+            partner_id=location.partner_id,
+            partner_name=partner.name,
+            category=partner.category,
+            address=location.address,
+            latitude=float(location.latitude),
+            longitude=float(location.longitude),
+            phone_number=location.phone_number,
+            working_hours=location.working_hours,
+            max_discount_percent=float(partner.default_cashback_rate or 0),
+            is_verified=bool(partner.is_verified),
+            open_intervals=(
+                location.open_intervals
+                if location.open_intervals is not None
+                else parse_working_hours(location.working_hours)
+            ),
+        )
+
+    def to_response_dict(self) -> Dict[str, Any]:
+        """Поля PartnerLocationResponse"""
+        return {
+            "id": self.id,
+            "partner_id": self.partner_id,
+            "partner_name": self.partner_name,
+            "address": self.address,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "phone_number": self.phone_number,
+            "working_hours": self.working_hours,
+            "max_discount_percent": self.max_discount_percent,
+            "open_intervals": self.open_intervals,
+        }
+
+    def is_open_at(self, minute: int) -> bool:
+        return is_open_at(self.open_intervals, minute)
+
+
+class PartnerSpatialIndex:
+    """
+    Сеточный индекс активных локаций партнёров
+
+    Точки раскладываются по ячейкам фиксированного размера в градусах.
+    Запрос перебирает только ячейки, пересекающие ограничивающий
+    прямоугольник радиуса, и уточняет кандидатов точной формулой Haversine.
+    """
+
+    def __init__(self, cell_size_deg: float = 0.05, max_age_seconds: Optional[int] = None):
+        self.cell_size_deg = cell_size_deg
+        self.max_age_seconds = max_age_seconds
+        self._cells: Dict[Cell, Dict[int, IndexedLocation]] = {}
+        self._locations: Dict[int, IndexedLocation] = {}
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        # Индекс расписаний перестраивается лениво после изменений
+        self._hours = WorkingHoursIndex()
+        self._hours_dirty = True
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    @property
+    def is_stale(self) -> bool:
+        """Индекс не построен или устарел (изменения из других воркеров)"""
+        if self._built_at is None:
+            return True
+        if not self.max_age_seconds:
+            return False
+        return time.monotonic() - self._built_at > self.max_age_seconds
+
+    def _cell_of(self, latitude: float, longitude: float) -> Cell:
+        return (
+            int(math.floor(latitude / self.cell_size_deg)),
+            int(math.floor(longitude / self.cell_size_deg)),
+        )
+
+    # Построение и инкрементальное обновление
+
+    def load(self, entries: Iterable[IndexedLocation]) -> int:
+        """Полная замена содержимого индекса"""
+        cells: Dict[Cell, Dict[int, IndexedLocation]] = {}
+        locations: Dict[int, IndexedLocation] = {}
+
+        for entry in entries:
+            locations[entry.id] = entry
+            cells.setdefault(self._cell_of(entry.latitude, entry.longitude), {})[entry.id] = entry
+
+        with self._lock:
+            self._cells = cells
+            self._locations = locations
+            self._built_at = time.monotonic()
+            self._hours_dirty = True
+
+        return len(locations)
+
+    def build(self, db: Session) -> int:
+        """Построение индекса из таблиц partners / partner_locations"""
+        locations = db.query(PartnerLocation).join(Partner).options(
+            joinedload(PartnerLocation.partner)
+        ).filter(
+            PartnerLocation.is_active == True,
+            Partner.is_active == True,
+            PartnerLocation.latitude.isnot(None),
+            PartnerLocation.longitude.isnot(None)
+        ).all()
+
+        count = self.load(IndexedLocation.from_model(loc) for loc in locations)
+        logger.info(f"Partner spatial index built: {count} locations")
+        return count
+
+    def ensure_built(self, db: Session) -> None:
+        """Ленивое построение/перестроение индекса"""
+        if self.is_stale:
+            self.build(db)
+
+    def upsert(self, entry: IndexedLocation) -> None:
+        """Добавление или перемещение одной локации"""
+        with self._lock:
+            self._discard(entry.id)
+            self._hours_dirty = True
+            self._locations[entry.id] = entry
+            self._cells.setdefault(self._cell_of(entry.latitude, entry.longitude), {})[entry.id] = entry
+
+    def remove(self, location_id: int) -> None:
+        """Удаление локации из индекса"""
+        with self._lock:
+            self._discard(location_id)
+            self._hours_dirty = True
+
+    def refresh_location(self, location: PartnerLocation) -> None:
+        """Синхронизация индекса с закоммиченной локацией"""
+        partner = location.partner
+        if (
+            not location.is_active
+            or partner is None
+            or not partner.is_active
+            or location.latitude is None
+            or location.longitude is None
+        ):
+            self.remove(location.id)
+            return
+
+        self.upsert(IndexedLocation.from_model(location))
+
+    def _discard(self, location_id: int) -> None:
+        previous = self._locations.pop(location_id, None)
+        if previous is None:
+            return
+
+        cell = self._cell_of(previous.latitude, previous.longitude)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(location_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    # Запросы
+
+    def _hours_index(self) -> WorkingHoursIndex:
+        with self._lock:
+            if self._hours_dirty:
+                self._hours.build(
+                    (entry.id, entry.open_intervals) for entry in self._locations.values()
+                )
+                self._hours_dirty = False
+            return self._hours
+
+    def open_location_ids(self, minute: int) -> np.ndarray:
+        """ID локаций, открытых в минуту недели (все проиндексированные)"""
+        return self._hours_index().open_ids(minute)
+
+    def _candidate_cells(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Cell]:
+        lat_from, lon_from = self._cell_of(min_lat, min_lon)
+        lat_to, lon_to = self._cell_of(max_lat, max_lon)
+
+        # Для больших радиусов дешевле пройти по занятым ячейкам
+        span = (lat_to - lat_from + 1) * (lon_to - lon_from + 1)
+        if span > len(self._cells):
+            return [
+                cell for cell in self._cells
+                if lat_from <= cell[0] <= lat_to and lon_from <= cell[1] <= lon_to
+            ]
+
+        return [
+            (lat_cell, lon_cell)
+            for lat_cell in range(lat_from, lat_to + 1)
+            for lon_cell in range(lon_from, lon_to + 1)
+        ]
+
+    def query(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        categories: Optional[Set[str]] = None,
+        min_cashback: Optional[float] = None,
+        is_verified: Optional[bool] = None,
+        limit: Optional[int] = None,
+        open_at_minute: Optional[int] = None
+    ) -> List[Tuple[IndexedLocation, float]]:
+        """
+        Локации в радиусе, отсортированные по расстоянию
+
+        :param open_at_minute: только открытые в минуту недели (week_minute)
+        :return: список пар (локация, расстояние в км)
+        """
+        min_lat, min_lon, max_lat, max_lon = bounding_box(latitude, longitude, radius_km)
+
+        with self._lock:
+            candidates = []
+            for cell in self._candidate_cells(min_lat, min_lon, max_lat, max_lon):
+                bucket = self._cells.get(cell)
+                if bucket:
+                    candidates.extend(bucket.values())
+
+        candidates = [
+            entry for entry in candidates
+            if (not categories or entry.category in categories)
+            and (min_cashback is None or entry.max_discount_percent >= min_cashback)
+            and (not is_verified or entry.is_verified)
+        ]
+        if open_at_minute is not None and candidates:
+            hours = self._hours_index()
+            open_mask = hours.open_mask(open_at_minute)
+            positions = [hours.position(entry.id) for entry in candidates]
+            candidates = [
+                entry for entry, position in zip(candidates, positions)
+                if (open_mask[position] if position is not None else entry.is_open_at(open_at_minute))
+            ]
+        if not candidates:
+            return []
+
+        lats = np.fromiter((entry.latitude for entry in candidates), dtype=np.float64, count=len(candidates))
+        lons = np.fromiter((entry.longitude for entry in candidates), dtype=np.float64, count=len(candidates))
+
+        # Префильтр по прямоугольнику, затем точный Haversine одним вызовом
+        in_box = np.flatnonzero(
+            (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        )
+        distances = haversine_km_batch(latitude, longitude, lats[in_box], lons[in_box])
+        inside = in_box[distances <= radius_km]
+        distances = distances[distances <= radius_km]
+
+        order = np.argsort(distances, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+
+        return [(candidates[inside[i]], float(distances[i])) for i in order]
+
+# Singleton
+partner_spatial_index = PartnerSpatialIndex(
+    max_age_seconds=settings.SPATIAL_INDEX_MAX_AGE_SECONDS
+)
@@ -0,0 +1,374 @@
+"""
+Профиль трат пользователя для персонализации предложений
+
+Компактный профиль (траты по категориям, визиты и последний визит
+по партнёрам) хранится в Redis hash `spend_profile:{user_id}` и
+кэшируется в in-process LRU. Профиль обновляется инкрементально на каждой
+завершённой транзакции и может быть перестроен из таблицы transactions.
+
+Визиты считаются и за всё время, и по дням за последние RECENT_VISIT_DAYS
+дней (скользящее окно для предложений). Перестройка из БД и инкременты
+не теряют и не задваивают транзакции: перестройка ставит маркер до чтения
+БД, инкремент во время перестройки (или в течение REBUILD_GRACE после неё)
+сбрасывает hash вместо инкремента, и снимок не записывается - hash
+строится заново при следующем чтении.
+"""
+import time
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.cache import redis_cache
+from app.core.config import settings
+from app.core.ttl_cache import TTLCache
+from app.models.partner import Partner
+from app.models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "spend_profile"
+# Поле-маркер: пустой профиль отличается от отсутствующего
+BUILT_FIELD = "_built"
+# Окно "недавних" визитов, дней
+RECENT_VISIT_DAYS = 30
+# Маркер перестройки живёт не дольше REBUILD_TIMEOUT; после записи снимка -
+# ещё REBUILD_GRACE секунд для запоздавших инкрементов
+REBUILD_TIMEOUT = 300
+REBUILD_GRACE = 10
+
+
+def profile_key(user_id: int) -> str:
+    return f"{KEY_PREFIX}:{user_id}"
+
+
+def rebuild_marker(user_id: int) -> str:
+    return f"{KEY_PREFIX}:rebuild:{user_id}"
+
+
+def day_number(timestamp: float) -> int:
+    """Номер дня (UTC) от начала эпохи"""
+    return int(timestamp // 86400)
+
+
+@dataclass
+class SpendProfile:
+    """Агрегированные траты пользователя"""
+    user_id: int
+    category_spend: Dict[str, float] = field(default_factory=dict)
+    partner_visits: Dict[int, int] = field(default_factory=dict)
+    last_visits: Dict[int, float] = field(default_factory=dict)  # partner_id -> unix time
+    # partner_id -> {номер дня: визитов}, только последние RECENT_VISIT_DAYS дней
+    daily_visits: Dict[int, Dict[int, int]] = field(default_factory=dict)
+
+    def spend_in_category(self, category: Optional[str]) -> float:
+        return self.category_spend.get(category or "", 0.0)
+
+    def visits(self, partner_id: int) -> int:
+        """Визиты за всё время"""
+        return self.partner_visits.get(partner_id, 0)
+
+    def recent_visits(self, partner_id: int, days: int = RECENT_VISIT_DAYS, now: Optional[float] = None) -> int:
+        """Визиты за последние days дней (days <= RECENT_VISIT_DAYS)"""
+        first_day = day_number(now if now is not None else time.time()) - days + 1
+        return sum(
+            count for day, count in self.daily_visits.get(partner_id, {}).items()
+            if day >= first_day
+        )
+
+    def last_visit(self, partner_id: int) -> Optional[datetime]:
+        timestamp = self.last_visits.get(partner_id)
+        return datetime.utcfromtimestamp(timestamp) if timestamp is not None else None
+
+    def top_categories(self, limit: int = 3) -> List[str]:
+        ranked = sorted(self.category_spend.items(), key=lambda item: item[1], reverse=True)
+        return [category for category, _ in ranked[:limit] if category]
+
+    def apply(self, category: Optional[str], partner_id: int, amount: float, timestamp: float) -> None:
+        """Учёт одной завершённой транзакции"""
+        category = category or ""
+        self.category_spend[category] = self.category_spend.get(category, 0.0) + amount
+        self.partner_visits[partner_id] = self.partner_visits.get(partner_id, 0) + 1
+        self.last_visits[partner_id] = max(self.last_visits.get(partner_id, 0.0), timestamp)
+        days = self.daily_visits.setdefault(partner_id, {})
+        day = day_number(timestamp)
+        days[day] = days.get(day, 0) + 1
+
+    # Формат Redis hash: c:<category>, v:<partner_id>, t:<partner_id>,
+    # d:<partner_id>:<день> (дни старше окна не пишутся и не читаются)
+
+    def to_hash(self) -> Dict[str, str]:
+        first_day = day_number(time.time()) - RECENT_VISIT_DAYS + 1
+        data = {BUILT_FIELD: "1"}
+        data.update({f"c:{category}": repr(amount) for category, amount in self.category_spend.items()})
+        data.update({f"v:{partner_id}": str(count) for partner_id, count in self.partner_visits.items()})
+        data.update({f"t:{partner_id}": repr(ts) for partner_id, ts in self.last_visits.items()})
+        data.update({
+            f"d:{partner_id}:{day}": str(count)
+            for partner_id, days in self.daily_visits.items()
+            for day, count in days.items() if day >= first_day
+        })
+        return data
+
+    @classmethod
+    def from_hash(cls, user_id: int, data: Dict[str, str]) -> "SpendProfile":
+        profile = cls(user_id=user_id)
+        first_day = day_number(time.time()) - RECENT_VISIT_DAYS + 1
+        for name, value in data.items():
+            kind, _, ident = name.partition(":")
+            if kind == "c":
+                profile.category_spend[ident] = float(value)
+            elif kind == "v":
+                profile.partner_visits[int(ident)] = int(float(value))
+            elif kind == "t":
+                profile.last_visits[int(ident)] = float(value)
+            elif kind == "d":
+                partner_id, _, day = ident.partition(":")
+                if int(day) >= first_day:
+                    profile.daily_visits.setdefault(int(partner_id), {})[int(day)] = int(float(value))
+        return profile
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+    """Unix time для naive datetime в UTC (как пишет datetime.utcnow)"""
+    if value is None:
+        return time.time()
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _day(value) -> int:
+    """Номер дня для func.date(): date (PostgreSQL) или строка (SQLite)"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return (value - date(1970, 1, 1)).days
+
+
+class SpendProfileService:
+    """Чтение и инкрементальное обновление профилей трат"""
+
+    def __init__(self, ttl: int, lru_size: int, lru_ttl: float):
+        self.ttl = ttl
+        self.local = TTLCache(max_size=lru_size, ttl=lru_ttl)
+
+    # Построение из БД
+
+    @staticmethod
+    def _aggregate_query(db: Session):
+        """Агрегаты завершённых транзакций по (user, partner)"""
+        return db.query(
+            Transaction.user_id,
+            Transaction.partner_id,
+            Partner.category,
+            func.sum(Transaction.amount),
+            func.count(Transaction.id),
+            func.max(func.coalesce(Transaction.completed_at, Transaction.created_at))
+        ).join(
+            Partner, Partner.id == Transaction.partner_id
+        ).filter(
+            Transaction.status == "completed"
+        ).group_by(
+            Transaction.user_id, Transaction.partner_id, Partner.category
+        )
+
+    @staticmethod
+    def _daily_query(db: Session, user_ids: List[int]):
+        """Визиты по дням за окно RECENT_VISIT_DAYS: (user, partner, день)"""
+        visited_at = func.coalesce(Transaction.completed_at, Transaction.created_at)
+        since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(
+            days=RECENT_VISIT_DAYS - 1
+        )
+        return db.query(
+            Transaction.user_id,
+            Transaction.partner_id,
+            func.date(visited_at),
+            func.count(Transaction.id)
+        ).filter(
+            Transaction.status == "completed",
+            Transaction.partner_id.isnot(None),
+            Transaction.user_id.in_(user_ids),
+            visited_at >= since
+        ).group_by(
+            Transaction.user_id, Transaction.partner_id, func.date(visited_at)
+        )
+
+    @staticmethod
+    def _fold_daily(rows: Iterable, profiles: Dict[int, SpendProfile]) -> None:
+        for user_id, partner_id, visited_on, count in rows:
+            profile = profiles.setdefault(user_id, SpendProfile(user_id=user_id))
+            profile.daily_visits.setdefault(partner_id, {})[_day(visited_on)] = int(count)
+
+    @staticmethod
+    def _fold(rows: Iterable, profiles: Dict[int, SpendProfile]) -> None:
+        for user_id, partner_id, category, total, count, last_at in rows:
+            profile = profiles.setdefault(user_id, SpendProfile(user_id=user_id))
+            category = category or ""
+            profile.category_spend[category] = profile.category_spend.get(category, 0.0) + float(total or 0)
+            profile.partner_visits[partner_id] = int(count)
+            profile.last_visits[partner_id] = _timestamp(last_at)
+
+    def build_from_db(self, db: Session, user_ids: Iterable[int]) -> Dict[int, SpendProfile]:
+        """Профили пользователей одним агрегирующим запросом"""
+        user_ids = list(user_ids)
+        profiles = {user_id: SpendProfile(user_id=user_id) for user_id in user_ids}
+        if user_ids:
+            self._fold(
+                self._aggregate_query(db).filter(Transaction.user_id.in_(user_ids)).all(),
+                profiles
+            )
+            self._fold_daily(self._daily_query(db, user_ids).all(), profiles)
+        return profiles
+
+    def iter_user_ids(self, db: Session, batch_size: int = 1000) -> Iterator[List[int]]:
+        """Пользователи с завершёнными транзакциями, пачками"""
+        query = db.query(Transaction.user_id).filter(
+            Transaction.status == "completed"
+        ).distinct().order_by(Transaction.user_id).yield_per(batch_size)
+
+        batch: List[int] = []
+        for (user_id,) in query:
+            batch.append(user_id)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # Чтение
+
+    async def get_profiles(self, db: Session, user_ids: Iterable[int]) -> Dict[int, SpendProfile]:
+        """
+        Профили для набора пользователей: LRU -> Redis (один pipeline)
+        -> один агрегирующий запрос к БД для оставшихся
+        """
+        profiles: Dict[int, SpendProfile] = {}
+        missing = []
+        for user_id in set(user_ids):
+            profile = self.local.get(user_id)
+            if profile is not None:
+                profiles[user_id] = profile
+            else:
+                missing.append(user_id)
+
+        if not missing:
+            return profiles
+
+        stored = await redis_cache.get_hashes(*(profile_key(user_id) for user_id in missing))
+        not_in_redis = []
+        for user_id, data in zip(missing, stored):
+            if data and BUILT_FIELD in data:
+                profile = SpendProfile.from_hash(user_id, data)
+                profiles[user_id] = profile
+                self.local.set(user_id, profile)
+            else:
+                not_in_redis.append(user_id)
+
+        if not_in_redis:
+            # Маркер - до чтения БД: инкремент между чтением и записью снимка
+            # отменит запись, а не потеряется
+            token = await redis_cache.begin_hash_rebuild(
+                (rebuild_marker(user_id) for user_id in not_in_redis), REBUILD_TIMEOUT
+            )
+            built = self.build_from_db(db, not_in_redis)
+            stored_ids = await self._store(built, token)
+            for user_id, profile in built.items():
+                profiles[user_id] = profile
+                # Снимок, который не записан из-за параллельного инкремента,
+                # может отставать - в LRU не кладётся
+                if token is None or user_id in stored_ids:
+                    self.local.set(user_id, profile)
+
+        return profiles
+
+    async def _store(self, built: Dict[int, SpendProfile], token: Optional[str]) -> set:
+        """Запись снимков перестройки, начатой с token; возвращает записанных пользователей"""
+        if token is None:
+            return set()
+        written = await redis_cache.finish_hash_rebuild(
+            {profile_key(user_id): profile.to_hash() for user_id, profile in built.items()},
+            {profile_key(user_id): rebuild_marker(user_id) for user_id in built},
+            token,
+            ttl=self.ttl,
+            grace=REBUILD_GRACE
+        )
+        written = set(written)
+        return {user_id for user_id in built if profile_key(user_id) in written}
+
+    async def get_profile(self, db: Session, user_id: int) -> SpendProfile:
+        return (await self.get_profiles(db, [user_id]))[user_id]
+
+    def get_profile_sync(self, db: Optional[Session], user_id: int) -> SpendProfile:
+        """Синхронное чтение для sync-кода: LRU -> агрегирующий запрос"""
+        profile = self.local.get(user_id)
+        if profile is None:
+            if db is None:
+                return SpendProfile(user_id=user_id)
+            profile = self.build_from_db(db, [user_id])[user_id]
+            self.local.set(user_id, profile)
+        return profile
+
+    # Обновление
+
+    async def record_transaction(self, transaction: Transaction, category: Optional[str]) -> None:
+        """
+        Инкрементальный учёт завершённой транзакции у партнёра
+        Вызывается после коммита транзакции
+        """
+        if transaction.partner_id is None or transaction.status != "completed":
+            return
+
+        amount = float(transaction.amount)
+        timestamp = _timestamp(transaction.completed_at or transaction.created_at)
+
+        # Отсутствующий hash не трогаем: он будет построен из БД целиком
+        # (уже с этой транзакцией) при следующем чтении. Во время перестройки
+        # hash сбрасывается - снимок мог не увидеть эту транзакцию
+        updated = await redis_cache.update_hash_if_exists(
+            profile_key(transaction.user_id),
+            increments={
+                f"c:{category or ''}": amount,
+                f"v:{transaction.partner_id}": 1,
+                f"d:{transaction.partner_id}:{day_number(timestamp)}": 1,
+            },
+            values={f"t:{transaction.partner_id}": repr(timestamp)},
+            ttl=self.ttl,
+            rebuild_marker=rebuild_marker(transaction.user_id),
+            # Дни, вышедшие из окна, удаляются - hash активного пользователя не растёт
+            prune=("d:", day_number(time.time()) - RECENT_VISIT_DAYS + 1)
+        )
+
+        local = self.local.get(transaction.user_id)
+        if local is not None:
+            if updated or not redis_cache.enabled:
+                local.apply(category, transaction.partner_id, amount, timestamp)
+            else:
+                self.local.delete(transaction.user_id)
+
+    async def invalidate(self, user_id: int) -> None:
+        self.local.delete(user_id)
+        await redis_cache.delete(profile_key(user_id))
+
+    async def rebuild_all(self, db: Session, batch_size: int = 1000) -> int:
+        """Полная перестройка профилей из таблицы transactions"""
+        total = 0
+        for user_ids in self.iter_user_ids(db, batch_size=batch_size):
+            # Маркеры - до чтения пачки из БД (как в get_profiles)
+            token = await redis_cache.begin_hash_rebuild(
+                (rebuild_marker(user_id) for user_id in user_ids), REBUILD_TIMEOUT
+            )
+            total += len(await self._store(self.build_from_db(db, user_ids), token))
+        self.local.clear()
+        logger.info(f"Spend profiles rebuilt: {total} users")
+        return total
+
+
+# Singleton
+spend_profile_service = SpendProfileService(
+    ttl=settings.SPEND_PROFILE_TTL,
+    lru_size=settings.SPEND_PROFILE_LRU_SIZE,
+    lru_ttl=settings.SPEND_PROFILE_LRU_TTL
+)
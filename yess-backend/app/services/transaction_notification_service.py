@@ -1,4 +1,5 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Union
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.core.notifications import SMSService, PushNotificationService
 from app.models.user import User
@@ -20,7 +21,7 @@ class TransactionNotificationService:
         user: User, 
         transaction: Transaction, 
         partner: Partner,
-        db: Session
+        db: Union[Session, AsyncSession]
     ):
         """
         Комплексное уведомление о транзакции
@@ -81,7 +82,7 @@ class TransactionNotificationService:
 
     async def _create_in_app_notification(
         self, 
-        db: Session, 
+        db: Union[Session, AsyncSession], 
         user: User, 
         transaction: Transaction, 
         partner: Partner
@@ -107,8 +108,11 @@ class TransactionNotificationService:
         )
         
         db.add(notification)
-        db.commit()
-        db.refresh(notification)
+        if isinstance(db, AsyncSession):
+            await db.commit()
+        else:
+            db.commit()
+            db.refresh(notification)
 
 # Singleton
 transaction_notification_service = TransactionNotificationService(
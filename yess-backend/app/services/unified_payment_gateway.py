@@ -14,6 +14,7 @@ from ..models.transaction import Transaction
 from ..models.wallet import Wallet
 from ..core.database import get_db
 from ..schemas.payment import PaymentRequest, PaymentResponse
+from .wallet_balance_service import wallet_balance_service
 
 logger = logging.getLogger(__name__)
 
@@ -279,12 +280,12 @@ class UnifiedPaymentGateway:
         else:
             wallet.balance += amount
         
-        db.commit()
+        await wallet_balance_service.commit(db)
     
     async def _get_user_balance(self, user_id: int, db: Session) -> float:
         """Получение баланса пользователя"""
-        wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
-        return wallet.balance if wallet else 0.0
+        snapshot = await wallet_balance_service.get_balance(db, user_id)
+        return snapshot.balance if snapshot else 0.0
     
     async def get_payment_methods(self) -> Dict[str, Any]:
         """Получение доступных методов оплаты"""
@@ -0,0 +1,193 @@
+"""
+Сквозной кэш балансов кошельков
+
+Запись `wallet_balance:{user_id}` версионирована (RedisCache.set_versioned)
+версией строки wallets.version, которая растёт на каждом UPDATE. Код,
+меняющий баланс, вместо db.commit() вызывает commit(db):
+
+1. flush - UPDATE в транзакции, у кошелька новая версия;
+2. reserve_version - пока эта версия не записана, чтения из кэша - промахи,
+   а значения старых версий (прочитанные из БД до коммита) отклоняются;
+3. коммит в БД;
+4. set_versioned - новый баланс с новой версией.
+
+Чтение: запись кэша, иначе БД с заполнением кэша (отклоняется, если за это
+время закоммичена более новая версия). Поэтому баланс из кэша не старее
+последнего закоммиченного изменения. Если Redis недоступен во время
+коммита, запись может отставать не дольше WALLET_BALANCE_CACHE_TTL.
+
+apply(db, change) - commit(db) с повтором change на свежих данных, если
+кошелёк параллельно изменён (StaleDataError проверки версии).
+"""
+import inspect
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, List, Optional, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.core.cache import RedisCache, redis_cache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "wallet_balance"
+
+
+def balance_key(user_id: int) -> str:
+    return f"{KEY_PREFIX}:{user_id}"
+
+
+async def _call(func: Callable[[], Union[Any, Awaitable[Any]]]) -> Any:
+    result = func()
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+@dataclass
+class BalanceSnapshot:
+    """Баланс кошелька на момент версии version"""
+    user_id: int
+    balance: Decimal
+    version: int
+    last_updated: Optional[datetime] = None
+
+    @classmethod
+    def from_wallet(cls, wallet) -> "BalanceSnapshot":
+        return cls(
+            user_id=wallet.user_id,
+            balance=Decimal(str(wallet.balance)),
+            version=wallet.version,
+            last_updated=wallet.last_updated
+        )
+
+    def to_cache(self) -> dict:
+        return {
+            "balance": str(self.balance),
+            "last_updated": self.last_updated.isoformat() if self.last_updated else None,
+        }
+
+    @classmethod
+    def from_cache(cls, user_id: int, version: int, data: dict) -> "BalanceSnapshot":
+        return cls(
+            user_id=user_id,
+            balance=Decimal(data["balance"]),
+            version=version,
+            last_updated=datetime.fromisoformat(data["last_updated"]) if data.get("last_updated") else None
+        )
+
+
+class WalletBalanceService:
+    """Чтение балансов из кэша и сквозная запись при изменении"""
+
+    def __init__(self, ttl: int = 300, reserve_ttl: int = 30, cache: Optional[RedisCache] = None):
+        self.ttl = ttl
+        self.reserve_ttl = reserve_ttl
+        self.cache = cache or redis_cache
+
+    async def get_cached(self, user_id: int) -> Optional[BalanceSnapshot]:
+        entry = await self.cache.get_versioned(balance_key(user_id))
+        if entry is None:
+            return None
+        version, data = entry
+        return BalanceSnapshot.from_cache(user_id, version, data)
+
+    async def store(self, snapshot: BalanceSnapshot) -> bool:
+        """False - в кэше уже более новая версия (или резерв), значение не записано"""
+        return await self.cache.set_versioned(
+            balance_key(snapshot.user_id), snapshot.version, snapshot.to_cache(), ttl=self.ttl
+        )
+
+    async def read_through(
+        self,
+        user_id: int,
+        loader: Callable[[], Union[Optional[BalanceSnapshot], Awaitable[Optional[BalanceSnapshot]]]]
+    ) -> Optional[BalanceSnapshot]:
+        """Кэш, при промахе loader (чтение БД) с заполнением кэша"""
+        snapshot = await self.get_cached(user_id)
+        if snapshot is not None:
+            return snapshot
+
+        snapshot = await _call(loader)
+        if snapshot is not None:
+            await self.store(snapshot)
+        return snapshot
+
+    async def write_through(
+        self,
+        flush: Callable[[], Union[List[BalanceSnapshot], Awaitable[List[BalanceSnapshot]]]],
+        commit: Callable[[], Union[None, Awaitable[None]]]
+    ) -> List[BalanceSnapshot]:
+        """
+        flush - изменения в БД без коммита, возвращает балансы с новыми версиями;
+        commit - коммит. Ошибка коммита пробрасывается, резерв истекает сам
+        """
+        snapshots = await _call(flush)
+        for snapshot in snapshots:
+            await self.cache.reserve_version(balance_key(snapshot.user_id), snapshot.version, self.reserve_ttl)
+
+        await _call(commit)
+
+        for snapshot in snapshots:
+            await self.store(snapshot)
+        return snapshots
+
+    async def get_balance(self, db: Union[Session, AsyncSession], user_id: int) -> Optional[BalanceSnapshot]:
+        """Баланс пользователя; None - кошелька нет. db - обычная или async сессия"""
+        from app.models.wallet import Wallet
+
+        async def load() -> Optional[BalanceSnapshot]:
+            if isinstance(db, AsyncSession):
+                wallet = (await db.execute(select(Wallet).where(Wallet.user_id == user_id))).scalars().first()
+            else:
+                wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+            return BalanceSnapshot.from_wallet(wallet) if wallet is not None else None
+
+        return await self.read_through(user_id, load)
+
+    async def commit(self, db: Union[Session, AsyncSession]) -> List[BalanceSnapshot]:
+        """db.commit() для кода, меняющего балансы: изменённые кошельки попадают в кэш"""
+        from app.models.wallet import Wallet
+
+        wallets = [obj for obj in (*db.new, *db.dirty) if isinstance(obj, Wallet)]
+
+        async def flush() -> List[BalanceSnapshot]:
+            await _call(db.flush)
+            return [BalanceSnapshot.from_wallet(wallet) for wallet in wallets]
+
+        return await self.write_through(flush, db.commit)
+
+    async def apply(
+        self,
+        db: Union[Session, AsyncSession],
+        change: Callable[[], Union[None, Awaitable[None]]],
+        attempts: int = 3
+    ) -> List[BalanceSnapshot]:
+        """
+        change() меняет балансы в db, затем commit(db). При StaleDataError -
+        rollback (объекты сессии перечитываются) и повтор change; после
+        attempts неудач StaleDataError пробрасывается
+        """
+        for attempt in range(1, attempts + 1):
+            await _call(change)
+            try:
+                return await self.commit(db)
+            except StaleDataError:
+                await _call(db.rollback)
+                if attempt == attempts:
+                    raise
+                logger.info(f"Wallet changed concurrently, retrying ({attempt}/{attempts})")
+        return []
+
+
+# Singleton
+wallet_balance_service = WalletBalanceService(
+    ttl=settings.WALLET_BALANCE_CACHE_TTL,
+    reserve_ttl=settings.WALLET_BALANCE_RESERVE_TTL
+)
@@ -16,6 +16,7 @@ from app.models.payment import Transaction, PaymentMethod
 from app.models.user import User
 from app.models.wallet import Wallet
 from app.core.config import settings
+from app.services.wallet_balance_service import wallet_balance_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -97,7 +98,7 @@ class WebhookHandler:
                 elif status == "cancelled":
                     await self._process_cancelled_payment(db, transaction)
                 
-                db.commit()
+                await wallet_balance_service.commit(db)
                 
                 logger.info(f"Transaction {transaction_id} status updated: {old_status} -> {status}")
                 
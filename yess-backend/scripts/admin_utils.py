@@ -84,6 +84,17 @@ class AdminCLI:
         except subprocess.CalledProcessError as e:
             print(f"Ошибка выполнения миграций: {e}")
 
+    @staticmethod
+    def warm_cache(datasets: Optional[List[str]] = None):
+        """Прогрев кэша (scripts/warm_cache.py)"""
+        command = [sys.executable, "-m", "scripts.warm_cache"]
+        if datasets:
+            command += ["--datasets", *datasets]
+        try:
+            subprocess.run(command, check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Ошибка прогрева кэша: {e}")
+
     @classmethod
     def main(cls):
         """Точка входа CLI"""
@@ -107,6 +118,10 @@ class AdminCLI:
         # Миграции
         subparsers.add_parser("migrate")
 
+        # Прогрев кэша
+        warm_cache_parser = subparsers.add_parser("warm-cache")
+        warm_cache_parser.add_argument("--datasets", nargs="+", help="Наборы данных (по умолчанию все)")
+
         args = parser.parse_args()
 
         if args.command == "create-admin":
@@ -121,6 +136,8 @@ class AdminCLI:
             cls.backup_database(args.output)
         elif args.command == "migrate":
             cls.run_migrations()
+        elif args.command == "warm-cache":
+            cls.warm_cache(args.datasets)
         else:
             parser.print_help()
 
@@ -0,0 +1,128 @@
+"""
+Нагрузочный бенчмарк: синхронная сессия против AsyncSession в async-эндпоинте
+
+Два одинаковых эндпоинта читают баланс кошелька (с pg_sleep - имитация
+медленного запроса): /sync через SessionLocal (как get_db), /async через
+AsyncSessionLocal (как get_async_db). Запросы идут от --clients
+одновременных клиентов в одном процессе с приложением (ASGI), поэтому
+блокировка event loop синхронным запросом видна так же, как в воркере
+uvicorn. С --url нагружается уже запущенный сервер (например /api/v1/wallet/?userId=1).
+Выводятся requests/sec и задержки p50/p95/p99/max.
+
+Запуск:
+    python -m scripts.bench_async_db
+    python -m scripts.bench_async_db --clients 200 --requests 4000 --query-delay 0.005
+    python -m scripts.bench_async_db --url "http://localhost:8000/api/v1/wallet/?userId=1"
+"""
+import time
+import asyncio
+import argparse
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import text
+
+from app.core.database import AsyncSessionLocal, SessionLocal, engine, get_async_engine
+
+QUERY = text("SELECT balance, pg_sleep(:delay) FROM wallets WHERE user_id = :user_id")
+
+
+def build_app(delay: float, user_id: int) -> FastAPI:
+    app = FastAPI()
+    params = {"delay": delay, "user_id": user_id}
+
+    @app.get("/sync")
+    async def sync_balance():
+        db = SessionLocal()
+        try:
+            row = db.execute(QUERY, params).first()
+        finally:
+            db.close()
+        return {"balance": str(row[0]) if row else None}
+
+    @app.get("/async")
+    async def async_balance():
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(QUERY, params)).first()
+        return {"balance": str(row[0]) if row else None}
+
+    return app
+
+
+def percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run_load(client: httpx.AsyncClient, url: str, clients: int, requests: int) -> None:
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    if not latencies:
+        print(f"{url:40s} все {errors} запросов с ошибкой")
+        return
+    print(
+        f"{url:40s} {len(latencies) / elapsed:10.1f} "
+        + " ".join(f"{percentile(latencies, q) * 1000:8.1f}" for q in (0.5, 0.95, 0.99))
+        + f" {latencies[-1] * 1000:8.1f} {errors:7d}"
+    )
+
+
+async def main_async(args) -> None:
+    header = f"{'endpoint':40s} {'req/s':>10s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} {'errors':>7s}"
+    limits = httpx.Limits(max_connections=args.clients)
+
+    if args.url:
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            print(header)
+            await run_load(client, args.url, args.clients, args.requests)
+        return
+
+    app = build_app(args.query_delay, args.user_id)
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=60) as client:
+            # Прогрев пулов соединений
+            await client.get("/sync")
+            await client.get("/async")
+            print(f"{args.clients} clients, {args.requests} requests, query delay {args.query_delay * 1000:.1f} ms")
+            print(header)
+            for path in ("/sync", "/async"):
+                await run_load(client, path, args.clients, args.requests)
+    finally:
+        await get_async_engine().dispose()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк sync/async сессий БД")
+    parser.add_argument("--clients", type=int, default=200, help="одновременных клиентов")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--query-delay", type=float, default=0.005, help="pg_sleep в запросе, секунд")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--url", default=None, help="нагрузить запущенный сервер")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
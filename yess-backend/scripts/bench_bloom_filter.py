@@ -0,0 +1,102 @@
+"""
+Бенчмарк фильтра существования под потоком случайных промо-кодов
+
+Фильтр строится из valid кодов (8 символов, как generate_promo_code), затем
+проверяется flood случайных кодов. Для каждой доли ложных срабатываний
+выводятся память, число хэш-функций, наблюдаемая доля ложных срабатываний
+(столько запросов дойдёт до БД) и пропускная способность проверки.
+С --redis-url дополнительно замеряется ExistenceFilter.lookup целиком
+(фильтр + промахи в Redis) против запроса на каждый код.
+
+Запуск:
+    python -m scripts.bench_bloom_filter
+    python -m scripts.bench_bloom_filter --valid 200000 --flood 500000 --error-rates 0.01 0.001 0.0001
+    python -m scripts.bench_bloom_filter --redis-url redis://localhost:6379/15 --db-latency 0.002
+"""
+import time
+import random
+import string
+import asyncio
+import argparse
+
+from app.core.bloom_filter import BloomFilter, ExistenceFilter
+
+ALPHABET = string.ascii_uppercase + string.digits
+
+
+def random_codes(count: int, rnd: random.Random, length: int = 8) -> list:
+    return ["".join(rnd.choice(ALPHABET) for _ in range(length)) for _ in range(count)]
+
+
+def bench_filter(valid: list, flood: list, error_rate: float, growth: float) -> None:
+    started = time.perf_counter()
+    bloom = BloomFilter.from_values(valid, error_rate, growth)
+    build_s = time.perf_counter() - started
+
+    valid_set = set(valid)
+    started = time.perf_counter()
+    passed = sum(1 for code in flood if code in bloom)
+    check_s = time.perf_counter() - started
+    false_positives = passed - sum(1 for code in flood if code in valid_set)
+
+    print(
+        f"{error_rate:<10g} {bloom.memory_bytes / 1024:10.1f} {bloom.hashes:6d} "
+        f"{false_positives / len(flood):12.5f} {bloom.estimated_error_rate():12.5f} "
+        f"{len(flood) / check_s:14,.0f} {build_s:8.2f}"
+    )
+
+
+async def bench_lookup(valid: list, flood: list, error_rate: float, redis_url: str, db_latency: float) -> None:
+    from app.core.cache import RedisCache
+
+    cache = RedisCache(url=redis_url, name="bench")
+    guard = ExistenceFilter("bench_codes", error_rate=error_rate, negative_ttl=60, cache=cache)
+    guard.rebuild(valid)
+    valid_set = set(valid)
+    db_queries = 0
+
+    def load(code):
+        nonlocal db_queries
+        db_queries += 1
+        time.sleep(db_latency)
+        return code if code in valid_set else None
+
+    started = time.perf_counter()
+    for code in flood:
+        await guard.lookup(code, lambda: load(code))
+    guarded_s = time.perf_counter() - started
+    await cache.close()
+
+    print(f"\nlookup: {len(flood)} random codes, db latency {db_latency * 1000:.1f} ms")
+    print(f"  with filter:    {guarded_s:8.2f} s, {db_queries} DB queries, {guard.stats}")
+    print(f"  without filter: {len(flood) * db_latency:8.2f} s (оценка), {len(flood)} DB queries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк Bloom filter промо-кодов")
+    parser.add_argument("--valid", type=int, default=100000, help="существующих кодов")
+    parser.add_argument("--flood", type=int, default=200000, help="случайных кодов в проверке")
+    parser.add_argument("--error-rates", type=float, nargs="+", default=[0.01, 0.001, 0.0001])
+    parser.add_argument("--growth", type=float, default=1.0, help="запас ёмкости (BLOOM_FILTER_GROWTH)")
+    parser.add_argument("--redis-url", default=None, help="замерить lookup с промахами в Redis")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="имитация запроса в БД, секунд")
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    valid = random_codes(args.valid, rnd)
+    flood = random_codes(args.flood, rnd)
+
+    print(f"{args.valid} valid codes, {args.flood} random lookups, growth {args.growth}")
+    print(
+        f"{'error rate':<10s} {'memory KB':>10s} {'hashes':>6s} {'observed fp':>12s} "
+        f"{'expected fp':>12s} {'checks/s':>14s} {'build s':>8s}"
+    )
+    for error_rate in args.error_rates:
+        bench_filter(valid, flood, error_rate, args.growth)
+
+    if args.redis_url:
+        asyncio.run(bench_lookup(valid, flood[:20000], args.error_rates[-1], args.redis_url, args.db_latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Бенчмарк кодеков кэша: время encode/decode и размер записи
+
+Типичные значения: список партнёров города (500 записей), профиль
+пользователя, баланс кошелька. Сравниваются прежний json.dumps/loads и
+CacheCodec со всеми доступными сериализаторами и алгоритмами сжатия
+(отсутствующие опциональные библиотеки пропускаются). С --redis-url
+записи сохраняются в Redis и сравнивается MEMORY USAGE.
+
+Запуск:
+    python -m scripts.bench_cache_codec
+    python -m scripts.bench_cache_codec --partners 500 --rounds 200 --redis-url redis://localhost:6379/15
+"""
+import json
+import time
+import random
+import argparse
+from decimal import Decimal
+from datetime import datetime, timedelta
+
+from app.core.cache_codec import CacheCodec, COMPRESSIONS, SERIALIZERS
+
+KEY_PREFIX = "bench:codec"
+
+CATEGORIES = ["Кафе", "Рестораны", "Продукты", "Одежда", "Красота", "Аптеки", "АЗС"]
+
+
+def partners_payload(count: int) -> list:
+    rnd = random.Random(7)
+    created = datetime(2024, 1, 1)
+    return [
+        {
+            "id": i,
+            "name": f"Партнёр {i} {rnd.choice(CATEGORIES)}",
+            "category": rnd.choice(CATEGORIES),
+            "description": "Скидки и кэшбэк для участников программы лояльности YESS. " * 2,
+            "logo_url": f"https://cdn.yess.kg/partners/{i}/logo.png",
+            "city_id": 1,
+            "cashback_rate": Decimal(f"{rnd.randint(1, 15)}.{rnd.randint(0, 99):02d}"),
+            "is_verified": rnd.random() < 0.7,
+            "latitude": 42.87 + rnd.random() / 10,
+            "longitude": 74.59 + rnd.random() / 10,
+            "rating": round(rnd.uniform(3, 5), 1),
+            "created_at": created + timedelta(days=i),
+        }
+        for i in range(count)
+    ]
+
+
+def user_payload() -> dict:
+    return {
+        "id": 42,
+        "phone": "+996555123456",
+        "name": "Айгуль",
+        "loyalty_level": "gold",
+        "balance": Decimal("1520.75"),
+        "favorite_categories": ["Кафе", "Продукты"],
+        "last_login": datetime(2024, 5, 1, 12, 30),
+    }
+
+
+def wallet_payload() -> dict:
+    return {"user_id": 42, "balance": Decimal("1520.75"), "version": 118}
+
+
+def legacy_json(value) -> bytes:
+    """Прежний путь: json.dumps без default падает на Decimal/datetime"""
+    return json.dumps(value, default=str).encode()
+
+
+def measure(encode, decode, value, rounds: int):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        data = encode(value)
+    encode_us = (time.perf_counter() - started) / rounds * 1e6
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        decode(data)
+    decode_us = (time.perf_counter() - started) / rounds * 1e6
+    return encode_us, decode_us, data
+
+
+def variants():
+    yield "json (прежний)", legacy_json, json.loads
+    for serializer in SERIALIZERS:
+        for compression in COMPRESSIONS:
+            try:
+                codec = CacheCodec(serializer=serializer, compression=compression)
+            except RuntimeError:
+                continue
+            yield f"{serializer}+{compression}", codec.encode, codec.decode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк кодеков кэша")
+    parser.add_argument("--partners", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--redis-url", default=None, help="замерить MEMORY USAGE в Redis")
+    args = parser.parse_args()
+
+    client = None
+    if args.redis_url:
+        from redis import Redis
+        client = Redis.from_url(args.redis_url)
+
+    payloads = (
+        (f"city list ({args.partners})", partners_payload(args.partners)),
+        ("user profile", user_payload()),
+        ("wallet balance", wallet_payload()),
+    )
+    for title, value in payloads:
+        print(f"\n{title}")
+        print(f"{'codec':18s} {'encode us':>10s} {'decode us':>10s} {'bytes':>9s}" + ("  redis bytes" if client else ""))
+        for label, encode, decode in variants():
+            encode_us, decode_us, data = measure(encode, decode, value, args.rounds)
+            line = f"{label:18s} {encode_us:10.1f} {decode_us:10.1f} {len(data):9d}"
+            if client is not None:
+                key = f"{KEY_PREFIX}:{label}"
+                client.set(key, data)
+                line += f"  {client.memory_usage(key):11d}"
+                client.delete(key)
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Бенчмарк групповой инвалидации кэша при 1M ключей в Redis
+
+Сравниваются: KEYS pattern + DEL (прежний clear_pattern), теги
+(RedisCache.invalidate_tags) и версия пространства имён (bump_namespace).
+Параллельный поток пингует Redis отдельным соединением: максимальная
+задержка PING во время операции - время, на которое Redis был заблокирован
+для остальных клиентов. Нужен запущенный Redis (лучше отдельная база).
+
+Запуск:
+    python -m scripts.bench_cache_invalidation --redis-url redis://localhost:6379/15
+    python -m scripts.bench_cache_invalidation --keys 1000000 --tagged 20000
+"""
+import time
+import asyncio
+import argparse
+import threading
+
+from redis import Redis
+
+from app.core.cache import RedisCache, tag_key
+
+PREFIX = "bench:inv"
+TAG = "bench:city:1"
+NAMESPACE = "bench:ns"
+
+
+class PingProbe:
+    """Фоновые PING отдельным соединением, максимум задержки за окно"""
+
+    def __init__(self, url: str):
+        self.client = Redis.from_url(url)
+        self.max_latency = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.max_latency = 0.0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            self.client.ping()
+            self.max_latency = max(self.max_latency, time.perf_counter() - started)
+            time.sleep(0.001)
+
+
+def seed(client: Redis, total: int, tagged: int, batch: int = 10000) -> None:
+    """total ключей, из них tagged - 'городские' (имя по шаблону + тег)"""
+    for offset in range(0, total, batch):
+        pipe = client.pipeline(transaction=False)
+        for i in range(offset, min(offset + batch, total)):
+            name = f"{PREFIX}:city:{i}" if i < tagged else f"{PREFIX}:other:{i}"
+            pipe.setex(name, 3600, "x" * 64)
+        pipe.execute()
+
+    for offset in range(0, tagged, batch):
+        members = [f"{PREFIX}:city:{i}" for i in range(offset, min(offset + batch, tagged))]
+        client.sadd(tag_key(TAG), *members)
+
+
+def reseed_tagged(client: Redis, tagged: int, batch: int = 10000) -> None:
+    for offset in range(0, tagged, batch):
+        members = [f"{PREFIX}:city:{i}" for i in range(offset, min(offset + batch, tagged))]
+        pipe = client.pipeline(transaction=False)
+        for name in members:
+            pipe.setex(name, 3600, "x" * 64)
+        pipe.sadd(tag_key(TAG), *members)
+        pipe.execute()
+
+
+def cleanup(client: Redis) -> None:
+    for pattern in (f"{PREFIX}:*", f"{tag_key(TAG)}", f"ns:{NAMESPACE}"):
+        batch = []
+        for name in client.scan_iter(match=pattern, count=10000):
+            batch.append(name)
+            if len(batch) >= 10000:
+                client.unlink(*batch)
+                batch = []
+        if batch:
+            client.unlink(*batch)
+
+
+def report(label: str, elapsed: float, probe: PingProbe, removed) -> None:
+    print(
+        f"{label:22s} {elapsed * 1000:10.1f} ms   "
+        f"max PING during op {probe.max_latency * 1000:8.1f} ms   removed {removed}"
+    )
+
+
+async def run(args) -> None:
+    client = Redis.from_url(args.redis_url)
+    cache = RedisCache(url=args.redis_url)
+    probe = PingProbe(args.redis_url)
+
+    started = time.perf_counter()
+    seed(client, args.keys, args.tagged)
+    print(f"seeded {args.keys} keys ({args.tagged} tagged) in {time.perf_counter() - started:.1f} s")
+
+    try:
+        # Прежний clear_pattern
+        with probe:
+            started = time.perf_counter()
+            names = client.keys(f"{PREFIX}:city:*")
+            removed = client.delete(*names) if names else 0
+            elapsed = time.perf_counter() - started
+        report("KEYS + DEL", elapsed, probe, removed)
+
+        reseed_tagged(client, args.tagged)
+        with probe:
+            started = time.perf_counter()
+            removed = await cache.invalidate_tags(TAG)
+            elapsed = time.perf_counter() - started
+        report("invalidate_tags", elapsed, probe, removed)
+
+        with probe:
+            started = time.perf_counter()
+            version = await cache.bump_namespace(NAMESPACE)
+            elapsed = time.perf_counter() - started
+        report("bump_namespace", elapsed, probe, f"version -> {version}")
+    finally:
+        if not args.keep:
+            cleanup(client)
+        await cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк инвалидации кэша")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--keys", type=int, default=1000000)
+    parser.add_argument("--tagged", type=int, default=10000)
+    parser.add_argument("--keep", action="store_true", help="не удалять ключи после замера")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Бенчмарк движка геозон: пропускная способность в пингах/сек
+
+Сравнивается пакетный матчинг с поштучной проверкой всех геозон
+(аналог запроса ST_DWithin на каждый пинг без сетевых накладных).
+
+Запуск:
+    python -m scripts.bench_geofence
+    python -m scripts.bench_geofence --geofences 20000 --pings 200000 --batch-size 5000
+"""
+import time
+import random
+import argparse
+
+import numpy as np
+
+from app.core.geo import haversine_km_batch
+from app.services.geofence_engine import Geofence, GeofenceEngine, LocationPing
+
+CENTER_LAT = 42.8746
+CENTER_LON = 74.5698
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк движка геозон")
+    parser.add_argument("--geofences", type=int, default=5000)
+    parser.add_argument("--pings", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--radius-km", type=float, default=0.5)
+    parser.add_argument("--naive-pings", type=int, default=2000)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    geofences = [
+        Geofence(
+            location_id=i,
+            partner_id=i // 3,
+            latitude=CENTER_LAT + rnd.uniform(-0.15, 0.15),
+            longitude=CENTER_LON + rnd.uniform(-0.2, 0.2),
+            radius_km=args.radius_km
+        )
+        for i in range(args.geofences)
+    ]
+    pings = [
+        LocationPing(
+            user_id=rnd.randrange(args.users),
+            latitude=CENTER_LAT + rnd.uniform(-0.15, 0.15),
+            longitude=CENTER_LON + rnd.uniform(-0.2, 0.2),
+            timestamp=float(i)
+        )
+        for i in range(args.pings)
+    ]
+
+    engine = GeofenceEngine(default_radius_km=args.radius_km, cooldown_seconds=3600)
+    started = time.perf_counter()
+    engine.load(geofences)
+    print(f"load {args.geofences} geofences: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    events = 0
+    started = time.perf_counter()
+    for offset in range(0, len(pings), args.batch_size):
+        events += sum(1 for _ in engine.process(pings[offset:offset + args.batch_size]))
+    elapsed = time.perf_counter() - started
+    print(
+        f"engine: {args.pings} pings, batch {args.batch_size}: "
+        f"{args.pings / elapsed:,.0f} pings/s, events after cooldown {events}, "
+        f"suppressed pairs tracked {len(engine.cooldown)}"
+    )
+
+    lats = np.array([g.latitude for g in geofences])
+    lons = np.array([g.longitude for g in geofences])
+    naive = pings[:args.naive_pings]
+    started = time.perf_counter()
+    for ping in naive:
+        distances = haversine_km_batch(ping.latitude, ping.longitude, lats, lons)
+        np.flatnonzero(distances <= args.radius_km)
+    elapsed = time.perf_counter() - started
+    print(f"per-ping scan: {len(naive)} pings: {len(naive) / elapsed:,.0f} pings/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Микро-бенчмарк расчёта расстояний: поштучный Haversine против numpy-ядра
+
+Запуск:
+    python -m scripts.bench_haversine --points 10000 --repeat 20
+"""
+import time
+import random
+import argparse
+import statistics
+
+import numpy as np
+
+from app.core.geo import haversine_km, haversine_km_batch, distance_matrix_km
+
+CENTER_LAT = 42.8746
+CENTER_LON = 74.5698
+
+
+def timed(func, repeat: int) -> float:
+    """Медианное время одного прогона в миллисекундах"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк Haversine")
+    parser.add_argument("--points", type=int, default=10_000)
+    parser.add_argument("--matrix", type=int, default=200, help="Размер N для матрицы N×N")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    points = [
+        (CENTER_LAT + rnd.uniform(-0.5, 0.5), CENTER_LON + rnd.uniform(-0.5, 0.5))
+        for _ in range(args.points)
+    ]
+    lats = np.array([p[0] for p in points])
+    lons = np.array([p[1] for p in points])
+    origin_lat, origin_lon = CENTER_LAT, CENTER_LON
+
+    def per_call_sort():
+        return sorted(points, key=lambda p: haversine_km(origin_lat, origin_lon, p[0], p[1]))
+
+    def batch_sort():
+        return np.argsort(haversine_km_batch(origin_lat, origin_lon, lats, lons))
+
+    per_call_ms = timed(per_call_sort, args.repeat)
+    batch_ms = timed(batch_sort, args.repeat)
+
+    print(f"Sort {args.points} points by distance")
+    print(f"  per-call: {per_call_ms:8.2f} ms  ({args.points / per_call_ms * 1000:,.0f} points/s)")
+    print(f"  batch:    {batch_ms:8.2f} ms  ({args.points / batch_ms * 1000:,.0f} points/s)")
+    print(f"  speedup:  {per_call_ms / batch_ms:8.1f}x")
+
+    n = args.matrix
+    matrix_points = points[:n]
+
+    def per_call_matrix():
+        return [
+            [haversine_km(a[0], a[1], b[0], b[1]) for b in matrix_points]
+            for a in matrix_points
+        ]
+
+    def batch_matrix():
+        return distance_matrix_km(lats[:n], lons[:n])
+
+    per_call_ms = timed(per_call_matrix, args.repeat)
+    batch_ms = timed(batch_matrix, args.repeat)
+
+    print(f"Distance matrix {n}x{n}")
+    print(f"  per-call: {per_call_ms:8.2f} ms")
+    print(f"  batch:    {batch_ms:8.2f} ms")
+    print(f"  speedup:  {per_call_ms / batch_ms:8.1f}x")
+
+    # Контроль корректности
+    reference = np.array([haversine_km(origin_lat, origin_lon, la, lo) for la, lo in points])
+    max_error = float(np.max(np.abs(reference - haversine_km_batch(origin_lat, origin_lon, lats, lons))))
+    print(f"Max abs error vs scalar: {max_error:.3e} km")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Бенчмарк тайлов карты против списка GET /partners/locations
+
+Сравнивается размер ответа (сырой и gzip) и время сервера на
+сериализацию: весь список активных локаций против тайлов,
+покрывающих экран телефона (4x5 тайлов) на нескольких зумах.
+
+Запуск:
+    python -m scripts.bench_map_tiles
+    python -m scripts.bench_map_tiles --locations 50000 --zooms 7 11 14 16
+"""
+import gzip
+import json
+import time
+import random
+import argparse
+
+from app.core.geo import tile_for_point, tile_bounds
+from app.schemas.partner import PartnerLocationResponse
+from app.services.map_tile_service import MapTileService, TilePoint
+
+# Кыргызстан и центр Бишкека
+COUNTRY_BOX = (39.2, 69.3, 43.3, 80.3)
+CENTER_LAT = 42.8746
+CENTER_LON = 74.5698
+CATEGORIES = ["food", "cafe", "beauty", "fitness", "clothes", "electronics"]
+
+
+def make_points(count: int, seed: int = 42):
+    rnd = random.Random(seed)
+    points = []
+    for i in range(count):
+        # 70% точек в Бишкеке, остальные по стране
+        if rnd.random() < 0.7:
+            lat = CENTER_LAT + rnd.gauss(0, 0.05)
+            lon = CENTER_LON + rnd.gauss(0, 0.07)
+        else:
+            lat = rnd.uniform(COUNTRY_BOX[0], COUNTRY_BOX[2])
+            lon = rnd.uniform(COUNTRY_BOX[1], COUNTRY_BOX[3])
+        partner_id = i // 4
+        points.append(TilePoint(
+            location_id=i,
+            partner_id=partner_id,
+            partner_name=f"Партнёр {partner_id}",
+            category=CATEGORIES[partner_id % len(CATEGORIES)],
+            max_discount_percent=float(5 + partner_id % 20),
+            latitude=lat,
+            longitude=lon
+        ))
+    return points
+
+
+def legacy_payload(points) -> bytes:
+    """Ответ текущего списка (все поля PartnerLocationResponse)"""
+    items = [
+        PartnerLocationResponse(
+            id=p.location_id,
+            partner_id=p.partner_id,
+            partner_name=p.partner_name,
+            address=f"ул. Примерная, {p.location_id}",
+            latitude=p.latitude,
+            longitude=p.longitude,
+            phone_number="+996700000000",
+            working_hours="09:00-21:00",
+            max_discount_percent=p.max_discount_percent
+        ).dict()
+        for p in points
+    ]
+    return json.dumps(items, ensure_ascii=False).encode("utf-8")
+
+
+def viewport_tiles(zoom: int, columns: int = 4, rows: int = 5):
+    cx, cy = tile_for_point(CENTER_LAT, CENTER_LON, zoom)
+    n = 1 << zoom
+    return [
+        (zoom, x % n, y)
+        for x in range(cx - columns // 2, cx - columns // 2 + columns)
+        for y in range(cy - rows // 2, cy - rows // 2 + rows)
+        if 0 <= y < n
+    ]
+
+
+def points_in_tile(points, zoom, x, y):
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(zoom, x, y)
+    return [
+        p for p in points
+        if min_lat <= p.latitude < max_lat and min_lon <= p.longitude < max_lon
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк тайлов карты")
+    parser.add_argument("--locations", type=int, default=20000)
+    parser.add_argument("--zooms", type=int, nargs="+", default=[7, 10, 12, 14, 16])
+    args = parser.parse_args()
+
+    points = make_points(args.locations)
+    service = MapTileService()
+
+    started = time.perf_counter()
+    legacy = legacy_payload(points)
+    legacy_ms = (time.perf_counter() - started) * 1000
+    print(f"locations: {args.locations}")
+    print(
+        f"{'list endpoint':>16}: {len(legacy) / 1024:>9.1f} KiB raw "
+        f"{len(gzip.compress(legacy)) / 1024:>8.1f} KiB gzip {legacy_ms:>8.1f} ms"
+    )
+
+    for zoom in args.zooms:
+        tiles = viewport_tiles(zoom)
+        raw = compressed = pins = 0
+        encode_ms = 0.0
+        for z, x, y in tiles:
+            # Выборка по bbox в бенчмарке не учитывается (в сервисе - запрос к БД)
+            tile_points = points_in_tile(points, z, x, y)
+            started = time.perf_counter()
+            tile = service.encode(z, x, y, tile_points)
+            encode_ms += (time.perf_counter() - started) * 1000
+            raw += len(tile.body)
+            compressed += len(gzip.compress(tile.body))
+            pins += len(tile_points)
+        print(
+            f"{f'z{zoom} x{len(tiles)} tiles':>16}: {raw / 1024:>9.1f} KiB raw "
+            f"{compressed / 1024:>8.1f} KiB gzip {encode_ms:>8.1f} ms (cold, {pins} locations)"
+        )
+
+
+if __name__ == "__main__":
+    main()
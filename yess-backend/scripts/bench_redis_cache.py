@@ -0,0 +1,128 @@
+"""
+Нагрузочный бенчмарк RedisCache: синхронный клиент внутри async против redis.asyncio
+
+"До" - прежняя схема: redis.Redis вызывается из async-метода и блокирует
+event loop на каждый round-trip. "После" - RedisCache на redis.asyncio с
+общим пулом. Оба варианта выполняют одинаковую смесь get/set из N
+конкурентных корутин; параллельно измеряется задержка event loop.
+Нужен запущенный Redis.
+
+Запуск:
+    python -m scripts.bench_redis_cache --redis-url redis://localhost:6379/15
+    python -m scripts.bench_redis_cache --concurrency 500 --requests 20000
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from redis import Redis
+
+from app.core.cache import RedisCache
+
+KEY_PREFIX = "bench:cache"
+
+
+class BlockingCache:
+    """Прежняя реализация: синхронный клиент в async-методах"""
+
+    def __init__(self, url: str):
+        self.redis = Redis.from_url(url, decode_responses=True)
+
+    async def get(self, key):
+        value = self.redis.get(key)
+        return json.loads(value) if value else None
+
+    async def set(self, key, value, ttl=None):
+        self.redis.setex(key, ttl or 60, json.dumps(value))
+        return True
+
+    async def close(self):
+        self.redis.close()
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run(cache, keys, requests: int, concurrency: int, write_ratio: float):
+    latencies = []
+    max_lag = 0.0
+    stop = asyncio.Event()
+    rnd = random.Random(3)
+    plan = [(rnd.choice(keys), rnd.random() < write_ratio) for _ in range(requests)]
+    queue = iter(plan)
+
+    async def heartbeat():
+        nonlocal max_lag
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            max_lag = max(max_lag, time.perf_counter() - started - 0.005)
+
+    async def worker():
+        for key, is_write in queue:
+            started = time.perf_counter()
+            if is_write:
+                await cache.set(key, {"key": key, "ts": started}, ttl=60)
+            else:
+                await cache.get(key)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    monitor = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": percentile(latencies, 0.99),
+        "lag": max_lag * 1000,
+    }
+
+
+async def main_async(args):
+    keys = [f"{KEY_PREFIX}:{i}" for i in range(args.keys)]
+
+    seed = RedisCache(url=args.redis_url, max_connections=args.pool_size)
+    if not await seed.ping():
+        raise SystemExit(f"Redis недоступен: {args.redis_url}")
+    await seed.set_many({key: {"key": key} for key in keys}, ttl=600)
+
+    variants = (
+        ("blocking", BlockingCache(args.redis_url)),
+        ("asyncio", seed),
+    )
+    try:
+        for label, cache in variants:
+            stats = await run(cache, keys, args.requests, args.concurrency, args.write_ratio)
+            print(
+                f"{label:9s} {stats['rps']:9.0f} req/s   p50 {stats['p50']:7.2f} ms   "
+                f"p99 {stats['p99']:7.2f} ms   max loop lag {stats['lag']:7.2f} ms"
+            )
+    finally:
+        await seed.delete_many(*keys)
+        for _, cache in variants:
+            await cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк RedisCache под конкурентной нагрузкой")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--pool-size", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Бенчмарк оптимизатора маршрутов: качество и время для 5-200 точек
+
+Сравнивается исходный ближайший сосед с NN + 2-opt/Or-opt.
+Для N <= 9 дополнительно считается точный оптимум перебором.
+
+Запуск:
+    python -m scripts.bench_route_optimizer
+    python -m scripts.bench_route_optimizer --sizes 5 10 50 200 --budget-ms 500
+"""
+import random
+import argparse
+import itertools
+import statistics
+
+from app.core.geo import distance_matrix_km
+from app.services.route_optimizer import RouteOptimizer, route_length
+
+CENTER_LAT = 42.8746
+CENTER_LON = 74.5698
+
+
+def brute_force_optimum(distances, start: int = 0) -> float:
+    others = [i for i in range(len(distances)) if i != start]
+    return min(
+        route_length([start, *perm], distances)
+        for perm in itertools.permutations(others)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк оптимизации маршрутов")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 8, 10, 20, 50, 100, 200])
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    optimizer = RouteOptimizer(time_budget_ms=args.budget_ms)
+
+    print(f"time budget: {args.budget_ms} ms, trials per size: {args.trials}")
+    print(f"{'stops':>6} {'NN km':>10} {'opt km':>10} {'gain %':>8} {'vs optimum %':>13} {'time ms':>9} {'timeouts':>9}")
+
+    for size in args.sizes:
+        nn_lengths, opt_lengths, gaps, timings = [], [], [], []
+        timeouts = 0
+
+        for trial in range(args.trials):
+            rnd = random.Random(size * 1000 + trial)
+            lats = [CENTER_LAT + rnd.uniform(-0.15, 0.15) for _ in range(size)]
+            lons = [CENTER_LON + rnd.uniform(-0.2, 0.2) for _ in range(size)]
+            distances = distance_matrix_km(lats, lons)
+
+            result = optimizer.optimize(distances, start=0)
+            nn_lengths.append(result.seed_distance_km)
+            opt_lengths.append(result.distance_km)
+            timings.append(result.elapsed_ms)
+            timeouts += int(result.timed_out)
+
+            if size <= 9:
+                optimum = brute_force_optimum(distances)
+                gaps.append((result.distance_km / optimum - 1) * 100)
+
+        nn_mean = statistics.mean(nn_lengths)
+        opt_mean = statistics.mean(opt_lengths)
+        gap = f"{statistics.mean(gaps):.2f}" if gaps else "-"
+        print(
+            f"{size:>6} {nn_mean:>10.2f} {opt_mean:>10.2f} {(1 - opt_mean / nn_mean) * 100:>8.2f} "
+            f"{gap:>13} {statistics.mean(timings):>9.1f} {timeouts:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Бенчмарк фильтра "открыто в момент T" для 50k локаций
+
+Сравниваются: разбор JSON working_hours на каждый запрос, bisect по
+предразобранным open_intervals и индекс WorkingHoursIndex.
+
+Запуск:
+    python -m scripts.bench_working_hours
+    python -m scripts.bench_working_hours --locations 100000 --queries 200
+"""
+import json
+import time
+import random
+import argparse
+
+from app.core.working_hours import (
+    MINUTES_PER_WEEK, WorkingHoursIndex, is_open_at, parse_working_hours
+)
+
+TEMPLATES = [
+    {"mon": "9:00-18:00", "tue": "9:00-18:00", "wed": "9:00-18:00", "thu": "9:00-18:00",
+     "fri": "9:00-18:00", "sat": "10:00-16:00", "sun": "выходной"},
+    {"пн-пт": "08:00-22:00", "сб-вс": "10:00-23:00"},
+    {"daily": "круглосуточно"},
+    {"mon-fri": "10:00-14:00, 15:00-19:00"},
+    {"fri": "18:00-03:00", "sat": "18:00-03:00", "sun": "12:00-00:00"},
+]
+
+
+def timed(fn, queries):
+    started = time.perf_counter()
+    total = 0
+    for minute in queries:
+        total += fn(minute)
+    return (time.perf_counter() - started) * 1000 / len(queries), total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк фильтра по времени работы")
+    parser.add_argument("--locations", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    raw = [json.dumps(rnd.choice(TEMPLATES), ensure_ascii=False) for _ in range(args.locations)]
+    queries = [rnd.randrange(MINUTES_PER_WEEK) for _ in range(args.queries)]
+
+    started = time.perf_counter()
+    intervals = [parse_working_hours(item) for item in raw]
+    parse_ms = (time.perf_counter() - started) * 1000
+
+    index = WorkingHoursIndex()
+    started = time.perf_counter()
+    index.build(enumerate(intervals))
+    build_ms = (time.perf_counter() - started) * 1000
+
+    print(f"locations: {args.locations}, bulk parse {parse_ms:.0f} ms, index build {build_ms:.0f} ms")
+
+    naive_ms, _ = timed(
+        lambda m: sum(is_open_at(parse_working_hours(item), m) for item in raw), queries[:5]
+    )
+    bisect_ms, bisect_total = timed(
+        lambda m: sum(is_open_at(item, m) for item in intervals), queries
+    )
+    index_ms, index_total = timed(lambda m: len(index.open_ids(m)), queries)
+
+    print(f"{'JSON parse per request':>26}: {naive_ms:>9.2f} ms/query")
+    print(f"{'bisect on open_intervals':>26}: {bisect_ms:>9.2f} ms/query")
+    print(f"{'WorkingHoursIndex':>26}: {index_ms:>9.3f} ms/query")
+    assert bisect_total == index_total, "index and bisect disagree"
+
+
+if __name__ == "__main__":
+    main()
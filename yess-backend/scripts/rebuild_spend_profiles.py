@@ -0,0 +1,38 @@
+"""
+Перестройка профилей трат пользователей из таблицы transactions
+
+Профили пишутся в Redis пачками одним агрегирующим запросом
+(GROUP BY user, partner) без загрузки отдельных транзакций.
+
+Запуск:
+    python -m scripts.rebuild_spend_profiles
+    python -m scripts.rebuild_spend_profiles --batch-size 5000
+"""
+import time
+import asyncio
+import argparse
+
+from app.core.database import SessionLocal
+from app.services.spend_profile_service import spend_profile_service
+
+
+async def rebuild(batch_size: int) -> None:
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        total = await spend_profile_service.rebuild_all(db, batch_size=batch_size)
+        print(f"rebuilt {total} spend profiles in {time.perf_counter() - started:.1f} s")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перестройка профилей трат")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    asyncio.run(rebuild(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Массовый разбор partner_locations.working_hours в open_intervals
+
+Нужен после миграции и при изменении правил разбора. Локации читаются
+пачками (только id и working_hours) и обновляются bulk update.
+Нераспознанные расписания (open_intervals = NULL, локация считается
+открытой) выводятся с id локации - их стоит поправить вручную.
+
+Запуск:
+    python -m scripts.reparse_working_hours
+    python -m scripts.reparse_working_hours --batch-size 5000 --dry-run
+"""
+import time
+import argparse
+
+from app.core.database import SessionLocal
+from app.core.working_hours import parse_working_hours
+from app.models.partner import PartnerLocation
+
+
+def reparse(batch_size: int, dry_run: bool) -> None:
+    db = SessionLocal()
+    started = time.perf_counter()
+    total = unrecognized = 0
+    try:
+        last_id = 0
+        while True:
+            # Keyset-пагинация: стабильна при обновлении строк в процессе
+            rows = db.query(PartnerLocation.id, PartnerLocation.working_hours).filter(
+                PartnerLocation.id > last_id
+            ).order_by(PartnerLocation.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            mappings = []
+            for location_id, working_hours in rows:
+                intervals = parse_working_hours(working_hours)
+                if intervals is None and working_hours:
+                    unrecognized += 1
+                    print(f"unrecognized working_hours: location {location_id}: {working_hours!r}")
+                mappings.append({"id": location_id, "open_intervals": intervals})
+
+            if not dry_run:
+                db.bulk_update_mappings(PartnerLocation, mappings)
+                db.commit()
+
+            total += len(rows)
+            last_id = rows[-1][0]
+
+        print(
+            f"{'checked' if dry_run else 'updated'} {total} locations "
+            f"({unrecognized} unrecognized schedules) in {time.perf_counter() - started:.1f} s"
+        )
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Разбор working_hours локаций")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    reparse(args.batch_size, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Прогрев кэша: каталог партнёров по городам, категории, тренды, акции, лидеры
+
+Запускается после деплоя или перезапуска Redis (в приложении то же
+выполняет cache_warmer.start при старте). Выводит прогресс по задачам,
+итог по наборам и общее время; при ошибках код выхода 1.
+
+Запуск:
+    python -m scripts.warm_cache
+    python -m scripts.warm_cache --datasets partners_by_city categories --concurrency 8
+    python -m scripts.warm_cache --list
+"""
+import sys
+import asyncio
+import argparse
+from typing import Optional
+
+from app.core.cache import redis_cache
+from app.services.cache_warmer import WarmTask, cache_warmer
+
+
+def print_progress(done: int, total: int, task: WarmTask, error: Optional[Exception]) -> None:
+    status = "ok" if error is None else f"ERROR {error}"
+    print(f"[{done:4d}/{total}] {task.dataset:18s} {task.label:20s} {status}")
+
+
+async def run(args) -> int:
+    if args.concurrency:
+        cache_warmer.concurrency = args.concurrency
+    try:
+        report = await cache_warmer.warm(args.datasets, progress=print_progress)
+    finally:
+        await redis_cache.close()
+
+    print()
+    for dataset in sorted(set(report.succeeded) | set(report.failed)):
+        print(
+            f"{dataset:18s} ok {report.succeeded.get(dataset, 0):5d}   "
+            f"failed {report.failed.get(dataset, 0):5d}"
+        )
+    print(f"Прогрето {sum(report.succeeded.values())}/{report.total} записей за {report.duration:.1f} с")
+    return 1 if report.failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогрев кэша")
+    parser.add_argument("--datasets", nargs="+", choices=cache_warmer.datasets, help="по умолчанию все")
+    parser.add_argument("--concurrency", type=int, default=None, help="одновременных задач")
+    parser.add_argument("--list", action="store_true", help="список наборов данных")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(cache_warmer.datasets))
+        return
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ from sqlalchemy import func
 from datetime import datetime, timedelta
 from typing import Dict, Any, List
 
+from src.core.database import db_router
 from src.models.user import User
 from src.models.transaction import Transaction
 from src.models.partner import Partner
@@ -11,6 +12,7 @@ class AdminAnalyticsService:
     """Сервис аналитики для администраторов"""
 
     @staticmethod
+    @db_router.read_only
     def get_revenue_dynamics(
         db: Session, 
         days: int = 30
@@ -37,6 +39,7 @@ class AdminAnalyticsService:
         ]
 
     @staticmethod
+    @db_router.read_only
     def get_user_growth(
         db: Session, 
         days: int = 30
@@ -66,6 +69,7 @@ class AdminReportService:
     """Сервис генерации отчетов"""
 
     @staticmethod
+    @db_router.read_only
     def generate_partner_performance_report(
         db: Session, 
         start_date: datetime = None, 
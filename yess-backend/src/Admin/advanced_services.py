@@ -3,6 +3,7 @@ from sqlalchemy import func, and_, or_
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 
+from src.core.database import db_router
 from src.models.user import User
 from src.models.transaction import Transaction
 from src.models.partner import Partner
@@ -78,6 +79,7 @@ class AdvancedReportingService:
     """Расширенный сервис генерации отчетов"""
 
     @staticmethod
+    @db_router.read_only
     def generate_comprehensive_report(
         db: Session, 
         start_date: Optional[datetime] = None, 
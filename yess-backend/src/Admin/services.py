@@ -6,6 +6,7 @@ from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
+from src.core.database import db_router
 from src.Admin.models import AdminUser, SystemConfig, AuditLog
 from src.models.user import User
 from src.models.partner import Partner
@@ -53,6 +54,7 @@ class AdminDashboardService:
     """Сервис для получения статистики и управления системой"""
 
     @staticmethod
+    @db_router.read_only
     def get_global_dashboard(db: Session) -> Dict[str, Any]:
         """Глобальная статистика системы"""
         return {
@@ -96,6 +98,7 @@ class AdminUserManagementService:
     """Сервис управления пользователями для администраторов"""
 
     @staticmethod
+    @db_router.read_only
     def list_users(db: Session, page: int = 1, page_size: int = 50) -> Dict[str, Any]:
         """Список пользователей с пагинацией"""
         total_users = db.query(User).count()
@@ -147,6 +150,7 @@ class AdminPartnerService:
     """Сервис управления партнерами для администраторов"""
 
     @staticmethod
+    @db_router.read_only
     def list_partners(
         db: Session, 
         page: int = 1, 
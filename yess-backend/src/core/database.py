@@ -0,0 +1,7 @@
+"""Сессии БД админ-панели: общий движок и роутинг реплик из app.core.database"""
+from app.core.database import (
+    db_router,
+    get_db,
+    get_primary_db,
+    get_read_db,
+)
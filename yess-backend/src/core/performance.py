@@ -1,19 +1,24 @@
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import QueuePool
-from redis import Redis
 from functools import lru_cache, wraps
 import time
 from typing import Callable, Any, Optional
 
+from app.core.cache import RedisCache
+from app.core.cache_codec import CacheCodec
+from app.core.resources import resources
+
 class PerformanceManager:
     """Менеджер производительности с расширенными возможностями"""
+
+    # Тег ключей cache_query (tag:performance_manager) - clear_cache без FLUSHDB
+    CACHE_TAG = "performance_manager"
     
     def __init__(
         self, 
         database_url: str, 
         redis_host: str = 'localhost', 
-        redis_port: int = 6379
+        redis_port: int = 6379,
+        codec: Optional[CacheCodec] = None
     ):
         """
         Инициализация менеджера производительности
@@ -22,15 +27,11 @@ class PerformanceManager:
             database_url (str): URL подключения к базе данных
             redis_host (str): Хост Redis
             redis_port (int): Порт Redis
+            codec (CacheCodec): Кодирование результатов в кэше (по умолчанию orjson)
         """
-        self.engine = create_engine(
-            database_url,
-            poolclass=QueuePool,
-            pool_size=20,  # Размер пула соединений
-            max_overflow=10,  # Максимальное число дополнительных соединений
-            pool_timeout=30,  # Время ожидания соединения
-            pool_recycle=1800,  # Обновление соединений каждые 30 минут
-        )
+        # Движок процесса (общий с app.core.database для того же URL):
+        # размер пула и pool_recycle задаёт app.core.resources
+        self.engine = resources.engine(database_url)
         
         self.SessionLocal = scoped_session(sessionmaker(
             bind=self.engine, 
@@ -38,12 +39,17 @@ class PerformanceManager:
             autoflush=False
         ))
         
-        self.redis_client = Redis(
-            host=redis_host, 
-            port=redis_port, 
-            db=0, 
-            max_connections=20
+        # Общий интерфейс кэшей: метрики под именем performance_manager
+        self.cache = RedisCache(
+            url=f"redis://{redis_host}:{redis_port}/0",
+            codec=codec or CacheCodec(),
+            name="performance_manager"
         )
+        self.codec = self.cache.codec
+
+    @property
+    def redis_client(self):
+        return self.cache.sync_redis
 
     def get_session(self):
         """
@@ -71,12 +77,12 @@ class PerformanceManager:
         Returns:
             Any: Результат запроса
         """
-        cached_result = self.redis_client.get(key)
-        if cached_result:
+        cached_result = self.cache.get_sync(key)
+        if cached_result is not None:
             return cached_result
 
         result = query_func()
-        self.redis_client.setex(key, timeout, result)
+        self.cache.set_sync(key, result, ttl=timeout, tags=(self.CACHE_TAG,))
         return result
 
     @staticmethod
@@ -87,6 +93,7 @@ class PerformanceManager:
     ):
         """
         Декоратор для трекинга производительности функций
+        (время отдельных SQL-запросов - app.core.query_stats)
         
         Args:
             logger: Логгер для записи информации о производительности
@@ -104,11 +111,7 @@ class PerformanceManager:
                 execution_time = time.time() - start_time
 
                 if log_slow_queries and execution_time > slow_query_threshold and logger:
-                    logger.warning(
-                        "Slow query detected", 
-                        function=func.__name__, 
-                        execution_time=execution_time
-                    )
+                    logger.warning(f"Slow call detected: {func.__name__} ({execution_time:.3f}s)")
 
                 return result
             return wrapper
@@ -119,9 +122,11 @@ class PerformanceManager:
         Очистка кэша
         
         Args:
-            key (Optional[str]): Ключ для удаления. Если None, очищается весь кэш
+            key (Optional[str]): Ключ для удаления. Если None, удаляются все
+                ключи, созданные cache_query (остальная база Redis не трогается)
         """
         if key:
-            self.redis_client.delete(key)
-        else:
-            self.redis_client.flushdb()
+            self.cache.delete_sync(key)
+            return
+
+        self.cache.invalidate_tags_sync(self.CACHE_TAG)
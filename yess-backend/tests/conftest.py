@@ -0,0 +1,314 @@
+import time
+import asyncio
+import random
+import hashlib
+import pytest
+import httpx
+
+
+class FakeDirectionsServer:
+    """
+    Локальный фейковый directions-сервер (Google Maps / Mapbox формат)
+    Отвечает с задержкой latency, не блокируя event loop
+    """
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.fail = False
+        self.calls = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+        if self.fail:
+            return httpx.Response(503, json={"error": "unavailable"})
+
+        if "mapbox" in request.url.host:
+            return httpx.Response(200, json={
+                "code": "Ok",
+                "routes": [{"distance": 1500.0, "duration": 300.0}]
+            })
+
+        return httpx.Response(200, json={
+            "status": "OK",
+            "routes": [{
+                "legs": [{
+                    "start_location": {"lat": 42.87, "lng": 74.57},
+                    "end_location": {"lat": 42.88, "lng": 74.60},
+                    "distance": {"text": "1.5 km"},
+                    "duration": {"text": "5 mins"}
+                }]
+            }]
+        })
+
+    @property
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handler)
+
+
+@pytest.fixture
+def fake_directions_server():
+    return FakeDirectionsServer()
+
+
+class FakeRedisServer:
+    """
+    Локальный фейковый Redis (RESP2) для тестов кэша
+    Поддерживает строки и хэши с TTL, pub/sub и Lua-скрипты из
+    app.core.cache, эмулированные на Python. reads - число GET/MGET/HMGET.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.subscribers = {}
+        self.reads = 0
+        self.server = None
+        self.handlers = set()
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"redis://127.0.0.1:{port}/0"
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        # Соединения синхронных клиентов закрываются из другого потока
+        for handler in list(self.handlers):
+            handler.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    def _alive(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _set(self, key, value, ttl=None):
+        self.data[key] = value
+        if ttl is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.monotonic() + ttl
+
+    def _scripts(self):
+        from app.core import cache
+
+        def release_lock(keys, args):
+            if self._alive(keys[0]) and self.data[keys[0]] == args[0]:
+                del self.data[keys[0]]
+                return 1
+            return 0
+
+        def tag_key(keys, args):
+            for tag in keys:
+                self._alive(tag)
+                members = self.data.setdefault(tag, set())
+                members.add(args[0])
+                sample = random.sample(list(members), min(int(args[2]) if len(args) > 2 else 0, len(members)))
+                members.difference_update(member for member in sample if not self._alive(member))
+                remaining = self.expires.get(tag, 0) - time.monotonic()
+                if remaining < int(args[1]):
+                    self.expires[tag] = time.monotonic() + int(args[1])
+            return len(keys)
+
+        def versioned_set(keys, args):
+            entry = self.data[keys[0]] if self._alive(keys[0]) else {}
+            version = int(args[0])
+            if version < int(entry.get("version", 0)) or version < int(entry.get("pending", 0)):
+                return 0
+            entry = {"version": args[0], "value": args[1]}
+            self._set(keys[0], entry, float(args[2]))
+            return 1
+
+        def version_reserve(keys, args):
+            entry = self.data[keys[0]] if self._alive(keys[0]) else {}
+            if int(args[0]) > int(entry.get("pending", 0)):
+                entry["pending"] = args[0]
+            self._set(keys[0], entry, float(args[1]))
+            return 1
+
+        def hash_update(keys, args):
+            if len(keys) > 1 and self._alive(keys[1]):
+                self.data[keys[1]] = "stale"
+                self.data.pop(keys[0], None)
+                return -1
+            if not self._alive(keys[0]):
+                return 0
+            entry = self.data[keys[0]]
+            if args[1]:
+                for field in [f for f in entry if f.startswith(args[1])]:
+                    if int(field.rsplit(":", 1)[1]) < int(args[2]):
+                        del entry[field]
+            for i in range(3, len(args), 3):
+                if args[i] == "incr":
+                    entry[args[i + 1]] = repr(float(entry.get(args[i + 1], 0)) + float(args[i + 2]))
+                else:
+                    entry[args[i + 1]] = args[i + 2]
+            if int(args[0]) > 0:
+                self.expires[keys[0]] = time.monotonic() + int(args[0])
+            return 1
+
+        def hash_replace(keys, args):
+            if not self._alive(keys[1]) or self.data[keys[1]] != args[0]:
+                return 0
+            entry = dict(zip(args[3::2], args[4::2]))
+            self._set(keys[0], entry, int(args[1]) or None)
+            if float(args[2]) > 0:
+                self._set(keys[1], "built", float(args[2]))
+            else:
+                self.data.pop(keys[1], None)
+            return 1
+
+        return {
+            hashlib.sha1(cache._HASH_UPDATE_IF_EXISTS.encode()).hexdigest(): hash_update,
+            hashlib.sha1(cache._HASH_REPLACE_IF_MARKED.encode()).hexdigest(): hash_replace,
+            hashlib.sha1(cache._RELEASE_LOCK.encode()).hexdigest(): release_lock,
+            hashlib.sha1(cache._TAG_KEY.encode()).hexdigest(): tag_key,
+            hashlib.sha1(cache._VERSIONED_SET.encode()).hexdigest(): versioned_set,
+            hashlib.sha1(cache._VERSION_RESERVE.encode()).hexdigest(): version_reserve,
+        }
+
+    def _run(self, args):
+        command = args[0].upper()
+        if command == "PING":
+            return "PONG"
+        if command == "GET":
+            self.reads += 1
+            return self.data[args[1]] if self._alive(args[1]) else None
+        if command == "MGET":
+            self.reads += 1
+            return [self.data[key] if self._alive(key) else None for key in args[1:]]
+        if command == "HMGET":
+            self.reads += 1
+            entry = self.data[args[1]] if self._alive(args[1]) else {}
+            return [entry.get(field) for field in args[2:]]
+        if command == "HGETALL":
+            entry = self.data[args[1]] if self._alive(args[1]) else {}
+            return [item for pair in entry.items() for item in pair]
+        if command == "SETEX":
+            self._set(args[1], args[3], float(args[2]))
+            return "OK"
+        if command == "SET":
+            options = [arg.upper() for arg in args[3:]]
+            if "NX" in options and self._alive(args[1]):
+                return None
+            ttl = None
+            if "PX" in options:
+                ttl = float(args[3 + options.index("PX") + 1]) / 1000
+            elif "EX" in options:
+                ttl = float(args[3 + options.index("EX") + 1])
+            self._set(args[1], args[2], ttl)
+            return "OK"
+        if command == "INCRBY":
+            value = (int(self.data[args[1]]) if self._alive(args[1]) else 0) + int(args[2])
+            self.data[args[1]] = str(value)
+            return value
+        if command == "SADD":
+            self._alive(args[1])
+            members = self.data.setdefault(args[1], set())
+            added = len(set(args[2:]) - members)
+            members.update(args[2:])
+            return added
+        if command == "SMEMBERS":
+            return sorted(self.data[args[1]]) if self._alive(args[1]) else []
+        if command == "SISMEMBER":
+            return int(self._alive(args[1]) and args[2] in self.data[args[1]])
+        if command == "EXPIRE":
+            if not self._alive(args[1]):
+                return 0
+            self.expires[args[1]] = time.monotonic() + float(args[2])
+            return 1
+        if command == "SPOP":
+            if not self._alive(args[1]):
+                return []
+            members = self.data[args[1]]
+            popped = [members.pop() for _ in range(min(int(args[2]), len(members)))]
+            if not members:
+                del self.data[args[1]]
+            return popped
+        if command in ("DEL", "UNLINK"):
+            deleted = [key for key in args[1:] if self._alive(key)]
+            for key in deleted:
+                del self.data[key]
+            return len(deleted)
+        if command == "SCRIPT" and args[1].upper() == "EXISTS":
+            return [int(sha in self._scripts()) for sha in args[2:]]
+        if command == "SCRIPT" and args[1].upper() == "LOAD":
+            return hashlib.sha1(args[2].encode()).hexdigest()
+        if command == "EVALSHA":
+            script = self._scripts().get(args[1])
+            if script is None:
+                return Exception("NOSCRIPT No matching script")
+            count = int(args[2])
+            return script(args[3:3 + count], args[3 + count:])
+        return Exception(f"ERR unknown command '{args[0]}'")
+
+    def _encode(self, value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, Exception):
+            return f"-{value}\r\n".encode()
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + b"".join(self._encode(item) for item in value)
+        if value in ("OK", "PONG", "QUEUED"):
+            return f"+{value}\r\n".encode()
+        # latin-1: значения кэша - произвольные bytes, побайтно туда и обратно
+        data = value.encode("latin-1")
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    async def _handle(self, reader, writer):
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        # Команды MULTI до EXEC
+        queued = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2].decode("latin-1"))
+
+                command = args[0].upper()
+                if command == "MULTI":
+                    queued = []
+                    writer.write(self._encode("OK"))
+                elif command == "EXEC":
+                    writer.write(self._encode([self._run(queued_args) for queued_args in queued or []]))
+                    queued = None
+                elif queued is not None:
+                    queued.append(args)
+                    writer.write(self._encode("QUEUED"))
+                elif command == "SUBSCRIBE":
+                    for channel in args[1:]:
+                        self.subscribers.setdefault(channel, []).append(writer)
+                        writer.write(self._encode(["subscribe", channel, 1]))
+                elif command == "PUBLISH":
+                    subscribers = self.subscribers.get(args[1], [])
+                    for subscriber in subscribers:
+                        subscriber.write(self._encode(["message", args[1], args[2]]))
+                    writer.write(self._encode(len(subscribers)))
+                else:
+                    writer.write(self._encode(self._run(args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self.handlers.discard(handler)
+            for subscribers in self.subscribers.values():
+                if writer in subscribers:
+                    subscribers.remove(writer)
+            writer.close()
+
+
+@pytest.fixture
+def fake_redis_server():
+    return FakeRedisServer()
@@ -0,0 +1,570 @@
+import uuid
+import time
+import asyncio
+import socket
+import threading
+import pytest
+from decimal import Decimal
+from datetime import datetime
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.core.bloom_filter import BloomFilter, ExistenceFilter
+from app.core.cache import RedisCache, cached
+from app.core.cache_codec import CacheCodec
+from app.core.cache_metrics import KeySampler
+from app.core.ttl_cache import TTLCache
+from app.services.wallet_balance_service import BalanceSnapshot, WalletBalanceService
+
+
+def closed_port() -> int:
+    """Порт, на котором гарантированно никто не слушает"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestRedisCacheReconnect:
+    @pytest.fixture
+    def cache(self):
+        return RedisCache(
+            url=f"redis://127.0.0.1:{closed_port()}/0",
+            socket_timeout=0.2,
+            socket_connect_timeout=0.2,
+            retry_attempts=0,
+            reconnect_backoff=0.2
+        )
+
+    @pytest.mark.asyncio
+    async def test_unavailable_redis_is_a_cache_miss(self, cache):
+        assert await cache.get("key") is None
+        assert await cache.set("key", {"a": 1}) is False
+        assert await cache.get_many("a", "b") == [None, None]
+
+    @pytest.mark.asyncio
+    async def test_backoff_then_reconnect(self, cache):
+        await cache.get("key")
+        assert not cache.enabled
+
+        # Во время паузы Redis не опрашивается - промах без сетевого вызова
+        started = time.perf_counter()
+        assert await cache.get("key") is None
+        assert time.perf_counter() - started < 0.01
+
+        await asyncio.sleep(0.25)
+        assert cache.enabled
+        await cache.close()
+
+
+class TestLocalTier:
+    def test_memory_cap_evicts_least_recent(self):
+        local = TTLCache(max_size=100, ttl=60, max_bytes=250)
+        for i in range(3):
+            local.set(f"partner:{i}", {"id": i}, size=100)
+
+        assert local.get("partner:0") is None
+        assert local.get("partner:2") == {"id": 2}
+        assert local.memory_bytes == 200
+
+    def test_oversized_entry_is_not_cached(self):
+        local = TTLCache(max_size=100, ttl=60, max_bytes=100)
+        local.set("partners:city:1", ["a"], size=50)
+        local.set("partners:city:2", ["b"] * 100, size=500)
+
+        assert local.get("partners:city:1") == ["a"]
+        assert local.get("partners:city:2") is None
+        assert local.memory_bytes == 50
+
+    @pytest.mark.asyncio
+    async def test_local_tier_unused_without_invalidation_listener(self):
+        """Без подписки на инвалидации локальные копии могли бы устареть"""
+        cache = RedisCache(
+            url=f"redis://127.0.0.1:{closed_port()}/0",
+            socket_connect_timeout=0.2,
+            retry_attempts=0,
+            local_prefixes=("partner:",)
+        )
+        cache.local.set("partner:1", {"stale": True})
+
+        assert await cache.get("partner:1") is None
+        assert cache.metrics()["local_hits"] == 0
+        await cache.close()
+
+
+class TestStampedeProtection:
+    @pytest.fixture
+    def loader(self):
+        class SlowQuery:
+            """Имитация дорогого запроса к БД"""
+            calls = 0
+
+            async def __call__(self):
+                SlowQuery.calls += 1
+                await asyncio.sleep(0.05)
+                return {"partners": list(range(10)), "version": SlowQuery.calls}
+
+        return SlowQuery()
+
+    @pytest.mark.asyncio
+    async def test_single_query_for_missing_key_across_workers(self, fake_redis_server, loader):
+        """1000 конкурентных запросов в двух воркерах - один запрос к БД"""
+        url = await fake_redis_server.start()
+        workers = [RedisCache(url=url), RedisCache(url=url)]
+
+        results = await asyncio.gather(*[
+            workers[i % 2].get_or_set("partners:city:1", loader, ttl=60, stale_ttl=60)
+            for i in range(1000)
+        ])
+
+        assert loader.calls == 1
+        assert all(result == {"partners": list(range(10)), "version": 1} for result in results)
+        for worker in workers:
+            await worker.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_expired_key_served_stale_while_one_refresh_runs(self, fake_redis_server, loader):
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url)
+        await cache.set(
+            "partners:city:1",
+            {"v": {"partners": [], "version": 0}, "exp": time.time() - 1, "d": 0.05},
+            ttl=60
+        )
+
+        results = await asyncio.gather(*[
+            cache.get_or_set("partners:city:1", loader, ttl=60, stale_ttl=60)
+            for _ in range(1000)
+        ])
+
+        # Все получили старое значение без ожидания, обновление одно
+        assert all(result["version"] == 0 for result in results)
+        await asyncio.gather(*cache._refreshing.values())
+        assert loader.calls == 1
+        assert cache.stats["stale_served"] >= 1
+        assert (await cache.get_or_set("partners:city:1", loader, ttl=60))["version"] == 1
+        await cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_decorator_without_redis_still_single_flight(self, loader):
+        cache = RedisCache(
+            url=f"redis://127.0.0.1:{closed_port()}/0",
+            socket_connect_timeout=0.2,
+            retry_attempts=0
+        )
+
+        @cached(key=lambda city_id: f"partners:city:{city_id}", ttl=60, cache=cache)
+        async def partners_for_city(city_id):
+            return await loader()
+
+        results = await asyncio.gather(*[partners_for_city(1) for _ in range(100)])
+
+        assert loader.calls == 1
+        assert len({result["version"] for result in results}) == 1
+        await cache.close()
+
+
+class TestGroupInvalidation:
+    @pytest.mark.asyncio
+    async def test_invalidate_tags_removes_only_tagged_entries(self, fake_redis_server):
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url)
+
+        for partner_id in range(1200):
+            await cache.set(f"partners:list:{partner_id}", [partner_id], tags=[f"city:{partner_id % 2}"])
+        await cache.set("partners:top", [1, 2], tags=["partner:1"])
+
+        assert await cache.invalidate_tags("city:0") == 600
+        assert await cache.get("partners:list:0") is None
+        assert await cache.get("partners:list:1") == [1]
+        assert await cache.get("partners:top") == [1, 2]
+        # Множество тега удалено вместе с участниками
+        assert "tag:city:0" not in fake_redis_server.data
+
+        await cache.invalidate_partner_cache(1)
+        assert await cache.get("partners:top") is None
+        await cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_expired_members_are_pruned_from_tag(self, fake_redis_server):
+        """Тег всего кэша (cache_service) не копит ключи, которых уже нет"""
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url)
+
+        for round_ in range(5):
+            for index in range(200):
+                await cache.set(f"service:{round_}:{index}", index, tags=["cache_service"])
+            # Записи прошлого круга истекли
+            await cache.delete_many(*(f"service:{round_}:{index}" for index in range(200)))
+
+        assert len(fake_redis_server.data["tag:cache_service"]) < 400
+        await cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_bump_namespace_hides_old_keys(self, fake_redis_server):
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url)
+
+        old_key = await cache.namespaced_key("promotions", "active")
+        await cache.set(old_key, ["promo"])
+        await cache.bump_namespace("promotions")
+        new_key = await cache.namespaced_key("promotions", "active")
+
+        assert new_key != old_key
+        assert await cache.get(new_key) is None
+        await cache.close()
+        await fake_redis_server.close()
+
+
+class TestClaims:
+    @pytest.mark.asyncio
+    async def test_claim_is_granted_once_across_workers(self, fake_redis_server):
+        """Окно cooldown геозон общее: ключ занимает один воркер"""
+        url = await fake_redis_server.start()
+        workers = [RedisCache(url=url), RedisCache(url=url)]
+
+        assert await workers[0].claim_many(["cooldown:1:7", "cooldown:2:7"], ttl=60) == [True, True]
+        assert await workers[1].claim_many(["cooldown:1:7", "cooldown:3:7"], ttl=60) == [False, True]
+        assert await RedisCache(url=f"redis://127.0.0.1:{closed_port()}/0").claim_many(["cooldown:1:7"], ttl=60) is None
+        for cache in workers:
+            await cache.close()
+        await fake_redis_server.close()
+
+
+class TestHashRebuild:
+    @pytest.mark.asyncio
+    async def test_update_during_rebuild_drops_snapshot(self, fake_redis_server):
+        """Инкремент во время перестройки: снимок не пишется, hash строится заново"""
+        cache = RedisCache(url=await fake_redis_server.start())
+        key, marker = "spend_profile:1", "spend_profile:rebuild:1"
+
+        token = await cache.begin_hash_rebuild([marker], timeout=60)
+        # Hash ещё нет - инкремент не применяется, перестройка испорчена
+        assert not await cache.update_hash_if_exists(key, increments={"v:7": 1}, rebuild_marker=marker)
+        assert await cache.finish_hash_rebuild({key: {"_built": "1", "v:7": "1"}}, {key: marker}, token) == []
+        assert await cache.get_hashes(key) == [{}]
+
+        token = await cache.begin_hash_rebuild([marker], timeout=60)
+        assert await cache.finish_hash_rebuild({key: {"_built": "1", "v:7": "2"}}, {key: marker}, token) == [key]
+        # Запоздавший инкремент транзакции, уже вошедшей в снимок, не задваивается
+        assert not await cache.update_hash_if_exists(key, increments={"v:7": 1}, rebuild_marker=marker)
+        assert await cache.get_hashes(key) == [{}]
+
+        await cache.finish_hash_rebuild({key: {"_built": "1", "v:7": "2"}}, {key: marker},
+                                        await cache.begin_hash_rebuild([marker], timeout=60), grace=0)
+        assert await cache.update_hash_if_exists(key, increments={"v:7": 1}, rebuild_marker=marker)
+        assert float((await cache.get_hashes(key))[0]["v:7"]) == 3
+        await cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_update_prunes_expired_day_counters(self, fake_redis_server):
+        """Счётчики дней вне окна удаляются при записи, а не только при чтении"""
+        cache = RedisCache(url=await fake_redis_server.start())
+        key = "spend_profile:1"
+        marker = "spend_profile:rebuild:1"
+        await cache.finish_hash_rebuild(
+            {key: {"_built": "1", "d:7:100": "1", "d:8:129": "2", "v:7": "3"}}, {key: marker},
+            await cache.begin_hash_rebuild([marker], timeout=60), grace=0
+        )
+
+        assert await cache.update_hash_if_exists(key, increments={"d:7:130": 1}, prune=("d:", 101))
+        assert set((await cache.get_hashes(key))[0]) == {"_built", "d:8:129", "d:7:130", "v:7"}
+        await cache.close()
+        await fake_redis_server.close()
+
+
+class TestCachedDecorator:
+    def test_key_is_stable_and_skips_self_and_session(self):
+        class Service:
+            @cached(version=2)
+            def partners(self, db, city_id, limit=10):
+                return []
+
+        key = Service.partners.cache_key(Service(), Session(), 1)
+        assert key == Service.partners.cache_key(Service(), Session(), city_id=1, limit=10)
+        assert key != Service.partners.cache_key(Service(), Session(), 2)
+        assert ":v2:" in key and "0x" not in key
+
+    def test_unencodable_argument_is_an_error(self):
+        @cached()
+        def partners(filters):
+            return []
+
+        with pytest.raises(TypeError):
+            partners.cache_key(object())
+
+    @pytest.mark.asyncio
+    async def test_sync_function_shares_entries_and_skips_empty(self, fake_redis_server):
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url)
+        calls = []
+
+        @cached(ttl=60, negative_ttl=0, compress=True, cache=cache)
+        def trending(city_id):
+            calls.append(city_id)
+            return [{"id": i, "name": "x" * 50} for i in range(100)] if city_id == 1 else []
+
+        # Синхронный клиент блокирует поток - сервер живёт в этом event loop
+        for _ in range(3):
+            assert len(await asyncio.to_thread(trending, 1)) == 100
+            assert await asyncio.to_thread(trending, 2) == []
+
+        assert calls == [1, 2, 2, 2]
+        # Крупное значение хранится сжатым (третий байт заголовка - алгоритм)
+        assert fake_redis_server.data[trending.cache_key(1)].encode("latin-1")[2] != 0
+        await cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_sync_function_called_from_async_code_runs_in_thread(self, fake_redis_server):
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url)
+        threads = []
+
+        @cached(ttl=60, cache=cache)
+        def categories(city_id):
+            threads.append(threading.get_ident())
+            time.sleep(0.05)
+            return [f"city {city_id}"]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(categories.call_async(city_id) for city_id in range(4)))
+        # Загрузки идут в потоках параллельно, не по очереди в event loop
+        assert time.perf_counter() - started < 0.15
+        assert results == [[f"city {city_id}"] for city_id in range(4)]
+        assert threading.get_ident() not in threads
+        assert await categories.call_async(1) == ["city 1"] and len(threads) == 4
+        await cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_refresh_overwrites_cached_value(self, fake_redis_server):
+        """Прогрев пересчитывает запись под тем же ключом, что читают запросы"""
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url)
+        version = 0
+
+        @cached(ttl=60, cache=cache)
+        async def categories(city_id=None):
+            nonlocal version
+            version += 1
+            return [f"v{version}"]
+
+        assert await categories() == ["v1"]
+        assert await categories.refresh(city_id=None) == ["v2"]
+        assert await categories() == ["v2"]
+        await cache.close()
+        await fake_redis_server.close()
+
+
+class TestWalletBalanceCache:
+    class FakeWallets:
+        """
+        Строка wallets: flush берёт блокировку строки и поднимает версию,
+        коммит публикует значение и снимает блокировку
+        """
+
+        def __init__(self):
+            self.committed = BalanceSnapshot(1, Decimal("100"), 1)
+            self.row_lock = asyncio.Lock()
+            self.pending = None
+
+        async def flush(self, delta: Decimal):
+            await self.row_lock.acquire()
+            self.pending = BalanceSnapshot(1, self.committed.balance + delta, self.committed.version + 1)
+            await asyncio.sleep(0)
+            return [self.pending]
+
+        async def commit(self):
+            await asyncio.sleep(0.001)
+            self.committed = self.pending
+            self.row_lock.release()
+
+        async def load(self, delay: float):
+            snapshot = self.committed
+            # Медленный ответ БД: к возврату значение может устареть
+            await asyncio.sleep(delay)
+            return snapshot
+
+    @pytest.mark.asyncio
+    async def test_reads_never_older_than_last_commit(self, fake_redis_server):
+        url = await fake_redis_server.start()
+        service = WalletBalanceService(ttl=60, reserve_ttl=5, cache=RedisCache(url=url))
+        wallets = self.FakeWallets()
+        stale = []
+
+        async def writer(n):
+            await asyncio.sleep(n * 0.002)
+            await service.write_through(lambda: wallets.flush(Decimal("1")), wallets.commit)
+
+        async def reader(n):
+            await asyncio.sleep(n * 0.0005)
+            committed = wallets.committed.version
+            snapshot = await service.read_through(1, lambda: wallets.load(0.003 * (n % 4)))
+            if snapshot.version < committed:
+                stale.append((snapshot.version, committed))
+
+        await asyncio.gather(*(writer(n) for n in range(20)), *(reader(n) for n in range(200)))
+
+        assert stale == []
+        cached_entry = await service.get_cached(1)
+        assert cached_entry.version == wallets.committed.version == 21
+        assert cached_entry.balance == Decimal("120")
+        await service.cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_older_version_is_rejected(self, fake_redis_server):
+        url = await fake_redis_server.start()
+        service = WalletBalanceService(ttl=60, cache=RedisCache(url=url))
+
+        assert await service.store(BalanceSnapshot(1, Decimal("5"), 3))
+        assert not await service.store(BalanceSnapshot(1, Decimal("4"), 2))
+        # Зарезервированная версия: до её записи - промах
+        await service.cache.reserve_version("wallet_balance:1", 4, 5)
+        assert await service.get_cached(1) is None
+        assert not await service.store(BalanceSnapshot(1, Decimal("5"), 3))
+        assert await service.store(BalanceSnapshot(1, Decimal("6"), 4))
+        assert (await service.get_cached(1)).balance == Decimal("6")
+        await service.cache.close()
+        await fake_redis_server.close()
+
+
+class TestCacheCodec:
+    class Balance(BaseModel):
+        user_id: int
+        amount: Decimal
+
+    @pytest.fixture
+    def payload(self):
+        return {
+            "balance": self.Balance(user_id=1, amount=Decimal("120.50")),
+            "updated_at": datetime(2024, 5, 1, 12, 30),
+            "partners": [{"id": i, "cashback": Decimal("5.25")} for i in range(200)],
+        }
+
+    @pytest.mark.parametrize("serializer", ["orjson", "json"])
+    def test_encodes_decimal_datetime_and_models(self, serializer, payload):
+        codec = CacheCodec(serializer=serializer, compression="zlib")
+        data = codec.encode(payload)
+
+        # Любой кодек читает запись по заголовку
+        decoded = CacheCodec(serializer="json").decode(data)
+        assert decoded["balance"] == {"user_id": 1, "amount": "120.50"}
+        assert decoded["updated_at"] == "2024-05-01T12:30:00"
+        assert len(data) < len(codec.encode(payload, compress=False))
+
+    def test_msgpack_restores_types(self, payload):
+        pytest.importorskip("msgpack")
+        codec = CacheCodec(serializer="msgpack")
+        decoded = codec.decode(codec.encode({"id": uuid.UUID(int=1), **payload}))
+
+        assert decoded["balance"]["amount"] == Decimal("120.50")
+        assert decoded["updated_at"] == datetime(2024, 5, 1, 12, 30)
+        assert decoded["id"] == uuid.UUID(int=1)
+
+    def test_reads_legacy_json_entries(self):
+        assert CacheCodec().decode('{"id": 1}') == {"id": 1}
+        assert CacheCodec().decode(b"[1, 2]") == [1, 2]
+
+
+class TestCacheMetrics:
+    def test_sampler_keeps_hottest_and_largest_keys(self):
+        sampler = KeySampler(rate=1.0, top_n=2, capacity=100)
+        for i in range(10):
+            for _ in range(i):
+                sampler.record(f"partner:{i}", size=i * 100)
+
+        assert [key for key, _ in sampler.hottest()] == ["partner:9", "partner:8"]
+        assert sampler.largest() == [("partner:9", 900), ("partner:8", 800)]
+
+        # Память ограничена: при переполнении остаются самые частые ключи
+        for i in range(1000):
+            sampler.record(f"user:{i}")
+        assert len(sampler._counts) <= 100
+        assert sampler.hottest()[0][0] == "partner:9"
+
+    @pytest.mark.asyncio
+    async def test_sync_interface_records_hits_and_key_sizes(self, fake_redis_server):
+        """Синхронный API (CacheService, PerformanceManager) - тот же RedisCache с выборкой ключей"""
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url, name="test_sync")
+        cache.telemetry.sampler.rate = 1.0
+
+        def use_cache():
+            cache.set_sync("report:1", {"rows": list(range(500))}, ttl=60, tags=["reports"])
+            for _ in range(3):
+                cache.get_sync("report:1")
+            assert cache.get_sync("report:2") is None
+            assert cache.invalidate_tags_sync("reports") == 1
+            return cache.get_sync("report:1")
+
+        assert await asyncio.to_thread(use_cache) is None
+        metrics = cache.metrics()
+        assert metrics["redis_hits"] == 3 and metrics["redis_misses"] == 2
+        assert metrics["hot_keys"][0] == {"key": "report:1", "accesses": 5}
+        assert metrics["largest_keys"][0]["key"] == "report:1"
+        await cache.close()
+        await fake_redis_server.close()
+
+
+class TestExistenceFilter:
+    def test_bloom_false_positive_rate_near_target(self):
+        bloom = BloomFilter.from_values((f"CODE{i}" for i in range(20000)), error_rate=0.01)
+
+        assert all(f"CODE{i}" in bloom for i in range(20000))
+        false_positives = sum(f"FAKE{i}" in bloom for i in range(20000)) / 20000
+        assert false_positives < 0.02
+        assert abs(bloom.estimated_error_rate() - 0.01) < 0.002
+
+    @pytest.mark.asyncio
+    async def test_impossible_lookups_skip_database(self, fake_redis_server):
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url)
+        codes = ExistenceFilter("promo_codes", error_rate=0.001, cache=cache)
+        other_worker = ExistenceFilter("promo_codes", error_rate=0.001, cache=cache)
+        codes.rebuild(["SPRING24", "WINTER24"])
+        other_worker.rebuild(["SPRING24", "WINTER24"])
+        queries = []
+
+        def load(code, table=("SPRING24", "WINTER24", "NEW24")):
+            queries.append(code)
+            return code if code in table else None
+
+        assert await codes.lookup("SPRING24", lambda: load("SPRING24")) == "SPRING24"
+        for i in range(200):
+            assert await codes.lookup(f"X{i}", lambda: load("garbage")) is None
+        assert queries == ["SPRING24"]
+
+        # Вставка в одном воркере видна другому до перестроения
+        await codes.add("NEW24")
+        assert await other_worker.lookup("NEW24", lambda: load("NEW24")) == "NEW24"
+        await cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_false_positive_is_cached_as_miss(self, fake_redis_server):
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url)
+        partners = ExistenceFilter("partners", negative_ttl=60, monotonic=True, cache=cache)
+        partners.rebuild([1, 2, 3])
+        queries = []
+
+        def load(partner_id):
+            queries.append(partner_id)
+            return None
+
+        # Удалённая запись проходит фильтр - в БД один раз, дальше промах из кэша
+        for _ in range(3):
+            assert await partners.lookup(2, lambda: load(2)) is None
+        # ID чуть выше максимума (создан в обход add) проверяется в БД
+        assert await partners.might_exist(4)
+        assert not await partners.might_exist(10 ** 9)
+        assert queries == [2]
+        await cache.close()
+        await fake_redis_server.close()
+
@@ -0,0 +1,110 @@
+import time
+import pytest
+from sqlalchemy import Column, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+
+from app.core.db_router import DatabaseRouter, ReadOnlySessionError
+
+Base = declarative_base()
+
+
+class Note(Base):
+    __tablename__ = "notes"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+
+
+class TestDatabaseRouter:
+    @pytest.fixture
+    def lags(self):
+        return {"replica-0": 0.0}
+
+    @pytest.fixture
+    def router(self, lags):
+        primary_engine = create_engine("sqlite://")
+        Base.metadata.create_all(primary_engine)
+        replica_engine = create_engine("sqlite://")
+        Base.metadata.create_all(replica_engine)
+
+        # Свой класс сессии на тест: слушатели событий вешаются на класс
+        primary_session = type("PrimarySession", (Session,), {})
+        router = DatabaseRouter(
+            sessionmaker(class_=primary_session, bind=primary_engine),
+            max_lag=5.0,
+            check_interval=0,
+            sticky_window=0.2,
+            probe=lambda db: lags["replica-0"]
+        )
+        router.watch(primary_session)
+        router.add_replica("replica-0", sessionmaker(bind=replica_engine))
+        return router
+
+    def test_read_only_sessions_use_replica_within_lag(self, router, lags):
+        assert router.session(read_only=True).info["replica"] == "replica-0"
+        assert router.session().info["replica"] is None
+
+        lags["replica-0"] = 30.0
+        assert router.session(read_only=True).info["replica"] is None
+        assert router.stats["lagging_fallbacks"] == 1
+
+    def test_failed_lag_check_falls_back_to_primary(self, router):
+        def broken(db):
+            raise ConnectionError("replica down")
+
+        router.probe = broken
+        assert router.session(read_only=True).info["replica"] is None
+
+    def test_user_reads_own_writes_from_primary(self, router):
+        db = router.session()
+        db.add(Note(user_id=7))
+        db.commit()
+        db.close()
+
+        assert router.session(read_only=True, user_id=7).info["replica"] is None
+        assert router.session(read_only=True, user_id=8).info["replica"] == "replica-0"
+
+        time.sleep(0.3)
+        assert router.session(read_only=True, user_id=7).info["replica"] == "replica-0"
+
+    @pytest.mark.asyncio
+    async def test_sync_check_does_not_call_redis_on_event_loop(self, router):
+        class SharedWindow:
+            """Окно других воркеров: блокирующее чтение недопустимо в event loop"""
+            def get_sync(self, key):
+                raise AssertionError("blocking Redis call on the event loop")
+
+            async def get(self, key):
+                return None
+
+        router.cache = SharedWindow()
+        assert router.session(read_only=True, user_id=8).info["replica"] is None
+        # Async-путь спрашивает Redis без блокировки и отпускает на реплику
+        assert not await router.recently_wrote_async(8)
+
+    def test_rolled_back_write_is_not_sticky(self, router):
+        db = router.session()
+        db.add(Note(user_id=7))
+        db.flush()
+        db.rollback()
+        db.close()
+
+        assert router.session(read_only=True, user_id=7).info["replica"] == "replica-0"
+
+    def test_decorated_reader_keeps_session_with_pending_writes(self, router, lags):
+        @router.read_only
+        def count(db):
+            return db.info["replica"], db.query(Note).count()
+
+        db = router.session()
+        assert count(db)[0] == "replica-0"
+
+        db.add(Note(user_id=1))
+        db.flush()
+        assert count(db) == (None, 1)
+        db.rollback()
+
+        lags["replica-0"] = 30.0
+        fallback = router.session(read_only=True)
+        fallback.add(Note(user_id=1))
+        with pytest.raises(ReadOnlySessionError):
+            fallback.flush()
@@ -0,0 +1,96 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.core.geo import distance_matrix_km, haversine_km, haversine_km_batch, path_legs_km
+
+
+@pytest.fixture
+def points():
+    rng = random.Random(5)
+    # Бишкек и окрестности плюс дальние точки, антимеридиан и полюс
+    points = [(42.87 + rng.uniform(-0.5, 0.5), 74.59 + rng.uniform(-0.5, 0.5)) for _ in range(50)]
+    points += [(-33.86, 151.21), (51.5, -0.12), (0.0, 179.99), (0.0, -179.99), (89.99, 0.0), (-42.87, -105.41)]
+    return points
+
+
+def scalar_matrix(first, second):
+    return np.array([[haversine_km(a[0], a[1], b[0], b[1]) for b in second] for a in first])
+
+
+class TestHaversineBatch:
+    def test_one_to_many_matches_scalar(self, points):
+        lats, lons = zip(*points)
+        expected = [haversine_km(42.87, 74.59, lat, lon) for lat, lon in points]
+
+        result = haversine_km_batch(42.87, 74.59, lats, lons)
+
+        assert result.shape == (len(points),)
+        assert result.tolist() == pytest.approx(expected, rel=1e-12, abs=1e-9)
+
+    def test_pairwise_matches_scalar(self, points):
+        first, second = points[:28], points[28:]
+        lats1, lons1 = zip(*first)
+        lats2, lons2 = zip(*second)
+        expected = [haversine_km(a[0], a[1], b[0], b[1]) for a, b in zip(first, second)]
+
+        assert haversine_km_batch(lats1, lons1, lats2, lons2).tolist() == pytest.approx(expected, rel=1e-12, abs=1e-9)
+
+    def test_known_distances(self):
+        # Один градус долготы на экваторе и антиподы (ограничение a <= 1)
+        assert haversine_km_batch(0.0, 0.0, [0.0], [1.0])[0] == pytest.approx(111.195, abs=1e-3)
+        assert haversine_km_batch(0.0, 0.0, [0.0], [180.0])[0] == pytest.approx(np.pi * 6371.0)
+        assert haversine_km_batch(0.0, 179.99, [0.0], [-179.99])[0] == pytest.approx(2.2239, abs=1e-3)
+
+    def test_empty_and_single(self):
+        assert haversine_km_batch(42.87, 74.59, [], []).shape == (0,)
+        single = haversine_km_batch(42.87, 74.59, [42.88], [74.6])
+        assert single.tolist() == pytest.approx([haversine_km(42.87, 74.59, 42.88, 74.6)])
+        assert haversine_km_batch(42.87, 74.59, [42.87], [74.59]).tolist() == [0.0]
+
+
+class TestDistanceMatrix:
+    def test_square_matches_scalar(self, points):
+        lats, lons = zip(*points)
+
+        matrix = distance_matrix_km(lats, lons)
+
+        assert matrix.shape == (len(points), len(points))
+        np.testing.assert_allclose(matrix, scalar_matrix(points, points), rtol=1e-12, atol=1e-9)
+        np.testing.assert_array_equal(np.diag(matrix), 0.0)
+        np.testing.assert_allclose(matrix, matrix.T, rtol=1e-12)
+
+    def test_rectangular_matches_scalar(self, points):
+        first, second = points[:7], points[7:20]
+        lats1, lons1 = zip(*first)
+        lats2, lons2 = zip(*second)
+
+        matrix = distance_matrix_km(lats1, lons1, lats2, lons2)
+
+        assert matrix.shape == (7, 13)
+        np.testing.assert_allclose(matrix, scalar_matrix(first, second), rtol=1e-12, atol=1e-9)
+
+    def test_empty_and_single(self):
+        assert distance_matrix_km([], []).shape == (0, 0)
+        assert distance_matrix_km([], [], [42.87], [74.59]).shape == (0, 1)
+        assert distance_matrix_km([42.87], [74.59]).tolist() == [[0.0]]
+
+
+class TestPathLegs:
+    def test_matches_scalar(self, points):
+        lats, lons = zip(*points)
+        expected = [haversine_km(a[0], a[1], b[0], b[1]) for a, b in zip(points, points[1:])]
+
+        legs = path_legs_km(lats, lons)
+
+        assert legs.shape == (len(points) - 1,)
+        assert legs.tolist() == pytest.approx(expected, rel=1e-12, abs=1e-9)
+        assert float(legs.sum()) == pytest.approx(sum(expected))
+
+    @pytest.mark.parametrize("count", [0, 1])
+    def test_empty_and_single(self, count):
+        legs = path_legs_km([42.87] * count, [74.59] * count)
+
+        assert legs.shape == (0,)
+        assert float(legs.sum()) == 0.0
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.geo import haversine_km
+from app.schemas.partner import RouteRequest
+from app.services.geolocation_service import GeolocationService
+
+STOPS = [
+    (1, 42.8746, 74.5698),
+    (2, 42.8411, 74.6036),
+    (3, 42.8820, 74.6280),
+    (4, 42.8135, 74.5512),
+]
+
+
+def make_location(location_id: int, latitude: float, longitude: float) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=location_id,
+        latitude=latitude,
+        longitude=longitude,
+        address=f"address-{location_id}",
+        partner=SimpleNamespace(name=f"partner-{location_id}")
+    )
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def filter(self, *conditions):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params=None):
+        return FakeResult(self.rows)
+
+    def query(self, model):
+        return FakeResult(self.rows)
+
+
+class TestDistanceCallers:
+    """Все бывшие вызовы calculate_distance считают тот же Haversine, что и geo"""
+
+    def test_calculate_distance_is_haversine(self):
+        for _, lat, lon in STOPS:
+            assert GeolocationService.calculate_distance(42.87, 74.59, lat, lon) == haversine_km(42.87, 74.59, lat, lon)
+
+    def test_calculate_distance_is_not_memoized_on_floats(self):
+        first = GeolocationService.calculate_distance(42.87, 74.59, 42.88, 74.6)
+        nudged = GeolocationService.calculate_distance(42.87, 74.59, 42.88 + 1e-9, 74.6)
+
+        assert first != nudged
+        assert nudged == haversine_km(42.87, 74.59, 42.88 + 1e-9, 74.6)
+
+    def test_route_to_partner(self):
+        service = GeolocationService(FakeSession([(42.8411, 74.6036, "partner", "address")]))
+
+        route = service.get_route_to_partner(42.8746, 74.5698, 7)
+
+        distance = haversine_km(42.8746, 74.5698, 42.8411, 74.6036)
+        assert route["distance_km"] == round(distance, 2)
+        assert route["estimated_time_minutes"] == round(distance / 30 * 60)
+
+    def test_build_route_legs(self):
+        locations = [make_location(*stop) for stop in STOPS]
+        request = RouteRequest(partner_location_ids=[4, 2, 1, 3])
+
+        route = GeolocationService.build_route(FakeSession(locations), request)
+
+        ordered = [STOPS[3], STOPS[1], STOPS[0], STOPS[2]]
+        legs = [haversine_km(a[1], a[2], b[1], b[2]) for a, b in zip(ordered, ordered[1:])]
+        assert [point["distance"] for point in route["route_points"]] == [round(leg, 2) for leg in legs]
+        assert route["total_distance"] == round(sum(legs), 2)
+
+    def test_build_route_optimized_order_is_consistent(self):
+        locations = [make_location(*stop) for stop in STOPS]
+        request = RouteRequest(partner_location_ids=[1, 2, 3, 4], optimize_order=True)
+
+        route = GeolocationService.build_route(FakeSession(locations), request)
+
+        points = route["route_points"]
+        assert points[0]["start"]["name"] == "partner-1"
+        legs = [
+            haversine_km(p["start"]["latitude"], p["start"]["longitude"], p["end"]["latitude"], p["end"]["longitude"])
+            for p in points
+        ]
+        assert route["total_distance"] == pytest.approx(round(sum(legs), 2))
@@ -0,0 +1,138 @@
+import time
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+from app.core.exceptions import CircuitOpenException, ExternalServiceException
+from app.core.map_client import MapProviderClient, route_cache_key
+from app.schemas.route import TransportMode
+from app.services import route_service as route_service_module
+from app.services.route_service import RouteService
+
+
+def make_locations(offset: float = 0.0):
+    return [
+        SimpleNamespace(latitude=42.8700 + offset, longitude=74.5700),
+        SimpleNamespace(latitude=42.8800 + offset, longitude=74.6000),
+    ]
+
+
+class TestMapProviderClient:
+    @pytest.fixture
+    def client(self, fake_directions_server):
+        return MapProviderClient(
+            timeouts={"google": 1.0},
+            max_concurrency=20,
+            failure_threshold=3,
+            reset_timeout=60,
+            transport=fake_directions_server.transport
+        )
+
+    @pytest.fixture
+    def google_enabled(self, monkeypatch, client):
+        monkeypatch.setattr(route_service_module, "map_client", client)
+        monkeypatch.setattr(route_service_module.settings, "GOOGLE_MAPS_API_KEY", "test-key")
+
+    @pytest.mark.asyncio
+    async def test_event_loop_stays_responsive(self, client, google_enabled, fake_directions_server):
+        """500 конкурентных маршрутов не блокируют event loop"""
+        max_lag = 0.0
+        stop = asyncio.Event()
+
+        async def heartbeat():
+            nonlocal max_lag
+            while not stop.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                max_lag = max(max_lag, time.perf_counter() - started - 0.01)
+
+        monitor = asyncio.create_task(heartbeat())
+        routes = await asyncio.gather(*[
+            RouteService._get_route_from_provider(make_locations(i * 0.001), TransportMode.DRIVING)
+            for i in range(500)
+        ])
+        stop.set()
+        await monitor
+        await client.aclose()
+
+        assert len(routes) == 500
+        assert all(route["total_distance"] == "1.5 km" for route in routes)
+        assert fake_directions_server.calls == 500
+        assert max_lag < 0.1
+
+    @pytest.mark.asyncio
+    async def test_quantized_cache_hit(self, client, google_enabled, fake_directions_server):
+        """Точки в пределах ~10 м используют один кэшированный маршрут"""
+        first = await RouteService._get_route_from_provider(make_locations(0.0), TransportMode.DRIVING)
+        second = await RouteService._get_route_from_provider(make_locations(0.00001), TransportMode.DRIVING)
+        await client.aclose()
+
+        assert first == second
+        assert fake_directions_server.calls == 1
+        assert client.stats["cache_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_circuit_breaker_falls_back_to_simple_route(self, client, google_enabled, fake_directions_server):
+        fake_directions_server.fail = True
+
+        for i in range(3):
+            route = await RouteService._get_route_from_provider(make_locations(i), TransportMode.DRIVING)
+            assert route["total_distance"].endswith("km")
+
+        assert client.breaker("google").state == "open"
+
+        calls_before = fake_directions_server.calls
+        route = await RouteService._get_route_from_provider(make_locations(10), TransportMode.DRIVING)
+        await client.aclose()
+
+        # Провайдер не вызывался, ответ посчитан локально
+        assert fake_directions_server.calls == calls_before
+        assert client.stats["short_circuited"] == 1
+        assert len(route["route_points"]) == 1
+
+    @pytest.mark.asyncio
+    async def test_get_json_raises_when_open(self, client, fake_directions_server):
+        fake_directions_server.fail = True
+
+        for _ in range(3):
+            with pytest.raises(ExternalServiceException):
+                await client.get_json("google", "https://maps.googleapis.com/maps/api/directions/json", {})
+
+        with pytest.raises(CircuitOpenException):
+            await client.get_json("google", "https://maps.googleapis.com/maps/api/directions/json", {})
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_probe_does_not_keep_circuit_open(self, client, fake_directions_server):
+        fake_directions_server.fail = True
+        for _ in range(3):
+            with pytest.raises(ExternalServiceException):
+                await client.get_json("google", "https://maps.googleapis.com/maps/api/directions/json", {})
+
+        breaker = client.breaker("google")
+        breaker.opened_at -= breaker.reset_timeout
+        fake_directions_server.fail = False
+        fake_directions_server.latency = 1.0
+        probe = asyncio.create_task(
+            client.get_json("google", "https://maps.googleapis.com/maps/api/directions/json", {})
+        )
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        # Отменённая проба снова открыла цепь, следующая проба проходит
+        assert breaker.state == "open"
+        breaker.opened_at -= breaker.reset_timeout
+        fake_directions_server.latency = 0.0
+        await client.get_json("google", "https://maps.googleapis.com/maps/api/directions/json", {})
+        assert breaker.state == "closed"
+        await client.aclose()
+
+    def test_route_cache_key_quantization(self):
+        key_a = route_cache_key("google", [(42.870001, 74.570001), (42.88, 74.6)], "DRIVING")
+        key_b = route_cache_key("google", [(42.870004, 74.569998), (42.88, 74.6)], "DRIVING")
+        key_c = route_cache_key("google", [(42.870001, 74.570001), (42.88, 74.6)], "WALKING")
+
+        assert key_a == key_b
+        assert key_a != key_c
@@ -0,0 +1,208 @@
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.v1 import partner as partner_api
+from app.core.cache import RedisCache
+from app.core.database import get_db
+from app.core.geo import tile_bounds, tile_for_point
+from app.services import map_tile_service as tiles_module
+from app.services.map_tile_service import MapTileService, TilePoint, delta_decode, tile_key
+
+BISHKEK = (42.8746, 74.5698)
+
+
+def make_point(location_id: int, latitude: float, longitude: float, partner_id: int = None) -> TilePoint:
+    partner_id = partner_id or location_id
+    return TilePoint(
+        location_id=location_id,
+        partner_id=partner_id,
+        partner_name=f"partner-{partner_id}",
+        category="cafe",
+        max_discount_percent=10.0,
+        latitude=latitude,
+        longitude=longitude
+    )
+
+
+def decode(tile) -> dict:
+    return json.loads(tile.body)
+
+
+class TestTileMath:
+    def test_world_tile(self):
+        min_lat, min_lon, max_lat, max_lon = tile_bounds(0, 0, 0)
+        assert (min_lon, max_lon) == (-180.0, 180.0)
+        assert max_lat == pytest.approx(85.0511, abs=1e-4)
+        assert min_lat == pytest.approx(-85.0511, abs=1e-4)
+        assert tile_for_point(*BISHKEK, 0) == (0, 0)
+
+    @pytest.mark.parametrize("zoom", [1, 5, 10, 14, 20])
+    def test_point_inside_its_tile(self, zoom):
+        x, y = tile_for_point(*BISHKEK, zoom)
+        min_lat, min_lon, max_lat, max_lon = tile_bounds(zoom, x, y)
+
+        assert min_lat <= BISHKEK[0] < max_lat
+        assert min_lon <= BISHKEK[1] < max_lon
+        assert x == int((BISHKEK[1] + 180) / 360 * (1 << zoom))
+
+    def test_is_valid(self):
+        service = MapTileService(max_zoom=10)
+        assert service.is_valid(3, 7, 0)
+        assert not service.is_valid(3, 8, 0)
+        assert not service.is_valid(11, 0, 0)
+        assert not service.is_valid(-1, 0, 0)
+
+
+class TestTileEncoding:
+    @pytest.fixture
+    def service(self):
+        return MapTileService(max_zoom=20, cluster_max_zoom=14, cluster_grid=8)
+
+    def test_delta_encoding_round_trip(self, service):
+        zoom = 15
+        x, y = tile_for_point(*BISHKEK, zoom)
+        min_lat, min_lon, max_lat, max_lon = tile_bounds(zoom, x, y)
+        points = [
+            make_point(i, min_lat + (max_lat - min_lat) * k, min_lon + (max_lon - min_lon) * k)
+            for i, k in enumerate([0.9, 0.1, 0.5, 0.3], start=1)
+        ]
+
+        payload = decode(service.encode(zoom, x, y, points))
+
+        assert payload["clusters"]["count"] == []
+        origin_lat, origin_lon = payload["origin"]
+        lats = delta_decode(payload["pins"]["lat"], origin_lat)
+        lons = delta_decode(payload["pins"]["lon"], origin_lon)
+        by_id = {p.location_id: p for p in points}
+        for location_id, lat, lon in zip(payload["pins"]["id"], lats, lons):
+            assert lat == pytest.approx(by_id[location_id].latitude, abs=1e-5)
+            assert lon == pytest.approx(by_id[location_id].longitude, abs=1e-5)
+        # Пины отсортированы, дельты после первой - неотрицательные
+        assert all(delta >= 0 for delta in payload["pins"]["lat"][1:])
+
+    def test_partner_dictionary(self, service):
+        zoom = 16
+        x, y = tile_for_point(*BISHKEK, zoom)
+        points = [
+            make_point(1, BISHKEK[0], BISHKEK[1], partner_id=7),
+            make_point(2, BISHKEK[0] + 0.0005, BISHKEK[1], partner_id=7),
+            make_point(3, BISHKEK[0] + 0.001, BISHKEK[1], partner_id=9),
+        ]
+        x2, y2 = tile_for_point(BISHKEK[0] + 0.001, BISHKEK[1], zoom)
+        assert (x, y) == (x2, y2)
+
+        payload = decode(service.encode(zoom, x, y, points))
+
+        assert [entry[0] for entry in payload["partners"]] == [7, 9]
+        assert payload["pins"]["partner"] == [0, 0, 1]
+
+    def test_clusters_below_cluster_max_zoom(self, service):
+        zoom = 10
+        x, y = tile_for_point(*BISHKEK, zoom)
+        min_lat, min_lon, max_lat, max_lon = tile_bounds(zoom, x, y)
+        # Три точки в одной ячейке сетки и одна - в противоположном углу тайла
+        near = (min_lat + (max_lat - min_lat) * 0.7, min_lon + (max_lon - min_lon) * 0.3)
+        points = [
+            make_point(1, near[0], near[1]),
+            make_point(2, near[0] + 0.001, near[1] + 0.001),
+            make_point(3, near[0] - 0.001, near[1] + 0.002),
+            make_point(4, min_lat + (max_lat - min_lat) * 0.05, min_lon + (max_lon - min_lon) * 0.05),
+        ]
+
+        clustered = decode(service.encode(zoom, x, y, points))
+        assert clustered["pins"]["id"] == [4]
+        assert clustered["clusters"]["count"] == [3]
+        cluster_lat = delta_decode(clustered["clusters"]["lat"], clustered["origin"][0])[0]
+        assert cluster_lat == pytest.approx(near[0], abs=1e-3)
+
+        detailed = decode(service.encode(14, *tile_for_point(*near, 14), points[:3]))
+        assert sorted(detailed["pins"]["id"]) == [1, 2, 3]
+        assert detailed["clusters"]["count"] == []
+
+    def test_etag_depends_on_content(self, service):
+        x, y = tile_for_point(*BISHKEK, 15)
+        first = service.encode(15, x, y, [make_point(1, *BISHKEK)])
+        same = service.encode(15, x, y, [make_point(1, *BISHKEK)])
+        moved = service.encode(15, x, y, [make_point(1, BISHKEK[0] + 0.0001, BISHKEK[1])])
+
+        assert first.etag == same.etag
+        assert first.etag != moved.etag
+
+
+class TestTileCache:
+    @pytest.fixture
+    def service(self, monkeypatch):
+        service = MapTileService(max_zoom=6, cluster_max_zoom=4)
+        service.loads = []
+
+        def load_points(db, zoom, x, y):
+            service.loads.append((zoom, x, y))
+            return [make_point(1, *BISHKEK)]
+
+        monkeypatch.setattr(service, "load_points", load_points)
+        return service
+
+    @staticmethod
+    def install_cache(url, monkeypatch) -> RedisCache:
+        cache = RedisCache(url=url)
+        monkeypatch.setattr(tiles_module, "redis_cache", cache)
+        return cache
+
+    @pytest.mark.asyncio
+    async def test_invalidation_per_zoom(self, service, fake_redis_server, monkeypatch):
+        """Сбрасывается по одному тайлу на зум - тот, что содержит точку"""
+        cache = self.install_cache(await fake_redis_server.start(), monkeypatch)
+        containing = [(zoom, *tile_for_point(*BISHKEK, zoom)) for zoom in range(7)]
+        neighbours = [(zoom, x + 1, y) for zoom, x, y in containing[2:]]
+
+        for tile in containing + neighbours:
+            await service.get_tile(None, *tile)
+        for tile in containing + neighbours:
+            await service.get_tile(None, *tile)
+        assert len(service.loads) == len(containing + neighbours)
+
+        assert await service.invalidate_points([BISHKEK, (None, None)]) == len(containing)
+        for zoom, x, y in containing:
+            assert await cache.get(tile_key(zoom, x, y)) is None
+        for zoom, x, y in neighbours:
+            assert await cache.get(tile_key(zoom, x, y)) is not None
+
+        await cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_endpoint_etag_and_not_modified(self, service, fake_redis_server, monkeypatch):
+        cache = self.install_cache(await fake_redis_server.start(), monkeypatch)
+        monkeypatch.setattr(partner_api, "map_tile_service", service)
+
+        app = FastAPI()
+        app.include_router(partner_api.router, prefix="/partners")
+        app.dependency_overrides[get_db] = lambda: None
+        zoom = 6
+        x, y = tile_for_point(*BISHKEK, zoom)
+        url = f"/partners/tiles/{zoom}/{x}/{y}"
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.get(url)
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+            assert json.loads(response.content)["pins"]["id"] == [1]
+
+            not_modified = await client.get(url, headers={"If-None-Match": f'"stale", {etag}'})
+            assert not_modified.status_code == 304
+            assert not_modified.content == b""
+            assert not_modified.headers["etag"] == etag
+
+            changed = await client.get(url, headers={"If-None-Match": '"stale"'})
+            assert changed.status_code == 200
+
+            invalid = await client.get(f"/partners/tiles/{zoom}/{1 << zoom}/0")
+            assert invalid.status_code == 400
+
+        assert service.loads == [(zoom, x, y)]
+
+        await cache.close()
+        await fake_redis_server.close()
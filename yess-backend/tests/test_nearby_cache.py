@@ -0,0 +1,153 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.cache import RedisCache
+from app.core.geo import geohash_bbox
+from app.schemas.partner import NearbyPartnerRequest
+from app.services import geolocation_service as geo_module
+from app.services.geolocation_service import GeolocationService
+from app.services.nearby_cache import NearbyPartnersCache
+from app.services.spatial_index import IndexedLocation, PartnerSpatialIndex
+
+OLD_POINT = (42.8700, 74.5900)
+NEW_POINT = (42.8800, 74.6050)
+FAR_POINT = (42.4900, 78.3900)  # Каракол, другая крупная ячейка
+
+
+def make_location(location_id: int, latitude: float, longitude: float) -> IndexedLocation:
+    return IndexedLocation(
+        id=location_id, partner_id=location_id, partner_name=f"partner-{location_id}",
+        category="food", address=None, phone_number=None, working_hours=None,
+        max_discount_percent=5.0, latitude=latitude, longitude=longitude
+    )
+
+
+class TelemetryRecorder:
+    """Вместо счётчиков Prometheus: какие события отправил кэш"""
+
+    def __init__(self):
+        self.events = []
+
+    def hit(self, tier, key, size=None):
+        self.events.append(("hit", tier, key))
+
+    def miss(self, key):
+        self.events.append(("miss", key))
+
+
+class CountingIndex(PartnerSpatialIndex):
+    def __init__(self):
+        super().__init__(cell_size_deg=0.05)
+        self.queries = 0
+        self.refreshed = []
+
+    def query(self, *args, **kwargs):
+        self.queries += 1
+        return super().query(*args, **kwargs)
+
+    def refresh_location(self, model):
+        self.refreshed.append(model.id)
+
+
+class FakeQuery:
+    def __init__(self, result):
+        self.result = result
+
+    def filter(self, *conditions):
+        return self
+
+    def first(self):
+        return self.result
+
+
+class FakeSession:
+    def __init__(self, location, partner):
+        self.location = location
+        self.partner = partner
+
+    def query(self, model):
+        return FakeQuery(self.location if model is geo_module.PartnerLocation else self.partner)
+
+    def add(self, instance):
+        pass
+
+    def commit(self):
+        pass
+
+    def refresh(self, instance):
+        pass
+
+
+def request_at(point, radius=2.0):
+    return NearbyPartnerRequest(latitude=point[0], longitude=point[1], radius=radius)
+
+
+class TestNearbyPartnersCache:
+    @pytest.fixture
+    def index(self, monkeypatch):
+        index = CountingIndex()
+        index.load([
+            make_location(1, *OLD_POINT),
+            make_location(2, OLD_POINT[0] + 0.003, OLD_POINT[1]),
+            make_location(3, *FAR_POINT),
+        ])
+
+        async def invalidate_tiles(points):
+            return 0
+
+        monkeypatch.setattr(geo_module, "partner_spatial_index", index)
+        monkeypatch.setattr(geo_module.map_tile_service, "invalidate_points", invalidate_tiles)
+        return index
+
+    @staticmethod
+    def install_cache(url, monkeypatch) -> NearbyPartnersCache:
+        cache = NearbyPartnersCache(RedisCache(url=url), precision=6, index_precision=4, ttl=300)
+        cache.telemetry = TelemetryRecorder()
+        monkeypatch.setattr(geo_module, "nearby_partners_cache", cache)
+        return cache
+
+    @pytest.mark.asyncio
+    async def test_same_cell_requests_share_entry(self, index, fake_redis_server, monkeypatch):
+        cache = self.install_cache(await fake_redis_server.start(), monkeypatch)
+        min_lat, min_lon, max_lat, max_lon = geohash_bbox(cache.cell_of(*OLD_POINT))
+        first = (min_lat + (max_lat - min_lat) * 0.2, min_lon + (max_lon - min_lon) * 0.2)
+        second = (min_lat + (max_lat - min_lat) * 0.8, min_lon + (max_lon - min_lon) * 0.9)
+
+        first_result = await GeolocationService.find_nearby_partners(None, request_at(first))
+        second_result = await GeolocationService.find_nearby_partners(None, request_at(second))
+
+        assert index.queries == 1
+        assert [event[0] for event in cache.telemetry.events] == ["miss", "hit"]
+        assert cache.telemetry.events[1][1] == "redis"
+        assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+        # Запись общая, но порядок - по реальной позиции каждого пользователя
+        assert {item.id for item in first_result} == {item.id for item in second_result} == {1, 2}
+
+        await cache.cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_location_update_invalidates_old_and_new_cells_only(self, index, fake_redis_server, monkeypatch):
+        cache = self.install_cache(await fake_redis_server.start(), monkeypatch)
+        for point in (OLD_POINT, NEW_POINT, FAR_POINT):
+            await GeolocationService.find_nearby_partners(None, request_at(point))
+        assert index.queries == 3
+
+        location = SimpleNamespace(id=1, latitude=OLD_POINT[0], longitude=OLD_POINT[1])
+        partner = SimpleNamespace(id=1, latitude=OLD_POINT[0], longitude=OLD_POINT[1])
+        await GeolocationService.update_partner_location(
+            FakeSession(location, partner), 1, NEW_POINT[0], NEW_POINT[1]
+        )
+        assert index.refreshed == [1]
+
+        for point in (OLD_POINT, NEW_POINT, FAR_POINT):
+            await GeolocationService.find_nearby_partners(None, request_at(point))
+
+        # Перестроены только записи у старой и новой позиции
+        assert index.queries == 5
+        assert cache.stats["invalidations"] == 2
+        assert [event[0] for event in cache.telemetry.events[3:]] == ["miss", "miss", "hit"]
+
+        await cache.cache.close()
+        await fake_redis_server.close()
@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import Column, ForeignKey, Integer, String, create_engine
+from sqlalchemy.orm import Session, contains_eager, declarative_base, joinedload, relationship
+
+from app.core.nplus1 import NPlusOneDetector, NPlusOneError
+
+Base = declarative_base()
+
+
+class Partner(Base):
+    __tablename__ = "partners"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    locations = relationship("PartnerLocation", back_populates="partner")
+
+
+class PartnerLocation(Base):
+    __tablename__ = "partner_locations"
+    id = Column(Integer, primary_key=True)
+    partner_id = Column(ForeignKey("partners.id"))
+    partner = relationship(Partner, back_populates="locations")
+
+
+class PromoCode(Base):
+    __tablename__ = "promo_codes"
+    id = Column(Integer, primary_key=True)
+    code = Column(String)
+
+
+class UserPromoCode(Base):
+    __tablename__ = "user_promo_codes"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    promo_code_id = Column(ForeignKey("promo_codes.id"))
+    promo_code = relationship(PromoCode)
+
+
+class TestNPlusOneDetector:
+    """Запросы горячих путей: связи в цикле против загрузки одним запросом"""
+
+    @pytest.fixture
+    def detector(self):
+        return NPlusOneDetector(enabled=True, threshold=3, raise_errors=True)
+
+    @pytest.fixture
+    def db(self, detector):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        detector.instrument(engine)
+        # Свой класс сессии на тест: слушатели событий вешаются на класс
+        session_class = type("TrackedSession", (Session,), {})
+        detector.watch(session_class)
+
+        db = session_class(bind=engine)
+        for index in range(5):
+            partner = Partner(name=f"partner-{index}")
+            db.add_all([PartnerLocation(partner=partner), PartnerLocation(partner=partner)])
+            db.add(UserPromoCode(user_id=1, promo_code=PromoCode(code=f"CODE{index}")))
+        db.commit()
+        db.close()
+        yield session_class(bind=engine)
+        engine.dispose()
+
+    def test_lazy_relationship_in_loop_fails(self, detector, db):
+        with pytest.raises(NPlusOneError, match="PartnerLocation.partner"):
+            with detector.track():
+                [location.partner.name for location in db.query(PartnerLocation)]
+
+    def test_partner_locations_in_one_query(self, detector, db):
+        with detector.track() as loads:
+            locations = db.query(PartnerLocation).join(Partner).options(
+                contains_eager(PartnerLocation.partner)
+            ).all()
+            names = {location.partner.name for location in locations}
+        assert len(names) == 5
+        assert loads.queries == 1 and not loads.lazy_loads
+
+    def test_user_promo_codes_in_one_query(self, detector, db):
+        with detector.track() as loads:
+            codes = [
+                upc.promo_code.code
+                for upc in db.query(UserPromoCode).options(joinedload(UserPromoCode.promo_code)).filter(
+                    UserPromoCode.user_id == 1
+                )
+            ]
+        assert len(codes) == 5
+        assert loads.queries == 1
+
+    def test_repeated_query_warns_without_raise(self, detector, db, caplog):
+        detector.raise_errors = False
+        with detector.track() as loads:
+            for partner_id in range(1, 6):
+                db.query(Partner).filter(Partner.id == partner_id).first()
+        assert loads.queries == 5
+        assert "N+1 in background" in caplog.text
+
+    def test_untracked_code_is_not_counted(self, detector, db):
+        [location.partner.name for location in db.query(PartnerLocation)]
@@ -0,0 +1,47 @@
+import pytest
+
+from app.core.cache import RedisCache
+from app.services import partner_search_service as search_module
+from app.services.partner_search_service import PartnerSearchService
+
+
+class TestAutocompleteCache:
+    @pytest.fixture
+    def service(self, monkeypatch):
+        service = PartnerSearchService(autocomplete_ttl=60)
+        service.db_calls = []
+
+        def from_db(db, prefix, limit):
+            service.db_calls.append(prefix)
+            return [{"id": 1, "name": "Кофе Хаус", "category": "cafe", "logo_url": None}]
+
+        monkeypatch.setattr(service, "_autocomplete_from_db", from_db)
+        return service
+
+    @pytest.mark.asyncio
+    async def test_same_normalized_prefix_hits_cache(self, service, fake_redis_server, monkeypatch):
+        """"Кофе", " кофе!" и "КОФЕ" - один ключ, один запрос к БД"""
+        url = await fake_redis_server.start()
+        cache = RedisCache(url=url)
+        monkeypatch.setattr(search_module, "redis_cache", cache)
+
+        results = [
+            await service.autocomplete(None, prefix, limit=5)
+            for prefix in ("Кофе", " кофе!", "КОФЕ")
+        ]
+
+        assert service.db_calls == ["кофе"]
+        assert results[0] == results[1] == results[2]
+        assert results[0][0]["name"] == "Кофе Хаус"
+
+        await service.autocomplete(None, "кофе", limit=10)
+        assert service.db_calls == ["кофе", "кофе"]
+
+        await cache.close()
+        await fake_redis_server.close()
+
+    @pytest.mark.asyncio
+    async def test_short_prefix_skips_db_and_cache(self, service):
+        assert await service.autocomplete(None, "к") == []
+        assert await service.autocomplete(None, " - ") == []
+        assert service.db_calls == []
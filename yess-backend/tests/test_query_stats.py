@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.core.query_stats import QueryStats, QueryStatsMiddleware, fingerprint
+
+
+class TestQueryStats:
+    def test_fingerprint_ignores_literals_and_list_sizes(self):
+        assert fingerprint("SELECT * FROM users WHERE id IN (%(id_1)s, %(id_2)s) AND name = 'x'") == fingerprint(
+            "SELECT *  FROM users\n WHERE id IN (%(id_1)s, %(id_2)s, %(id_3)s) AND name = 'it''s'"
+        ) == "SELECT * FROM users WHERE id IN (?+) AND name = ?"
+        assert fingerprint("SELECT 1 FROM t WHERE a = :a::int LIMIT 10") == "SELECT ? FROM t WHERE a = ?::int LIMIT ?"
+
+    @pytest.mark.asyncio
+    async def test_statements_are_attributed_to_endpoint_and_slow_ones_explained(self, tmp_path):
+        stats = QueryStats(slow_threshold=0, explain_interval=3600)
+        engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+        stats.instrument(engine)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+            conn.execute(text("INSERT INTO items (name) VALUES ('a'), ('b')"))
+
+        def list_items():
+            with engine.connect() as conn:
+                for item_id in (1, 2):
+                    conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": item_id}).fetchall()
+
+        async def app(scope, receive, send):
+            scope["endpoint"] = list_items
+            list_items()
+
+        await QueryStatsMiddleware(app)({"type": "http", "path": "/items"}, None, None)
+
+        select = next(s for s in stats.snapshot() if s["statement"].startswith("SELECT name"))
+        assert select["count"] == 2
+        assert select["endpoints"] == {f"{__name__}.{list_items.__qualname__}": 2}
+        detail = stats.get(select["fingerprint"])
+        assert "items" in detail["explain"] and detail["sample"].startswith("SELECT name")
+        # Вне запроса и для записи - без плана
+        insert = next(s for s in stats.snapshot() if s["statement"].startswith("INSERT"))
+        assert insert["endpoints"] == {"background": 1}
+        assert stats.get(insert["fingerprint"])["explain"] is None
+
+    def test_router_dependency_attributes_sync_endpoint(self, tmp_path):
+        from fastapi import APIRouter, Depends, FastAPI
+        from fastapi.testclient import TestClient
+        from app.core.query_stats import track_endpoint
+
+        stats = QueryStats(explain=False)
+        engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+        stats.instrument(engine)
+        router = APIRouter(dependencies=[Depends(track_endpoint)])
+
+        @router.get("/ping")
+        def ping():
+            with engine.connect() as conn:
+                return {"value": conn.execute(text("SELECT 1")).scalar()}
+
+        app = FastAPI()
+        app.include_router(router)
+        assert TestClient(app).get("/ping").json() == {"value": 1}
+        assert stats.snapshot()[0]["endpoints"] == {f"{__name__}.{ping.__qualname__}": 1}
@@ -0,0 +1,48 @@
+import gc
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.cache import RedisCache
+from app.core.resources import ResourceManager
+
+
+class TestResourceManager:
+    def test_pool_limits_shrink_with_workers(self):
+        assert ResourceManager(workers=1, db_budget=90).db_pool_limits() == (10, 20)
+        assert ResourceManager(workers=4, db_budget=90).db_pool_limits() == (10, 1)
+        assert ResourceManager(workers=16, db_budget=90).db_pool_limits() == (2, 0)
+        assert ResourceManager(workers=4, redis_budget=400).redis_pool_limit() == 50
+
+    def test_engine_is_shared_and_checkouts_are_reported(self, tmp_path):
+        manager = ResourceManager(workers=1, db_budget=8, leak_threshold=0)
+        url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+        engine = manager.engine(url)
+        assert manager.engine(url) is engine
+
+        held = [engine.connect() for _ in range(2)]
+        pool = manager.snapshot()[0]
+        assert (pool["checked_out"], pool["capacity"], pool["saturation"]) == (2, 4, 0.5)
+        assert pool["long_checkouts"] == 2
+
+        for connection in held:
+            connection.close()
+        assert manager.snapshot()[0]["checked_out"] == 0
+
+    def test_session_dropped_without_close_is_a_leak(self, tmp_path):
+        manager = ResourceManager()
+        factory = sessionmaker(bind=manager.engine(f"sqlite:///{tmp_path / 'db.sqlite'}"))
+
+        db = factory()
+        db.execute(text("SELECT 1"))
+        db.close()
+        db = factory()
+        db.execute(text("SELECT 1"))
+        del db
+        gc.collect()
+
+        assert manager.stats["sessions_leaked"] == 1
+
+    def test_caches_with_same_url_share_redis_pool(self):
+        first = RedisCache(url="redis://localhost:1/3", name="first")
+        second = RedisCache(url="redis://localhost:1/3", name="second")
+        assert first.sync_redis.connection_pool is second.sync_redis.connection_pool
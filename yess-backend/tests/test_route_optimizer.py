@@ -0,0 +1,100 @@
+import itertools
+import random
+import time
+
+import numpy as np
+import pytest
+
+from app.services.route_optimizer import RouteOptimizer, route_length
+
+
+def euclidean_matrix(points) -> np.ndarray:
+    coords = np.array(points, dtype=float)
+    return np.linalg.norm(coords[:, None, :] - coords[None, :, :], axis=-1)
+
+
+def random_points(count: int, seed: int):
+    rng = random.Random(seed)
+    return [(rng.uniform(0, 10), rng.uniform(0, 10)) for _ in range(count)]
+
+
+def best_length(distances, start=None, end=None) -> float:
+    """Полный перебор для малых N"""
+    n = len(distances)
+    best = None
+    for order in itertools.permutations(range(n)):
+        if start is not None and order[0] != start:
+            continue
+        if end is not None and order[-1] != end:
+            continue
+        length = route_length(order, distances)
+        best = length if best is None else min(best, length)
+    return best
+
+
+class TestRouteOptimizer:
+    @pytest.fixture
+    def optimizer(self):
+        return RouteOptimizer(time_budget_ms=1000)
+
+    @pytest.mark.parametrize("start, end", [(0, None), (0, 5), (3, 1), (None, 2), (None, None)])
+    def test_fixed_start_and_end(self, optimizer, start, end):
+        distances = euclidean_matrix(random_points(8, seed=11))
+
+        result = optimizer.optimize(distances, start=start, end=end)
+
+        assert sorted(result.order) == list(range(8))
+        if start is not None:
+            assert result.order[0] == start
+        if end is not None:
+            assert result.order[-1] == end
+        assert result.distance_km == pytest.approx(route_length(result.order, distances))
+        assert result.distance_km <= best_length(distances, start, end) * 1.1
+
+    def test_same_start_and_end_rejected(self, optimizer):
+        with pytest.raises(ValueError):
+            optimizer.optimize(euclidean_matrix(random_points(4, seed=1)), start=2, end=2)
+
+    def test_two_opt_uncrosses_route(self):
+        """Квадрат, обойдённый крест-накрест: разворот отрезка убирает пересечение"""
+        distances = euclidean_matrix([(0, 0), (1, 1), (1, 0), (0, 1)]).tolist()
+        route = [0, 1, 2, 3]
+
+        improved = RouteOptimizer._two_opt(route, distances, True, False, time.perf_counter() + 1)
+
+        assert improved
+        assert route_length(route, distances) == pytest.approx(3.0)
+
+    @pytest.mark.parametrize("seed", [3, 5, 8])
+    def test_improves_on_nearest_neighbour(self, optimizer, seed):
+        distances = euclidean_matrix(random_points(60, seed=seed))
+
+        result = optimizer.optimize(distances, start=0)
+
+        assert not result.timed_out
+        assert result.distance_km < result.seed_distance_km
+        nearest = RouteOptimizer._nearest_neighbour_from(distances, 0, None)
+        assert result.seed_distance_km == pytest.approx(route_length(nearest, distances))
+
+    def test_time_budget(self):
+        distances = euclidean_matrix(random_points(300, seed=2))
+        optimizer = RouteOptimizer(time_budget_ms=20)
+
+        result = optimizer.optimize(distances, start=0, end=299)
+
+        assert result.timed_out
+        # Затравка (ближайший сосед) не ограничена бюджетом - запас на неё
+        assert result.elapsed_ms < 1000
+        assert sorted(result.order) == list(range(300))
+        assert result.order[0] == 0 and result.order[-1] == 299
+        assert result.distance_km <= result.seed_distance_km
+
+    @pytest.mark.parametrize("count", [0, 1, 2])
+    def test_trivial_inputs(self, optimizer, count):
+        distances = euclidean_matrix(random_points(count, seed=4)) if count else np.zeros((0, 0))
+
+        result = optimizer.optimize(distances, start=None, end=0 if count else None)
+
+        assert sorted(result.order) == list(range(count))
+        if count:
+            assert result.order[-1] == 0
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.geo import haversine_km
+from app.services.route_service import RouteService
+
+
+def make_locations():
+    # Точки на одной широте: оптимальный порядок - по долготе
+    return [
+        SimpleNamespace(id=location_id, latitude=42.87, longitude=longitude)
+        for location_id, longitude in [(10, 74.60), (11, 74.50), (12, 74.55), (13, 74.65)]
+    ]
+
+
+class TestOptimizeLocationOrder:
+    def test_end_at_first_location_is_kept(self):
+        """Конец = первая локация списка: начало по умолчанию не должно его отменять"""
+        order = RouteService.optimize_location_order(make_locations(), end_location_id=10)
+
+        assert [loc.id for loc in order] == [11, 12, 13, 10]
+
+    def test_default_start_is_first_location(self):
+        order = RouteService.optimize_location_order(make_locations(), end_location_id=13)
+
+        assert [loc.id for loc in order] == [10, 12, 11, 13]
+
+    @pytest.mark.parametrize("start_id, end_id", [(11, 13), (13, 11), (12, 10)])
+    def test_explicit_start_and_end(self, start_id, end_id):
+        order = RouteService.optimize_location_order(
+            make_locations(), start_location_id=start_id, end_location_id=end_id
+        )
+
+        assert order[0].id == start_id
+        assert order[-1].id == end_id
+
+    def test_same_start_and_end_drops_end(self):
+        order = RouteService.optimize_location_order(
+            make_locations(), start_location_id=12, end_location_id=12
+        )
+
+        assert order[0].id == 12
+        assert sorted(loc.id for loc in order) == [10, 11, 12, 13]
+
+
+class TestSimpleRoute:
+    def test_fallback_distances_match_scalar_haversine(self):
+        locations = make_locations()
+
+        route = RouteService._calculate_simple_route(locations)
+
+        legs = [
+            haversine_km(a.latitude, a.longitude, b.latitude, b.longitude)
+            for a, b in zip(locations, locations[1:])
+        ]
+        assert [point["distance"] for point in route["route_points"]] == [f"{leg:.2f} km" for leg in legs]
+        assert route["total_distance"] == f"{sum(legs):.2f} km"
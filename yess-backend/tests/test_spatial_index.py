@@ -0,0 +1,98 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.geo import haversine_km
+from app.services.spatial_index import IndexedLocation, PartnerSpatialIndex
+
+CATEGORIES = ["food", "cafe", "beauty", None]
+
+
+def make_location(location_id: int, latitude: float, longitude: float, **fields) -> IndexedLocation:
+    values = {
+        "partner_id": location_id,
+        "partner_name": f"partner-{location_id}",
+        "category": "food",
+        "address": None,
+        "phone_number": None,
+        "working_hours": None,
+        "max_discount_percent": 5.0,
+    }
+    values.update(fields)
+    return IndexedLocation(id=location_id, latitude=latitude, longitude=longitude, **values)
+
+
+def brute_force(locations, latitude, longitude, radius_km, categories=None, limit=None):
+    """Полный проход с точным Haversine"""
+    found = sorted(
+        (haversine_km(latitude, longitude, loc.latitude, loc.longitude), loc.id)
+        for loc in locations
+        if not categories or loc.category in categories
+    )
+    found = [(distance, location_id) for distance, location_id in found if distance <= radius_km]
+    return found[:limit] if limit is not None else found
+
+
+class TestPartnerSpatialIndex:
+    @pytest.fixture
+    def locations(self):
+        rng = random.Random(7)
+        # Бишкек и окрестности ~ 60 x 60 км
+        return [
+            make_location(
+                location_id,
+                42.87 + rng.uniform(-0.3, 0.3),
+                74.59 + rng.uniform(-0.4, 0.4),
+                category=rng.choice(CATEGORIES)
+            )
+            for location_id in range(1, 2001)
+        ]
+
+    @pytest.fixture
+    def index(self, locations):
+        index = PartnerSpatialIndex(cell_size_deg=0.05)
+        index.load(locations)
+        return index
+
+    @pytest.mark.parametrize("radius_km", [0.5, 3.0, 12.0, 80.0])
+    def test_query_matches_brute_force(self, index, locations, radius_km):
+        result = index.query(42.87, 74.59, radius_km)
+        expected = brute_force(locations, 42.87, 74.59, radius_km)
+
+        assert [entry.id for entry, _ in result] == [location_id for _, location_id in expected]
+        assert [distance for _, distance in result] == pytest.approx([distance for distance, _ in expected])
+
+    def test_category_filter_and_limit(self, index, locations):
+        result = index.query(42.9, 74.6, 10.0, categories={"cafe", "beauty"}, limit=15)
+        expected = brute_force(locations, 42.9, 74.6, 10.0, categories={"cafe", "beauty"}, limit=15)
+
+        assert len(result) == 15
+        assert [entry.id for entry, _ in result] == [location_id for _, location_id in expected]
+        assert all(entry.category in ("cafe", "beauty") for entry, _ in result)
+
+    def test_refresh_moves_and_removes_location(self, index):
+        """refresh_location (после update_partner_location): только затронутая локация"""
+        partner = SimpleNamespace(
+            name="moved", category="food", default_cashback_rate=10, is_verified=True, is_active=True
+        )
+        model = SimpleNamespace(
+            id=5000, partner_id=77, partner=partner, is_active=True,
+            latitude=42.0, longitude=75.5, address=None, phone_number=None,
+            working_hours=None, open_intervals=None
+        )
+        size = len(index)
+
+        index.refresh_location(model)
+        assert [entry.id for entry, _ in index.query(42.0, 75.5, 1.0)] == [5000]
+
+        model.latitude, model.longitude = 42.5, 76.0
+        index.refresh_location(model)
+        assert index.query(42.0, 75.5, 1.0) == []
+        assert [entry.id for entry, _ in index.query(42.5, 76.0, 1.0)] == [5000]
+        assert len(index) == size + 1
+
+        model.is_active = False
+        index.refresh_location(model)
+        assert index.query(42.5, 76.0, 1.0) == []
+        assert len(index) == size
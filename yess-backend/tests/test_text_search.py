@@ -0,0 +1,45 @@
+import pytest
+
+from app.core.text_search import normalize, prefix_tsquery, query_terms, searchable, to_latin
+
+
+class TestNormalize:
+    @pytest.mark.parametrize("text, expected", [
+        ("Кофе-Хаус!", "кофе хаус"),
+        ("  Ёлка,  Ёжик ", "елка ежик"),
+        ("Өрүк Һ Ң", "орук х н"),
+        ("Coffee №1", "coffee 1"),
+        ("", ""),
+        (None, ""),
+    ])
+    def test_normalize(self, text, expected):
+        assert normalize(text) == expected
+
+    def test_to_latin(self):
+        assert to_latin("кофе") == "kofe"
+        assert to_latin("щедрый чай") == "shchedryy chay"
+
+    def test_searchable_adds_latin_only_for_cyrillic(self):
+        assert searchable("Кофе Хаус") == "кофе хаус kofe khaus"
+        assert searchable("Coffee House") == "coffee house"
+
+
+class TestPrefixTsquery:
+    def test_query_terms_have_transliteration(self):
+        assert query_terms("Кофе Бар") == [["кофе", "kofe"], ["бар", "bar"]]
+        assert query_terms("kofe") == [["kofe"]]
+
+    def test_all_words_by_prefix(self):
+        assert prefix_tsquery("кофе бар") == "(кофе:* | kofe:*) & (бар:* | bar:*)"
+
+    def test_empty_query(self):
+        assert prefix_tsquery("") is None
+        assert prefix_tsquery(" ,!- ") is None
+
+    def test_latin_query_matches_cyrillic_document(self):
+        """"kofe" находит "кофе": латинская форма есть в документе и в запросе"""
+        document = searchable("Кофе").split()
+        for variants in query_terms("kofe"):
+            assert any(word.startswith(variant) for variant in variants for word in document)
+        for variants in query_terms("Кофе"):
+            assert "kofe" in variants
@@ -0,0 +1,178 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.working_hours import (
+    MINUTES_PER_DAY,
+    MINUTES_PER_WEEK,
+    WorkingHoursIndex,
+    is_open_at,
+    merge_intervals,
+    parse_working_hours,
+    week_minute,
+)
+
+MON, TUE, WED, THU, FRI, SAT, SUN = range(7)
+
+
+def at(day: int, hour: int, minute: int = 0) -> int:
+    """Минута недели"""
+    return day * MINUTES_PER_DAY + hour * 60 + minute
+
+
+def open_days(intervals, hour: int, minute: int = 0):
+    return [day for day in range(7) if is_open_at(intervals, at(day, hour, minute))]
+
+
+class TestParseWorkingHours:
+    def test_daily_string(self):
+        intervals = parse_working_hours("9:00-18:00")
+
+        assert len(intervals) == 14
+        assert open_days(intervals, 9) == list(range(7))
+        assert open_days(intervals, 17, 59) == list(range(7))
+        assert open_days(intervals, 18) == []
+        assert open_days(intervals, 8, 59) == []
+
+    @pytest.mark.parametrize("key", ["mon", "Monday", "пн", "понедельник"])
+    def test_en_and_ru_day_names(self, key):
+        intervals = parse_working_hours({key: "10.00 - 19.30"})
+
+        assert intervals == [at(MON, 10), at(MON, 19, 30)]
+
+    @pytest.mark.parametrize("key", ["mon-fri", "пн-пт", "weekdays", "будни"])
+    def test_day_ranges(self, key):
+        intervals = parse_working_hours({key: "9-18", "sat": "10-16"})
+
+        assert open_days(intervals, 12) == [MON, TUE, WED, THU, FRI, SAT]
+        assert open_days(intervals, 17) == [MON, TUE, WED, THU, FRI]
+
+    def test_wrapping_day_range(self):
+        """"пт-пн": пятница, выходные и понедельник"""
+        intervals = parse_working_hours({"пт-пн": "10-20"})
+
+        assert open_days(intervals, 12) == [MON, FRI, SAT, SUN]
+
+    def test_multiple_ranges_per_day(self):
+        intervals = parse_working_hours({"daily": ["9-13", "14-18"]})
+
+        assert open_days(intervals, 12) == list(range(7))
+        assert open_days(intervals, 13, 30) == []
+
+    @pytest.mark.parametrize("value", ["24/7", "Круглосуточно", "24h"])
+    def test_always_open(self, value):
+        assert parse_working_hours({"daily": value}) == [0, MINUTES_PER_WEEK]
+
+    def test_overnight_range(self):
+        intervals = parse_working_hours({"fri": "22:00-03:00"})
+
+        assert intervals == [at(FRI, 22), at(SAT, 3)]
+        assert is_open_at(intervals, at(FRI, 23, 59))
+        assert is_open_at(intervals, at(SAT, 2, 59))
+        assert not is_open_at(intervals, at(SAT, 3))
+        assert not is_open_at(intervals, at(FRI, 2))
+
+    def test_overnight_sunday_to_monday(self):
+        """Воскресенье 20:00-02:00: хвост переносится на понедельник"""
+        intervals = parse_working_hours({"sun": "20:00-02:00"})
+
+        assert intervals == [0, at(MON, 2), at(SUN, 20), MINUTES_PER_WEEK]
+        assert is_open_at(intervals, at(SUN, 23))
+        assert is_open_at(intervals, at(MON, 1, 59))
+        assert not is_open_at(intervals, at(MON, 2))
+        assert not is_open_at(intervals, at(SUN, 19))
+
+    def test_overnight_merges_with_next_day(self):
+        intervals = parse_working_hours({"sun": "18-02", "mon": "00:00-01:00"})
+
+        assert intervals == [0, at(MON, 2), at(SUN, 18), MINUTES_PER_WEEK]
+
+    @pytest.mark.parametrize("value", ["выходной", "Closed", None, False, "-", "нет"])
+    def test_closed_day(self, value):
+        intervals = parse_working_hours({"mon-fri": "9-18", "sat": value, "sun": value})
+
+        assert intervals is not None
+        assert open_days(intervals, 12) == [MON, TUE, WED, THU, FRI]
+
+    def test_closed_all_week(self):
+        intervals = parse_working_hours({"daily": "выходной"})
+
+        assert intervals == []
+        assert not is_open_at(intervals, at(WED, 12))
+
+    @pytest.mark.parametrize("raw", [
+        None,
+        "",
+        {},
+        {"mon": "с девяти до шести"},
+        {"mon-fri": "9-18", "sat": "по записи"},
+        {"holiday": "9-18"},
+        ["9-18"],
+    ])
+    def test_unknown_schedule(self, raw):
+        """Нераспознанное расписание - None, и локация считается открытой"""
+        intervals = parse_working_hours(raw)
+
+        assert intervals is None
+        assert is_open_at(intervals, at(SUN, 4))
+
+    def test_json_string(self):
+        assert parse_working_hours('{"mon": "9-18"}') == [at(MON, 9), at(MON, 18)]
+
+
+class TestHelpers:
+    def test_merge_intervals(self):
+        assert merge_intervals([(10, 20), (15, 30), (30, 40), (50, 60), (5, 5)]) == [10, 40, 50, 60]
+
+    def test_week_minute_uses_local_time(self):
+        # Понедельник 20:30 UTC = вторник 02:30 в Бишкеке (UTC+6)
+        moment = datetime(2024, 1, 1, 20, 30)
+
+        assert week_minute(moment) == at(TUE, 2, 30)
+        assert week_minute(moment.replace(tzinfo=timezone.utc), "UTC") == at(MON, 20, 30)
+
+
+class TestWorkingHoursIndex:
+    @pytest.fixture
+    def schedules(self):
+        return {
+            1: parse_working_hours({"mon-fri": "9-18"}),
+            2: parse_working_hours({"sun": "20:00-02:00"}),
+            3: parse_working_hours({"daily": "24/7"}),
+            4: parse_working_hours({"daily": "выходной"}),
+            5: None,
+            6: parse_working_hours({"fri-sat": "22-04"}),
+        }
+
+    @pytest.fixture
+    def index(self, schedules):
+        index = WorkingHoursIndex()
+        index.build(schedules.items())
+        return index
+
+    @pytest.mark.parametrize("minute, expected", [
+        (at(MON, 1), [2, 3, 5]),
+        (at(MON, 10), [1, 3, 5]),
+        (at(SAT, 3), [3, 5, 6]),
+        (at(SUN, 3), [3, 5, 6]),
+        (at(SUN, 21), [2, 3, 5]),
+        (at(WED, 18), [3, 5]),
+    ])
+    def test_open_ids(self, index, minute, expected):
+        assert sorted(index.open_ids(minute).tolist()) == expected
+
+    def test_matches_is_open_at(self, index, schedules):
+        rng = random.Random(3)
+        for minute in [0, MINUTES_PER_WEEK - 1] + [rng.randrange(MINUTES_PER_WEEK) for _ in range(500)]:
+            expected = [location_id for location_id, intervals in schedules.items() if is_open_at(intervals, minute)]
+            assert sorted(index.open_ids(minute).tolist()) == expected
+
+    def test_positions_and_empty_index(self, index):
+        assert len(index) == 6
+        assert index.position(4) == 3
+        assert index.position(99) is None
+
+        empty = WorkingHoursIndex()
+        assert empty.build([]) == 0
+        assert empty.open_ids(at(MON, 12)).tolist() == []